@@ -1,3 +1,6 @@
+import "./featured.js";
+import "./search.js";
+
 // Close the top-left persona dropdown when clicking outside or pressing Escape.
 const wordmarkMenu = document.querySelector("details.wordmark-menu");
 if (wordmarkMenu) {
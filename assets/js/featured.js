@@ -0,0 +1,85 @@
+// Infinite scroll for the home gallery. The first screen is rendered into the
+// page; the rest of the featured photos are published by
+// partials/home-gallery.html as /featured/page-N.json, each with thumbnail
+// URLs and a layout precomputed by scripts/build_featured.py. Pages are
+// appended as .featured-block elements, positioned by the same CSS custom
+// properties as the inline block, so there is no layout pass here either.
+
+const gallery = document.getElementById("gallery");
+const sentinel = document.getElementById("gallery-more");
+
+function renderItem(entry) {
+  const item = document.createElement("a");
+  item.className = "gallery-item";
+  item.href = entry.href;
+  item.title = entry.title;
+  item.dataset.pswpSrc = entry.full;
+  item.dataset.pswpWidth = entry.fullWidth;
+  item.dataset.pswpHeight = entry.fullHeight;
+  item.dataset.pswpTarget = entry.target;
+  item.style.aspectRatio = `${entry.width} / ${entry.height}`;
+  entry.boxes.forEach(([left, top, width, height], n) => {
+    item.style.setProperty(`--l${n}`, `${left}%`);
+    item.style.setProperty(`--t${n}`, `${top}%`);
+    item.style.setProperty(`--w${n}`, `${width}%`);
+    item.style.setProperty(`--h${n}`, `${height}%`);
+  });
+
+  const figure = document.createElement("figure");
+  figure.style.backgroundColor = entry.color;
+  if (entry.lqip) {
+    figure.style.backgroundImage = `url(${entry.lqip})`;
+    figure.style.backgroundSize = "cover";
+  }
+  figure.style.aspectRatio = `${entry.width} / ${entry.height}`;
+
+  const img = document.createElement("img");
+  img.className = "lazyload";
+  img.width = entry.width;
+  img.height = entry.height;
+  img.alt = entry.title;
+  img.dataset.src = entry.thumb;
+
+  figure.appendChild(img);
+  item.appendChild(figure);
+  return item;
+}
+
+if (gallery && sentinel && gallery.dataset.next) {
+  let next = gallery.dataset.next;
+  let loading = false;
+
+  const observer = new IntersectionObserver(
+    (entries) => {
+      if (!entries.some((e) => e.isIntersecting) || loading || !next) return;
+      loading = true;
+      fetch(next)
+        .then((response) => {
+          if (!response.ok) throw new Error(`${response.status} ${next}`);
+          return response.json();
+        })
+        .then((page) => {
+          const block = document.createElement("div");
+          block.className = "featured-block";
+          page.ratios.forEach((ratio, n) => block.style.setProperty(`--ar${n}`, ratio));
+          page.items.forEach((entry) => block.appendChild(renderItem(entry)));
+          gallery.appendChild(block);
+          next = page.next;
+          if (!next) {
+            observer.disconnect();
+          } else {
+            // Re-arm: fires again at once if the sentinel is still in range.
+            observer.unobserve(sentinel);
+            observer.observe(sentinel);
+          }
+        })
+        .catch(() => observer.disconnect())
+        .finally(() => {
+          loading = false;
+        });
+    },
+    { rootMargin: "1200px 0px" },
+  );
+
+  observer.observe(sentinel);
+}
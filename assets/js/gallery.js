@@ -3,7 +3,9 @@ import * as params from "@params";
 
 const gallery = document.getElementById("gallery");
 
-if (gallery) {
+// The home gallery may ship with boxes precomputed by scripts/build_featured.py
+// and positioned by CSS; only lay out galleries that still need it.
+if (gallery && gallery.dataset.layout !== "static") {
   let containerWidth = 0;
   const items = gallery.querySelectorAll(".gallery-item");
 
@@ -0,0 +1,148 @@
+// Site search over the static index built by scripts/build_search.py
+// (static/search/). A search fetches the small manifest once, then only the
+// term shards whose prefix fits the typed words and the document blocks
+// holding the results shown; every file is cached for the rest of the visit.
+// Every word must match the start of a term: "faro 2025-08" finds the Faroe
+// photos from August 2025.
+
+const form = document.querySelector("form.site-search");
+const LIMIT = 20; // results shown
+
+// Same terms as `tokens()` in scripts/build_search.py.
+function tokens(text) {
+  const plain = text.toLowerCase().normalize("NFKD").replace(/\p{M}/gu, "");
+  return plain.match(/\d{4}(?:-\d{1,2}){1,2}|[\p{L}\p{N}]+/gu) || [];
+}
+
+// Front-coded terms: each line is the length shared with the previous term
+// (one base-36 digit) and the rest. Lengths count code points, not UTF-16 units.
+function frontDecode(text) {
+  const terms = [];
+  let prev = [];
+  for (const line of text ? text.split("\n") : []) {
+    prev = prev.slice(0, parseInt(line[0], 36)).concat(Array.from(line.slice(1)));
+    terms.push(prev.join(""));
+  }
+  return terms;
+}
+
+// Delta-encoded posting list (polyline integers, as in scripts/route_codec.py).
+function decodePostings(text) {
+  const ids = [];
+  let value = 0;
+  let shift = 0;
+  let id = 0;
+  for (let i = 0; i < text.length; i++) {
+    const byte = text.charCodeAt(i) - 63;
+    value |= (byte & 0x1f) << shift;
+    shift += 5;
+    if (byte < 0x20) {
+      id += value & 1 ? ~(value >> 1) : value >> 1;
+      ids.push(id);
+      value = 0;
+      shift = 0;
+    }
+  }
+  return ids;
+}
+
+if (form) {
+  const input = form.querySelector("input");
+  const list = form.querySelector(".site-search__results");
+  const base = new URL(form.dataset.index, location.href);
+  const files = new Map();
+  let pending = 0;
+  let timer;
+
+  const load = (url) => {
+    if (!files.has(url)) {
+      files.set(
+        url,
+        fetch(url).then((response) => {
+          if (!response.ok) throw new Error(`${response.status} ${url}`);
+          return response.json();
+        }),
+      );
+    }
+    return files.get(url);
+  };
+  const file = (name) => load(new URL(name, base).href);
+  const pages = () =>
+    load(form.dataset.pages).then((flat) => {
+      const urls = new Map();
+      for (let i = 0; i < flat.length; i += 2) urls.set(flat[i], flat[i + 1]);
+      return urls;
+    });
+
+  // Document ids with a term starting with `word`: a term lives in the shard
+  // with the longest key it starts with, so only keys that start with the
+  // word, or that the word starts with, can hold one.
+  async function lookup(manifest, word) {
+    const keys = Object.keys(manifest.shards).filter((k) => word.startsWith(k) || k.startsWith(word));
+    const ids = new Set();
+    for (const shard of await Promise.all(keys.map((k) => file(manifest.shards[k])))) {
+      frontDecode(shard.terms).forEach((term, n) => {
+        if (term.startsWith(word)) decodePostings(shard.postings[n]).forEach((id) => ids.add(id));
+      });
+    }
+    return ids;
+  }
+
+  async function search(query) {
+    const words = [...new Set(tokens(query))];
+    if (!words.length) return [];
+    const manifest = await file("index.json");
+    const sets = await Promise.all(words.map((word) => lookup(manifest, word)));
+    const ids = [...sets.reduce((a, b) => new Set([...a].filter((id) => b.has(id))))].sort((a, b) => a - b);
+    const shown = ids.slice(0, LIMIT);
+    const blocks = await Promise.all(shown.map((id) => file(manifest.blocks[Math.floor(id / manifest.block)])));
+    const urls = await pages();
+    return shown.map((id, n) => {
+      const [page, photo, title, date] = blocks[n][id % manifest.block];
+      const url = urls.get(manifest.pages[page]) || "#";
+      return { href: photo ? url + photo : url, title: title || photo, date, trip: !photo };
+    });
+  }
+
+  function render(results) {
+    list.replaceChildren(
+      ...results.map((r) => {
+        const item = document.createElement("li");
+        const link = document.createElement("a");
+        link.href = r.href;
+        link.textContent = r.title;
+        if (r.trip) item.className = "is-trip";
+        item.appendChild(link);
+        if (r.date) {
+          const date = document.createElement("time");
+          date.dateTime = r.date;
+          date.textContent = r.date;
+          item.appendChild(date);
+        }
+        return item;
+      }),
+    );
+    list.hidden = !results.length;
+  }
+
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => {
+      const request = ++pending;
+      search(input.value)
+        .then((results) => request === pending && render(results))
+        .catch(() => request === pending && render([]));
+    }, 120);
+  });
+  form.addEventListener("submit", (event) => {
+    event.preventDefault();
+    const first = list.querySelector("a");
+    if (first) location.href = first.href;
+  });
+  input.addEventListener("keydown", (event) => {
+    if (event.key === "Escape") {
+      input.value = "";
+      render([]);
+    }
+  });
+}
@@ -0,0 +1,77 @@
+"""
+Single entry point for the workflow scripts: `python3 -m scripts <command>`.
+
+Only the chosen command's script is loaded, and each script imports geopy
+or Pillow when it first needs them, so `--help` and argument errors return
+in a few tens of milliseconds.
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+
+USAGE = """\
+usage: python3 -m scripts <command> [args...]
+       python3 -m scripts <command> --help
+
+commands:
+  extract     Scan, validate and geocode a trip folder; write GPX (smart-gps-extract.py)
+  geocode     Re-geocode an extracted trip from gpx/<name>-gps.json
+  gpx         Convert exiftool JSON to a GPX track (json2gpx.py)
+  featured    Build the home page's featured photos (build_featured.py)
+  tiles       Draw the GPX tracks into static map tiles (build_tiles.py)
+  search      Build the site's search index over trips and photos (build_search.py)
+  write-meta  Write city/state/country into photo IPTC (write-location-metadata.py)"""
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# command -> (script file, entry function)
+COMMANDS = {
+    'extract': ('smart-gps-extract.py', 'main'),
+    'geocode': ('smart-gps-extract.py', 'geocode_main'),
+    'gpx': ('json2gpx.py', 'main'),
+    'featured': ('build_featured.py', 'main'),
+    'tiles': ('build_tiles.py', 'main'),
+    'search': ('build_search.py', 'main'),
+    'write-meta': ('write-location-metadata.py', 'main'),
+}
+
+
+def load_command(name):
+    """Load the script behind `name` and return its entry function."""
+    filename, func = COMMANDS[name]
+    module_name = os.path.splitext(filename)[0]
+    if filename == 'smart-gps-extract.py':
+        from scripts import smart_gps_extract
+        module = smart_gps_extract.load()
+    elif '-' not in module_name:
+        module = importlib.import_module(f"scripts.{module_name}")
+    else:
+        # Dashed filenames can't be imported by name.
+        spec = importlib.util.spec_from_file_location(module_name.replace('-', '_'),
+                                                      os.path.join(SCRIPTS_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return getattr(module, func)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(USAGE)
+        return 0 if argv else 2
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"unknown command: {name}\n\n{USAGE}", file=sys.stderr)
+        return 2
+
+    entry = load_command(name)
+    # Scripts parse sys.argv themselves; make their usage lines read `scripts <command>`.
+    sys.argv = [f"scripts {name}", *rest]
+    result = entry()
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+Offline country and admin-1 (state/province) lookup by point in polygon.
+
+The nearest place in a gazetteer is often across the border from the
+photo, and the country decides the `content/trips/<Country>/` folder. This
+module answers from boundary polygons instead: local GeoJSON files such as
+Natural Earth's admin-0 countries and admin-1 states/provinces (ogr2ogr
+-f GeoJSON converts the shapefiles), loaded once per process.
+
+With shapely 2 installed, the polygons are prepared and packed into a
+shapely STRtree, and `locate_many` queries whole coordinate arrays at once
+(well over 100k points per second). Without it, the same structure is
+built in pure Python: an STR-packed R-tree of polygon bounding boxes, each
+polygon prepared by bucketing its edges into latitude bands so a test only
+crosses the edges near the point. That manages about 100k points per
+second over small regions, fewer over detailed coastlines: fast enough for
+a trip, not for a library.
+
+    python3 -m scripts write-meta ~/Pictures/Trip \\
+        --boundaries ne_10m_admin_0_countries.geojson \\
+        --admin1 ne_10m_admin_1_states_provinces.geojson
+"""
+
+import json
+import math
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from scripts import deps
+
+NODE_CAPACITY = 16  # children per R-tree node
+MAX_BANDS = 256  # latitude bands per prepared polygon
+
+# Property names tried in order. NAME_LONG matches Nominatim's English
+# country names best ("United States", "Faroe Islands").
+COUNTRY_FIELDS = ("NAME_LONG", "name_long", "NAME_EN", "name_en", "ADMIN", "admin", "NAME", "name")
+ADMIN1_FIELDS = ("name_en", "NAME_EN", "name", "NAME")
+ADMIN1_COUNTRY_FIELDS = ("admin", "ADMIN", "geonunit")
+
+Box = Tuple[float, float, float, float]  # min lon, min lat, max lon, max lat
+
+
+class Region(NamedTuple):
+    name: str
+    country: str = ""  # admin-1 regions: the country they belong to
+
+
+def _first(props: dict, fields: Sequence[str]) -> str:
+    for field in fields:
+        if props.get(field):
+            return str(props[field])
+    return ""
+
+
+class PreparedPolygon:
+    """Even-odd point-in-polygon test over the edges in the point's latitude band.
+
+    `rings` are the outer ring and holes as lists of (lon, lat).
+    """
+
+    def __init__(self, rings: List[List[Tuple[float, float]]]):
+        edges = []
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if y1 != y2:  # horizontal edges never cross a horizontal ray
+                    edges.append((x1, y1, x2, y2))
+        xs = [x for ring in rings for x, _ in ring]
+        ys = [y for ring in rings for _, y in ring]
+        self.box: Box = (min(xs), min(ys), max(xs), max(ys))
+        self.bands = max(1, min(MAX_BANDS, len(edges) // 8))
+        self.band_height = (self.box[3] - self.box[1]) / self.bands or 1.0
+        self.edges: List[list] = [[] for _ in range(self.bands)]
+        for edge in edges:
+            low, high = sorted((edge[1], edge[3]))
+            for band in range(self._band(low), self._band(high) + 1):
+                self.edges[band].append(edge)
+
+    def _band(self, lat: float) -> int:
+        return min(self.bands - 1, max(0, int((lat - self.box[1]) / self.band_height)))
+
+    def contains(self, lon: float, lat: float) -> bool:
+        min_x, min_y, max_x, max_y = self.box
+        if not (min_x <= lon <= max_x and min_y <= lat <= max_y):
+            return False
+        inside = False
+        for x1, y1, x2, y2 in self.edges[self._band(lat)]:
+            if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+
+def _union(boxes) -> Box:
+    boxes = list(boxes)
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def _tiles(items: list, capacity: int):
+    """Groups of `capacity` items: vertical slices by x, then runs by y within each."""
+    slices = math.ceil(math.sqrt(math.ceil(len(items) / capacity)))
+    per_slice = slices * capacity
+    by_x = sorted(items, key=lambda item: item[0][0] + item[0][2])
+    for s in range(0, len(by_x), per_slice):
+        column = sorted(by_x[s:s + per_slice], key=lambda item: item[0][1] + item[0][3])
+        for c in range(0, len(column), capacity):
+            yield column[c:c + capacity]
+
+
+def str_pack(boxes: List[Box], capacity: int = NODE_CAPACITY) -> tuple:
+    """Sort-Tile-Recursive packed R-tree over `boxes`.
+
+    Nodes are (box, children, leaf); a leaf's children are (box, index into
+    `boxes`), other nodes' children are nodes.
+    """
+    items, leaf = [(box, i) for i, box in enumerate(boxes)], True
+    while True:
+        nodes = [(_union(box for box, _ in group), group if leaf else [node for _, node in group], leaf)
+                 for group in _tiles(items, capacity)]
+        if len(nodes) == 1:
+            return nodes[0]
+        items, leaf = [(node[0], node) for node in nodes], False
+
+
+def _query(root: tuple, lon: float, lat: float, out: list) -> None:
+    """Append the indexes of every box containing the point."""
+    box = root[0]
+    if not (box[0] <= lon <= box[2] and box[1] <= lat <= box[3]):
+        return
+    # Children are tested before they are pushed: only nodes containing the point go on the stack
+    stack = [root]
+    while stack:
+        _, children, leaf = stack.pop()
+        if leaf:
+            for b, i in children:
+                if b[0] <= lon <= b[2] and b[1] <= lat <= b[3]:
+                    out.append(i)
+        else:
+            for node in children:
+                b = node[0]
+                if b[0] <= lon <= b[2] and b[1] <= lat <= b[3]:
+                    stack.append(node)
+
+
+def _polygons(geometry: dict) -> List[list]:
+    """Rings of each polygon in a GeoJSON Polygon/MultiPolygon, as (lon, lat) tuples."""
+    kind, coords = geometry.get("type"), geometry.get("coordinates") or []
+    polygons = [coords] if kind == "Polygon" else coords if kind == "MultiPolygon" else []
+    return [[[(float(x), float(y)) for x, y, *_ in ring] for ring in polygon if ring]
+            for polygon in polygons if polygon]
+
+
+class BoundaryIndex:
+    """Regions by point: the first region (in file order) whose polygon contains it."""
+
+    def __init__(self, features: List[Tuple[Region, dict]], use_shapely: Optional[bool] = None):
+        self.regions = [region for region, _ in features]
+        if use_shapely is None:
+            use_shapely = not deps.missing("shapely")
+        self.engine = "shapely" if use_shapely else "python"
+        if use_shapely:
+            import shapely
+            from shapely.geometry import shape
+
+            self._geoms = [shape(geometry) for _, geometry in features]
+            shapely.prepare(self._geoms)
+            self._tree = shapely.STRtree(self._geoms)
+            return
+        self._parts: List[Tuple[int, PreparedPolygon]] = []
+        for i, (_, geometry) in enumerate(features):
+            for rings in _polygons(geometry):
+                self._parts.append((i, PreparedPolygon(rings)))
+        self._root = str_pack([part.box for _, part in self._parts]) if self._parts else None
+
+    @classmethod
+    def from_geojson(cls, path: str, fields: Sequence[str] = COUNTRY_FIELDS,
+                     country_fields: Sequence[str] = (), use_shapely: Optional[bool] = None) -> "BoundaryIndex":
+        """Regions from a GeoJSON FeatureCollection, named by the first of `fields` present."""
+        with open(path, encoding="utf-8") as fh:
+            collection = json.load(fh)
+        features = []
+        for feature in collection.get("features", []):
+            props = feature.get("properties") or {}
+            name = _first(props, fields)
+            if name and feature.get("geometry"):
+                features.append((Region(name, _first(props, country_fields)), feature["geometry"]))
+        return cls(features, use_shapely)
+
+    def __len__(self) -> int:
+        return len(self.regions)
+
+    def locate(self, lat: float, lon: float) -> Optional[Region]:
+        return self.locate_many([(lat, lon)])[0]
+
+    def locate_many(self, points: Sequence[Tuple[float, float]]) -> List[Optional[Region]]:
+        """Region of each (lat, lon), or None outside every polygon."""
+        if not points:
+            return []
+        if self.engine == "shapely":
+            return self._locate_shapely(points)
+        found: Dict[Tuple[float, float], Optional[Region]] = {}  # photos repeat coordinates
+        locate = self._locate_python
+        result = []
+        for point in points:
+            key = tuple(point)
+            if key not in found:
+                found[key] = locate(*key)
+            result.append(found[key])
+        return result
+
+    def _locate_python(self, lat: float, lon: float) -> Optional[Region]:
+        if self._root is None:
+            return None
+        candidates = []
+        _query(self._root, lon, lat, candidates)
+        candidates.sort()  # parts are in feature (file) order
+        for c in candidates:
+            feature, part = self._parts[c]
+            if part.contains(lon, lat):
+                return self.regions[feature]
+        return None
+
+    def _locate_shapely(self, points: Sequence[Tuple[float, float]]) -> List[Optional[Region]]:
+        import numpy as np
+        import shapely
+
+        coords = np.asarray(points, dtype=float)
+        query, hits = self._tree.query(shapely.points(coords[:, 1], coords[:, 0]), predicate="intersects")
+        best = np.full(len(coords), len(self.regions))
+        np.minimum.at(best, query, hits)  # overlapping claims: first in file order wins
+        return [self.regions[i] if i < len(self.regions) else None for i in best.tolist()]
+
+
+class Boundaries:
+    """Country and admin-1 indexes together; answers (state, country)."""
+
+    def __init__(self, countries: Optional[BoundaryIndex] = None, admin1: Optional[BoundaryIndex] = None):
+        self.countries = countries
+        self.admin1 = admin1
+
+    def lookup(self, lat: float, lon: float) -> Tuple[str, str]:
+        return self.lookup_many([(lat, lon)])[0]
+
+    def lookup_many(self, points: Sequence[Tuple[float, float]]) -> List[Tuple[str, str]]:
+        """(state, country) per point; "" where no polygon says."""
+        states = self.admin1.locate_many(points) if self.admin1 else [None] * len(points)
+        countries = self.countries.locate_many(points) if self.countries else [None] * len(points)
+        result = []
+        for state, country in zip(states, countries):
+            name = country.name if country else (state.country if state else "")
+            # A state from the other side of a border the two files disagree on is dropped
+            keep = state and (not state.country or not country or state.country == country.name)
+            result.append((state.name if keep else "", name))
+        return result
+
+
+@lru_cache(maxsize=4)
+def load_boundaries(countries: Optional[str] = None, admin1: Optional[str] = None) -> Boundaries:
+    """Boundaries from GeoJSON files, read once per process."""
+    return Boundaries(
+        BoundaryIndex.from_geojson(countries) if countries else None,
+        BoundaryIndex.from_geojson(admin1, ADMIN1_FIELDS, ADMIN1_COUNTRY_FIELDS) if admin1 else None,
+    )
@@ -6,97 +6,471 @@ time. This script reads them with exiftool and writes `data/featured_photos.yaml
 a list of the high-rated photos that `layouts/partials/home-gallery.html` renders
 as one cross-trip justified gallery on the home page.
 
+Each entry also carries what the template would otherwise ask Hugo to derive
+from the decoded thumbnail: its final `fit 600x600` size, a dominant colour and
+a tiny base64 JPEG placeholder (LQIP). These are computed with Pillow in one
+parallel pass, so the template only interpolates strings.
+
+The justified layout itself is precomputed too: for a set of breakpoint
+container widths the script runs the same algorithm as `assets/js/gallery.js`
+(see `scripts/justified_layout.py`) and stores every box as percentages, plus
+the container sizes in `data/featured_layout.yaml`. The page then renders laid
+out with CSS container queries and no JS layout pass.
+
+Near-duplicates are dropped as well: every photo under `content/trips` gets a
+perceptual hash (cached by file content in `.cache/image-hashes.json`, which
+forgets photos no longer in the archive), and a featured photo within
+`--dup-threshold` bits of a higher-ranked one is skipped, whatever its file
+name. `--report` writes all near-duplicate groups found in the archive.
+
+Selection is bounded: records are streamed from exiftool into per-page
+min-heaps, so at most `--limit` photos (and `--per-page` from one trip) reach
+the home page and the build cost stays flat as `content/trips` grows.
+
+The same exiftool pass also reads each photo's camera, lens and exposure,
+and writes them display-ready to `data/exif/<page>/photos.json` (see
+`scripts/exif_display.py`), so the trip galleries and their lightbox
+captions never decode EXIF at build time.
+
+Only the first screen (`--inline` photos) goes into `data/featured_photos.yaml`
+and the first HTML response. The rest are split into fixed-size pages in
+`data/featured_pages.json`, each with its own precomputed layout; the home
+template publishes them as `/featured/page-N.json` with thumbnail URLs, and
+`assets/js/featured.js` appends them on scroll.
+
 Usage:
-    python3 scripts/build_featured.py [min_rating]
+    python3 scripts/build_featured.py [min_rating] [--limit N] [--per-page N]
+                                      [--half-life DAYS] [--dup-threshold N] [--report FILE]
+                                      [--inline N] [--page-size N]
 
-    min_rating  Minimum star rating to include (default: 3).
+    min_rating       Minimum star rating to include (default: 3).
+    --limit          Maximum featured photos (default: 60).
+    --per-page       Maximum featured photos from one trip page (default: 8).
+    --half-life      Halve a photo's score every DAYS of age (default: no decay).
+    --dup-threshold  Max pHash distance (bits of 64) for a near-duplicate (default: 6).
+    --report         Write near-duplicate groups across the archive to FILE (JSON).
+    --inline         Photos rendered into the page itself (default: 24).
+    --page-size      Photos per lazily loaded JSON page (default: 24).
 
-Re-run this whenever you change ratings, then commit the updated data file.
+Re-run this whenever you change ratings or add photos, then commit the updated data files.
 """
 
+import argparse
+import base64
+import heapq
+import io
 import json
 import os
 import subprocess
 import sys
+from datetime import datetime
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import deps, perf  # noqa: E402
+from scripts.exif_display import EXIF_DIR, TAGS as EXIF_TAGS, ExifPages  # noqa: E402
+from scripts.exif_json import iter_records  # noqa: E402
+from scripts.image_hash import BKTree, HashCache, duplicate_groups, phash  # noqa: E402
+from scripts.justified_layout import layout_gallery  # noqa: E402
+from scripts.perf import TRACER  # noqa: E402
 
 CONTENT_ROOT = "content/trips"
 OUTPUT = "data/featured_photos.yaml"
+LAYOUT_OUTPUT = "data/featured_layout.yaml"
+PAGES_OUTPUT = "data/featured_pages.json"
+# Container widths (px) the layout is precomputed for. Each layout is used,
+# scaled, from its width up to the next one; the first also covers narrower.
+LAYOUT_WIDTHS = (360, 480, 640, 800, 1024, 1280, 1600)
 DEFAULT_MIN_RATING = 3
+DEFAULT_DUP_THRESHOLD = 6
+DEFAULT_LIMIT = 60  # photos on the home page, however large the archive grows
+DEFAULT_PER_PAGE = 8  # at most this many from one trip page
+DEFAULT_INLINE = 24  # first screen, rendered into the home page HTML
+DEFAULT_PAGE_SIZE = 24  # photos per /featured/page-N.json
+HASH_CACHE = ".cache/image-hashes.json"
+THUMB_BOX = 600  # keep in sync with `images.Process "fit 600x600"` in home-gallery.html
+LQIP_SIZE = 16  # longest edge of the inline placeholder, in pixels
+
+
+def fit_size(width: int, height: int, box: int = THUMB_BOX) -> tuple:
+    """Size Hugo's `fit BOXxBOX` produces: downscale only, rounded half up."""
+    if width <= box and height <= box:
+        return width, height
+    wratio, hratio = width / box, height / box
+    if wratio > hratio:
+        return box, min(int(height / wratio + 0.5), box)
+    return min(int(width / hratio + 0.5), box), box
+
+
+def placeholder(path: str) -> dict:
+    """Thumbnail size, dominant colour and LQIP data URI for one photo.
+
+    Returns an empty dict when the file cannot be decoded, or is larger than
+    Pillow's decompression-bomb limit; the template then falls back to its
+    defaults.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+            if im.getexif().get(0x0112, 1) in (5, 6, 7, 8):  # rotated 90°
+                width, height = height, width
+            # JPEG draft mode decodes straight at 1/2..1/8 scale, which is far
+            # cheaper than a full decode for a 16 px placeholder.
+            im.draft("RGB", (LQIP_SIZE * 8, LQIP_SIZE * 8))
+            small = ImageOps.exif_transpose(im).convert("RGB")
+    except (OSError, Image.DecompressionBombError):  # corrupt, or a huge panorama
+        return {}
+
+    small.thumbnail((LQIP_SIZE * 4, LQIP_SIZE * 4))
+    palette = small.quantize(colors=5)
+    _, index = max(palette.getcolors())
+    r, g, b = palette.getpalette()[index * 3:index * 3 + 3]
+
+    small.thumbnail((LQIP_SIZE, LQIP_SIZE))
+    buf = io.BytesIO()
+    small.save(buf, format="JPEG", quality=40, optimize=True)
+
+    thumb_w, thumb_h = fit_size(width, height)
+    return {
+        "width": thumb_w,
+        "height": thumb_h,
+        "color": f"#{r:02x}{g:02x}{b:02x}",
+        "lqip": "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+    }
+
+
+def gallery_params(config: str = "hugo.toml") -> dict:
+    """`[params.gallery]` from the site config, over the theme's defaults."""
+    params = {"targetRowHeight": 288, "boxSpacing": 8, "targetRowHeightTolerance": 0.25}
+    try:
+        import tomllib
+    except ImportError:
+        print("warning: Python < 3.11 cannot read hugo.toml; using the theme's layout defaults", file=sys.stderr)
+        return params
+    try:
+        with open(config, "rb") as fh:
+            params.update(tomllib.load(fh).get("params", {}).get("gallery", {}))
+    except FileNotFoundError:
+        pass
+    return params
+
+
+def compute_layouts(items: list, params: dict, widths=LAYOUT_WIDTHS) -> list:
+    """Attach per-breakpoint boxes to every item; return the container sizes.
+
+    Boxes are `[left, top, width, height]` in percent of the container, so one
+    layout scales cleanly until the next breakpoint takes over; `gap` is the
+    box spacing in percent of the width, used between stacked pages. Returns
+    an empty list (and attaches nothing) if any item lacks a thumbnail size.
+    """
+    if not items or any("width" not in i for i in items):
+        return []
+    aspect_ratios = [i["width"] / i["height"] for i in items]
+    breakpoints = []
+    for n, width in enumerate(widths):
+        layout = layout_gallery(
+            aspect_ratios, width,
+            spacing=params["boxSpacing"],
+            row_height=params["targetRowHeight"],
+            height_tolerance=params["targetRowHeightTolerance"],
+        )
+        height = layout["container_height"]
+        for item, box in zip(items, layout["boxes"]):
+            item.setdefault("boxes", []).append([
+                round(box["left"] / width * 100, 3),
+                round(box["top"] / height * 100, 3),
+                round(box["width"] / width * 100, 3),
+                round(box["height"] / height * 100, 3),
+            ])
+        breakpoints.append({
+            "min": 0 if n == 0 else width,
+            "width": width,
+            "height": round(height, 2),
+            "gap": round(params["boxSpacing"] / width * 100, 3),
+        })
+    return breakpoints
+
+
+def paginate(items: list, inline: int, page_size: int) -> tuple:
+    """Split ranked items into the inline first screen and fixed-size pages."""
+    first, rest = items[:inline], items[inline:]
+    return first, [rest[n:n + page_size] for n in range(0, len(rest), page_size)]
+
+
+def int_at_least(minimum: int):
+    """argparse type: an integer no smaller than `minimum`."""
+    def parse(text: str) -> int:
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid int value: {text!r}")
+        if value < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}, got {value}")
+        return value
+    return parse
+
+
+def write_yaml_item(fh, i: dict) -> None:
+    """One data-file list entry; strings go through json.dumps (valid YAML)."""
+    fh.write(f"- page: {json.dumps(i['page'])}\n")
+    fh.write(f"  src: {json.dumps(i['src'])}\n")
+    fh.write(f"  rating: {i['rating']}\n")
+    fh.write(f"  date: {json.dumps(i['date'])}\n")
+    fh.write(f"  title: {json.dumps(i['title'])}\n")
+    for key in ("width", "height"):
+        if key in i:
+            fh.write(f"  {key}: {i[key]}\n")
+    for key in ("color", "lqip"):
+        if key in i:
+            fh.write(f"  {key}: {json.dumps(i[key])}\n")
+    if "boxes" in i:
+        fh.write(f"  boxes: {json.dumps(i['boxes'])}\n")
+
+
+def archive_hashes(paths: list, cache: HashCache) -> dict:
+    """Perceptual hash per path; only files with unseen content are decoded."""
+    hashes, digests, missing = {}, {}, []
+    for path in paths:
+        digests[path] = cache.digest(path)
+        h = cache.get(digests[path])
+        if h is None:
+            missing.append(path)
+        else:
+            hashes[path] = h
+    TRACER.count("phash.cache_hit", len(hashes))
+    TRACER.count("phash.computed", len(missing))
+    if missing:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor() as pool:
+            for path, h in zip(missing, pool.map(phash, missing, chunksize=8)):
+                if h is not None:
+                    cache.put(digests[path], h)
+                    hashes[path] = h
+    return hashes
+
+
+def drop_near_duplicates(items: list, hashes: dict, threshold: int) -> list:
+    """Keep the first (highest-ranked) photo of every near-duplicate cluster.
+
+    Photos without a hash (undecodable) fall back to the file name, which also
+    catches the hero cover that lives both in a trip and in `content/trips/`.
+    """
+    kept, accepted, names = [], BKTree(), set()
+    for i in items:
+        h = hashes.get(os.path.join("content", i["page"], i["src"]))
+        if h is not None:
+            if accepted.search(h, threshold):
+                continue
+            accepted.add(h, i["src"])
+        elif i["src"] in names:
+            continue
+        names.add(i["src"])
+        kept.append(i)
+    return kept
+
+
+def featured_item(record: dict, min_rating: int) -> Optional[dict]:
+    """Turn one exiftool record into a featured candidate, or None if unrated."""
+    rating = record.get("Rating")
+    if rating is None or int(rating) < min_rating:
+        return None
+    source = record["SourceFile"]  # e.g. content/trips/China/Sichuan/2024....jpg
+    rel = os.path.relpath(source, "content")  # trips/China/Sichuan/2024....jpg
+    date = record.get("DateTimeOriginal") or record.get("CreateDate") or ""
+    title = record.get("Title") or record.get("ImageDescription") or ""
+    # Drop camera-default junk descriptions (e.g. "OLYMPUS DIGITAL CAMERA").
+    if "DIGITAL CAMERA" in str(title).upper():
+        title = ""
+    return {
+        "page": os.path.dirname(rel).replace(os.sep, "/"),  # trips/China/Sichuan
+        "src": os.path.basename(rel),
+        "rating": int(rating),
+        "date": str(date),
+        "title": str(title).strip(),
+    }
+
+
+class FeaturedSelector:
+    """Streaming top-K selection with a per-page cap and optional date decay.
+
+    Candidates are ranked by score (the star rating, optionally halved every
+    `half_life_days` of age), then by date, newest first; ties keep stream
+    order. Each page keeps only its best `min(per_page, limit)` candidates in
+    a bounded min-heap, so memory grows with the number of trips, never with
+    the number of photos, and the final sort touches a bounded pool.
+    """
+
+    def __init__(self, limit: int, per_page: Optional[int] = None,
+                 half_life_days: Optional[float] = None, now: Optional[datetime] = None):
+        self.limit = limit
+        self.cap = min(per_page or limit, limit)
+        self.half_life_days = half_life_days
+        self.now = now or datetime.now()
+        self.seen = 0
+        self._heaps: dict = {}
+
+    def score(self, item: dict) -> float:
+        """Rating, decayed by age when a half-life is set (undated: no decay)."""
+        if not self.half_life_days:
+            return float(item["rating"])
+        try:
+            taken = datetime.strptime(item["date"][:19], "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            return float(item["rating"])
+        age_days = max(0.0, (self.now - taken).total_seconds() / 86400)
+        return item["rating"] * 0.5 ** (age_days / self.half_life_days)
+
+    def push(self, item: dict) -> None:
+        """Offer one candidate; O(log cap)."""
+        self.seen += 1
+        entry = (self.score(item), item["date"], -self.seen, item)
+        heap = self._heaps.setdefault(item["page"], [])
+        if len(heap) < self.cap:
+            heapq.heappush(heap, entry)
+        elif entry[:3] > heap[0][:3]:
+            heapq.heapreplace(heap, entry)
+
+    def ranked(self) -> list:
+        """The retained pool, best first (may exceed `limit` to absorb dedup)."""
+        pool = [entry for heap in self._heaps.values() for entry in heap]
+        pool.sort(key=lambda e: e[:3], reverse=True)
+        return [entry[3] for entry in pool]
 
 
 def main() -> int:
-    min_rating = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MIN_RATING
+    parser = argparse.ArgumentParser(description="Build data/featured_photos.yaml from star ratings")
+    parser.add_argument("min_rating", nargs="?", type=int, default=DEFAULT_MIN_RATING,
+                        help=f"minimum star rating to include (default: {DEFAULT_MIN_RATING})")
+    parser.add_argument("--dup-threshold", type=int, default=DEFAULT_DUP_THRESHOLD,
+                        help=f"max pHash distance for a near-duplicate (default: {DEFAULT_DUP_THRESHOLD})")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help=f"maximum number of featured photos (default: {DEFAULT_LIMIT})")
+    parser.add_argument("--per-page", type=int, default=DEFAULT_PER_PAGE,
+                        help=f"maximum featured photos from one trip page (default: {DEFAULT_PER_PAGE})")
+    parser.add_argument("--half-life", type=float, metavar="DAYS",
+                        help="decay ratings by age: a photo DAYS old counts half its stars")
+    parser.add_argument("--report", metavar="FILE", help="write near-duplicate groups across the archive (JSON)")
+    parser.add_argument("--inline", type=int_at_least(0), default=DEFAULT_INLINE,
+                        help=f"photos rendered into the home page itself (default: {DEFAULT_INLINE})")
+    parser.add_argument("--page-size", type=int_at_least(1), default=DEFAULT_PAGE_SIZE,
+                        help=f"photos per lazily loaded JSON page (default: {DEFAULT_PAGE_SIZE})")
+    perf.add_arguments(parser)
+    args = parser.parse_args()
+    min_rating = args.min_rating
+
+    # Pillow is imported where it's used (placeholders, pHash) so --help stays fast.
+    if deps.missing("PIL"):
+        print("error: Pillow is required (pip3 install --user --break-system-packages pillow)", file=sys.stderr)
+        return 1
 
     repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     os.chdir(repo)
+    perf.start(args)  # after chdir, so --trace/--cprofile paths are repo-relative
 
     if not os.path.isdir(CONTENT_ROOT):
         print(f"error: {CONTENT_ROOT} not found (run from the repo root)", file=sys.stderr)
         return 1
 
-    # One batched exiftool pass over the whole trips tree.
-    proc = subprocess.run(
-        [
-            "exiftool", "-j", "-q", "-r",
-            "-Rating", "-Title", "-ImageDescription",
-            "-DateTimeOriginal", "-CreateDate",
-            "-ext", "jpg", "-ext", "jpeg", "-ext", "heic",
-            CONTENT_ROOT,
-        ],
-        capture_output=True, text=True,
-    )
-    if proc.returncode != 0 and not proc.stdout.strip():
-        print(proc.stderr, file=sys.stderr)
+    selector = FeaturedSelector(args.limit, args.per_page, args.half_life)
+    paths = []  # every photo, for the archive-wide pHash stage
+    exif = ExifPages()
+
+    # One batched exiftool pass over the whole trips tree, consumed as a stream.
+    with TRACER.stage("scan"), TRACER.timed("subprocess.exiftool"):
+        proc = subprocess.Popen(
+            [
+                "exiftool", "-j", "-q", "-r",
+                "-Rating", "-Title", "-CreateDate",
+                *EXIF_TAGS,  # with ImageDescription and DateTimeOriginal
+                "-ext", "jpg", "-ext", "jpeg", "-ext", "heic",
+                CONTENT_ROOT,
+            ],
+            stdout=subprocess.PIPE, text=True,
+        )
+        with proc.stdout:
+            for r in iter_records(proc.stdout):
+                paths.append(os.path.normpath(r["SourceFile"]))
+                exif.add(r)
+                item = featured_item(r, min_rating)
+                if item is not None:
+                    selector.push(item)
+        status = proc.wait()
+    TRACER.count("featured.photos", len(paths))
+    TRACER.count("featured.candidates", selector.seen)
+    if status != 0 and not paths:
         return 1
+    with TRACER.stage("exif"):
+        stats = exif.write()
+    print(f"EXIF of {stats['photos']} photos on {stats['pages']} pages in {EXIF_DIR} "
+          f"({stats['written']} written, {stats['unchanged']} unchanged, {stats['removed']} removed)")
 
-    records = json.loads(proc.stdout or "[]")
+    # Perceptual hashes for the whole archive, then near-duplicate dedup.
+    with TRACER.stage("hash"):
+        cache = HashCache(HASH_CACHE)
+        hashes = archive_hashes(paths, cache)
+        cache.save()
+    with TRACER.stage("select"):
+        pool = selector.ranked()
+        items = drop_near_duplicates(pool, hashes, args.dup_threshold)[:args.limit]
+    print(f"Selected {len(items)} of {selector.seen} candidates "
+          f"(limit {args.limit}, at most {args.per_page} per page"
+          + (f", half-life {args.half_life:g} days)" if args.half_life else ")"))
+    if args.report:
+        groups = duplicate_groups(hashes, args.dup_threshold)
+        with open(args.report, "w", encoding="utf-8") as fh:
+            json.dump({"threshold": args.dup_threshold, "groups": groups}, fh, indent=2, ensure_ascii=False)
+        print(f"Found {len(groups)} near-duplicate group(s) in {CONTENT_ROOT} — {args.report}")
 
-    seen = set()
-    items = []
-    for r in records:
-        rating = r.get("Rating")
-        if rating is None or int(rating) < min_rating:
-            continue
-        source = r["SourceFile"]  # e.g. content/trips/China/Sichuan/2024....jpg
-        rel = os.path.relpath(source, "content")  # trips/China/Sichuan/2024....jpg
-        page = os.path.dirname(rel).replace(os.sep, "/")  # trips/China/Sichuan
-        src = os.path.basename(rel)
-        if src in seen:  # dedupe (e.g. the hero cover that also lives in a trip)
-            continue
-        seen.add(src)
-        date = r.get("DateTimeOriginal") or r.get("CreateDate") or ""
-        title = r.get("Title") or r.get("ImageDescription") or ""
-        # Drop camera-default junk descriptions (e.g. "OLYMPUS DIGITAL CAMERA").
-        if "DIGITAL CAMERA" in title.upper():
-            title = ""
-        items.append({
-            "page": page,
-            "src": src,
-            "rating": int(rating),
-            "date": str(date),
-            "title": str(title).strip(),
-        })
+    # One parallel decode pass for every placeholder (CPU-bound, so processes).
+    from concurrent.futures import ProcessPoolExecutor
 
-    # Highest-rated first, then newest.
-    items.sort(key=lambda i: (-i["rating"], i["date"]), reverse=False)
-    items.sort(key=lambda i: i["date"], reverse=True)
-    items.sort(key=lambda i: i["rating"], reverse=True)
+    paths = [os.path.join("content", i["page"], i["src"]) for i in items]
+    with TRACER.stage("placeholders"), ProcessPoolExecutor() as pool:
+        for i, extra in zip(items, pool.map(placeholder, paths, chunksize=8)):
+            i.update(extra)
+
+    # First screen inline, the rest as fixed-size pages, each laid out on its
+    # own. Without thumbnail sizes there is no static layout to page, so
+    # everything stays inline for gallery.js.
+    with TRACER.stage("layout"):
+        params = gallery_params()
+        if all("width" in i for i in items):
+            first, pages = paginate(items, args.inline, args.page_size)
+        else:
+            first, pages = items, []
+        breakpoints = compute_layouts(first, params)
+        page_data = [
+            {"heights": [bp["height"] for bp in compute_layouts(page, params)], "items": page}
+            for page in pages
+        ]
 
     os.makedirs("data", exist_ok=True)
     with open(OUTPUT, "w", encoding="utf-8") as fh:
         fh.write(f"# Generated by scripts/build_featured.py (Rating >= {min_rating}). Do not edit by hand.\n")
-        for i in items:
-            fh.write(f"- page: {json.dumps(i['page'])}\n")
-            fh.write(f"  src: {json.dumps(i['src'])}\n")
-            fh.write(f"  rating: {i['rating']}\n")
-            fh.write(f"  date: {json.dumps(i['date'])}\n")
-            fh.write(f"  title: {json.dumps(i['title'])}\n")
+        for i in first:
+            write_yaml_item(fh, i)
+
+    with open(LAYOUT_OUTPUT, "w", encoding="utf-8") as fh:
+        fh.write("# Generated by scripts/build_featured.py. Do not edit by hand.\n")
+        fh.write("breakpoints:\n" if breakpoints else "breakpoints: []\n")
+        for bp in breakpoints:
+            fh.write(f"  - min: {bp['min']}\n")
+            fh.write(f"    width: {bp['width']}\n")
+            fh.write(f"    height: {bp['height']}\n")
+            fh.write(f"    gap: {bp['gap']}\n")
+
+    with open(PAGES_OUTPUT, "w", encoding="utf-8") as fh:
+        json.dump(page_data, fh, ensure_ascii=False, separators=(",", ":"))
 
     counts = {}
     for i in items:
         counts[i["rating"]] = counts.get(i["rating"], 0) + 1
     breakdown = ", ".join(f"{k}★×{counts[k]}" for k in sorted(counts, reverse=True))
-    print(f"Wrote {len(items)} photos to {OUTPUT} (Rating >= {min_rating}) — {breakdown}")
+    print(f"Wrote {len(items)} photos (Rating >= {min_rating}) — {breakdown}")
+    print(f"  {len(first)} inline in {OUTPUT}, {len(items) - len(first)} in {len(pages)} page(s) in {PAGES_OUTPUT}")
     return 0
 
 
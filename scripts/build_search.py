@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Build the site's client-side search index over trips and their photos.
+
+Searching in a Hugo template would mean walking every page resource on
+every build, and shipping one big index would make the first search slow
+once the archive has tens of thousands of photos. This script reads the
+front matter of every page bundle under `content/trips` instead and writes
+a static inverted index to `static/search/`, which `assets/js/search.js`
+queries in the browser.
+
+Each trip page and each photo in it is a document. A photo is found by its
+title (from the page's `resources` front matter, glob `src` patterns
+included), the date in its file name (`YYYYMMDD-*.jpg`, else the page
+date), and its page's title, tags and places: the folder names under
+`content/trips`, `location` front matter, and with a `track` parameter the
+cities, states and countries that `smart-gps-extract.py` found for that day
+in `gpx/<track>-summary.json`. Words are lowercased and accents dropped, so
+"torshavn" finds Tórshavn; dates stay whole, so "2025-08" is a prefix of
+every photo from that month.
+
+The index is split so a search fetches only what it needs:
+
+- `index.json`: the shard and block file names and the page paths (small)
+- term shards: the sorted terms starting with one prefix, front-coded (each
+  term stores how many leading characters it shares with the previous one),
+  with one posting list per term: ascending document ids, delta-encoded as
+  the printable variable-length integers of the route files
+  (`scripts/route_codec.py`). A prefix whose shard would exceed
+  `--shard-bytes` is split on the next character.
+- document blocks: `[page, photo file, title, date]` for `DOC_BLOCK`
+  documents each; only the blocks holding the shown results are fetched.
+
+Shard and block files are named by their content hash, so browsers may
+cache them for good, and a rebuild only writes the files that changed and
+removes those no longer listed.
+
+Usage:
+    python3 scripts/build_search.py [--content content/trips] [--gpx-dir gpx]
+                                    [--out static/search] [--shard-bytes N]
+    python3 scripts/build_search.py --query "faroe 2025-08"   # look up in the built index
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import deps, perf  # noqa: E402
+from scripts.perf import TRACER  # noqa: E402
+from scripts.route_codec import decode_values, encode_values  # noqa: E402
+
+CONTENT_ROOT = "content/trips"
+GPX_DIR = "gpx"
+OUTPUT_DIR = "static/search"
+MANIFEST = "index.json"
+SHARD_BYTES = 16 * 1024  # split a prefix's shard above this size
+DOC_BLOCK = 500  # documents per block file
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+SHARED = "0123456789abcdefghijklmnopqrstuvwxyz"  # front-coding prefix lengths, one character each
+# A date (or a query's partial date, 2025-08) stays one term; everything else
+# splits into runs of letters and digits. Keep in sync with assets/js/search.js.
+TOKEN = re.compile(r"\d{4}(?:-\d{1,2}){1,2}|[^\W_]+")
+FILE_DATE = re.compile(r"(?:\d+_)?(\d{8})")  # 20250820-P8200150.jpg, 01_20250820-...
+
+
+def normalize(text: str) -> str:
+    """Lowercase without accents."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokens(text: str) -> List[str]:
+    """The search terms in `text`."""
+    return TOKEN.findall(normalize(text))
+
+
+def read_front_matter(path: str) -> dict:
+    """The YAML front matter of a content file ({} without one)."""
+    import yaml
+
+    with open(path, encoding="utf-8") as fh:
+        if fh.readline().strip() != "---":
+            return {}
+        lines = list(itertools.takewhile(lambda line: line.strip() != "---", fh))
+    try:
+        meta = yaml.safe_load("".join(lines))
+    except yaml.YAMLError as e:
+        print(f"warning: {path}: {e}", file=sys.stderr)
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def iter_pages(content_root: str = CONTENT_ROOT) -> Iterator[Tuple[str, dict, List[str]]]:
+    """(page path, front matter, photo file names) of every published page bundle, in path order.
+
+    The page path is relative to the content directory (`trips/Germany/Dresden`),
+    as `site.GetPage` takes it. Leaf bundles (`index.md`) are not descended into.
+    """
+    content = os.path.dirname(os.path.normpath(content_root))
+    for root, dirs, files in os.walk(content_root):
+        dirs.sort()
+        if "index.md" in files:
+            name, dirs[:] = "index.md", []
+        elif "_index.md" in files:
+            name = "_index.md"
+        else:
+            continue
+        meta = read_front_matter(os.path.join(root, name))
+        if meta.get("draft"):
+            continue
+        photos = sorted(f for f in files if f.lower().endswith(IMAGE_EXTS))
+        yield os.path.relpath(root, content).replace(os.sep, "/"), meta, photos
+
+
+def resource_titles(resources, photos: List[str]) -> Dict[str, str]:
+    """Photo title per file name from `resources` front matter; the first matching entry wins, as in Hugo."""
+    titles = {}
+    for entry in resources if isinstance(resources, list) else []:
+        if isinstance(entry, dict) and entry.get("title") and entry.get("src"):
+            pattern = str(entry["src"]).lower()
+            for photo in photos:
+                if fnmatch.fnmatchcase(photo.lower(), pattern):
+                    titles.setdefault(photo, str(entry["title"]))
+    return titles
+
+
+def photo_date(name: str) -> Optional[str]:
+    """YYYY-MM-DD from a `YYYYMMDD-` file name prefix, or None."""
+    match = FILE_DATE.match(name)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def trip_places(gpx_dir: str, track) -> Tuple[List[str], Dict[str, List[str]]]:
+    """(places of the trip, {date: places of that day}) from `gpx/<track>-summary.json`."""
+    if not track:
+        return [], {}
+    try:
+        with open(os.path.join(gpx_dir, f"{track}-summary.json"), encoding="utf-8") as fh:
+            summary = json.load(fh)
+    except (OSError, ValueError):
+        return [], {}
+    days = {}
+    for day in summary.get("daily_locations", []):
+        places = [*day.get("all_cities", []), day.get("state"), day.get("country")]
+        days[day.get("date")] = [str(p) for p in places if p]
+    trip = [*summary.get("cities_visited", []), *summary.get("countries_visited", [])]
+    return [str(p) for p in trip if p], days
+
+
+def build_index(content_root: str = CONTENT_ROOT, gpx_dir: str = GPX_DIR):
+    """(page paths, documents, {term: ascending document ids}) for every trip page and photo."""
+    pages, docs, postings = [], [], {}
+
+    def add(doc, *texts):
+        for term in {t for text in texts for t in tokens(text)}:
+            postings.setdefault(term, []).append(len(docs))
+        docs.append(doc)
+
+    for page, meta, photos in iter_pages(content_root):
+        k = len(pages)
+        pages.append(page)
+        title = str(meta.get("title") or os.path.basename(page))
+        date = str(meta.get("date") or "")[:10]
+        tags = meta.get("tags") if isinstance(meta.get("tags"), list) else []
+        location = meta.get("location") if isinstance(meta.get("location"), dict) else {}
+        trip, days = trip_places(gpx_dir, meta.get("track"))
+        # The folders under content/trips are country and city names
+        shared = [title, *map(str, tags), *page.split("/")[1:], *map(str, location.values())]
+        add([k, "", title, date], *shared, *trip, date, str(meta.get("description") or ""))
+
+        titles = resource_titles(meta.get("resources"), photos)
+        for photo in photos:
+            day = photo_date(photo) or date
+            add([k, photo, titles.get(photo, ""), day], titles.get(photo, ""), day, *shared, *days.get(day, []))
+    return pages, docs, postings
+
+
+def front_code(terms: List[str]) -> str:
+    """Sorted terms, each as its shared-prefix length with the previous one and the rest, one per line."""
+    out, prev = [], ""
+    for term in terms:
+        shared = min(len(os.path.commonprefix([prev, term])), len(SHARED) - 1)
+        out.append(SHARED[shared] + term[shared:])
+        prev = term
+    return "\n".join(out)
+
+
+def front_decode(text: str) -> List[str]:
+    """The terms of a `front_code` string."""
+    terms, prev = [], ""
+    for line in text.split("\n") if text else []:
+        prev = prev[:SHARED.index(line[0])] + line[1:]
+        terms.append(prev)
+    return terms
+
+
+def encode_postings(ids: List[int]) -> str:
+    """Ascending document ids as delta-encoded printable integers."""
+    return encode_values(b - a for a, b in zip([0] + ids, ids))
+
+
+def shard_terms(terms: List[str], cost: Dict[str, int], limit: int = SHARD_BYTES) -> Dict[str, List[str]]:
+    """Sorted terms grouped under prefix keys, a group over `limit` bytes split on its next character.
+
+    A term lives in the shard with the longest key it starts with, so the
+    terms starting with a query word are in the shards whose key starts with
+    that word or is a prefix of it.
+    """
+    shards = {}
+    stack = [(key, list(group)) for key, group in itertools.groupby(terms, key=lambda t: t[:1])]
+    while stack:
+        key, group = stack.pop()
+        if len(group) == 1 or sum(cost[t] for t in group) <= limit:
+            shards[key] = group
+            continue
+        depth = len(key) + 1
+        if group[0] == key:  # sorted: a term equal to the key comes first
+            shards[key], group = [key], group[1:]
+        stack += [(k, list(g)) for k, g in itertools.groupby(group, key=lambda t: t[:depth])]
+    return dict(sorted(shards.items()))
+
+
+def _write_hashed(out_dir: str, prefix: str, data, stats: dict) -> str:
+    """Write `data` as compact JSON named by its hash, unless that file exists; returns the name."""
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    name = f"{prefix}{hashlib.sha1(body).hexdigest()[:12]}.json"
+    path = os.path.join(out_dir, name)
+    if os.path.exists(path):
+        stats["unchanged"] += 1
+    else:
+        with open(path, "wb") as fh:
+            fh.write(body)
+        stats["written"] += 1
+    return name
+
+
+def write_index(out_dir: str, pages: List[str], docs: List[list], postings: Dict[str, List[int]],
+                shard_bytes: int = SHARD_BYTES, block: int = DOC_BLOCK) -> dict:
+    """Write the shards, document blocks and manifest; returns counts.
+
+    Counts: pages, docs, terms, shards, written, unchanged, removed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stats = {"pages": len(pages), "docs": len(docs), "terms": len(postings), "shards": 0,
+             "written": 0, "unchanged": 0, "removed": 0}
+    encoded = {term: encode_postings(ids) for term, ids in postings.items()}
+    cost = {term: len(term.encode("utf-8")) + len(p) + 4 for term, p in encoded.items()}  # with JSON quoting
+
+    shards = {}
+    for key, terms in shard_terms(sorted(encoded), cost, shard_bytes).items():
+        shards[key] = _write_hashed(out_dir, "t-", {"terms": front_code(terms),
+                                                    "postings": [encoded[t] for t in terms]}, stats)
+    blocks = [_write_hashed(out_dir, "d-", docs[n:n + block], stats) for n in range(0, len(docs), block)]
+    stats["shards"] = len(shards)
+
+    keep = set(shards.values()) | set(blocks)
+    for name in os.listdir(out_dir):
+        if name.startswith(("t-", "d-")) and name.endswith(".json") and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+            stats["removed"] += 1
+
+    manifest = {"version": 1, "docs": len(docs), "block": block, "blocks": blocks, "pages": pages, "shards": shards}
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return stats
+
+
+def build(content_root: str = CONTENT_ROOT, gpx_dir: str = GPX_DIR, out_dir: str = OUTPUT_DIR,
+          shard_bytes: int = SHARD_BYTES) -> dict:
+    """Index every trip page and photo under `content_root` into `out_dir`; returns counts."""
+    with TRACER.stage("scan"):
+        pages, docs, postings = build_index(content_root, gpx_dir)
+    with TRACER.stage("write"):
+        return write_index(out_dir, pages, docs, postings, shard_bytes)
+
+
+def search(out_dir: str, query: str) -> List[list]:
+    """[page path, photo, title, date] of the documents matching every word of `query` as a prefix.
+
+    Looks the words up the way assets/js/search.js does, for checking an index.
+    """
+    def load(name):
+        with open(os.path.join(out_dir, name), encoding="utf-8") as fh:
+            return json.load(fh)
+
+    manifest = load(MANIFEST)
+    ids = None
+    for word in tokens(query):
+        found = set()
+        for key, name in manifest["shards"].items():
+            if word.startswith(key) or key.startswith(word):
+                shard = load(name)
+                for term, posting in zip(front_decode(shard["terms"]), shard["postings"]):
+                    if term.startswith(word):
+                        found.update(itertools.accumulate(decode_values(posting)))
+        ids = found if ids is None else ids & found
+    block, blocks = manifest["block"], {}
+    for i in sorted(ids or ()):
+        if i // block not in blocks:
+            blocks[i // block] = load(manifest["blocks"][i // block])
+    docs = [blocks[i // block][i % block] for i in sorted(ids or ())]
+    return [[manifest["pages"][page], *rest] for page, *rest in docs]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build the client-side search index over trips and photos")
+    parser.add_argument("--content", default=CONTENT_ROOT, help=f"trip pages to index (default: {CONTENT_ROOT})")
+    parser.add_argument("--gpx-dir", default=GPX_DIR, help=f"trip summaries for per-day places (default: {GPX_DIR})")
+    parser.add_argument("--out", default=OUTPUT_DIR, help=f"index directory (default: {OUTPUT_DIR})")
+    parser.add_argument("--shard-bytes", type=int, default=SHARD_BYTES,
+                        help=f"split a term prefix's shard above this size (default: {SHARD_BYTES})")
+    parser.add_argument("--query", metavar="TEXT", help="look TEXT up in the built index instead of building")
+    perf.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(repo)
+    if args.query is not None:
+        try:
+            results = search(args.out, args.query)
+        except OSError as e:
+            print(f"error: no index in {args.out} ({e.strerror}); build it first", file=sys.stderr)
+            return 1
+        for page, photo, title, date in results:
+            print(f"{date:10}  {page}/{photo}  {title}")
+        print(f"{len(results)} result(s)")
+        return 0
+
+    # PyYAML is imported where it's used so --help stays fast.
+    if deps.missing("yaml"):
+        print(f"error: PyYAML is required ({deps.PIP} {deps.PIP_NAMES['yaml']})", file=sys.stderr)
+        return 1
+    perf.start(args)  # after chdir, so --trace/--cprofile paths are repo-relative
+
+    if not os.path.isdir(args.content):
+        print(f"error: {args.content} not found (run from the repo root)", file=sys.stderr)
+        return 1
+    stats = build(args.content, args.gpx_dir, args.out, args.shard_bytes)
+    print(f"{stats['pages']} pages, {stats['docs']} documents -> {stats['terms']} terms in "
+          f"{stats['shards']} shards in {args.out} "
+          f"({stats['written']} files written, {stats['unchanged']} unchanged, {stats['removed']} removed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
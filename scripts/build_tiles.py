@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Rasterize the trip tracks in `gpx/` into a static XYZ map tile pyramid.
+
+Drawing the GPX tracks in the browser would mean shipping every point, so
+the routes are drawn here instead, once per zoom level from 0 to
+`--max-zoom` (default 12), into transparent 256 px tiles under
+`static/tiles/{z}/{x}/{y}.png` that overlay any web map (or stand alone).
+
+Each zoom is one NumPy pass: the points of every track are projected to
+Web Mercator pixels, each segment is densified to one sample per pixel,
+widened to the line width, and the pixels are bucketed per tile with a
+single sort. Only tiles some track passes through are written.
+
+Builds are incremental: every tile's pixel set is hashed and the hashes
+are kept in `.cache/tiles.json`, so a rerun writes only the tiles a changed
+track contributes to, and removes tiles no track touches any more.
+
+`data/trip_maps.json` lists, for each track, the deepest zoom at which it
+fits in a few tiles and which of them exist, so a trip page
+(`layouts/partials/trip-map.html`) loads only those few small images.
+
+Usage:
+    python3 scripts/build_tiles.py [--gpx-dir gpx] [--out static/tiles]
+                                   [--max-zoom 12] [--format png|webp] [--force]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import deps, perf  # noqa: E402
+from scripts.perf import TRACER  # noqa: E402
+
+GPX_DIR = "gpx"
+OUTPUT_DIR = "static/tiles"
+TRIP_MAPS = "data/trip_maps.json"
+MANIFEST = ".cache/tiles.json"
+TILE_SIZE = 256
+MIN_ZOOM = 0
+MAX_ZOOM = 12
+LINE_WIDTH = 2  # pixels
+COLOR = (214, 69, 65)  # route colour (RGB)
+VIEW_TILES = 3  # a trip page shows at most VIEW_TILES x VIEW_TILES tiles
+MAX_LAT = 85.05112878  # Web Mercator's edge
+FORMATS = {"png": "PNG", "webp": "WEBP"}
+
+Tile = Tuple[int, int, int]  # z, x, y
+
+
+def read_track(path: str) -> List[List[Tuple[float, float]]]:
+    """(lat, lon) points of each track segment or route in a GPX file, streamed."""
+    segments, current = [], []
+    for _, elem in ET.iterparse(path, events=("end",)):
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if tag in ("trkpt", "rtept"):
+            try:
+                current.append((float(elem.get("lat")), float(elem.get("lon"))))
+            except (TypeError, ValueError):
+                pass
+            elem.clear()
+        elif tag in ("trkseg", "rte") and current:
+            segments.append(current)
+            current = []
+    if current:
+        segments.append(current)
+    return segments
+
+
+def project(points, zoom: int):
+    """Web Mercator pixel coordinates (float arrays x, y) of (lat, lon) points at `zoom`."""
+    import numpy as np
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lat = np.radians(np.clip(points[:, 0], -MAX_LAT, MAX_LAT))
+    world = TILE_SIZE * 2 ** zoom
+    x = (points[:, 1] + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * world
+    return x, y
+
+
+def densify(x, y, world: float):
+    """Integer pixels along the polyline through (x, y), one sample per pixel step.
+
+    Segments wider than half the world cross the antimeridian; they are not
+    drawn, rather than drawn the long way round.
+    """
+    import numpy as np
+
+    if len(x) < 2:
+        return np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+    dx, dy = np.diff(x), np.diff(y)
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+    steps = np.where(np.abs(dx) > world / 2, 1, np.maximum(steps, 1))
+    seg = np.repeat(np.arange(len(dx)), steps)
+    t = (np.arange(len(seg)) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[seg]
+    t[np.abs(dx[seg]) > world / 2] = 0.0
+    xs = np.append(x[:-1][seg] + dx[seg] * t, x[-1])
+    ys = np.append(y[:-1][seg] + dy[seg] * t, y[-1])
+    return np.floor(xs).astype(np.int64), np.floor(ys).astype(np.int64)
+
+
+def track_pixels(segments, zoom: int, width: int = LINE_WIDTH):
+    """Unique global pixels (x, y) covered by the segments' lines at `zoom`."""
+    import numpy as np
+
+    world = TILE_SIZE * 2 ** zoom
+    xs, ys = [], []
+    for points in segments:
+        x, y = densify(*project(points, zoom), world)
+        xs.append(x)
+        ys.append(y)
+    if not xs:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    x, y = np.concatenate(xs), np.concatenate(ys)
+    # Widen in global coordinates, so lines stay unbroken across tile edges
+    offsets = range(-(width // 2), width - width // 2)
+    x = np.concatenate([x + d for d in offsets for _ in offsets]) % world
+    y = np.clip(np.concatenate([y + d for _ in offsets for d in offsets]), 0, world - 1)
+    flat = np.unique(y * world + x)
+    return flat % world, flat // world
+
+
+def bucket(x, y) -> Dict[Tuple[int, int], "object"]:
+    """Pixels grouped by tile: (tx, ty) -> sorted in-tile offsets (row * TILE_SIZE + col)."""
+    import numpy as np
+
+    if not len(x):
+        return {}
+    keys = (x // TILE_SIZE) << 32 | (y // TILE_SIZE)
+    local = (y % TILE_SIZE) * TILE_SIZE + (x % TILE_SIZE)
+    order = np.lexsort((local, keys))
+    keys, local = keys[order], local[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return {(int(keys[s] >> 32), int(keys[s] & 0xFFFFFFFF)): local[s:e] for s, e in zip(starts, ends)}
+
+
+def tile_hash(offsets, fmt: str) -> str:
+    """What a tile's image depends on: its pixels and the style."""
+    style = f"{fmt}:{COLOR}:{LINE_WIDTH}:{TILE_SIZE}".encode()
+    return hashlib.sha1(style + offsets.astype("<u4").tobytes()).hexdigest()
+
+
+def render(offsets, fmt: str = "png") -> bytes:
+    """A transparent tile with the route pixels in COLOR."""
+    import numpy as np
+    from PIL import Image
+
+    rgba = np.zeros((TILE_SIZE * TILE_SIZE, 4), np.uint8)
+    rgba[offsets] = (*COLOR, 255)
+    image = Image.fromarray(rgba.reshape(TILE_SIZE, TILE_SIZE, 4), "RGBA")
+    buf = io.BytesIO()
+    if fmt == "webp":
+        image.save(buf, "WEBP", lossless=True)
+    else:
+        image.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def trip_view(segments, tiles: set, max_zoom: int) -> dict:
+    """Deepest zoom at which the track fits in VIEW_TILES x VIEW_TILES tiles, and its tiles."""
+    points = [p for seg in segments for p in seg]
+    lats, lons = [p[0] for p in points], [p[1] for p in points]
+    bbox = [min(lons), min(lats), max(lons), max(lats)]
+    for zoom in range(max_zoom, -1, -1):
+        x, y = project([(bbox[3], bbox[0]), (bbox[1], bbox[2])], zoom)
+        x0, x1 = int(x[0]) // TILE_SIZE, int(x[1]) // TILE_SIZE
+        y0, y1 = int(y[0]) // TILE_SIZE, int(y[1]) // TILE_SIZE
+        if x1 - x0 < VIEW_TILES and y1 - y0 < VIEW_TILES:
+            break
+    return {
+        "bbox": [round(v, 5) for v in bbox],
+        "zoom": zoom,
+        "x": [x0, x1],
+        "y": [y0, y1],
+        "tiles": [[tx, ty] for ty in range(y0, y1 + 1) for tx in range(x0, x1 + 1)
+                  if (zoom, tx, ty) in tiles],
+    }
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def tile_path(out_dir: str, tile: Tile, fmt: str) -> str:
+    z, x, y = tile
+    return os.path.join(out_dir, str(z), str(x), f"{y}.{fmt}")
+
+
+def build(gpx_dir: str = GPX_DIR, out_dir: str = OUTPUT_DIR, min_zoom: int = MIN_ZOOM,
+          max_zoom: int = MAX_ZOOM, fmt: str = "png", manifest_path: str = MANIFEST,
+          trip_maps: str = TRIP_MAPS, force: bool = False) -> dict:
+    """Write changed tiles for every track in `gpx_dir`; returns counts.
+
+    Counts: tracks, tiles (all non-empty), written, unchanged, removed.
+    """
+    import numpy as np
+
+    with TRACER.stage("read"):
+        tracks = {}
+        for name in sorted(os.listdir(gpx_dir)) if os.path.isdir(gpx_dir) else []:
+            if name.endswith(".gpx"):
+                segments = read_track(os.path.join(gpx_dir, name))
+                if segments:
+                    tracks[name[:-4]] = segments
+    old = {} if force else load_manifest(manifest_path)
+    new, stats = {}, {"tracks": len(tracks), "tiles": 0, "written": 0, "unchanged": 0, "removed": 0}
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        with TRACER.stage(f"zoom {zoom}"):
+            pixels = [track_pixels(segments, zoom) for segments in tracks.values()]
+            if not pixels:
+                continue
+            world = TILE_SIZE * 2 ** zoom
+            x = np.concatenate([p[0] for p in pixels])
+            y = np.concatenate([p[1] for p in pixels])
+            flat = np.unique(y * world + x)  # where tracks overlap
+            for (tx, ty), offsets in bucket(flat % world, flat // world).items():
+                key = f"{zoom}/{tx}/{ty}"
+                digest = new[key] = tile_hash(offsets, fmt)
+                path = tile_path(out_dir, (zoom, tx, ty), fmt)
+                if old.get(key) == digest and os.path.exists(path):
+                    stats["unchanged"] += 1
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with TRACER.timed("tiles.render"):
+                    data = render(offsets, fmt)
+                with open(path, "wb") as fh:
+                    fh.write(data)
+                stats["written"] += 1
+    stats["tiles"] = len(new)
+
+    # Tiles no track reaches any more (or outside the zoom range now), and
+    # every tile of the other formats after a --format switch
+    for root, _, files in os.walk(out_dir):
+        parts = os.path.relpath(root, out_dir).split(os.sep)
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext[1:] not in FORMATS or len(parts) != 2:
+                continue
+            if ext != f".{fmt}" or "/".join(parts + [stem]) not in new:
+                os.remove(os.path.join(root, name))
+                stats["removed"] += 1
+
+    tiles = {tuple(int(v) for v in key.split("/")) for key in new}
+    views = {name: trip_view(segments, tiles, max_zoom) for name, segments in tracks.items()}
+    for path, data in ((manifest_path, new), (trip_maps, {"format": fmt, "tile_size": TILE_SIZE, "trips": views})):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=1, sort_keys=True)
+            fh.write("\n")
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Draw the GPX tracks into a static map tile pyramid")
+    parser.add_argument("--gpx-dir", default=GPX_DIR, help=f"tracks to draw (default: {GPX_DIR})")
+    parser.add_argument("--out", default=OUTPUT_DIR, help=f"tile directory (default: {OUTPUT_DIR})")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM, help=f"(default: {MIN_ZOOM})")
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM, help=f"(default: {MAX_ZOOM})")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="png", help="tile image format (default: png)")
+    parser.add_argument("--force", action="store_true", help="rewrite every tile")
+    perf.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # NumPy and Pillow are imported where they're used so --help stays fast.
+    absent = deps.missing("numpy", "PIL")
+    if absent:
+        packages = " ".join(deps.PIP_NAMES.get(m, m) for m in absent)
+        print(f"error: {', '.join(absent)} required ({deps.PIP} {packages})", file=sys.stderr)
+        return 1
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(repo)
+    perf.start(args)  # after chdir, so --trace/--cprofile paths are repo-relative
+
+    stats = build(args.gpx_dir, args.out, args.min_zoom, args.max_zoom, args.format, force=args.force)
+    print(f"{stats['tracks']} tracks -> {stats['tiles']} tiles in {args.out} "
+          f"({stats['written']} written, {stats['unchanged']} unchanged, {stats['removed']} removed)")
+    print(f"trip views: {TRIP_MAPS}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
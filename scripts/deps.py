@@ -0,0 +1,31 @@
+"""
+Deferred loading of the heavy third-party dependencies.
+
+Importing gpxpy or geopy takes about 100 ms each, which used to dominate the
+start-up of every script, even for `--help`. Scripts now call `ensure()`
+once their arguments are parsed. It only looks the packages up
+(`find_spec`) without importing them. The actual import happens in the
+function that first needs the package.
+"""
+
+import importlib.util
+import sys
+
+# Import name -> pip package name, where they differ.
+PIP_NAMES = {"PIL": "pillow", "yaml": "pyyaml"}
+PIP = "pip3 install --user --break-system-packages"
+
+
+def missing(*modules: str) -> list:
+    """Top-level modules from `modules` that are not installed."""
+    return [m for m in modules if importlib.util.find_spec(m) is None]
+
+
+def ensure(*modules: str) -> None:
+    """Exit with an install hint unless every module is importable."""
+    absent = missing(*modules)
+    if absent:
+        packages = " ".join(PIP_NAMES.get(m, m) for m in absent)
+        print(f"❌ 缺少依赖: {', '.join(absent)}")
+        print(f"请运行: {PIP} {packages}")
+        sys.exit(1)
@@ -0,0 +1,155 @@
+"""
+Display-ready EXIF for the trip pages' galleries and lightbox captions.
+
+Reading `.Exif` in a template decodes every photo's metadata on every
+build. `scripts/build_featured.py` already runs one exiftool pass over
+`content/trips`; it also asks for the tags below, formats them here once,
+and writes one data file per page:
+
+    data/exif/trips/Germany/Dresden/photos.json
+    {"20250922-P9220041.jpg": {"camera": "Olympus E-M1MarkII", "lens": "OLYMPUS M.25mm F1.2",
+                               "gear": "Olympus E-M1MarkII · OLYMPUS M.25mm F1.2",
+                               "focal": "25 mm (50 mm eq.)", "aperture": "f/1.2",
+                               "exposure": "1/250 s", "iso": "ISO 200",
+                               "settings": "25 mm (50 mm eq.) · f/1.2 · 1/250 s · ISO 200",
+                               "date": "2025-09-22T14:32:10", "title": "..."}}
+
+`layouts/partials/photo-exif.html` looks the page's file up, so the
+gallery only indexes a map. Fields a photo lacks are left out. Files are
+rewritten only when their content changes, and files of pages without
+photos any more are removed.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Optional
+
+EXIF_DIR = "data/exif"
+PAGE_FILE = "photos.json"
+# `#`: the number rather than exiftool's print conversion (0.004, not "1/250")
+TAGS = ("-Make", "-Model", "-LensModel", "-Lens", "-FocalLength#", "-FocalLengthIn35mmFormat#",
+        "-FNumber#", "-ExposureTime#", "-ISO#", "-DateTimeOriginal", "-ImageDescription")
+# Company suffixes in `Make`: "OLYMPUS CORPORATION", "NIKON CORPORATION", "OM Digital Solutions"
+MAKE_SUFFIX = re.compile(r"\s+(corporation|corp\b|imaging|optical|digital solutions|camera ag|co\b|company|inc\b).*$",
+                         re.IGNORECASE)
+NO_LENS = re.compile(r"[-\s]*|unknown.*|0(\.0)? ?mm.*", re.IGNORECASE)
+
+
+def _number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def camera(make, model) -> str:
+    """"Olympus E-M1MarkII" from "OLYMPUS CORPORATION" and "E-M1MarkII"; the make once."""
+    make = MAKE_SUFFIX.sub("", str(make or "").strip())
+    if make.isupper() and len(make) > 3:  # NIKON, FUJIFILM; not OM or DJI
+        make = make.title()
+    model = str(model or "").strip()
+    brand = make.split(" ")[0]
+    if brand and model.lower().startswith(brand.lower()):
+        return brand + model[len(brand):]  # "Canon EOS R5", "Nikon Z 6"
+    return f"{make} {model}".strip()
+
+
+def exposure(seconds: float) -> str:
+    """1/250 s, 1/3 s, 2.5 s."""
+    if seconds >= 1 or round(1 / seconds, 1) != round(1 / seconds):
+        return f"{round(seconds, 1):g} s"
+    return f"1/{round(1 / seconds)} s"
+
+
+def display_fields(record: dict) -> Dict[str, str]:
+    """The display strings for one exiftool record (requested with TAGS)."""
+    fields = {}
+    name = camera(record.get("Make"), record.get("Model"))
+    if name:
+        fields["camera"] = name
+    lens = str(record.get("LensModel") or record.get("Lens") or "").strip()
+    if lens and not NO_LENS.fullmatch(lens):
+        fields["lens"] = lens
+    gear = [fields[k] for k in ("camera", "lens") if k in fields]
+    if gear:
+        fields["gear"] = " · ".join(gear)
+
+    focal, focal35 = _number(record.get("FocalLength")), _number(record.get("FocalLengthIn35mmFormat"))
+    if focal:
+        fields["focal"] = f"{round(focal, 1):g} mm"
+        if focal35 and abs(focal35 - focal) >= 1:
+            fields["focal"] += f" ({round(focal35):g} mm eq.)"
+    f_number = _number(record.get("FNumber"))
+    if f_number:
+        fields["aperture"] = f"f/{round(f_number, 1):g}"
+    seconds = _number(record.get("ExposureTime"))
+    if seconds:
+        fields["exposure"] = exposure(seconds)
+    iso = _number(record.get("ISO"))
+    if iso:
+        fields["iso"] = f"ISO {round(iso)}"
+    settings = [fields[k] for k in ("focal", "aperture", "exposure", "iso") if k in fields]
+    if settings:
+        fields["settings"] = " · ".join(settings)
+
+    try:
+        taken = datetime.strptime(str(record.get("DateTimeOriginal", ""))[:19], "%Y:%m:%d %H:%M:%S")
+        fields["date"] = taken.isoformat()
+    except ValueError:
+        pass
+    title = str(record.get("ImageDescription") or "").strip()
+    if title and "DIGITAL CAMERA" not in title.upper():  # camera-default junk
+        fields["title"] = title
+    return fields
+
+
+class ExifPages:
+    """Display fields of every photo, grouped by page, written as one data file per page."""
+
+    def __init__(self, content: str = "content"):
+        self.content = content
+        self.pages: Dict[str, Dict[str, dict]] = {}
+
+    def add(self, record: dict) -> None:
+        """Take one exiftool record; photos without any display field are left out."""
+        fields = display_fields(record)
+        if fields:
+            page, name = os.path.split(os.path.relpath(record["SourceFile"], self.content))
+            self.pages.setdefault(page.replace(os.sep, "/"), {})[name] = fields
+
+    def write(self, out_dir: str = EXIF_DIR) -> dict:
+        """Write changed page files, remove stale ones; returns counts.
+
+        Counts: pages, photos, written, unchanged, removed.
+        """
+        stats = {"pages": len(self.pages), "photos": sum(len(p) for p in self.pages.values()),
+                 "written": 0, "unchanged": 0, "removed": 0}
+        keep = set()
+        for page, photos in self.pages.items():
+            path = os.path.normpath(os.path.join(out_dir, *page.split("/"), PAGE_FILE))
+            keep.add(path)
+            body = json.dumps(photos, ensure_ascii=False, sort_keys=True, indent=1) + "\n"
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    if fh.read() == body:
+                        stats["unchanged"] += 1
+                        continue
+            except OSError:
+                pass
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as fh:
+                fh.write(body)
+            os.replace(path + ".tmp", path)
+            stats["written"] += 1
+
+        for root, _, files in os.walk(out_dir, topdown=False):
+            path = os.path.normpath(os.path.join(root, PAGE_FILE))
+            if PAGE_FILE in files and path not in keep:
+                os.remove(path)
+                stats["removed"] += 1
+            if root != out_dir and not os.listdir(root):
+                os.rmdir(root)
+        return stats
@@ -0,0 +1,62 @@
+"""
+Incremental reader for exiftool's `-json` output.
+
+`exiftool -j` prints one JSON array with an object per file. Parsing it with
+`json.load` holds the whole document and every record at once; `iter_records`
+yields the objects one by one straight from a pipe or file instead, so memory
+stays flat however many photos exiftool walks.
+
+`RecordDecoder` is the same parser driven by pushed chunks, for readers that
+can't block on `stream.read()` (e.g. an asyncio subprocess pipe).
+"""
+
+import json
+from typing import Iterator, List, TextIO
+
+CHUNK_SIZE = 1 << 16
+
+
+class RecordDecoder:
+    """Push-style parser: `feed()` text as it arrives, get complete objects back."""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._done = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Objects completed by `chunk` (an empty chunk means end of input)."""
+        buf, pos, records = self._buf + chunk, 0, []
+        while not self._done:
+            # Skip whitespace, the opening bracket and separators between objects.
+            while pos < len(buf) and buf[pos] in " \t\r\n[,":
+                pos += 1
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                self._done = True
+                break
+            try:
+                obj, pos = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break  # incomplete object: wait for more input
+            records.append(obj)
+        # Keep only the unparsed tail.
+        self._buf = "" if self._done else buf[pos:]
+        return records
+
+    def close(self) -> List[dict]:
+        """Signal end of input; raises JSONDecodeError if it was truncated."""
+        return self.feed("")
+
+
+def iter_records(stream: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """Yield each object of a top-level JSON array read from `stream`."""
+    decoder = RecordDecoder()
+    while True:
+        chunk = stream.read(chunk_size)
+        yield from decoder.feed(chunk)
+        if not chunk:
+            return
@@ -49,7 +49,7 @@ echo "   输出文件: gpx/${OUTPUT_NAME}-gps.json"
 # Convert to GPX
 echo ""
 echo "🔄 转换为 GPX 格式..."
-python3 scripts/json2gpx.py "gpx/${OUTPUT_NAME}-gps.json" "gpx/${OUTPUT_NAME}.gpx"
+python3 scripts/json2gpx.py "gpx/${OUTPUT_NAME}-gps.json" "gpx/${OUTPUT_NAME}.gpx" --route "data/routes/${OUTPUT_NAME}.json"
 
 echo ""
 echo "🎉 完成！"
@@ -0,0 +1,407 @@
+"""
+Reverse geocoding through a chain of providers with circuit breakers.
+
+A lookup asks each provider in turn and stops at the first answer:
+
+    cache       rounded coordinates seen before; kept on disk between runs
+                only when a file is given (--geocode-cache / GEOCODE_CACHE),
+                and without places whose city is Unknown
+    labels      a trip's places from smart-gps-extract (<name>-locations.json),
+                when the caller passes one
+    gazetteer   nearest place in an offline file (--gazetteer / GEOCODE_GAZETTEER), if any
+    nominatim   the remote API, behind the shared rate limiter
+
+Answers from later providers are written back to the cache. With boundary
+polygons configured (--boundaries / --admin1, see boundaries.py)
+the state and country come from the polygon containing the point instead,
+which a nearest-place answer gets wrong near borders. Each provider
+has a circuit breaker: after BREAKER_THRESHOLD errors in a row it opens and
+the chain falls through to the next provider immediately, instead of
+sleeping through a backoff for every sample of a trip while the API is
+down. After BREAKER_COOLDOWN seconds one request is let through to probe;
+success closes the breaker. Breakers are process-wide per server, like
+the throttle, so batch trips share them.
+
+Every provider records a timer (`geocode.<name>`) and hit/miss/error/
+skipped counters (`geocode.<name>.hit`, ...) in the tracer.
+"""
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from scripts.boundaries import Boundaries, load_boundaries
+from scripts.geocoding import NOMINATIM, GeocodeSettings, Throttle
+from scripts.perf import TRACER
+from scripts.stage_cache import file_sha256
+
+BREAKER_THRESHOLD = 3  # errors in a row before a provider is skipped
+BREAKER_COOLDOWN = 30.0  # seconds before a skipped provider is tried again
+GAZETTEER_RADIUS_KM = 25.0  # farther from every place: no answer
+LABEL_RADIUS_KM = 5.0  # a trip label stands for photos this close to its sample
+
+Key = Tuple[float, float]
+
+
+class Place(NamedTuple):
+    city: str
+    state: str = ""
+    country: str = ""
+
+
+class ProviderError(Exception):
+    """A provider failed (timeout, HTTP error, network); the chain moves on."""
+
+
+def cache_key(lat: float, lon: float) -> Key:
+    """Coordinates rounded to ~1 km, so nearby photos share one lookup."""
+    return (round(lat, 2), round(lon, 2))
+
+
+def place_label(lat: float, lon: float, place: Place) -> dict:
+    """A geocoded sample as stored in `<name>-locations.json`."""
+    return {'lat': round(lat, 5), 'lon': round(lon, 5),
+            'city': place.city, 'state': place.state, 'country': place.country}
+
+
+def place_from_address(addr: Optional[dict]) -> Optional[Place]:
+    """Place from a Nominatim `address` object (None without any name)."""
+    if not addr:
+        return None
+    city = (addr.get('city') or
+            addr.get('town') or
+            addr.get('village') or
+            addr.get('municipality') or
+            addr.get('county') or
+            'Unknown')
+    return Place(city, addr.get('state') or addr.get('region') or '', addr.get('country', 'Unknown'))
+
+
+class CircuitBreaker:
+    """Closed → open after `threshold` failures in a row → half-open after `cooldown`."""
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None  # monotonic time the breaker opened; None while closed
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        """Whether to call the provider now (one probe at a time once half-open)."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                if self.opened_at is None or self._probing:
+                    TRACER.count(f"geocode.{self.name}.opened")
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(key: str) -> CircuitBreaker:
+    """The process-wide breaker for `key` ("<provider>" or "<provider>@<server>")."""
+    with _BREAKERS_LOCK:
+        if key not in _BREAKERS:
+            _BREAKERS[key] = CircuitBreaker(key.split('@')[0])
+        return _BREAKERS[key]
+
+
+class PlaceCache:
+    """Rounded coordinates -> Place, optionally persisted as JSON at `path`.
+
+    `entries` may be shared with other chains (batch mode passes one dict to
+    every trip). Writes are atomic and merge with what is on disk, so
+    concurrent runs don't drop each other's entries. Places without a city
+    stay in memory: a later run asks again rather than repeat the miss for good.
+    """
+
+    name = "cache"
+
+    def __init__(self, entries: Optional[dict] = None, path: Optional[str] = None):
+        self.entries = {} if entries is None else entries
+        self.path = path
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            for key, place in self._read().items():
+                self.entries.setdefault(key, place)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        entries = {}
+        for key, value in raw.items():
+            lat, lon = key.split(',')
+            place = Place(*value)
+            if place.city != 'Unknown':  # older files kept misses too
+                entries[(float(lat), float(lon))] = place
+        return entries
+
+    def lookup(self, lat: float, lon: float) -> Optional[Place]:
+        return self.entries.get(cache_key(lat, lon))
+
+    def store(self, lat: float, lon: float, place: Place) -> None:
+        with self._lock:
+            self.entries[cache_key(lat, lon)] = place
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Write new entries to `path` (no-op for memory-only caches)."""
+        with self._lock:
+            if not (self.path and self._dirty):
+                return
+            merged = self._read()
+            merged.update((key, place) for key, place in self.entries.items() if place.city != 'Unknown')
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({f"{lat},{lon}": list(place) for (lat, lon), place in sorted(merged.items())},
+                          f, ensure_ascii=False, indent=0)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance (haversine)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+    """Nearest known place within `radius_km`, from an offline list.
+
+    Places are bucketed into 1° cells, so a lookup only measures the
+    places in the 3×3 cells around the point.
+    """
+
+    name = "gazetteer"
+
+    def __init__(self, places: List[Tuple[float, float, Place]], radius_km: float = GAZETTEER_RADIUS_KM,
+                 name: Optional[str] = None):
+        if name:
+            self.name = name
+        self.radius_km = radius_km
+        self.cells: Dict[Tuple[int, int], list] = {}
+        for lat, lon, place in places:
+            self.cells.setdefault((math.floor(lat), math.floor(lon)), []).append((lat, lon, place))
+        self.size = len(places)
+
+    def lookup(self, lat: float, lon: float) -> Optional[Place]:
+        best, best_km = None, self.radius_km
+        cell_lat, cell_lon = math.floor(lat), math.floor(lon)
+        for dlat in (-1, 0, 1):
+            for dlon in (-1, 0, 1):
+                lon_cell = (cell_lon + dlon + 180) % 360 - 180
+                for plat, plon, place in self.cells.get((cell_lat + dlat, lon_cell), ()):
+                    km = distance_km(lat, lon, plat, plon)
+                    if km <= best_km:
+                        best, best_km = place, km
+        return best
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path: str, radius_km: float = GAZETTEER_RADIUS_KM) -> Gazetteer:
+    """Gazetteer from a file, read once per process.
+
+    Either a JSON list of {"lat", "lon", "address": {...}} (Nominatim-style
+    addresses, as served by tests/benchmarks/nominatim.py) or a GeoNames
+    dump such as cities1000.txt (tab-separated; country codes as country).
+    """
+    places = []
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            for entry in json.load(f):
+                place = place_from_address(entry.get('address'))
+                if place:
+                    places.append((float(entry['lat']), float(entry['lon']), place))
+        else:
+            for line in f:
+                cols = line.rstrip('\n').split('\t')
+                if len(cols) > 10:
+                    places.append((float(cols[4]), float(cols[5]), Place(cols[1], '', cols[8])))
+    return Gazetteer(places, radius_km)
+
+
+def load_labels(path: str, radius_km: float = LABEL_RADIUS_KM) -> Gazetteer:
+    """A trip's geocoded samples ({date: [place_label, ...]}) as a provider named "labels"."""
+    with open(path, encoding='utf-8') as f:
+        days = json.load(f)
+    places = [(label['lat'], label['lon'], Place(label['city'], label['state'], label['country']))
+              for labels in days.values() for label in labels]
+    return Gazetteer(places, radius_km, name="labels")
+
+
+class RemoteProvider:
+    """geopy reverse geocoder behind the shared throttle.
+
+    `before_request` runs once a token is granted, right before the HTTP
+    request (smart-gps-extract uses it to stop a cancelled trip).
+    """
+
+    name = "nominatim"
+
+    def __init__(self, geolocator, throttle: Throttle = NOMINATIM,
+                 before_request: Optional[Callable[[], None]] = None):
+        self.geolocator = geolocator
+        self.throttle = throttle
+        self.before_request = before_request
+        # One breaker per server (geopy clients are shared per server too)
+        self.breaker_key = f"{self.name}@{getattr(geolocator, 'domain', None) or id(geolocator)}"
+
+    def lookup(self, lat: float, lon: float) -> Optional[Place]:
+        try:
+            with self.throttle.request():
+                if self.before_request:
+                    self.before_request()
+                location = self.geolocator.reverse(f"{lat}, {lon}", language='en')
+        except (OSError, ValueError) as e:
+            self.throttle.backoff()
+            raise ProviderError(str(e)) from e
+        except Exception as e:
+            from geopy.exc import GeopyError
+            if not isinstance(e, GeopyError):
+                raise
+            # Rate-limited responses say how long to wait
+            self.throttle.backoff(retry_after=getattr(e, 'retry_after', None))
+            raise ProviderError(str(e)) from e
+        self.throttle.success()
+        return place_from_address(location.raw.get('address')) if location else None
+
+
+class GeocoderChain:
+    """Ask providers in order; the first answer wins and is cached.
+
+    `regions` (boundary polygons) then decide the answer's state and country.
+    """
+
+    def __init__(self, providers: list, cache: Optional[PlaceCache] = None,
+                 regions: Optional[Boundaries] = None):
+        self.cache = cache
+        self.regions = regions
+        self.providers = ([cache] if cache is not None else []) + list(providers)
+        self.breakers = {p.name: breaker_for(getattr(p, 'breaker_key', p.name)) for p in self.providers}
+
+    def lookup(self, lat: float, lon: float) -> Tuple[Optional[Place], Optional[str]]:
+        """(place, name of the provider that answered), or (None, None).
+
+        Outside every provider's knowledge but inside a boundary polygon, the
+        answer is an 'Unknown' city in that state and country, from "boundaries".
+        """
+        place, name = self._ask(lat, lon)
+        refined = self.refine(lat, lon, place)
+        if place is None and refined is not None:
+            name = "boundaries"
+        return refined, name
+
+    def refine(self, lat: float, lon: float, place: Optional[Place]) -> Optional[Place]:
+        """`place` with the state and country of the polygon containing the point."""
+        if self.regions is None:
+            return place
+        with TRACER.timed("geocode.boundaries"):
+            state, country = self.regions.lookup(lat, lon)
+        if not country:
+            TRACER.count("geocode.boundaries.miss")
+            return place
+        TRACER.count("geocode.boundaries.hit")
+        if place is None:
+            return Place('Unknown', state, country)
+        if not state and place.country == country:
+            state = place.state  # no admin-1 polygons: keep the provider's state
+        return place._replace(state=state, country=country)
+
+    def _ask(self, lat: float, lon: float) -> Tuple[Optional[Place], Optional[str]]:
+        for provider in self.providers:
+            name = provider.name
+            breaker = self.breakers[name]
+            if not breaker.allow():
+                TRACER.count(f"geocode.{name}.skipped")
+                continue
+            try:
+                with TRACER.timed(f"geocode.{name}"):
+                    place = provider.lookup(lat, lon)
+            except ProviderError:
+                breaker.failure()
+                TRACER.count(f"geocode.{name}.error")
+                continue
+            breaker.success()
+            if place is None:
+                TRACER.count(f"geocode.{name}.miss")
+                continue
+            TRACER.count(f"geocode.{name}.hit")
+            if self.cache is not None and provider is not self.cache:
+                self.cache.store(lat, lon, place)
+            return place, name
+        return None, None
+
+    def flush(self) -> None:
+        if self.cache is not None:
+            self.cache.flush()
+
+
+def chain_signature(settings: GeocodeSettings = GeocodeSettings()) -> dict:
+    """What the places of `make_chain(settings=settings)` depend on, for stage keys.
+
+    The server actually asked and the content of each offline file. The
+    places cache is left out: it only holds the answers of those providers.
+    """
+    return {
+        "url": settings.url or os.environ.get("NOMINATIM_URL") or "",
+        "gazetteer": settings.gazetteer and file_sha256(settings.gazetteer),
+        "gazetteer_radius_km": GAZETTEER_RADIUS_KM,
+        "boundaries": settings.boundaries and file_sha256(settings.boundaries),
+        "admin1": settings.admin1 and file_sha256(settings.admin1),
+    }
+
+
+def make_chain(geolocator, throttle: Throttle = NOMINATIM, cache: Optional[dict] = None,
+               before_request: Optional[Callable[[], None]] = None,
+               labels: Optional[str] = None, settings: GeocodeSettings = GeocodeSettings()) -> GeocoderChain:
+    """Chain with the cache file, gazetteer and boundaries of `settings` (from geocoding.configure).
+
+    `labels` is a `<name>-locations.json` to answer from before anything else.
+    """
+    providers = [load_labels(labels)] if labels else []
+    if settings.gazetteer:
+        providers.append(load_gazetteer(settings.gazetteer))
+    providers.append(RemoteProvider(geolocator, throttle, before_request))
+    regions = None
+    if settings.boundaries or settings.admin1:
+        regions = load_boundaries(settings.boundaries, settings.admin1)
+    return GeocoderChain(providers, PlaceCache(cache, settings.cache), regions)
@@ -0,0 +1,366 @@
+"""
+Rate limiting and HTTP connections for the Nominatim reverse geocoder.
+
+`Throttle` is a token bucket shared by every script and thread that
+geocodes: callers take a token under a lock and sleep outside it, in a
+thread (`wait`, `request`) or in a coroutine (`wait_async`). After a
+failure it backs off exponentially with jitter, and never less than the
+server's Retry-After. `concurrency` caps requests in flight at once.
+
+The public server allows one request per second per client; that is the
+"public" preset and the default. A self-hosted Nominatim can take far more:
+
+    preset        rate (req/s)   burst   in flight
+    public        0.9            1       1
+    self-hosted   25             10      8
+
+Settings come from the command line (`add_arguments` / `configure`) or
+the environment, e.g. to point the scripts at the local stand-in
+(`python -m tests.benchmarks nominatim`) for offline load tests. The
+environment is only read: `configure` returns the server, cache and offline
+files as `GeocodeSettings` for the caller to pass to `make_nominatim` and
+`geocoder_chain.make_chain`.
+
+    NOMINATIM_URL          base URL of a Nominatim-compatible API
+    NOMINATIM_PRESET       public | self-hosted
+    NOMINATIM_RATE, NOMINATIM_BURST, NOMINATIM_CONCURRENCY
+                           override the preset (only raise them for your
+                           own server)
+    GEOCODE_CACHE          places cache file kept between runs (default:
+                           none, memory only; see scripts/geocoder_chain.py)
+    GEOCODE_GAZETTEER      offline places asked before the API
+    GEOCODE_BOUNDARIES, GEOCODE_ADMIN1
+                           country / state polygons (GeoJSON, see
+                           scripts/boundaries.py)
+
+Clients from `make_nominatim` are shared per server and keep their
+connections alive (`keep_alive_adapter`), so a run opens at most
+`concurrency` connections instead of one per request.
+"""
+
+import contextlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from scripts.perf import TRACER
+
+PRESETS = {
+    # name: (requests per second, burst, requests in flight)
+    "public": (1 / 1.1, 1, 1),  # usage policy: max 1/s, with a little margin
+    "self-hosted": (25.0, 10, 8),
+}
+DEFAULT_PRESET = "public"
+NOMINATIM_INTERVAL = 1 / PRESETS[DEFAULT_PRESET][0]  # seconds between requests
+ERROR_BACKOFF = 2.0  # first pause after a failed request; doubles per failure in a row
+MAX_BACKOFF = 60.0
+
+
+class Throttle:
+    """Thread-safe token bucket: one token per `interval`, up to `burst` saved up.
+
+    Implemented as a virtual schedule (GCRA): `_tat` is when the bucket
+    would be full again, so taking a token never needs a refill loop.
+    """
+
+    def __init__(self, interval: float = NOMINATIM_INTERVAL, burst: int = 1,
+                 concurrency: int = 1, seed=None):
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._tat = 0.0  # monotonic "theoretical arrival time" of the next token
+        self._failures = 0  # consecutive failures, for the exponential backoff
+        self.configure(interval, burst, concurrency)
+
+    @classmethod
+    def from_rate(cls, rate: float, burst: int = 1, concurrency: int = 1, **kwargs):
+        """Throttle allowing `rate` requests per second (0 or less: unlimited)."""
+        return cls(1 / rate if rate > 0 else 0.0, burst, concurrency, **kwargs)
+
+    @classmethod
+    def preset(cls, name: str = DEFAULT_PRESET, **kwargs):
+        return cls.from_rate(*PRESETS[name], **kwargs)
+
+    def configure(self, interval: float, burst: int = 1, concurrency: int = 1) -> None:
+        """Change the limits in place (before requests are in flight)."""
+        with self._lock:
+            self.interval = max(0.0, interval)
+            self.burst = max(1, int(burst))
+            self.concurrency = max(1, int(concurrency))
+            self._in_flight = threading.BoundedSemaphore(self.concurrency)
+
+    @property
+    def rate(self) -> float:
+        return 1 / self.interval if self.interval else float("inf")
+
+    def reserve(self) -> float:
+        """Take the next token; returns how long until it may be used (no sleeping)."""
+        with self._lock:
+            now = time.monotonic()
+            tat = max(now, self._tat)
+            slot = max(now, tat - (self.burst - 1) * self.interval)
+            self._tat = max(tat, slot) + self.interval
+        delay = slot - now
+        TRACER.add_time("geocode.throttle_sleep", delay)
+        return delay
+
+    def wait(self) -> float:
+        """Block until the caller's token; returns the time slept."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self) -> float:
+        """`wait()` for coroutines: the event loop keeps running meanwhile."""
+        import asyncio
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    @contextlib.contextmanager
+    def request(self):
+        """Hold one of `concurrency` in-flight places and wait for a token."""
+        with self._in_flight:
+            self.wait()
+            yield
+
+    def backoff(self, seconds=None, retry_after=None) -> float:
+        """Hold every later request back after a failure; returns the pause.
+
+        Without `seconds`, the pause doubles with each failure in a row
+        (from ERROR_BACKOFF up to MAX_BACKOFF) and is jittered, so callers
+        that failed together don't retry together. It is never shorter than
+        the server's `retry_after`. The bucket is empty afterwards.
+        """
+        with self._lock:
+            if seconds is None:
+                self._failures += 1
+                seconds = min(MAX_BACKOFF, ERROR_BACKOFF * 2 ** (self._failures - 1))
+                seconds *= self._rng.uniform(0.5, 1.0)
+            if retry_after:
+                seconds = max(seconds, float(retry_after))
+            self._tat = max(self._tat, time.monotonic() + seconds + (self.burst - 1) * self.interval)
+        TRACER.count("geocode.backoff")
+        return seconds
+
+    def success(self) -> None:
+        """Reset the backoff after a request went through."""
+        self._failures = 0
+
+
+# Process-wide limiter shared by every geocoding call site.
+NOMINATIM = Throttle.preset()
+
+
+class GeocodeSettings(NamedTuple):
+    """Where lookups go, from `configure`. None: openstreetmap.org, places
+    cached in memory only, no offline files."""
+
+    url: Optional[str] = None  # Nominatim-compatible server
+    cache: Optional[str] = None  # places cache file kept between runs
+    gazetteer: Optional[str] = None
+    boundaries: Optional[str] = None  # country polygons (GeoJSON)
+    admin1: Optional[str] = None  # state/province polygons (GeoJSON)
+
+
+def settings(args=None):
+    """(url, rate, burst, concurrency) from command-line args, then environment, then preset."""
+    def pick(name, env, cast):
+        value = getattr(args, name, None)
+        if value is None and os.environ.get(env):
+            value = cast(os.environ[env])
+        return value
+
+    preset = pick("geocode_preset", "NOMINATIM_PRESET", str) or DEFAULT_PRESET
+    if preset not in PRESETS:
+        raise ValueError(f"unknown geocoding preset {preset!r} (choose from {', '.join(PRESETS)})")
+    limits = [pick(name, env, cast) for name, env, cast in (
+        ("geocode_rate", "NOMINATIM_RATE", float),
+        ("geocode_burst", "NOMINATIM_BURST", int),
+        ("geocode_concurrency", "NOMINATIM_CONCURRENCY", int),
+    )]
+    rate, burst, concurrency = (default if value is None else value
+                                for value, default in zip(limits, PRESETS[preset]))
+    return pick("nominatim_url", "NOMINATIM_URL", str), rate, burst, concurrency
+
+
+def add_arguments(parser):
+    """Add the geocoding server and rate-limit options to an argparse parser."""
+    group = parser.add_argument_group("geocoding")
+    group.add_argument("--nominatim-url", metavar="URL",
+                       help="Nominatim-compatible server (default: $NOMINATIM_URL or openstreetmap.org)")
+    group.add_argument("--geocode-preset", choices=sorted(PRESETS),
+                       help=f"rate-limit preset (default: $NOMINATIM_PRESET or {DEFAULT_PRESET})")
+    group.add_argument("--geocode-rate", type=float, metavar="N",
+                       help="requests per second, overriding the preset")
+    group.add_argument("--geocode-burst", type=int, metavar="N",
+                       help="requests allowed back to back, overriding the preset")
+    group.add_argument("--geocode-concurrency", type=int, metavar="N",
+                       help="requests in flight at once, overriding the preset")
+    group.add_argument("--geocode-cache", metavar="FILE",
+                       help="keep places found between runs in FILE (default: $GEOCODE_CACHE, else memory only)")
+    group.add_argument("--no-geocode-cache", action="store_true",
+                       help="ignore $GEOCODE_CACHE: keep places in memory for this run only")
+    group.add_argument("--gazetteer", metavar="FILE",
+                       help="offline places (JSON or a GeoNames cities*.txt), asked before the API "
+                            "(default: $GEOCODE_GAZETTEER)")
+    group.add_argument("--boundaries", metavar="FILE",
+                       help="country polygons (GeoJSON) deciding each photo's country "
+                            "(default: $GEOCODE_BOUNDARIES)")
+    group.add_argument("--admin1", metavar="FILE",
+                       help="state/province polygons (GeoJSON) deciding each photo's state "
+                            "(default: $GEOCODE_ADMIN1)")
+
+
+def configure(args=None, throttle=None) -> GeocodeSettings:
+    """Apply `settings(args)` to the shared limiter (or `throttle`); returns where lookups go.
+
+    Command-line values win over the environment. Nothing is written back to
+    the environment, so one call's options never reach the next.
+    """
+    url, rate, burst, concurrency = settings(args)
+    (throttle or NOMINATIM).configure(1 / rate if rate > 0 else 0.0, burst, concurrency)
+
+    def pick(option, env):
+        return getattr(args, option, None) or os.environ.get(env) or None
+
+    cache = None if getattr(args, "no_geocode_cache", False) else pick("geocode_cache", "GEOCODE_CACHE")
+    return GeocodeSettings(url, cache, pick("gazetteer", "GEOCODE_GAZETTEER"),
+                           pick("boundaries", "GEOCODE_BOUNDARIES"), pick("admin1", "GEOCODE_ADMIN1"))
+
+
+def keep_alive_adapter(*, proxies=None, ssl_context=None):
+    """geopy `adapter_factory` whose connections are pooled and kept alive."""
+    return _keep_alive_class()(proxies=proxies, ssl_context=ssl_context)
+
+
+_KEEP_ALIVE = None
+
+
+def _keep_alive_class():
+    # Built on first use, so importing this module doesn't import geopy, or the
+    # HTTP and TLS stacks (~40 ms that `--help` and cached runs don't need).
+    global _KEEP_ALIVE
+    if _KEEP_ALIVE is not None:
+        return _KEEP_ALIVE
+
+    import http.client
+    import socket
+    import ssl
+
+    from geopy.adapters import BaseSyncAdapter
+    from geopy.adapters import AdapterHTTPError
+    from geopy.exc import GeocoderParseError, GeocoderServiceError, GeocoderTimedOut, GeocoderUnavailable
+
+    class KeepAliveAdapter(BaseSyncAdapter):
+        """Reuses HTTP/1.1 connections, pooled per server.
+
+        geopy's fallback adapter (urllib) opens a new connection, and for
+        HTTPS a new TLS session, for every request. Here a request takes an
+        idle connection if there is one, so a run holds as many connections
+        as it ever had requests in flight. A reused connection the server
+        has closed in the meantime is retried once on a new one. Proxies
+        aren't supported.
+        """
+
+        def __init__(self, *, proxies, ssl_context):
+            super().__init__(proxies=proxies, ssl_context=ssl_context)
+            self.ssl_context = ssl_context
+            self._pools = {}  # (scheme, netloc) -> LifoQueue of idle connections
+            self._lock = threading.Lock()
+
+        def _pool(self, key):
+            with self._lock:
+                return self._pools.setdefault(key, queue.LifoQueue())
+
+        def _connect(self, scheme, netloc, timeout):
+            TRACER.count("geocode.connections")
+            if scheme == "https":
+                return http.client.HTTPSConnection(
+                    netloc, timeout=timeout, context=self.ssl_context or ssl.create_default_context())
+            return http.client.HTTPConnection(netloc, timeout=timeout)
+
+        def get_json(self, url, *, timeout, headers):
+            text = self.get_text(url, timeout=timeout, headers=headers)
+            try:
+                return json.loads(text)
+            except ValueError:
+                raise GeocoderParseError("Could not deserialize using deserializer:\n%s" % text)
+
+        def get_text(self, url, *, timeout, headers):
+            parts = urlsplit(url)
+            target = parts.path + ("?" + parts.query if parts.query else "")
+            pool = self._pool((parts.scheme, parts.netloc))
+
+            for attempt in (1, 2):
+                try:
+                    conn, reused = pool.get_nowait(), True
+                except queue.Empty:
+                    conn, reused = self._connect(parts.scheme, parts.netloc, timeout), False
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                try:
+                    conn.request("GET", target, headers=dict(headers, Connection="keep-alive"))
+                    response = conn.getresponse()
+                    body = response.read()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as error:
+                    conn.close()
+                    if reused and attempt == 1:
+                        continue  # the server closed an idle connection: retry on a new one
+                    raise GeocoderUnavailable(str(error))
+                except socket.timeout:
+                    conn.close()
+                    raise GeocoderTimedOut("Service timed out")
+                except (OSError, http.client.HTTPException) as error:
+                    conn.close()
+                    raise GeocoderServiceError(str(error))
+
+                if response.will_close:
+                    conn.close()
+                else:
+                    pool.put(conn)
+                break
+
+            charset = response.headers.get_content_charset() or "utf-8"
+            text = body.decode(charset, errors="replace")
+            if response.status >= 400:
+                raise AdapterHTTPError(
+                    "Non-successful status code %s" % response.status,
+                    status_code=response.status,
+                    headers={k.lower(): v for k, v in response.getheaders()},
+                    text=text,
+                )
+            return text
+
+    _KEEP_ALIVE = KeepAliveAdapter
+    return _KEEP_ALIVE
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def make_nominatim(user_agent: str, url: Optional[str] = None):
+    """Shared geopy Nominatim client for `url` (GeocodeSettings.url), else
+    $NOMINATIM_URL, else openstreetmap.org."""
+    from geopy.geocoders import Nominatim
+
+    url = url or os.environ.get("NOMINATIM_URL") or ""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get((user_agent, url))
+        if client is None:
+            options = {}
+            if url:
+                parts = urlsplit(url if "://" in url else "http://" + url)
+                options = dict(scheme=parts.scheme, domain=parts.netloc + parts.path.rstrip("/"))
+            client = Nominatim(user_agent=user_agent, adapter_factory=keep_alive_adapter, **options)
+            _CLIENTS[(user_agent, url)] = client
+        return client
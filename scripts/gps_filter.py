@@ -0,0 +1,138 @@
+"""
+Drop GPS fixes that can't be where the photo was taken.
+
+Phones sometimes stamp a photo with a stale fix or a Wi-Fi guess hundreds
+of kilometres away. One such point draws a spike into the GPX track, can
+outvote the real city for its day, and costs a geocoding request. The
+trip's photos are checked in time order, as NumPy arrays in one pass:
+
+- error: `GPSHPositioningError` above `max_error_m`
+- speed: reached from the previous photo and left for the next one faster
+  than `max_speed_kmh`, while those two neighbours are close to each other
+  (a real flight moves the whole track; a bad fix jumps out and back)
+- lone: farther than `jump_km` from both neighbours, which again are close
+  to each other, at over a tenth of `max_speed_kmh` (a stale fix between
+  photos hours apart; a day trip with one photo is slower than that).
+  The first and last photo are never lone: the trip may start at home.
+
+The thresholds come from the command line (`add_arguments` / `from_args`).
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from scripts.trip_stats import distance_km, haversine_km
+
+REASONS = ("error", "speed", "lone")
+CHUNK = 1 << 16  # points checked at a time
+
+
+class GpsFilter(NamedTuple):
+    max_speed_kmh: float = 1000.0  # faster than an airliner between two photos
+    max_error_m: float = 1000.0  # GPSHPositioningError; Wi-Fi guesses are often kilometres off
+    jump_km: float = 200.0
+    drop: bool = True  # False: only report
+
+
+def add_arguments(parser):
+    """Add the outlier filter options to an argparse parser."""
+    default = GpsFilter()
+    group = parser.add_argument_group("GPS outlier filter")
+    group.add_argument("--max-speed", type=float, metavar="KMH", default=default.max_speed_kmh,
+                       help=f"drop fixes reached and left faster than this (default: {default.max_speed_kmh:g}; "
+                            "0: no speed or jump check)")
+    group.add_argument("--max-error", type=float, metavar="M", default=default.max_error_m,
+                       help=f"drop fixes with a larger GPSHPositioningError (default: {default.max_error_m:g}; 0: off)")
+    group.add_argument("--keep-outliers", action="store_true",
+                       help="only report suspicious fixes, keep them in the track")
+
+
+def from_args(args=None) -> GpsFilter:
+    """The filter for parsed `add_arguments` options; defaults for options not given."""
+    default = GpsFilter()
+    return default._replace(
+        max_speed_kmh=getattr(args, "max_speed", default.max_speed_kmh),
+        max_error_m=getattr(args, "max_error", default.max_error_m),
+        drop=not getattr(args, "keep_outliers", False),
+    )
+
+
+def _interior(lat, lon, seconds, gps_filter: GpsFilter):
+    """Reason codes of lat[1:-1]: each point against the points before and after it."""
+    import numpy as np
+
+    step = haversine_km(lat, lon)  # point i -> i + 1
+    speed = np.diff(seconds)
+    np.maximum(speed, 1.0, out=speed)
+    np.divide(step * 3600, speed, out=speed)
+    d_in, d_out, v_in, v_out = step[:-1], step[1:], speed[:-1], speed[1:]
+    closest = np.minimum(d_in, d_out)
+    closest *= 0.5
+    agree = distance_km(lat[:-2], lon[:-2], lat[2:], lon[2:]) < closest
+
+    limit = gps_filter.max_speed_kmh
+    fast = (v_in > limit) & (v_out > limit) & agree
+    far = ((d_in > gps_filter.jump_km) & (d_out > gps_filter.jump_km)
+           & (v_in > limit / 10) & (v_out > limit / 10) & agree)
+    codes = np.zeros(len(lat) - 2, dtype=np.int8)
+    codes[far] = 1 + REASONS.index("lone")
+    codes[fast] = 1 + REASONS.index("speed")
+    return codes
+
+
+def _end_is_fast(lat, lon, seconds, gps_filter: GpsFilter) -> bool:
+    """Whether point 0 of three jumps too fast to point 1, which point 2 agrees with."""
+    d01, d12 = haversine_km(lat, lon).tolist()
+    hours = max(abs(seconds[1] - seconds[0]), 1.0) / 3600
+    return d01 / hours > gps_filter.max_speed_kmh and d12 < 0.5 * d01
+
+
+def find_outliers(lat, lon, seconds, error, gps_filter: GpsFilter = GpsFilter()):
+    """Reason code per point (0 kept, else 1 + index into REASONS), for time-ordered arrays.
+
+    `error` is the horizontal error in metres, NaN where unknown. Points
+    are checked in chunks, so the temporaries stay small on whole libraries.
+    """
+    import numpy as np
+
+    reason = np.zeros(len(lat), dtype=np.int8)
+    if gps_filter.max_error_m > 0:
+        reason[error > gps_filter.max_error_m] = 1 + REASONS.index("error")
+    ok = np.flatnonzero(reason == 0)
+    if len(ok) < 3 or gps_filter.max_speed_kmh <= 0:
+        return reason
+    if len(ok) < len(lat):
+        lat, lon, seconds = lat[ok], lon[ok], seconds[ok]
+    n = len(ok)
+    for start in range(1, n - 1, CHUNK):
+        stop = min(start + CHUNK, n - 1)
+        reason[ok[start:stop]] = _interior(lat[start - 1:stop + 1], lon[start - 1:stop + 1],
+                                           seconds[start - 1:stop + 1], gps_filter)
+    # The first and last photo have one neighbour: only a fast jump counts there
+    for end, span in ((0, slice(0, 3)), (n - 1, slice(n - 1, n - 4 if n > 3 else None, -1))):
+        if _end_is_fast(lat[span], lon[span], seconds[span], gps_filter):
+            reason[ok[end]] = 1 + REASONS.index("speed")
+    return reason
+
+
+def filter_photos(photos: List[dict], errors: Sequence[Optional[float]],
+                  gps_filter: GpsFilter = GpsFilter()) -> Tuple[List[dict], Dict[str, list]]:
+    """(photos to keep, {reason: outlier photos}) for photos with 'lat', 'lon' and 'time'.
+
+    `errors` holds each photo's GPSHPositioningError (None when absent).
+    The photos are returned in time order; with `drop=False` all of them.
+    """
+    import numpy as np
+
+    n = len(photos)
+    if not n:
+        return [], {r: [] for r in REASONS}
+    epoch = photos[0]['time']
+    seconds = np.fromiter(((p['time'] - epoch).total_seconds() for p in photos), float, n)
+    order = np.argsort(seconds, kind='stable')
+    lat = np.fromiter((p['lat'] for p in photos), float, n)[order]
+    lon = np.fromiter((p['lon'] for p in photos), float, n)[order]
+    error = np.fromiter((np.nan if e is None else e for e in errors), float, n)[order]
+    reason = find_outliers(lat, lon, seconds[order], error, gps_filter)
+
+    outliers = {r: [photos[i] for i in order[reason == k + 1]] for k, r in enumerate(REASONS)}
+    return [photos[i] for i in (order[reason == 0] if gps_filter.drop else order)], outliers
@@ -0,0 +1,44 @@
+"""
+Streaming GPX 1.1 track writer.
+
+`gpxpy` builds a `GPXTrackPoint` object per point and then the whole document
+as one string before anything reaches the disk: several hundred bytes per
+point, twice over. A track here is a single segment of timestamped points, so
+it is written line by line instead, in the same layout gpxpy produces, and
+memory stays flat however long the track is.
+"""
+
+from html import escape  # not xml.sax.saxutils: it imports urllib.request and the TLS stack
+from typing import Iterable, Optional, TextIO, Tuple
+
+HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd" '
+    'version="1.1" creator="{creator}">\n'
+    '  <trk>\n'
+    '    <name>{name}</name>\n'
+    '    <trkseg>\n'
+)
+FOOTER = '    </trkseg>\n  </trk>\n</gpx>'
+
+Point = Tuple[float, float, Optional[float], str]  # lat, lon, elevation, ISO time
+
+
+def write_track(fh: TextIO, points: Iterable[Point], creator: str, name: str) -> int:
+    """Write one track with one segment; returns the number of points.
+
+    `points` may be any iterable, e.g. a generator over a sorted index, and
+    is consumed once. Times are written as given (`datetime.isoformat()`).
+    """
+    fh.write(HEADER.format(creator=escape(creator), name=escape(name, quote=False)))
+    count = 0
+    for lat, lon, ele, time in points:
+        fh.write(f'      <trkpt lat="{float(lat)!r}" lon="{float(lon)!r}">\n')
+        if ele is not None:
+            fh.write(f'        <ele>{float(ele)!r}</ele>\n')
+        fh.write(f'        <time>{time}</time>\n      </trkpt>\n')
+        count += 1
+    fh.write(FOOTER)
+    return count
@@ -0,0 +1,192 @@
+"""
+Perceptual hashes and near-duplicate lookup for the photo archive.
+
+- `phash()` computes a 64-bit DCT perceptual hash, which survives re-exports,
+  resizes and moderate re-edits (crop, tone, sharpening).
+- `BKTree` indexes hashes by Hamming distance, so "everything within N bits"
+  queries touch only a fraction of the archive.
+- `HashCache` persists hashes keyed by the SHA-1 of the file bytes (with a
+  size/mtime shortcut), so unchanged photos are never decoded twice. Photos
+  a run no longer sees (deleted, renamed) are dropped when it saves.
+"""
+
+import hashlib
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_SIZE = 8  # 8x8 low-frequency DCT block -> 64-bit hash
+DCT_SIZE = 32  # input is reduced to 32x32 greyscale before the DCT
+
+# DCT-II basis rows for the low frequencies only; the transform is then
+# (8x32) @ pixels (32x32) @ (32x8), about 10k multiplications per image.
+_DCT = [
+    [math.cos(math.pi * k * (2 * n + 1) / (2 * DCT_SIZE)) for n in range(DCT_SIZE)]
+    for k in range(HASH_SIZE)
+]
+
+
+def phash(path: str) -> Optional[int]:
+    """64-bit perceptual hash of an image file, or None if it can't be decoded
+    (or is past Pillow's decompression-bomb limit)."""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path) as im:
+            im.draft("L", (DCT_SIZE * 4, DCT_SIZE * 4))
+            grey = ImageOps.exif_transpose(im).convert("L").resize(
+                (DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS
+            )
+    except (OSError, Image.DecompressionBombError):  # corrupt, or a huge panorama
+        return None
+
+    pixels = grey.tobytes()  # one byte per pixel in mode "L"
+    rows = [pixels[r * DCT_SIZE:(r + 1) * DCT_SIZE] for r in range(DCT_SIZE)]
+    # Columns first: tmp[k][c] = sum_r basis[k][r] * rows[r][c]
+    tmp = [
+        [sum(basis[r] * rows[r][c] for r in range(DCT_SIZE)) for c in range(DCT_SIZE)]
+        for basis in _DCT
+    ]
+    coeffs = [sum(t[c] * basis[c] for c in range(DCT_SIZE)) for t in tmp for basis in _DCT]
+
+    ac = coeffs[1:]  # the DC term only encodes overall brightness
+    median = sorted(ac)[len(ac) // 2]
+    value = 0
+    for c in coeffs:
+        value = (value << 1) | (c > median)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance.
+
+    Each node keeps children keyed by their distance to it; the triangle
+    inequality prunes every subtree outside [d - radius, d + radius].
+    """
+
+    def __init__(self, items: Iterable[Tuple[int, object]] = ()):
+        self._root = None  # (hash, value, {distance: node})
+        self._size = 0
+        for h, value in items:
+            self.add(h, value)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, h: int, value: object) -> None:
+        """Insert a hash with an attached value (e.g. a file path)."""
+        self._size += 1
+        if self._root is None:
+            self._root = (h, value, {})
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (h, value, {})
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> List[Tuple[int, object]]:
+        """All `(distance, value)` pairs within `radius` bits of `h`."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_hash, value, children = stack.pop()
+            d = hamming(h, node_hash)
+            if d <= radius:
+                found.append((d, value))
+            for dist, child in children.items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return found
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of the file bytes."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Perceptual hashes cached by file content.
+
+    `hashes` maps SHA-1 -> phash (hex); `files` maps path -> [size, mtime_ns,
+    sha1] so unchanged files skip even the SHA-1 read. `save` keeps only the
+    paths passed to `digest` in this run, and the hashes of their contents.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hashes: Dict[str, str] = {}
+        self.files: Dict[str, list] = {}
+        self.seen: set = set()
+        try:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            self.hashes = data.get("hashes", {})
+            self.files = data.get("files", {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def digest(self, path: str) -> str:
+        """Content digest of `path`, reusing the stored one if size/mtime match."""
+        st = os.stat(path)
+        self.seen.add(path)
+        known = self.files.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        sha1 = file_digest(path)
+        self.files[path] = [st.st_size, st.st_mtime_ns, sha1]
+        return sha1
+
+    def get(self, sha1: str) -> Optional[int]:
+        value = self.hashes.get(sha1)
+        return int(value, 16) if value else None
+
+    def put(self, sha1: str, h: int) -> None:
+        self.hashes[sha1] = f"{h:016x}"
+
+    def save(self) -> None:
+        """Write the cache, without the files not seen since it was loaded."""
+        self.files = {path: entry for path, entry in self.files.items() if path in self.seen}
+        live = {entry[2] for entry in self.files.values()}
+        self.hashes = {sha1: h for sha1, h in self.hashes.items() if sha1 in live}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"hashes": self.hashes, "files": self.files}, fh)
+        os.replace(tmp, self.path)
+
+
+def duplicate_groups(hashes: Dict[str, int], radius: int) -> List[List[str]]:
+    """Group paths whose hashes lie within `radius` bits (transitively)."""
+    tree = BKTree((h, path) for path, h in hashes.items())
+    parent = {path: path for path in hashes}
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for path, h in hashes.items():
+        for _, other in tree.search(h, radius):
+            a, b = find(path), find(other)
+            if a != b:
+                parent[b] = a
+
+    groups: Dict[str, List[str]] = {}
+    for path in hashes:
+        groups.setdefault(find(path), []).append(path)
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: g[0])
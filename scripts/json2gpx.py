@@ -3,99 +3,133 @@
 Convert exiftool JSON output to GPX track file.
 
 Usage:
-    python3 json2gpx.py input.json output.gpx
+    python3 json2gpx.py input.json output.gpx [--route data/routes/<track>.json]
+
+The input is streamed record by record and only the four fields of each
+track point are kept, in typed arrays (32 bytes per point), so a whole
+Photos library export converts in a few dozen MB.
 """
 
-import json
+import argparse
+import math
+import os
 import sys
+from array import array
 from datetime import datetime
 
-try:
-    import gpxpy
-    import gpxpy.gpx
-except ImportError:
-    print("❌ 未安装 gpxpy")
-    print("请运行: pip3 install --user gpxpy")
-    sys.exit(1)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import perf  # noqa: E402
+from scripts.exif_json import iter_records  # noqa: E402
+from scripts.gpx_writer import write_track  # noqa: E402
+from scripts.perf import TRACER  # noqa: E402
+from scripts.route_codec import build_route, trip_bbox, write_route  # noqa: E402
+
+REQUIRED = ('GPSLatitude', 'GPSLongitude', 'DateTimeOriginal')
+
+
+def pack_time(dt: datetime) -> int:
+    """datetime -> YYYYMMDDhhmmss as an int (sorts like the datetime)."""
+    return (((((dt.year * 100 + dt.month) * 100 + dt.day) * 100 + dt.hour) * 100
+             + dt.minute) * 100 + dt.second)
+
+
+def unpack_time(v: int, sep: str = 'T') -> str:
+    """YYYYMMDDhhmmss int -> ISO 8601 string (GPX `<time>` format)."""
+    return (f"{v // 10**10:04d}-{v // 10**8 % 100:02d}-{v // 10**6 % 100:02d}{sep}"
+            f"{v // 10**4 % 100:02d}:{v // 100 % 100:02d}:{v % 100:02d}")
 
 
-def json_to_gpx(input_json: str, output_gpx: str):
-    """Convert exiftool JSON to GPX track."""
-    
+def _days(times, lats, lons, order):
+    """(date, points) per calendar day of the time-sorted `order`."""
+    day, points = None, []
+    for i in order:
+        if times[i] // 10**6 != day:
+            if points:
+                yield unpack_time(day * 10**6)[:10], points
+            day, points = times[i] // 10**6, []
+        points.append((lats[i], lons[i]))
+    if points:
+        yield unpack_time(day * 10**6)[:10], points
+
+
+@TRACER.stage("gpx")
+def json_to_gpx(input_json: str, output_gpx: str, output_route: str = None):
+    """Convert exiftool JSON to GPX track, and optionally a simplified route (see route_codec)."""
+
     print(f"📖 读取 {input_json}...")
-    with open(input_json, 'r') as f:
-        data = json.load(f)
-    
-    # Create GPX object
-    gpx = gpxpy.gpx.GPX()
-    gpx.creator = "Mac Photos GPS Extractor"
-    
-    track = gpxpy.gpx.GPXTrack()
-    track.name = "Mac Photos Track"
-    gpx.tracks.append(track)
-    
-    segment = gpxpy.gpx.GPXTrackSegment()
-    track.segments.append(segment)
-    
-    # Filter valid points with GPS
-    valid_points = [
-        p for p in data 
-        if all(k in p for k in ['GPSLatitude', 'GPSLongitude', 'DateTimeOriginal'])
-    ]
-    
-    if not valid_points:
+    times, lats, lons, alts = array('q'), array('d'), array('d'), array('d')
+    valid = skipped = 0
+    with open(input_json, 'r', encoding='utf-8') as f:
+        for item in iter_records(f):
+            # Filter valid points with GPS
+            if not all(k in item for k in REQUIRED):
+                continue
+            valid += 1
+            try:
+                # Parse datetime (EXIF format: "2025:07:24 14:23:45")
+                time = datetime.strptime(item['DateTimeOriginal'], '%Y:%m:%d %H:%M:%S')
+                lat = float(item['GPSLatitude'])
+                lon = float(item['GPSLongitude'])
+                alt = float(item['GPSAltitude']) if 'GPSAltitude' in item else math.nan
+            except Exception as e:
+                skipped += 1
+                if skipped <= 3:  # Only print first few errors
+                    filename = item.get('FileName', 'unknown')
+                    print(f"⚠️  跳过 {filename}: {e}")
+                continue
+            times.append(pack_time(time))
+            lats.append(lat)
+            lons.append(lon)
+            alts.append(alt)
+
+    if not valid:
         print("❌ 未找到包含 GPS 和时间的照片")
         sys.exit(1)
-    
-    # Sort by time
-    valid_points.sort(key=lambda x: x['DateTimeOriginal'])
-    
-    print(f"✨ 找到 {len(valid_points)} 个有效轨迹点")
-    
-    # Add track points
-    skipped = 0
-    for item in valid_points:
-        try:
-            # Parse datetime (EXIF format: "2025:07:24 14:23:45")
-            time_str = item['DateTimeOriginal']
-            time = datetime.strptime(time_str, '%Y:%m:%d %H:%M:%S')
-            
-            lat = float(item['GPSLatitude'])
-            lon = float(item['GPSLongitude'])
-            alt = float(item.get('GPSAltitude', 0)) if 'GPSAltitude' in item else None
-            
-            segment.points.append(gpxpy.gpx.GPXTrackPoint(
-                lat, lon, elevation=alt, time=time
-            ))
-            
-        except Exception as e:
-            skipped += 1
-            if skipped <= 3:  # Only print first few errors
-                filename = item.get('FileName', 'unknown')
-                print(f"⚠️  跳过 {filename}: {e}")
-    
+
+    print(f"✨ 找到 {valid} 个有效轨迹点")
+
+    # Sort by time (stable, so photos taken in the same second keep input order)
+    order = sorted(range(len(times)), key=times.__getitem__)
+    points = (
+        (lats[i], lons[i], None if math.isnan(alts[i]) else alts[i], unpack_time(times[i]))
+        for i in order
+    )
+
     # Write GPX
     print(f"💾 写入 {output_gpx}...")
-    with open(output_gpx, 'w') as f:
-        f.write(gpx.to_xml())
-    
+    with open(output_gpx, 'w', encoding='utf-8') as f:
+        count = write_track(f, points, creator="Mac Photos GPS Extractor", name="Mac Photos Track")
+    TRACER.count("gpx.points", count)
+    TRACER.count("gpx.skipped", skipped)
+    if output_route:
+        with TRACER.timed("gpx.route"):
+            write_route(output_route, build_route(_days(times, lats, lons, order), bbox=trip_bbox(zip(lats, lons))))
+        print(f"🗺️  页面路线: {output_route} ({os.path.getsize(output_route) / 1024:.1f} KB)")
+
     print(f"✅ 成功生成 GPX 轨迹！")
-    print(f"   轨迹点数: {len(segment.points)}")
+    print(f"   轨迹点数: {count}")
     if skipped > 0:
         print(f"   跳过: {skipped} 个")
     print(f"\n📍 时间范围:")
-    if segment.points:
-        print(f"   开始: {segment.points[0].time}")
-        print(f"   结束: {segment.points[-1].time}")
+    if order:
+        print(f"   开始: {unpack_time(times[order[0]], ' ')}")
+        print(f"   结束: {unpack_time(times[order[-1]], ' ')}")
 
 
-if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: python3 json2gpx.py input.json output.gpx")
-        sys.exit(1)
-    
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    
-    json_to_gpx(input_file, output_file)
+def main():
+    """Command-line entry point."""
 
+    parser = argparse.ArgumentParser(description='Convert exiftool JSON to a GPX track')
+    parser.add_argument('input', help='exiftool JSON (-n -json with GPS and DateTimeOriginal)')
+    parser.add_argument('output', help='GPX file to write')
+    parser.add_argument('--route', metavar='FILE', help='also write the simplified per-day route for trip pages (data/routes/<track>.json)')
+    perf.add_arguments(parser)
+    args = parser.parse_args()
+
+    perf.start(args)
+
+    json_to_gpx(args.input, args.output, args.route)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Python port of the gallery's justified layout.
+
+Mirrors `themes/gallery/assets/js/justified-layout.ts` (SmugMug's algorithm as
+modified by the theme) plus the `fillLastRow` pass in `assets/js/gallery.js`,
+so build scripts can precompute exactly the boxes the browser would.
+Keep the two in sync when either side changes.
+"""
+
+from typing import Dict, List
+
+
+class Row:
+    """One row of a justified layout; sizes only, positions via `top`."""
+
+    def __init__(self, top: float, row_width: float, spacing: float,
+                 row_height: float, height_tolerance: float):
+        self.top = top
+        self.row_width = row_width
+        self.spacing = spacing
+        self.row_height = row_height
+        self.min_aspect_ratio = row_width / row_height * (1 - height_tolerance)
+        self.max_aspect_ratio = row_width / row_height * (1 + height_tolerance)
+        self.items: List[Dict] = []
+        self.height = 0.0
+
+    def add_item(self, aspect_ratio: float) -> bool:
+        """Try to add an item; returns False if it was rejected (row completed)."""
+        new_items = self.items + [{"aspect_ratio": aspect_ratio}]
+        width_without_spacing = self.row_width - (len(new_items) - 1) * self.spacing
+        new_aspect_ratio = sum(i["aspect_ratio"] for i in new_items)
+        target_aspect_ratio = width_without_spacing / self.row_height
+
+        if new_aspect_ratio < self.min_aspect_ratio:
+            # Row still too tall: accept and keep the row open.
+            self.items = new_items
+            return True
+
+        if new_aspect_ratio > self.max_aspect_ratio:
+            if not self.items:
+                # Pano special case: a lone item fills the row on its own.
+                self.items = new_items
+                self.complete_layout(width_without_spacing / new_aspect_ratio)
+                return True
+
+            previous_width = self.row_width - (len(self.items) - 1) * self.spacing
+            previous_aspect_ratio = sum(i["aspect_ratio"] for i in self.items)
+            previous_target = previous_width / self.row_height
+
+            if abs(new_aspect_ratio - target_aspect_ratio) > abs(previous_aspect_ratio - previous_target):
+                self.complete_layout(previous_width / previous_aspect_ratio)
+                return False
+
+        self.items = new_items
+        self.complete_layout(width_without_spacing / new_aspect_ratio)
+        return True
+
+    def complete_layout(self, new_height: float) -> None:
+        """Fix the row height (clamped to 0.5x..2x) and size every item."""
+        width_without_spacing = self.row_width - (len(self.items) - 1) * self.spacing
+        clamped = max(0.5 * self.row_height, min(new_height, 2 * self.row_height))
+
+        if new_height != clamped:
+            self.height = clamped
+            ratio = (width_without_spacing / clamped) / (width_without_spacing / new_height)
+        else:
+            self.height = new_height
+            ratio = 1.0
+
+        left = 0.0
+        for item in self.items:
+            item["top"] = self.top
+            item["width"] = item["aspect_ratio"] * self.height * ratio
+            item["height"] = self.height
+            item["left"] = left
+            left += item["width"] + self.spacing
+
+
+def justified_layout(aspect_ratios: List[float], row_width: float, spacing: float,
+                     row_height: float, height_tolerance: float) -> Dict:
+    """Lay out boxes like the theme's justified-layout.ts.
+
+    Returns `{"container_height": float, "boxes": [{top, left, width, height}, ...]}`.
+    """
+    params = dict(row_width=row_width, spacing=spacing,
+                  row_height=row_height, height_tolerance=height_tolerance)
+    container_height = 0.0
+    last_row_height = 0.0
+    boxes: List[Dict] = []
+    row = None
+
+    for aspect_ratio in aspect_ratios:
+        if row is None:
+            row = Row(top=container_height, **params)
+
+        added = row.add_item(aspect_ratio)
+
+        if row.height > 0:
+            last_row_height = row.height
+            boxes.extend(row.items)
+            container_height += row.height + spacing
+            row = Row(top=container_height, **params)
+
+            if not added:
+                row.add_item(aspect_ratio)
+                if row.height > 0:
+                    last_row_height = row.height
+                    boxes.extend(row.items)
+                    container_height += row.height + spacing
+                    row = Row(top=container_height, **params)
+
+    if row is not None and row.items:
+        row.complete_layout(last_row_height or row_height)
+        boxes.extend(row.items)
+        container_height += row.height + spacing
+
+    container_height -= spacing
+    return {"container_height": container_height, "boxes": boxes}
+
+
+def fill_last_row(layout: Dict, aspect_ratios: List[float], container_width: float,
+                  spacing: float, row_height: float) -> Dict:
+    """Stretch the trailing row to the container width, as gallery.js does.
+
+    A lone widow is capped at 1.9x the target row height and centred instead.
+    """
+    boxes = layout["boxes"]
+    if not boxes:
+        return layout
+    last_top = max(b["top"] for b in boxes)
+    idx = [i for i, b in enumerate(boxes) if abs(b["top"] - last_top) < 0.5]
+    cur_width = sum(boxes[i]["width"] for i in idx) + (len(idx) - 1) * spacing
+    if cur_width >= container_width - 1:
+        return layout
+
+    ars = [aspect_ratios[i] for i in idx]
+    available = container_width - (len(idx) - 1) * spacing
+    height = min(available / sum(ars), row_height * 1.9)
+    widths = [ar * height for ar in ars]
+    total_width = sum(widths) + (len(idx) - 1) * spacing
+    left = max(0.0, (container_width - total_width) / 2)
+    for i, width in zip(idx, widths):
+        boxes[i]["height"] = height
+        boxes[i]["width"] = width
+        boxes[i]["left"] = left
+        left += width + spacing
+    layout["container_height"] = last_top + height
+    return layout
+
+
+def layout_gallery(aspect_ratios: List[float], container_width: float, spacing: float = 8,
+                   row_height: float = 288, height_tolerance: float = 0.25) -> Dict:
+    """Full home-gallery layout: justified rows plus the last-row fill."""
+    layout = justified_layout(aspect_ratios, container_width, spacing, row_height, height_tolerance)
+    return fill_last_row(layout, aspect_ratios, container_width, spacing, row_height)
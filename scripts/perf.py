@@ -0,0 +1,187 @@
+"""
+Stage timings, counters and performance traces for the workflow scripts.
+
+`TRACER` is process-wide, like the geocoding throttle. The scripts record into
+it unconditionally; recording is a few dict updates, so it costs nothing
+measurable. The flags from `add_arguments()` decide what is reported:
+
+    --profile         print a per-stage / per-counter summary at exit (stderr)
+    --trace FILE      write the same data as JSON
+    --cprofile FILE   dump cProfile stats of the main thread (pstats format)
+    --quiet           replace per-item output with a rate-limited progress line
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Tracer:
+    """Thread-safe collector of stage spans, timers and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.perf_counter()
+        self.quiet = False
+        self.stages = []  # {"name", "label", "start_s", "wall_s", "cpu_s"}
+        self.timers = defaultdict(lambda: [0, 0.0])  # name -> [calls, seconds]
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def label(self, name):
+        """Tag stages run by this thread (e.g. with the batch trip's name)."""
+        previous = getattr(self._local, "label", None)
+        self._local.label = name
+        try:
+            yield
+        finally:
+            self._local.label = previous
+
+    @contextmanager
+    def stage(self, name):
+        """Record wall and CPU time of a pipeline stage.
+
+        CPU time is the calling thread's, so concurrent batch trips don't
+        count each other's work.
+        """
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            span = {
+                "name": name,
+                "label": getattr(self._local, "label", None),
+                "start_s": round(wall - self.started, 6),
+                "wall_s": round(time.perf_counter() - wall, 6),
+                "cpu_s": round(time.thread_time() - cpu, 6),
+            }
+            with self._lock:
+                self.stages.append(span)
+
+    @contextmanager
+    def timed(self, name):
+        """Accumulate calls and wall time under `name` (e.g. a subprocess)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            timer = self.timers[name]
+            timer[0] += 1
+            timer[1] += seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def report(self):
+        """Everything recorded so far, as JSON-able data."""
+        with self._lock:
+            return {
+                "argv": sys.argv,
+                "wall_s": round(time.perf_counter() - self.started, 6),
+                "cpu_s": round(time.process_time(), 6),
+                "stages": list(self.stages),
+                "timers": {k: {"calls": c, "seconds": round(s, 6)} for k, (c, s) in sorted(self.timers.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def print_summary(self, stream=None):
+        stream = stream or sys.stderr
+        data = self.report()
+        print(f"\n⏱  wall {data['wall_s']:.3f}s  cpu {data['cpu_s']:.3f}s", file=stream)
+        for span in data["stages"]:
+            name = f"{span['label']}/{span['name']}" if span["label"] else span["name"]
+            print(f"   {name:<32} wall {span['wall_s']:8.3f}s  cpu {span['cpu_s']:8.3f}s", file=stream)
+        for name, timer in data["timers"].items():
+            print(f"   {name:<32} {timer['calls']:6d}×     {timer['seconds']:8.3f}s", file=stream)
+        for name, value in data["counters"].items():
+            print(f"   {name:<32} {value:6d}", file=stream)
+
+
+TRACER = Tracer()
+
+
+def run(cmd, **kwargs):
+    """`subprocess.run`, timed under `subprocess.<program>`."""
+    import subprocess
+
+    with TRACER.timed(f"subprocess.{os.path.basename(cmd[0])}"):
+        return subprocess.run(cmd, **kwargs)
+
+
+class Progress:
+    """Progress line for long loops, printed at most every `interval` seconds.
+
+    Used instead of per-item output in --quiet mode, where printing two lines
+    per photo would itself dominate a 100k-file run. `total=None` is for
+    streams of unknown length; pass `force=True` for the final line.
+    """
+
+    def __init__(self, total, label="", interval=1.0, stream=None):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._last = 0.0
+
+    def update(self, done, detail="", force=False):
+        now = time.monotonic()
+        final = force or (self.total is not None and done >= self.total)
+        if not final and now - self._last < self.interval:
+            return
+        self._last = now
+        count = f"{done}/{self.total}" if self.total is not None else str(done)
+        line = f"{self.label} {count}" + (f"  {detail}" if detail else "")
+        print(line, file=self.stream, flush=True)
+
+
+def add_arguments(parser):
+    """Add --profile, --trace, --cprofile and --quiet to an argparse parser."""
+    group = parser.add_argument_group("performance")
+    group.add_argument("--profile", action="store_true",
+                       help="print stage timings and counters at exit")
+    group.add_argument("--trace", metavar="FILE",
+                       help="write stage timings and counters as JSON")
+    group.add_argument("--cprofile", metavar="FILE",
+                       help="dump cProfile stats of the main thread to FILE")
+    group.add_argument("--quiet", action="store_true",
+                       help="rate-limit progress output instead of printing every item")
+
+
+def start(args):
+    """Apply the flags from `add_arguments`; reports are written at exit.
+
+    Reporting runs from `atexit`, so it also covers runs that end in
+    `sys.exit()` halfway through.
+    """
+    import atexit
+
+    TRACER.quiet = getattr(args, "quiet", False)
+    profiler = None
+    if getattr(args, "cprofile", None):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if getattr(args, "trace", None):
+            with open(args.trace, "w", encoding="utf-8") as fh:
+                json.dump(TRACER.report(), fh, indent=2, ensure_ascii=False)
+        if getattr(args, "profile", False):
+            TRACER.print_summary()
+
+    atexit.register(finish)
+    return finish
@@ -0,0 +1,193 @@
+"""
+Compact route geometry for drawing a trip on its page without map tiles.
+
+A trip's GPX has a point per photo, which is far more than a page needs
+to draw the route. Here each day's track is simplified (Douglas-Peucker,
+to about one pixel of a 1000 px wide map of the whole trip), and photos
+taken close together are merged into anchor points with a photo count.
+Both are stored as Google encoded polylines: coordinates quantized to
+1e-5 degrees (about a metre), delta-encoded, and written as printable
+variable-length integers. A trip fits in a few KB of JSON:
+
+    {"precision": 5, "bbox": [min lon, min lat, max lon, max lat],
+     "days": [{"date": "2025-08-15", "line": "...", "anchors": "...", "photos": [3, 12]}]}
+
+Routes are Hugo data, `data/routes/<track>.json` (not next to the GPX,
+which `make clean` empties), so `layouts/partials/trip-route.html` reads
+them from `site.Data.routes`, decodes them and draws an SVG.
+"""
+
+import json
+import math
+import os
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+PRECISION = 5  # decimal places kept: 1e-5 degrees, about 1 m
+MAP_PIXELS = 1000  # simplify to about one pixel of a map this wide
+MIN_TOLERANCE_M = 10.0
+ANCHOR_CELLS = 20  # anchors merge photos within this many tolerances (map pixels) of each other
+EARTH_RADIUS_M = 6371000.0
+ROUTE_DIR = "data/routes"
+# Everything above that shapes a route, for the GPX stage's key (stage_cache)
+ROUTE_PARAMS = (PRECISION, MAP_PIXELS, MIN_TOLERANCE_M, ANCHOR_CELLS)
+
+LatLon = Tuple[float, float]
+Box = Tuple[float, float, float, float]  # min lon, min lat, max lon, max lat
+
+
+def encode_values(values: Iterable[int]) -> str:
+    """Signed integers as printable variable-length characters (5 bits each, the polyline alphabet)."""
+    out = []
+    for value in values:
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def decode_values(text: str) -> List[int]:
+    """The integers of an `encode_values` string."""
+    values, value, shift = [], 0, 0
+    for char in text:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    return values
+
+
+def encode(points: Iterable[LatLon], precision: int = PRECISION) -> str:
+    """Google encoded polyline of (lat, lon) points."""
+    scale = 10 ** precision
+    deltas, prev_lat, prev_lon = [], 0, 0
+    for lat, lon in points:
+        ilat, ilon = round(lat * scale), round(lon * scale)
+        deltas += (ilat - prev_lat, ilon - prev_lon)
+        prev_lat, prev_lon = ilat, ilon
+    return encode_values(deltas)
+
+
+def decode(text: str, precision: int = PRECISION) -> List[LatLon]:
+    """(lat, lon) points of a Google encoded polyline."""
+    scale = 10 ** precision
+    values = decode_values(text)
+    points, lat, lon = [], 0, 0
+    for dlat, dlon in zip(values[::2], values[1::2]):
+        lat, lon = lat + dlat, lon + dlon
+        points.append((lat / scale, lon / scale))
+    return points
+
+
+def _metres(points: Sequence[LatLon]) -> List[Tuple[float, float]]:
+    """Points on a local equirectangular plane, in metres."""
+    lat0 = math.radians(sum(p[0] for p in points) / len(points))
+    kx, ky = EARTH_RADIUS_M * math.cos(lat0) * math.pi / 180, EARTH_RADIUS_M * math.pi / 180
+    return [(lon * kx, lat * ky) for lat, lon in points]
+
+
+def simplify(points: Sequence[LatLon], tolerance_m: float) -> List[LatLon]:
+    """Douglas-Peucker: the fewest points within `tolerance_m` of the original line."""
+    if len(points) < 3:
+        return list(points)
+    xy = _metres(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        best, index = tolerance_m, None
+        for i in range(first + 1, last):
+            x, y = xy[i]
+            if length:
+                # Distance to the segment, not the infinite line: tracks double back
+                t = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length ** 2))
+                d = math.hypot(x - x1 - t * dx, y - y1 - t * dy)
+            else:
+                d = math.hypot(x - x1, y - y1)
+            if d > best:
+                best, index = d, i
+        if index is not None:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def anchors(points: Sequence[LatLon], cell_m: float) -> Tuple[List[LatLon], List[int]]:
+    """Photo positions merged per `cell_m` grid cell: first position and photo count."""
+    if not points:
+        return [], []
+    cells = {}
+    for (lat, lon), (x, y) in zip(points, _metres(points)):
+        key = (math.floor(x / cell_m), math.floor(y / cell_m))
+        if key in cells:
+            cells[key][1] += 1
+        else:
+            cells[key] = [(lat, lon), 1]
+    return [p for p, _ in cells.values()], [n for _, n in cells.values()]
+
+
+def trip_bbox(points: Iterable[LatLon]) -> Box:
+    """(min lon, min lat, max lon, max lat) of the points, in one pass."""
+    min_lat = min_lon = math.inf
+    max_lat = max_lon = -math.inf
+    for lat, lon in points:
+        min_lat, max_lat = min(min_lat, lat), max(max_lat, lat)
+        min_lon, max_lon = min(min_lon, lon), max(max_lon, lon)
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def trip_tolerance(bbox: Box) -> float:
+    """About one pixel of a MAP_PIXELS wide map of the whole trip, in metres."""
+    (x1, y1), (x2, y2) = _metres([(bbox[1], bbox[0]), (bbox[3], bbox[2])])
+    return max(MIN_TOLERANCE_M, math.hypot(x2 - x1, y2 - y1) / MAP_PIXELS)
+
+
+def build_route(days: Iterable[Tuple[str, Iterable[LatLon]]], bbox: Optional[Box] = None,
+                tolerance_m: Optional[float] = None) -> dict:
+    """The route document for (date, time-ordered points) pairs.
+
+    With the trip's `bbox` given, `days` is consumed one day at a time, so
+    memory follows the busiest day rather than the whole trip.
+    """
+    if bbox is None:
+        days = [(date, list(points)) for date, points in days]
+        bbox = trip_bbox(p for _, points in days for p in points)
+    route = {"precision": PRECISION, "bbox": [], "days": []}
+    if math.isinf(bbox[0]):
+        return route
+    route["bbox"] = [round(v, PRECISION) for v in bbox]
+    tolerance_m = tolerance_m or trip_tolerance(bbox)
+    for date, points in days:
+        points = list(points)
+        if not points:
+            continue
+        places, counts = anchors(points, tolerance_m * ANCHOR_CELLS)
+        route["days"].append({
+            "date": date,
+            "line": encode(simplify(points, tolerance_m)),
+            "anchors": encode(places),
+            "photos": counts,
+        })
+    return route
+
+
+def route_path(gpx_dir: str, name: str) -> str:
+    """`data/routes/<name>.json` of the site whose tracks are in `gpx_dir` (`gpx` -> `data/routes`)."""
+    return os.path.normpath(os.path.join(gpx_dir, os.pardir, ROUTE_DIR, f"{name}.json"))
+
+
+def write_route(path: str, route: dict) -> None:
+    """Write the route as compact JSON (replacing the file in one step)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(route, fh, separators=(",", ":"))
+    os.replace(tmp, path)
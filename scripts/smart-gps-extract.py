@@ -17,25 +17,46 @@ Examples:
     
     # Combined: expected range + manual cities for missing dates
     python3 scripts/smart-gps-extract.py ~/Downloads/Trip trip-2025 -s 2025-07-01 -e 2025-07-10 --d1 Berlin --d8 Paris
+
+    # Batch: many trips from a manifest, concurrently and without prompts
+    python3 scripts/smart-gps-extract.py --batch trips.json --jobs 8
+
+Batch manifest (JSON list, or {"trips": [...]}; relative folders are resolved
+against the manifest's directory):
+    [
+      {"folder": "~/Pictures/Denmark", "name": "denmark-2025",
+       "start": "2025-08-12", "end": "2025-08-23", "overrides": {"1": "Copenhagen"}},
+      {"folder": "~/Pictures/Faroe", "name": "faroe-2025"}
+    ]
 """
 
+import io
 import json
+import os
 import sys
 import time
-import subprocess
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
+from itertools import groupby
 
-try:
-    import gpxpy
-    import gpxpy.gpx
-    from geopy.geocoders import Nominatim
-    from geopy.exc import GeocoderTimedOut
-except ImportError as e:
-    print(f"❌ 缺少依赖: {e}")
-    print("请运行: pip3 install --user --break-system-packages gpxpy geopy")
-    sys.exit(1)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import perf  # noqa: E402
+from scripts.deps import ensure  # noqa: E402
+from scripts.geocoding import (  # noqa: E402
+    NOMINATIM, GeocodeSettings, make_nominatim,
+    add_arguments as add_geocoding_arguments, configure as configure_geocoding,
+)
+from scripts.gps_filter import (  # noqa: E402
+    GpsFilter, filter_photos,
+    add_arguments as add_gps_filter_arguments, from_args as gps_filter_from_args,
+)
+from scripts.gpx_writer import write_track  # noqa: E402
+from scripts.perf import TRACER  # noqa: E402
+from scripts.route_codec import ROUTE_PARAMS, build_route, route_path, trip_bbox, write_route  # noqa: E402
+from scripts.stage_cache import StageStamps, file_sha256, fingerprint, folder_signature  # noqa: E402
+from scripts.trip_stats import trip_stats  # noqa: E402
 
 
 # Color codes
@@ -86,12 +107,25 @@ def ask_continue(prompt="继续？"):
     return response.lower() in ['y', 'yes', 'Y']
 
 
-def extract_gps_data(photo_folder, output_name):
-    """Extract GPS data from photos using exiftool."""
+class ExtractionError(Exception):
+    """A step cannot continue; the message has already been printed."""
+
+
+class StageCancelled(Exception):
+    """A speculative stage was cancelled because the user declined to continue."""
+
+
+@TRACER.stage('extract')
+def extract_gps_data(photo_folder, output_name, output_dir='gpx', stamps=None):
+    """Extract GPS data from photos using exiftool.
+
+    With `stamps`, the scan is skipped when the photos (paths, sizes, mtimes)
+    and the exiftool arguments match the run that wrote `<name>-gps.json`.
+    """
     
     print_step(1, 5, "扫描照片并提取 GPS 数据")
     
-    output_json = f"gpx/{output_name}-gps.json"
+    output_json = f"{output_dir}/{output_name}-gps.json"
     
     cmd = [
         'exiftool',
@@ -99,20 +133,31 @@ def extract_gps_data(photo_folder, output_name):
         '-ext', 'jpg', '-ext', 'jpeg', '-ext', 'heic', 
         '-ext', 'HEIC', '-ext', 'JPG',
         '-FileName', '-GPSLatitude', '-GPSLongitude', 
-        '-GPSAltitude', '-DateTimeOriginal',
+        '-GPSAltitude', '-GPSHPositioningError', '-DateTimeOriginal',
         str(photo_folder)
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    
-    if result.returncode != 0:
-        print_error(f"exiftool 错误: {result.stderr}")
-        sys.exit(1)
-    
-    with open(output_json, 'w') as f:
-        f.write(result.stdout)
+    key = None
+    if stamps is not None:
+        key = fingerprint('extract', cmd[:-1], folder_signature(photo_folder))
     
-    data = json.loads(result.stdout)
+    if key and stamps.fresh(output_json, key):
+        print_info(f"♻️  照片未变化，复用 {output_json}")
+        with open(output_json) as f:
+            data = json.load(f)
+    else:
+        result = perf.run(cmd, capture_output=True, text=True)
+        
+        if result.returncode != 0:
+            print_error(f"exiftool 错误: {result.stderr}")
+            raise ExtractionError(f"exiftool 错误: {result.stderr.strip()}")
+        
+        with open(output_json, 'w') as f:
+            f.write(result.stdout)
+        if key:
+            stamps.record(output_json, key)
+        
+        data = json.loads(result.stdout)
     
     total = len(data)
     with_gps = len([p for p in data if 'GPSLatitude' in p and 'GPSLongitude' in p])
@@ -129,13 +174,18 @@ def extract_gps_data(photo_folder, output_name):
         print("请确保:")
         print("  1. 照片是从手机拍摄的（带 GPS）")
         print('  2. 导出时勾选了"位置信息"')
-        sys.exit(1)
+        raise ExtractionError("没有找到包含 GPS 的照片")
     
     return data
 
 
-def analyze_date_range(data, expected_start=None, expected_end=None):
-    """Analyze date range and group photos by date."""
+@TRACER.stage('analyze')
+def analyze_date_range(data, expected_start=None, expected_end=None, gps_filter=GpsFilter()):
+    """Analyze date range and group photos by date.
+
+    Fixes `gps_filter` finds implausible (see gps_filter) are dropped here,
+    before geocoding and the GPX see them. Each day's photos are in time order.
+    """
     
     print_step(2, 5, "分析行程时间范围")
     
@@ -147,23 +197,33 @@ def analyze_date_range(data, expected_start=None, expected_end=None):
     
     if not valid_photos:
         print_error("没有包含完整 GPS 和时间信息的照片")
-        sys.exit(1)
-    
-    # Group by date
-    photos_by_date = defaultdict(list)
+        raise ExtractionError("没有包含完整 GPS 和时间信息的照片")
     
+    photos, errors = [], []
     for p in valid_photos:
         try:
             dt = datetime.strptime(p['DateTimeOriginal'], '%Y:%m:%d %H:%M:%S')
-            date_str = dt.strftime('%Y-%m-%d')
-            photos_by_date[date_str].append({
-                'lat': p['GPSLatitude'],
-                'lon': p['GPSLongitude'],
-                'time': dt,
-                'filename': p['FileName']
-            })
         except ValueError:
             continue
+        photos.append({
+            'lat': p['GPSLatitude'],
+            'lon': p['GPSLongitude'],
+            'time': dt,
+            'alt': p.get('GPSAltitude'),
+            'filename': p['FileName']
+        })
+        errors.append(p.get('GPSHPositioningError'))
+    
+    photos, outliers = filter_photos(photos, errors, gps_filter)
+    report_outliers(outliers, gps_filter)
+    if not photos:
+        print_error("没有可信的 GPS 照片")
+        raise ExtractionError("没有可信的 GPS 照片")
+    
+    # Group by date (photos are in time order)
+    photos_by_date = defaultdict(list)
+    for p in photos:
+        photos_by_date[p['time'].strftime('%Y-%m-%d')].append(p)
     
     dates = sorted(photos_by_date.keys())
     
@@ -211,15 +271,61 @@ def analyze_date_range(data, expected_start=None, expected_end=None):
     return photos_by_date, dates, missing_dates if (expected_start or expected_end) else []
 
 
-def reverse_geocode_locations(photos_by_date, dates, day_overrides=None):
-    """Reverse geocode GPS to city names for each day."""
-    
+def report_outliers(outliers, gps_filter):
+    """Print how many fixes the GPS filter caught, and a few examples."""
+    labels = {'error': '定位误差过大', 'speed': '速度不合理', 'lone': '孤立跳点'}
+    total = sum(len(photos) for photos in outliers.values())
+    for reason, photos in outliers.items():
+        TRACER.count(f"gps_filter.{reason}", len(photos))
+    if not total:
+        return
+    print()
+    action = "已排除" if gps_filter.drop else "已保留 (--keep-outliers)"
+    counts = "，".join(f"{labels[r]} {len(p)}" for r, p in outliers.items() if p)
+    print_warning(f"{total} 个 GPS 异常点{action}: {counts}")
+    examples = [(reason, p) for reason, photos in outliers.items() for p in photos][:3]
+    for reason, p in examples:
+        print(f"   - {p['filename']} ({p['time']:%Y-%m-%d %H:%M}, {p['lat']:.4f}, {p['lon']:.4f}): {labels[reason]}")
+
+
+def make_geocoder(url=None):
+    """Nominatim client; geopy is only imported once geocoding starts."""
+    return make_nominatim("photography-songshgeo", url)
+
+
+@TRACER.stage('geocode')
+def reverse_geocode_locations(photos_by_date, dates, day_overrides=None,
+                              throttle=NOMINATIM, cache=None, cancel=None, known=None,
+                              geocode_settings=GeocodeSettings()):
+    """Reverse geocode GPS to city names for each day.
+
+    `throttle` spaces out API requests and `cache` maps rounded coordinates to
+    places; batch mode passes the same ones to every trip. Lookups go through
+    the provider chain (places cache, gazetteer, API; see geocoder_chain), so
+    while the API is failing samples fall through at once instead of each
+    waiting out a backoff. Setting the `cancel` event stops before the next
+    request with StageCancelled.
+    `known` maps date -> sampled place labels (lat, lon, city, state,
+    country) from an earlier run on the same GPS data; those days are
+    reused, and days geocoded now are added to it.
+    Each day gets the state and country of its primary city, and its
+    samples under 'labels'. `geocode_settings` (from the command line) names
+    the server, places cache file and offline data.
+    """
+    
+    from scripts.geocoder_chain import make_chain, place_label  # with boundaries: not needed for --help
+
     print_step(3, 5, "查询每天的城市位置（OpenStreetMap API）")
     print_info("⏱  这可能需要几秒钟...\n")
     
-    geolocator = Nominatim(user_agent="photography-songshgeo")
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise StageCancelled()
+    
+    chain = make_chain(make_geocoder(geocode_settings.url), throttle, cache, before_request=check_cancel,
+                       settings=geocode_settings)
     locations_by_date = {}
-    cache = {}
+    progress = perf.Progress(len(dates), "   地点查询") if TRACER.quiet else None
     
     for i, date in enumerate(dates, 1):
         coords_list = photos_by_date[date]
@@ -231,67 +337,69 @@ def reverse_geocode_locations(photos_by_date, dates, day_overrides=None):
                 'primary': city,
                 'all': [city],
                 'count': len(coords_list),
-                'manual': True
+                'manual': True,
+                'state': '',
+                'country': '',
+                'labels': []
             }
-            print(f"   第 {i:2d} 天 ({date}): {Colors.BLUE}{city}{Colors.NC} (手动指定)")
+            if not TRACER.quiet:
+                print(f"   第 {i:2d} 天 ({date}): {Colors.BLUE}{city}{Colors.NC} (手动指定)")
             continue
         
-        cities = []
-        
-        # Sample up to 3 coordinates per day
-        sample_size = min(3, len(coords_list))
-        sample_indices = [0, len(coords_list)//2, len(coords_list)-1] if len(coords_list) > 2 else list(range(len(coords_list)))
-        sample_coords = [coords_list[idx] for idx in sample_indices[:sample_size]]
-        
-        for coord in sample_coords:
-            lat, lon = coord['lat'], coord['lon']
-            cache_key = (round(lat, 2), round(lon, 2))
+        if known is not None and date in known:
+            # Sampled on an earlier run from the same GPS data
+            labels = known[date]
+            TRACER.count('geocode.days_reused')
+        else:
+            labels = []
             
-            if cache_key in cache:
-                city = cache[cache_key]
-            else:
-                try:
-                    location = geolocator.reverse(f"{lat}, {lon}", language='en')
-                    if location and location.raw.get('address'):
-                        addr = location.raw['address']
-                        city = (addr.get('city') or 
-                               addr.get('town') or 
-                               addr.get('village') or
-                               addr.get('municipality') or
-                               addr.get('county') or
-                               'Unknown')
-                        cache[cache_key] = city
-                    else:
-                        city = 'Unknown'
-                    time.sleep(1.1)  # API rate limit
-                except (GeocoderTimedOut, Exception):
-                    city = 'Unknown'
-                    time.sleep(2)
+            # Sample up to 3 coordinates per day
+            sample_size = min(3, len(coords_list))
+            sample_indices = [0, len(coords_list)//2, len(coords_list)-1] if len(coords_list) > 2 else list(range(len(coords_list)))
+            sample_coords = [coords_list[idx] for idx in sample_indices[:sample_size]]
             
-            if city != 'Unknown':
-                cities.append(city)
+            for coord in sample_coords:
+                check_cancel()
+                place, _ = chain.lookup(coord['lat'], coord['lon'])
+                
+                if place and place.city != 'Unknown':
+                    labels.append(place_label(coord['lat'], coord['lon'], place))
+            
+            if known is not None and labels:
+                known[date] = labels
         
         # Count most common city
+        cities = [label['city'] for label in labels]
         if cities:
             city_counts = Counter(cities)
             primary_city = city_counts.most_common(1)[0][0]
             all_cities = list(city_counts.keys())
+            primary = next(label for label in labels if label['city'] == primary_city)
             locations_by_date[date] = {
                 'primary': primary_city,
                 'all': all_cities,
                 'count': len(coords_list),
-                'manual': False
+                'manual': False,
+                'state': primary['state'],
+                'country': primary['country'],
+                'labels': labels
             }
         else:
             locations_by_date[date] = {
                 'primary': 'Unknown',
                 'all': [],
                 'count': len(coords_list),
-                'manual': False
+                'manual': False,
+                'state': '',
+                'country': '',
+                'labels': []
             }
         
         # Print result
         loc = locations_by_date[date]
+        if progress:
+            progress.update(i, f"{date} {loc['primary']}")
+            continue
         city_display = f"{Colors.GREEN}{loc['primary']}{Colors.NC}" if loc['primary'] != 'Unknown' else f"{Colors.RED}Unknown{Colors.NC}"
         print(f"   第 {i:2d} 天 ({date}): {city_display}")
         
@@ -301,19 +409,89 @@ def reverse_geocode_locations(photos_by_date, dates, day_overrides=None):
         
         print(f"          照片数: {loc['count']} 张")
     
+    if chain.regions is not None:
+        # Boundary polygons: every photo of the day votes, not just the samples
+        for date, loc in locations_by_date.items():
+            regions = [r for r in chain.regions.lookup_many(
+                [(c['lat'], c['lon']) for c in photos_by_date[date]]) if r[1]]
+            if regions:
+                loc['state'], loc['country'] = Counter(regions).most_common(1)[0][0]
+    
+    # Manually named days borrow state/country from a geocoded day in that city
+    geocoded = {label['city']: label for loc in locations_by_date.values() for label in loc['labels']}
+    for loc in locations_by_date.values():
+        if loc['manual'] and not loc['country'] and loc['primary'] in geocoded:
+            loc['state'] = geocoded[loc['primary']]['state']
+            loc['country'] = geocoded[loc['primary']]['country']
+    
+    chain.flush()
     return locations_by_date
 
 
-def validate_coverage(locations_by_date, dates):
-    """Validate that all days have location data."""
+def geocode_trip(photos_by_date, dates, day_overrides, output_dir, output_name,
+                 stamps=None, gps_filter=GpsFilter(), geocode_settings=GeocodeSettings(), **kwargs):
+    """Step 3 with the per-day samples cached in `<name>-locations.json`.
+
+    The file maps each date to its sampled place labels (coordinates with
+    city, state and country); write-location-metadata reads it with
+    --locations instead of geocoding the same places again. The samples are
+    keyed by the GPS data and the geocoding setup (server, gazetteer and
+    boundary files; see geocoder_chain.chain_signature); overrides are
+    applied on top, so changing a --dN reuses every geocoded day. Days that
+    came back Unknown are not cached and are retried on the next run.
+    """
+    if stamps is None:
+        return reverse_geocode_locations(photos_by_date, dates, day_overrides,
+                                         geocode_settings=geocode_settings, **kwargs)
+    
+    from scripts.geocoder_chain import chain_signature  # with boundaries: not needed for --help
+
+    artifact = f"{output_dir}/{output_name}-locations.json"
+    key = fingerprint('geocode-labels', file_sha256(f"{output_dir}/{output_name}-gps.json"), gps_filter,
+                      chain_signature(geocode_settings))
+    known = {}
+    if stamps.fresh(artifact, key):
+        with open(artifact, encoding='utf-8') as f:
+            known = json.load(f)
+    before = dict(known)
+    
+    locations_by_date = reverse_geocode_locations(photos_by_date, dates, day_overrides, known=known,
+                                                  geocode_settings=geocode_settings, **kwargs)
+    
+    if known != before or not stamps.fresh(artifact, key):
+        with open(artifact, 'w', encoding='utf-8') as f:
+            json.dump(known, f, indent=2, ensure_ascii=False, sort_keys=True)
+        stamps.record(artifact, key)
+    return locations_by_date
+
+
+def find_unknown_days(locations_by_date, dates):
+    """(day number, date) for every day whose city could not be determined."""
+    return [
+        (i, date) for i, date in enumerate(dates, 1)
+        if locations_by_date[date]['primary'] == 'Unknown' and not locations_by_date[date].get('manual')
+    ]
+
+
+def missing_day_numbers(missing_dates, start_date):
+    """Day numbers (1-based from `start_date`) of dates missing from the trip."""
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    return [
+        (datetime.strptime(d, '%Y-%m-%d') - start_dt).days + 1
+        for d in sorted(missing_dates)
+    ]
+
+
+def validate_coverage(locations_by_date, dates, batch=False, rerun=None):
+    """Validate that all days have location data.
+
+    `rerun` is the command suggested with the missing `--dN` arguments
+    (default: this script with the current folder and name).
+    """
     
     print_step(4, 5, "验证地点覆盖完整性")
     
-    missing_days = []
-    for i, date in enumerate(dates, 1):
-        loc = locations_by_date[date]
-        if loc['primary'] == 'Unknown' and not loc.get('manual'):
-            missing_days.append((i, date))
+    missing_days = find_unknown_days(locations_by_date, dates)
     
     if missing_days:
         print()
@@ -322,12 +500,20 @@ def validate_coverage(locations_by_date, dates):
             print(f"   第 {day_num} 天: {date}")
         
         print()
+        if batch:
+            print_warning("请在清单的 overrides 中指定缺失日期的城市，然后重新运行:")
+            overrides = ', '.join(f'"{day_num}": "CityName"' for day_num, _ in missing_days)
+            print(f'{Colors.BLUE}"overrides": {{{overrides}}}{Colors.NC}')
+            print()
+            return False
         print_warning("请手动指定缺失日期的城市，然后重新运行:")
         print()
         
         # Generate example command
         manual_args = ' '.join([f'--d{day_num} "CityName"' for day_num, _ in missing_days])
-        print(f'{Colors.BLUE}./scripts/smart-gps-extract.py "{sys.argv[1]}" "{sys.argv[2] if len(sys.argv) > 2 else "track"}" {manual_args}{Colors.NC}')
+        if rerun is None:
+            rerun = f'./scripts/smart-gps-extract.py "{sys.argv[1]}" "{sys.argv[2] if len(sys.argv) > 2 else "track"}"'
+        print(f'{Colors.BLUE}{rerun} {manual_args}{Colors.NC}')
         print()
         
         return False
@@ -344,20 +530,26 @@ def validate_coverage(locations_by_date, dates):
     return True
 
 
-def generate_gpx(photos_by_date, dates, locations_by_date, output_name):
-    """Generate GPX track file."""
+@TRACER.stage('gpx')
+def generate_gpx(photos_by_date, dates, locations_by_date, output_name, output_dir='gpx', stamps=None,
+                 gps_filter=GpsFilter()):
+    """Generate GPX track file, and the simplified route trip pages draw (data/routes/).
+
+    With `stamps`, an existing track built from the same GPS data, GPS filter
+    and route parameters is kept.
+    """
     
     print_step(5, 5, "生成 GPX 轨迹文件")
     
-    gpx = gpxpy.gpx.GPX()
-    gpx.creator = "Smart GPS Extractor - SongshGeo"
-    
-    track = gpxpy.gpx.GPXTrack()
-    track.name = f"Trip {dates[0]} to {dates[-1]}"
-    gpx.tracks.append(track)
-    
-    segment = gpxpy.gpx.GPXTrackSegment()
-    track.segments.append(segment)
+    output_gpx = f"{output_dir}/{output_name}.gpx"
+    output_route = route_path(output_dir, output_name)
+    key = None
+    if stamps is not None:
+        key = fingerprint('gpx', file_sha256(f"{output_dir}/{output_name}-gps.json"), gps_filter, ROUTE_PARAMS)
+        if stamps.fresh(output_gpx, key) and stamps.fresh(output_route, key):
+            print()
+            print_success(f"GPS 数据未变化，保留 {output_gpx}")
+            return output_gpx
     
     # Collect all points sorted by time
     all_points = []
@@ -366,31 +558,47 @@ def generate_gpx(photos_by_date, dates, locations_by_date, output_name):
     
     all_points.sort(key=lambda x: x['time'])
     
-    # Add track points
-    for point in all_points:
-        segment.points.append(gpxpy.gpx.GPXTrackPoint(
-            point['lat'],
-            point['lon'],
-            elevation=point.get('alt'),
-            time=point['time']
-        ))
-    
-    # Write GPX
-    output_gpx = f"gpx/{output_name}.gpx"
-    with open(output_gpx, 'w') as f:
-        f.write(gpx.to_xml())
+    # Write GPX, streamed point by point
+    with open(output_gpx, 'w', encoding='utf-8') as f:
+        count = write_track(
+            f,
+            ((p['lat'], p['lon'], p.get('alt'), p['time'].isoformat()) for p in all_points),
+            creator="Smart GPS Extractor - SongshGeo",
+            name=f"Trip {dates[0]} to {dates[-1]}",
+        )
+    with TRACER.timed('gpx.route'):
+        # all_points is in time order, so its days come one after another
+        days = groupby(all_points, key=lambda p: p['time'].strftime('%Y-%m-%d'))
+        route = build_route(
+            ((date, ((p['lat'], p['lon']) for p in day)) for date, day in days),
+            bbox=trip_bbox((p['lat'], p['lon']) for p in all_points))
+        write_route(output_route, route)
+    if key:
+        stamps.record(output_gpx, key)
+        stamps.record(output_route, key)
     
     print()
     print_success("GPX 轨迹生成完成！")
-    print(f"   轨迹点数: {Colors.BLUE}{len(segment.points)}{Colors.NC}")
+    print(f"   轨迹点数: {Colors.BLUE}{count}{Colors.NC}")
     print(f"   时间跨度: {Colors.BLUE}{len(dates)}{Colors.NC} 天")
+    print(f"   页面路线: {Colors.BLUE}{output_route}{Colors.NC} ({os.path.getsize(output_route) / 1024:.1f} KB)")
     
     return output_gpx
 
 
-def save_location_summary(locations_by_date, dates, output_name):
-    """Save location summary to JSON."""
+@TRACER.stage('summary')
+def save_location_summary(locations_by_date, dates, output_name, output_dir='gpx', stamps=None,
+                          photos_by_date=None):
+    """Save location summary to JSON (left untouched if its content is unchanged).
+
+    The summary is its own stamp key, so anything shown in it (places,
+    overrides, statistics) rewrites the file when it changes.
+
+    With `photos_by_date`, the trip's and each day's statistics (distance,
+    elevation, active hours, extent) are included; see trip_stats.
+    """
     
+    totals, per_day = trip_stats(photos_by_date, dates) if photos_by_date else ({}, {})
     summary = {
         'trip_name': output_name,
         'start_date': dates[0],
@@ -401,22 +609,379 @@ def save_location_summary(locations_by_date, dates, output_name):
                 'day': i,
                 'date': date,
                 'primary_city': locations_by_date[date]['primary'],
+                'state': locations_by_date[date].get('state', ''),
+                'country': locations_by_date[date].get('country', ''),
                 'all_cities': locations_by_date[date]['all'],
                 'photo_count': locations_by_date[date]['count'],
-                'manually_set': locations_by_date[date].get('manual', False)
+                'manually_set': locations_by_date[date].get('manual', False),
+                **({'stats': per_day[date]} if date in per_day else {}),
             }
             for i, date in enumerate(dates, 1)
         ],
-        'cities_visited': sorted(set(loc['primary'] for loc in locations_by_date.values()))
+        'cities_visited': sorted(set(loc['primary'] for loc in locations_by_date.values())),
+        'countries_visited': sorted(set(loc['country'] for loc in locations_by_date.values() if loc.get('country'))),
+        **({'stats': totals} if totals else {}),
     }
     
-    output_file = f"gpx/{output_name}-summary.json"
+    output_file = f"{output_dir}/{output_name}-summary.json"
+    key = fingerprint('summary', summary) if stamps is not None else None
+    if key and stamps.fresh(output_file, key):
+        return output_file
+    
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
+    if key:
+        stamps.record(output_file, key)
     
     return output_file
 
 
+class _ThreadLocalStdout:
+    """sys.stdout stand-in that diverts a worker thread's prints to its own buffer.
+
+    Batch trips and speculative stages run in background threads, so their
+    step-by-step output would otherwise interleave with the foreground;
+    threads that haven't called `capture()` write through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer=None):
+        self._local.buffer = io.StringIO() if buffer is None else buffer
+        return self._local.buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class _StageOutput:
+    """Output of a background stage: held back until `attach()`, live after it."""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if self._stream is None:
+                return self._buffer.write(text)
+        return self._stream.write(text)
+
+    def attach(self, stream):
+        with self._lock:
+            stream.write(self._buffer.getvalue())
+            stream.flush()
+            self._stream = stream
+
+
+class Speculative:
+    """Run a stage in a daemon thread while the user reads a prompt.
+
+    Its prints are held back until `result()`, which replays them, keeps
+    streaming whatever follows and returns the stage's value (or re-raises its
+    error). `cancel()` sets the shared event the stage polls; the thread is
+    abandoned and its output never shown.
+    """
+
+    def __init__(self, stdout, cancel, func, *args, **kwargs):
+        self._stdout = stdout
+        self.cancel_event = cancel
+        self._output = _StageOutput()
+        self._value = self._error = None
+        self._thread = threading.Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+        self._thread.start()
+
+    def _run(self, func, args, kwargs):
+        self._stdout.capture(self._output)
+        try:
+            self._value = func(*args, **kwargs)
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._stdout.release()
+
+    def wait(self):
+        """Block until the stage finishes, without showing its output."""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def result(self):
+        """Show the stage's output (live from now on) and return its value."""
+        self._output.attach(self._stdout.stream)
+        return self.wait()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+def load_manifest(path):
+    """Read a batch manifest into normalised trip entries.
+
+    Accepts a JSON list or `{"trips": [...]}` of objects with `folder` and
+    optional `name`, `start`, `end` and `overrides` (day number -> city).
+    Output names must be unique, since trips write their files concurrently.
+    """
+    with open(path, encoding='utf-8') as f:
+        raw = json.load(f)
+    entries = raw.get('trips', []) if isinstance(raw, dict) else raw
+    base = Path(path).resolve().parent
+
+    trips, seen = [], set()
+    for n, entry in enumerate(entries, 1):
+        if not entry.get('folder'):
+            raise ExtractionError(f"清单第 {n} 项缺少 folder")
+        folder = Path(entry['folder']).expanduser()
+        if not folder.is_absolute():
+            folder = base / folder
+        name = entry.get('name') or folder.name
+        if name in seen:
+            raise ExtractionError(f"清单中输出名称重复: {name}")
+        seen.add(name)
+        trips.append({
+            'folder': folder,
+            'name': name,
+            'start': entry.get('start'),
+            'end': entry.get('end'),
+            'overrides': {str(k): v for k, v in (entry.get('overrides') or {}).items()},
+        })
+    return trips
+
+
+def run_trip(trip, output_dir='gpx', throttle=NOMINATIM, cache=None, force=False, gps_filter=GpsFilter(),
+             geocode_settings=GeocodeSettings()):
+    """Run all five steps for one manifest entry without prompting.
+
+    Returns a result dict for the batch report; failures are recorded in it
+    rather than raised, so one bad trip never stops the others. Stages whose
+    inputs are unchanged since the last run are skipped unless `force`.
+    """
+    started = time.monotonic()
+    result = {
+        'name': trip['name'], 'folder': str(trip['folder']), 'status': 'ok',
+        'photos': 0, 'days': 0, 'cities': [], 'needs_overrides': [], 'error': None,
+    }
+    try:
+        if not Path(trip['folder']).exists():
+            print_error(f"文件夹不存在: {trip['folder']}")
+            raise ExtractionError(f"文件夹不存在: {trip['folder']}")
+
+        stamps = StageStamps(output_dir, trip['name'], enabled=not force)
+        data = extract_gps_data(trip['folder'], trip['name'], output_dir, stamps)
+        result['photos'] = len(data)
+
+        photos_by_date, dates, missing_dates = analyze_date_range(data, trip['start'], trip['end'], gps_filter)
+        result['days'] = len(dates)
+        if missing_dates:
+            start = trip['start'] or dates[0]
+            result['status'] = 'missing-dates'
+            result['needs_overrides'] = missing_day_numbers(missing_dates, start)
+            return result
+
+        locations_by_date = geocode_trip(
+            photos_by_date, dates, trip['overrides'], output_dir, trip['name'], stamps, gps_filter,
+            throttle=throttle, cache=cache, geocode_settings=geocode_settings
+        )
+        if not validate_coverage(locations_by_date, dates, batch=True):
+            result['status'] = 'unknown-days'
+            result['needs_overrides'] = [day for day, _ in find_unknown_days(locations_by_date, dates)]
+            return result
+
+        generate_gpx(photos_by_date, dates, locations_by_date, trip['name'], output_dir, stamps, gps_filter)
+        save_location_summary(locations_by_date, dates, trip['name'], output_dir, stamps, photos_by_date)
+        result['cities'] = sorted(set(loc['primary'] for loc in locations_by_date.values()))
+    except ExtractionError as e:
+        result.update(status='failed', error=str(e))
+    except Exception as e:
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        result['seconds'] = round(time.monotonic() - started, 1)
+    return result
+
+
+def run_batch(trips, output_dir='gpx', jobs=None, throttle=NOMINATIM, force=False, gps_filter=GpsFilter(),
+              geocode_settings=GeocodeSettings()):
+    """Process trips concurrently; returns one result dict per trip, in order.
+
+    Each trip's exiftool scan runs in its own process, so up to `jobs` scans
+    proceed in parallel while geocoding requests from every trip queue on
+    the shared `throttle` and reuse one coordinate cache.
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(trips) or 1))
+    cache = {}
+    print_lock = threading.Lock()
+    proxy = _ThreadLocalStdout(sys.stdout)
+
+    def worker(trip):
+        buffer = proxy.capture()
+        try:
+            with TRACER.label(trip['name']):
+                result = run_trip(trip, output_dir, throttle=throttle, cache=cache, force=force,
+                                  gps_filter=gps_filter, geocode_settings=geocode_settings)
+        finally:
+            proxy.release()
+        # Print each trip's log as one block, as soon as it finishes.
+        with print_lock:
+            print_header(f"📸 {trip['name']}")
+            print(buffer.getvalue(), end='')
+        return result
+
+    from concurrent.futures import ThreadPoolExecutor
+    
+    sys.stdout = proxy
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(worker, trips))
+    finally:
+        sys.stdout = proxy.stream
+
+
+def print_batch_report(results, output_dir='gpx'):
+    """Print the consolidated table of batch results."""
+    status_text = {
+        'ok': f"{Colors.GREEN}完成{Colors.NC}",
+        'missing-dates': f"{Colors.YELLOW}日期缺失{Colors.NC}",
+        'unknown-days': f"{Colors.YELLOW}地点未知{Colors.NC}",
+        'failed': f"{Colors.RED}失败{Colors.NC}",
+    }
+    print_header("📊 批量处理报告")
+    width = max([len(r['name']) for r in results] + [4])
+    for r in results:
+        line = f"   {r['name']:<{width}}  {status_text[r['status']]}  {r['photos']:5d} 张  {r['days']:3d} 天  {r['seconds']:6.1f}s"
+        if r['cities']:
+            line += f"  {', '.join(r['cities'])}"
+        print(line)
+        if r['needs_overrides']:
+            overrides = ', '.join(f'"{day}": "CityName"' for day in r['needs_overrides'])
+            print(f"      {Colors.BLUE}\"overrides\": {{{overrides}}}{Colors.NC}")
+        if r['error']:
+            print(f"      {Colors.RED}{r['error']}{Colors.NC}")
+
+    ok = sum(r['status'] == 'ok' for r in results)
+    print()
+    if ok == len(results):
+        print_success(f"全部 {ok} 个行程处理完成，输出目录: {output_dir}/")
+    else:
+        print_warning(f"{ok}/{len(results)} 个行程处理完成，其余请根据上方提示修正清单后重新运行")
+
+
+def add_day_arguments(parser):
+    """Dynamic day arguments (--d1, --d2, ...) for manual city overrides."""
+    for i in range(1, 32):  # Support up to 31 days
+        parser.add_argument(f'--d{i}', metavar='CITY', help=f'Manually specify city for day {i}')
+
+
+def collect_day_overrides(args):
+    """Day number (as a string) -> city for every --dN given."""
+    day_overrides = {}
+    for i in range(1, 32):
+        city = getattr(args, f'd{i}', None)
+        if city:
+            day_overrides[str(i)] = city
+    return day_overrides
+
+
+def print_missing_dates_hint(missing_dates, start, rerun):
+    """Tell the user which --dN arguments to add for dates without photos."""
+    print()
+    print_error("时间范围不完整！")
+    print()
+    print_warning("请补充缺失日期的城市信息，然后重新运行:")
+    print()
+    
+    # Calculate which day numbers these are
+    manual_args = [f'--d{day_num} "CityName"' for day_num in missing_day_numbers(missing_dates, start)]
+    print(f'{Colors.BLUE}{rerun} {" ".join(manual_args)}{Colors.NC}')
+    print()
+
+
+def expected_range_args(args):
+    """The -s/-e arguments of a command line, for rerun hints."""
+    expected_range = ''
+    if args.expected_start:
+        expected_range += f' -s {args.expected_start}'
+    if args.expected_end:
+        expected_range += f' -e {args.expected_end}'
+    return expected_range
+
+
+def geocode_main():
+    """Steps 2-4 on an existing `<output_dir>/<name>-gps.json`, without prompts.
+
+    Re-geocodes a trip (e.g. after adding --dN overrides) without rescanning
+    the photos, and rewrites its summary.
+    """
+    
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Geocode an extracted trip and write its location summary',
+        epilog='Example: python3 -m scripts geocode denmark-2025 --d3 Aarhus'
+    )
+    parser.add_argument('output_name', help='Trip name used at extraction')
+    parser.add_argument('-o', '--output-dir', default='gpx', metavar='DIR',
+                       help='Directory holding <name>-gps.json (default: gpx)')
+    parser.add_argument('-s', '--expected-start', metavar='DATE',
+                       help='Expected start date (YYYY-MM-DD)')
+    parser.add_argument('-e', '--expected-end', metavar='DATE',
+                       help='Expected end date (YYYY-MM-DD)')
+    parser.add_argument('--force', action='store_true',
+                       help='Geocode every day again, ignoring cached results')
+    add_day_arguments(parser)
+    add_gps_filter_arguments(parser)
+    add_geocoding_arguments(parser)
+    perf.add_arguments(parser)
+    
+    args = parser.parse_args()
+    ensure('geopy', 'numpy')
+    geocode_settings = configure_geocoding(args)
+    perf.start(args)
+    gps_filter = gps_filter_from_args(args)
+    
+    gps_json = Path(args.output_dir) / f"{args.output_name}-gps.json"
+    try:
+        with open(gps_json, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print_error(f"无法读取 {gps_json}: {e}")
+        sys.exit(1)
+    
+    rerun = f'python3 -m scripts geocode "{args.output_name}"' + expected_range_args(args)
+    try:
+        photos_by_date, dates, missing_dates = analyze_date_range(data, args.expected_start, args.expected_end,
+                                                                  gps_filter)
+        if missing_dates:
+            print_missing_dates_hint(missing_dates, args.expected_start or dates[0], rerun)
+            sys.exit(1)
+        stamps = StageStamps(args.output_dir, args.output_name, enabled=not args.force)
+        locations_by_date = geocode_trip(photos_by_date, dates, collect_day_overrides(args),
+                                         args.output_dir, args.output_name, stamps, gps_filter,
+                                         geocode_settings=geocode_settings)
+    except ExtractionError:
+        sys.exit(1)
+    if not validate_coverage(locations_by_date, dates, rerun=rerun):
+        sys.exit(1)
+    
+    summary_file = save_location_summary(locations_by_date, dates, args.output_name, args.output_dir, stamps,
+                                         photos_by_date)
+    print(f"   行程总结: {Colors.GREEN}{summary_file}{Colors.NC}")
+
+
 def main():
     """Main function."""
     
@@ -429,10 +994,11 @@ def main():
 Examples:
   python3 scripts/smart-gps-extract.py ~/Downloads/Denmark denmark-2025
   python3 scripts/smart-gps-extract.py ~/Downloads/Trip trip-2025 --d1 Copenhagen --d3 Aarhus
+  python3 scripts/smart-gps-extract.py --batch trips.json --jobs 8
         """
     )
     
-    parser.add_argument('photo_folder', help='Photo folder path')
+    parser.add_argument('photo_folder', nargs='?', help='Photo folder path')
     parser.add_argument('output_name', nargs='?', default='track', help='Output name (default: track)')
     
     # Expected date range
@@ -441,18 +1007,48 @@ Examples:
     parser.add_argument('-e', '--expected-end', metavar='DATE',
                        help='Expected end date (YYYY-MM-DD)')
     
-    # Dynamic day arguments (d1, d2, d3, etc.)
-    for i in range(1, 32):  # Support up to 31 days
-        parser.add_argument(f'--d{i}', metavar='CITY', help=f'Manually specify city for day {i}')
+    # Batch mode
+    parser.add_argument('--batch', metavar='MANIFEST',
+                       help='Process every trip in a JSON manifest, without prompts')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                       help='Trips processed concurrently in batch mode (default: CPU count)')
+    parser.add_argument('-o', '--output-dir', default='gpx', metavar='DIR',
+                       help='Output directory (default: gpx)')
+    parser.add_argument('--report', metavar='FILE',
+                       help='Also write the batch results as JSON')
+    parser.add_argument('--force', action='store_true',
+                       help='Rerun every step, ignoring artifacts from earlier runs')
+    
+    add_day_arguments(parser)
+    add_gps_filter_arguments(parser)
+    add_geocoding_arguments(parser)
+    perf.add_arguments(parser)
     
     args = parser.parse_args()
+    ensure('geopy', 'numpy')
+    geocode_settings = configure_geocoding(args)
+    perf.start(args)
     
-    # Collect day overrides
-    day_overrides = {}
-    for i in range(1, 32):
-        city = getattr(args, f'd{i}', None)
-        if city:
-            day_overrides[str(i)] = city
+    if args.batch:
+        try:
+            trips = load_manifest(args.batch)
+        except (OSError, ValueError, ExtractionError) as e:
+            print_error(f"无法读取清单 {args.batch}: {e}")
+            sys.exit(1)
+        print_header("📸 批量 GPS 提取")
+        print_info(f"📋 清单: {args.batch}（{len(trips)} 个行程）")
+        results = run_batch(trips, args.output_dir, args.jobs, force=args.force,
+                            gps_filter=gps_filter_from_args(args), geocode_settings=geocode_settings)
+        print_batch_report(results, args.output_dir)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+        sys.exit(0 if all(r['status'] == 'ok' for r in results) else 1)
+    
+    if not args.photo_folder:
+        parser.error('photo_folder is required unless --batch is given')
+    
+    day_overrides = collect_day_overrides(args)
     
     # Validate photo folder
     photo_folder = Path(args.photo_folder)
@@ -460,8 +1056,9 @@ Examples:
         print_error(f"文件夹不存在: {photo_folder}")
         sys.exit(1)
     
-    # Create gpx directory if not exists
-    Path('gpx').mkdir(exist_ok=True)
+    # Create output directory if not exists
+    output_dir = args.output_dir
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
     
     # Print header
     print_header("📸 智能 GPS 提取与验证")
@@ -473,81 +1070,99 @@ Examples:
         for day, city in sorted(day_overrides.items(), key=lambda x: int(x[0])):
             print_info(f"📍 手动指定第 {day} 天: {city}")
     
+    proxy = _ThreadLocalStdout(sys.stdout)
+    sys.stdout = proxy
+    try:
+        stamps = StageStamps(output_dir, args.output_name, enabled=not args.force)
+        run_interactive(args, photo_folder, output_dir, day_overrides, proxy, stamps, geocode_settings)
+    except ExtractionError:
+        sys.exit(1)
+    finally:
+        sys.stdout = proxy.stream
+
+
+def _geocode_after_analysis(analysis, day_overrides, cancel, output_dir, output_name, stamps,
+                            gps_filter=GpsFilter(), geocode_settings=GeocodeSettings()):
+    """Step 3, started as soon as step 2's result exists (None if it can't run)."""
+    try:
+        photos_by_date, dates, missing_dates = analysis.wait()
+    except ExtractionError:
+        return None
+    if missing_dates or cancel.is_set():
+        return None
+    return geocode_trip(photos_by_date, dates, day_overrides, output_dir, output_name, stamps, gps_filter,
+                        cancel=cancel, geocode_settings=geocode_settings)
+
+
+def run_interactive(args, photo_folder, output_dir, day_overrides, stdout, stamps=None,
+                    geocode_settings=GeocodeSettings()):
+    """The prompt-driven single-trip flow.
+
+    Steps 2 and 3 start in the background as soon as their inputs exist, so
+    date analysis and geocoding progress while each prompt is on screen;
+    answering "n" cancels them. With `stamps`, unchanged steps are skipped.
+    """
+    
     # Step 1: Extract GPS data
-    data = extract_gps_data(photo_folder, args.output_name)
+    data = extract_gps_data(photo_folder, args.output_name, output_dir, stamps)
+    
+    gps_filter = gps_filter_from_args(args)
+    cancel = threading.Event()
+    analysis = Speculative(stdout, cancel, analyze_date_range, data, args.expected_start, args.expected_end,
+                           gps_filter)
+    geocoding = Speculative(stdout, cancel, _geocode_after_analysis, analysis, day_overrides, cancel,
+                            output_dir, args.output_name, stamps, gps_filter, geocode_settings)
     
     if not ask_continue("继续分析行程？"):
+        geocoding.cancel()
         print_warning("已取消")
         return
     
     # Step 2: Analyze date range
-    result = analyze_date_range(data, args.expected_start, args.expected_end)
-    photos_by_date, dates, missing_dates = result if len(result) == 3 else (*result, [])
+    photos_by_date, dates, missing_dates = analysis.result()
     
     # Handle missing dates from expected range
     if missing_dates:
-        print()
-        print_error("时间范围不完整！")
-        print()
-        print_warning("请补充缺失日期的城市信息，然后重新运行:")
-        print()
-        
-        # Calculate which day numbers these are
-        if args.expected_start:
-            start_dt = datetime.strptime(args.expected_start, '%Y-%m-%d')
-        else:
-            start_dt = datetime.strptime(dates[0], '%Y-%m-%d')
-        
-        manual_args = []
-        for missing_date in sorted(missing_dates):
-            missing_dt = datetime.strptime(missing_date, '%Y-%m-%d')
-            day_num = (missing_dt - start_dt).days + 1
-            manual_args.append(f'--d{day_num} "CityName"')
-        
-        cmd_args = ' '.join(manual_args)
-        expected_range = ''
-        if args.expected_start:
-            expected_range += f' -s {args.expected_start}'
-        if args.expected_end:
-            expected_range += f' -e {args.expected_end}'
-        
-        print(f'{Colors.BLUE}python3 scripts/smart-gps-extract.py "{args.photo_folder}" "{args.output_name}"{expected_range} {cmd_args}{Colors.NC}')
-        print()
-        sys.exit(1)
+        rerun = f'python3 scripts/smart-gps-extract.py "{args.photo_folder}" "{args.output_name}"'
+        print_missing_dates_hint(missing_dates, args.expected_start or dates[0],
+                                 rerun + expected_range_args(args))
+        raise ExtractionError("时间范围不完整")
     
     if not ask_continue("继续查询地点信息？"):
+        geocoding.cancel()
         print_warning("已取消")
         return
     
     # Step 3: Reverse geocode
-    locations_by_date = reverse_geocode_locations(photos_by_date, dates, day_overrides)
+    locations_by_date = geocoding.result()
     
     # Step 4: Validate coverage
     if not validate_coverage(locations_by_date, dates):
-        sys.exit(1)
+        raise ExtractionError("地点覆盖不完整")
     
     if not ask_continue("地点验证通过，继续生成 GPX？"):
         print_warning("已取消")
         return
     
     # Step 5: Generate GPX
-    output_gpx = generate_gpx(photos_by_date, dates, locations_by_date, args.output_name)
+    output_gpx = generate_gpx(photos_by_date, dates, locations_by_date, args.output_name, output_dir, stamps,
+                              gps_filter)
     
     # Save summary
-    summary_file = save_location_summary(locations_by_date, dates, args.output_name)
+    summary_file = save_location_summary(locations_by_date, dates, args.output_name, output_dir, stamps, photos_by_date)
     
     # Final summary
     print_header("✅ 处理完成！")
     
     print(f"{Colors.BLUE}📁 生成的文件:{Colors.NC}")
-    print(f"   GPX 轨迹: {Colors.GREEN}gpx/{args.output_name}.gpx{Colors.NC}")
-    print(f"   GPS 数据: gpx/{args.output_name}-gps.json")
-    print(f"   行程总结: gpx/{args.output_name}-summary.json")
+    print(f"   GPX 轨迹: {Colors.GREEN}{output_gpx}{Colors.NC}")
+    print(f"   GPS 数据: {output_dir}/{args.output_name}-gps.json")
+    print(f"   行程总结: {summary_file}")
     
     print(f"\n{Colors.BLUE}📖 下一步:{Colors.NC}")
     print("   1. 在 Lightroom 中加载 GPX 文件")
     print("   2. File > Plug-in Extras > Geoencoding Support > Load Track Log")
-    print(f"   3. 选择: {Colors.GREEN}gpx/{args.output_name}.gpx{Colors.NC}")
+    print(f"   3. 选择: {Colors.GREEN}{output_gpx}{Colors.NC}")
     print()
 
 
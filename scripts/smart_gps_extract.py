@@ -3,6 +3,10 @@ Importable wrapper for smart-gps-extract.py
 
 This module provides importable functions from the main script
 for testing purposes.
+
+The script (its filename has dashes) is only loaded on the first attribute
+access (PEP 562), so importing this module costs nothing until a name from
+it is actually used.
 """
 
 import sys
@@ -13,33 +17,39 @@ from pathlib import Path
 import importlib.util
 
 script_path = Path(__file__).parent / 'smart-gps-extract.py'
-spec = importlib.util.spec_from_file_location("smart_gps_extract_main", script_path)
-if spec and spec.loader:
-    smart_gps_extract_main = importlib.util.module_from_spec(spec)
-    sys.modules["smart_gps_extract_main"] = smart_gps_extract_main
-    spec.loader.exec_module(smart_gps_extract_main)
-    
-    # Re-export all functions and classes
-    Colors = smart_gps_extract_main.Colors
-    print_info = smart_gps_extract_main.print_info
-    print_success = smart_gps_extract_main.print_success
-    print_warning = smart_gps_extract_main.print_warning
-    print_error = smart_gps_extract_main.print_error
-    print_header = smart_gps_extract_main.print_header
-    ask_continue = smart_gps_extract_main.ask_continue
-    
-    # Export main functions if they exist
-    try:
-        extract_gps_data = smart_gps_extract_main.extract_gps_data
-        analyze_date_range = smart_gps_extract_main.analyze_date_range
-        reverse_geocode_locations = smart_gps_extract_main.reverse_geocode_locations
-        validate_coverage = smart_gps_extract_main.validate_coverage
-        generate_gpx = smart_gps_extract_main.generate_gpx
-        save_location_summary = smart_gps_extract_main.save_location_summary
-    except AttributeError:
-        # Functions might not be defined as top-level
-        pass
-
-else:
-    raise ImportError("Could not load smart-gps-extract.py")
 
+# Names re-exported from the script
+__all__ = [
+    'Colors', 'print_info', 'print_success', 'print_warning', 'print_error',
+    'print_header', 'ask_continue',
+    'extract_gps_data', 'analyze_date_range', 'reverse_geocode_locations',
+    'validate_coverage', 'generate_gpx', 'save_location_summary',
+    'ExtractionError', 'load_manifest', 'run_trip', 'run_batch', 'print_batch_report',
+    'Speculative', 'StageCancelled', 'run_interactive', 'geocode_main', 'main',
+    'geocode_trip',
+]
+
+
+def load():
+    """Load (once) and return the script module."""
+    module = sys.modules.get("smart_gps_extract_main")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("smart_gps_extract_main", script_path)
+        if not (spec and spec.loader):
+            raise ImportError("Could not load smart-gps-extract.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["smart_gps_extract_main"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["smart_gps_extract_main"]
+            raise
+    return module
+
+
+def __getattr__(name):
+    if name == 'smart_gps_extract_main':
+        return load()
+    if name in __all__:
+        return getattr(load(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,107 @@
+"""
+Fingerprints for the GPS pipeline's intermediate artifacts.
+
+Each stage (extract -> geocode -> GPX -> summary) hashes its inputs and
+parameters into a key and records it, together with the SHA-256 of the file it
+wrote, in `<output_dir>/<name>.stamps.json`. On the next run a stage whose key
+matches, and whose artifact is still byte-for-byte what it wrote, is skipped
+and the artifact reused. Downstream keys include the upstream artifact's
+digest, so a change anywhere invalidates exactly the stages after it.
+
+What each key of smart-gps-extract covers:
+
+    extract   <name>-gps.json         exiftool arguments; folder_signature of the photos
+    geocode   <name>-locations.json   SHA-256 of <name>-gps.json; GPS filter;
+                                      geocoder_chain.chain_signature (server,
+                                      gazetteer and boundary files)
+    gpx       <name>.gpx, route       SHA-256 of <name>-gps.json; GPS filter;
+                                      route_codec.ROUTE_PARAMS
+    summary   <name>-summary.json     the summary itself (places, overrides, stats)
+
+Day overrides (--dN) only enter the summary: they are applied on top of
+the cached labels. A key lists inputs, not code; after changing how a
+stage computes its output, run with --force.
+"""
+
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+from scripts.perf import TRACER
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".heic")
+
+
+def fingerprint(stage: str, *parts) -> str:
+    """Stable key for a stage run: SHA-256 of its name and JSON-able inputs."""
+    payload = json.dumps([stage, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """SHA-256 of a file's bytes, or None if it doesn't exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def folder_signature(folder: str, extensions: Iterable[str] = PHOTO_EXTENSIONS) -> list:
+    """Sorted (relative path, size, mtime_ns) of every photo under `folder`.
+
+    Stat data stands in for the photos' contents: hashing a whole trip's
+    originals would cost more than the exiftool scan it is meant to skip.
+    """
+    extensions = tuple(e.lower() for e in extensions)
+    entries = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in files:
+            if name.lower().endswith(extensions):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                entries.append([os.path.relpath(path, folder), st.st_size, st.st_mtime_ns])
+    entries.sort()
+    return entries
+
+
+class StageStamps:
+    """The recorded fingerprints of one trip's artifacts.
+
+    With `enabled=False` nothing counts as fresh (a forced rebuild), but new
+    stamps are still recorded for the next run.
+    """
+
+    def __init__(self, output_dir: str, name: str, enabled: bool = True):
+        self.path = os.path.join(output_dir, f"{name}.stamps.json")
+        self.enabled = enabled
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                self.stamps = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            self.stamps = {}
+
+    def fresh(self, artifact: str, key: str) -> bool:
+        """True if `artifact` was produced from `key` and hasn't changed since."""
+        stamp = self.stamps.get(os.path.basename(artifact))
+        fresh = (
+            self.enabled
+            and stamp is not None
+            and stamp.get("key") == key
+            and stamp.get("sha256") == file_sha256(artifact)
+        )
+        TRACER.count("stage_cache.hit" if fresh else "stage_cache.miss")
+        return fresh
+
+    def record(self, artifact: str, key: str) -> None:
+        """Stamp `artifact` as the output for `key` and save the stamps file."""
+        self.stamps[os.path.basename(artifact)] = {"key": key, "sha256": file_sha256(artifact)}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.stamps, fh, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
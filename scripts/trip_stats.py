@@ -0,0 +1,116 @@
+"""
+Trip statistics for the location summary: distance, elevation, time, extent.
+
+The photos are copied once into three float arrays in time order (24
+bytes per photo), and everything else is whole-array NumPy: haversine
+distances between consecutive photos, altitude differences, and per-day
+sums by `np.add.reduceat` over the day boundaries. Apart from sorting a
+day's photos, nothing is done per photo in Python, so a whole library's
+track costs a few linear passes.
+
+Distances follow the photos, so they are a lower bound on the distance
+travelled: a day's distance joins that day's photos, and the trip total
+also counts the hops between the last photo of one day and the first of
+the next. Elevation uses only photos with `GPSAltitude`. Coordinate pairs
+(bbox, centroid) are in GeoJSON's lon, lat order.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+EARTH_RADIUS_KM = 6371.0088  # mean radius
+
+
+def _arrays(photos_by_date: Dict[str, list], dates: List[str]):
+    """Time-ordered lat, lon, alt (NaN where missing), day start offsets and active seconds per day."""
+    import numpy as np
+
+    n = sum(len(photos_by_date[date]) for date in dates)
+    lat, lon = np.empty(n), np.empty(n)
+    alt = np.full(n, np.nan)
+    starts, span, i = [], [], 0
+    for date in dates:
+        day = sorted(photos_by_date[date], key=lambda p: p['time'])
+        starts.append(i)
+        span.append((day[-1]['time'] - day[0]['time']).total_seconds() if day else 0.0)
+        j = i + len(day)
+        lat[i:j] = np.fromiter((p['lat'] for p in day), float, len(day))
+        lon[i:j] = np.fromiter((p['lon'] for p in day), float, len(day))
+        alt[i:j] = np.fromiter((math.nan if p.get('alt') is None else p['alt'] for p in day), float, len(day))
+        i = j
+    return lat, lon, alt, np.array(starts, dtype=np.intp), np.array(span)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between points of equal-length arrays, in km."""
+    import numpy as np
+
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_km(lat, lon):
+    """Great-circle distance between consecutive points, in km (one less than the points)."""
+    return distance_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+
+def _per_day(values, starts, n):
+    """Sum of per-step `values` (length n - 1) within each day, excluding the hops between days."""
+    import numpy as np
+
+    values = np.append(values, 0.0)
+    values[starts[1:] - 1] = 0.0  # the step from a day's last photo into the next day
+    return np.add.reduceat(values, starts)
+
+
+def _climbs(alt, starts, n):
+    """Per-day elevation gain and loss, comparing each altitude with the previous known one that day."""
+    import numpy as np
+
+    known = ~np.isnan(alt)
+    day = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    # Drop the photos without altitude, then difference the rest within each day
+    a, d = alt[known], day[known]
+    step = np.diff(a)
+    step[d[1:] != d[:-1]] = 0.0
+    gain = np.bincount(d[1:], weights=np.maximum(step, 0.0), minlength=len(starts))
+    loss = np.bincount(d[1:], weights=np.maximum(-step, 0.0), minlength=len(starts))
+    return gain, loss, np.bincount(d, minlength=len(starts))
+
+
+def trip_stats(photos_by_date: Dict[str, list], dates: List[str]) -> Tuple[dict, Dict[str, dict]]:
+    """(trip totals, {date: that day's stats}) for photos with 'lat', 'lon', 'time' and optional 'alt'."""
+    import numpy as np
+
+    lat, lon, alt, starts, span = _arrays(photos_by_date, dates)
+    n = len(lat)
+    if not n:
+        return {}, {}
+    steps = haversine_km(lat, lon)
+    distance = _per_day(steps, starts, n)
+    gain, loss, with_alt = _climbs(alt, starts, n)
+
+    per_day = {}
+    for k, date in enumerate(dates):
+        per_day[date] = {
+            'distance_km': round(float(distance[k]), 2),
+            'active_hours': round(float(span[k]) / 3600, 2),
+        }
+        if with_alt[k] > 1:
+            per_day[date].update(elevation_gain_m=round(float(gain[k])), elevation_loss_m=round(float(loss[k])))
+
+    # Mean of the unit vectors' longitudes, so a trip across 180° centres near it, not at 0°
+    rad = np.radians(lon)
+    totals = {
+        'distance_km': round(float(steps.sum()), 2),
+        'active_hours': round(float(span.sum()) / 3600, 2),
+        'bbox': [round(float(v), 5) for v in (lon.min(), lat.min(), lon.max(), lat.max())],
+        'centroid': [round(math.degrees(math.atan2(np.sin(rad).mean(), np.cos(rad).mean())), 5),
+                     round(float(lat.mean()), 5)],
+    }
+    if with_alt.sum() > 1:
+        totals.update(elevation_gain_m=round(float(gain.sum())), elevation_loss_m=round(float(loss.sum())),
+                      max_altitude_m=round(float(np.nanmax(alt))))
+    return totals, per_day
@@ -6,30 +6,59 @@ Uses Nominatim (OpenStreetMap) API for free reverse geocoding,
 then writes City/Country/State to IPTC metadata using exiftool.
 
 Usage:
-    python3 write-location-metadata.py photos_directory [--dry-run]
+    python3 write-location-metadata.py photos_directory [--dry-run] [-j 4]
+        [--locations gpx/<name>-locations.json]
+
+The three steps run concurrently as an asyncio pipeline joined by bounded
+queues:
+
+    exiftool scan ──▶ geocode (cache → gazetteer → API) ──▶ N exiftool writers
+
+Photos are geocoded while the scan is still running and written while the
+next lookup waits for its rate-limit slot, so a run takes about as long as
+its slowest step alone. When a queue is full the step before it pauses
+(down to exiftool blocking on its pipe), so memory stays flat. Writers
+batch photos with the same location into one exiftool call.
+
+With --locations, the places smart-gps-extract already geocoded for the
+trip answer for photos within a few km of its samples, so the trip is not
+looked up twice.
 """
 
+import codecs
+import os
+import re
 import sys
-import json
-import time
-import subprocess
 from pathlib import Path
 
-try:
-    from geopy.geocoders import Nominatim
-    from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-except ImportError:
-    print("❌ 未安装 geopy")
-    print("请运行: pip3 install --user --break-system-packages geopy")
-    sys.exit(1)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import perf  # noqa: E402
+from scripts.deps import ensure  # noqa: E402
+from scripts.exif_json import CHUNK_SIZE, RecordDecoder  # noqa: E402
+from scripts import geocoding  # noqa: E402
+from scripts.geocoding import NOMINATIM, GeocodeSettings, make_nominatim  # noqa: E402
+from scripts.perf import TRACER  # noqa: E402
 
+QUEUE_SIZE = 256  # photos buffered between two steps
+WRITERS = 4  # concurrent exiftool writer processes
+WRITE_BATCH = 50  # photos per exiftool write call (same location only)
 
-def extract_gps_from_photos(directory):
-    """Extract GPS data from photos."""
-    
-    print(f"📸 扫描照片: {directory}\n")
-    
-    cmd = [
+
+class PipelineStats:
+    """Counters shared by the pipeline steps (all on the event loop thread)."""
+
+    def __init__(self):
+        self.found = 0
+        self.success = 0
+        self.failed = 0
+
+    @property
+    def done(self):
+        return self.success + self.failed
+
+
+def scan_command(directory):
+    return [
         'exiftool',
         '-json', '-n', '-r',
         '-ext', 'jpg', '-ext', 'jpeg', '-ext', 'JPG',
@@ -37,132 +66,235 @@ def extract_gps_from_photos(directory):
         '-GPSLatitude', '-GPSLongitude',
         directory
     ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    data = json.loads(result.stdout)
-    
-    photos_with_gps = [
-        p for p in data 
-        if 'GPSLatitude' in p and 'GPSLongitude' in p
-    ]
-    
-    print(f"   找到 {len(photos_with_gps)} 张有 GPS 的照片\n")
-    
-    return photos_with_gps
 
 
-def reverse_geocode(lat, lon, geolocator):
-    """Query city/country from coordinates."""
-    
+async def stream_photos(directory, outbox, stats):
+    """Producer: stream exiftool's records with GPS into `outbox`, then None."""
+    import asyncio
+
+    print(f"📸 扫描照片: {directory}\n")
+
+    with TRACER.timed("subprocess.exiftool"):
+        proc = await asyncio.create_subprocess_exec(
+            *scan_command(directory),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        decoder = RecordDecoder()
+        text = codecs.getincrementaldecoder('utf-8')()
+        eof = False
+        try:
+            while not eof:
+                chunk = await proc.stdout.read(CHUNK_SIZE)
+                eof = not chunk
+                for p in decoder.feed(text.decode(chunk, final=eof)):
+                    if 'GPSLatitude' in p and 'GPSLongitude' in p:
+                        stats.found += 1
+                        await outbox.put(p)  # blocks while geocoding is behind
+        finally:
+            if not eof and proc.returncode is None:
+                proc.kill()  # cancelled or failed mid-scan
+            await proc.wait()
+    await outbox.put(None)
+
+
+def reverse_geocode(lat, lon, chain):
+    """(city, state, country) from the first provider in `chain` that knows, and its name."""
+
+    place, provider = chain.lookup(lat, lon)
+    if place is None:
+        return (None, None, None), None
+    return tuple(place), provider
+
+
+async def geocode_photos(inbox, outbox, geolocator, stats, writers, throttle=NOMINATIM, say=print,
+                         labels=None, settings=GeocodeSettings()):
+    """Geocode each photo (cached by rounded coordinates) and queue it for writing.
+
+    Lookups go through the provider chain (places cache, the trip's
+    `labels` file if given, gazetteer, then Nominatim; see geocoder_chain). `throttle.concurrency` workers look
+    photos up at once, each lookup in a worker thread; photos near one
+    already being looked up wait for that answer instead of asking again.
+    Ends by sending one None per writer.
+    """
+    import asyncio
+
+    from scripts.geocoder_chain import Place, make_chain
+
+    chain = make_chain(geolocator, throttle, labels=labels, settings=settings)
+    cache = {}  # rounded (lat, lon) -> future of ((city, state, country), provider)
+    progress = perf.Progress(None, "   进度") if TRACER.quiet else None
+    n = 0
+
+    async def lookup(lat, lon):
+        # Only the remote provider waits for a token, inside the thread
+        return await asyncio.to_thread(reverse_geocode, lat, lon, chain)
+
+    async def worker():
+        nonlocal n
+        while (photo := await inbox.get()) is not None:
+            n += 1
+            i = n
+            if progress:
+                progress.update(stats.done, f"成功 {stats.success} 失败 {stats.failed}")
+            filename = photo['FileName']
+            lat = photo['GPSLatitude']
+            lon = photo['GPSLongitude']
+
+            # Round to 2 decimals for cache
+            cache_key = (round(lat, 2), round(lon, 2))
+
+            if cache_key in cache:
+                TRACER.count("geocode.cache_hit")
+                (city, state, country), provider = await cache[cache_key]
+                cached = city is not None
+                if cached and chain.regions is not None:
+                    # Same ~1 km cell, but maybe across a border from the photo that asked
+                    city, state, country = chain.refine(lat, lon, Place(city, state, country))
+            else:
+                TRACER.count("geocode.cache_miss")
+                cache[cache_key] = asyncio.ensure_future(lookup(lat, lon))
+                (city, state, country), provider = await cache[cache_key]
+                cached = provider == "cache"
+                if not city:
+                    del cache[cache_key]  # ask again for the next photo here
+
+            if not city:
+                stats.failed += 1
+                say(f"   [{i}] {filename}  ❌ 查询失败")
+                continue
+            if cached:
+                say(f"   [{i}] {filename}  📍 {city}, {country} (缓存)")
+            elif provider == "labels":
+                say(f"   [{i}] {filename}  📍 {city}, {country} (行程地点)")
+            else:
+                where = f"{city}, {state}, {country}" if state else f"{city}, {country}"
+                say(f"   [{i}] {filename}  📍 {where}")
+
+            if city and country:
+                await outbox.put((photo['SourceFile'], (city, state, country)))  # blocks while writers are busy
+        await inbox.put(None)  # pass the end marker on to the next worker
+
     try:
-        location = geolocator.reverse(f"{lat}, {lon}", language='en')
-        
-        if location and location.raw.get('address'):
-            addr = location.raw['address']
-            
-            city = (addr.get('city') or 
-                   addr.get('town') or 
-                   addr.get('village') or 
-                   addr.get('municipality') or
-                   addr.get('county') or
-                   'Unknown')
-            
-            state = (addr.get('state') or 
-                    addr.get('region') or '')
-            
-            country = addr.get('country', 'Unknown')
-            
-            return city, state, country
-        
-    except (GeocoderTimedOut, GeocoderServiceError):
-        pass
-    
-    return None, None, None
-
-
-def write_metadata_to_photo(photo_path, city, state, country, dry_run=False):
-    """Write location metadata to photo using exiftool."""
-    
-    cmd = ['exiftool', '-overwrite_original']
-    
+        await asyncio.gather(*(worker() for _ in range(throttle.concurrency)))
+    finally:
+        chain.flush()
+    for _ in range(writers):
+        await outbox.put(None)
+    if progress:
+        progress.update(stats.done, f"成功 {stats.success} 失败 {stats.failed}", force=True)
+
+
+def location_tags(city, state, country):
+    """exiftool assignments for a location."""
+
+    tags = []
     if city and city != 'Unknown':
-        cmd.extend(['-IPTC:City=' + city])
+        tags.append('-IPTC:City=' + city)
     if state:
-        cmd.extend(['-IPTC:Province-State=' + state])
+        tags.append('-IPTC:Province-State=' + state)
     if country and country != 'Unknown':
-        cmd.extend(['-IPTC:Country-PrimaryLocationName=' + country])
-    
-    cmd.append(photo_path)
-    
+        tags.append('-IPTC:Country-PrimaryLocationName=' + country)
+    return tags
+
+
+async def write_metadata(paths, location, dry_run=False, say=print):
+    """Write one location to `paths` with a single exiftool call; returns how many succeeded."""
+    import asyncio
+
+    cmd = ['exiftool', '-overwrite_original', *location_tags(*location), *paths]
+
     if dry_run:
-        print(f"      [DRY RUN] {' '.join(cmd)}")
-        return True
-    else:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.returncode == 0
+        say(f"      [DRY RUN] {' '.join(cmd)}")
+        return len(paths)
+
+    with TRACER.timed("subprocess.exiftool"):
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        out, _ = await proc.communicate()
+    if proc.returncode == 0:
+        return len(paths)
+    # Exit status 1 if any file failed; the others are reported as
+    # "    2 image files updated" and "    1 image files unchanged"
+    done = re.findall(rb'(\d+) image files? (?:updated|unchanged)', out)
+    return sum(int(n) for n in done)
+
+
+async def write_photos(inbox, stats, dry_run=False, batch_size=WRITE_BATCH, say=print):
+    """Writer: take whatever is queued (up to `batch_size`), one exiftool call per location."""
+
+    finished = False
+    while not finished:
+        batch = [await inbox.get()]
+        while batch[-1] is not None and len(batch) < batch_size and not inbox.empty():
+            batch.append(inbox.get_nowait())
+        if batch[-1] is None:  # stop at our end marker; the others are for the other writers
+            finished = True
+            batch.pop()
+
+        by_location = {}
+        for path, location in batch:
+            by_location.setdefault(location, []).append(path)
+        for location, paths in by_location.items():
+            written = await write_metadata(paths, location, dry_run, say)
+            stats.success += written
+            stats.failed += len(paths) - written
+            if not dry_run:
+                say(f"      ✅ 已写入元数据: {len(paths)} 张 ({location[0]})"
+                    + (f", {len(paths) - written} 张失败" if written < len(paths) else ""))
 
 
-def process_photos(photos, dry_run=False):
-    """Process all photos with reverse geocoding and metadata writing."""
-    
+async def run_pipeline(directory, dry_run=False, writers=WRITERS, geolocator=None,
+                       throttle=NOMINATIM, queue_size=QUEUE_SIZE, batch_size=WRITE_BATCH, labels=None,
+                       settings=GeocodeSettings()):
+    """Scan, geocode and write concurrently; returns the PipelineStats.
+
+    `labels` is a `<name>-locations.json` from smart-gps-extract to reuse;
+    `settings` (geocoding.configure) names the server, cache and offline files.
+    """
+    import asyncio  # not at the top: ~60 ms that `--help` shouldn't pay
+
+    if geolocator is None:
+        geolocator = make_nominatim("photography-site-songshgeo", settings.url)
+
+    # --quiet: one progress line per second instead of a line per photo
+    say = (lambda *a, **k: None) if TRACER.quiet else print
+    stats = PipelineStats()
+    found = asyncio.Queue(maxsize=queue_size)
+    located = asyncio.Queue(maxsize=queue_size)
+
+    steps = [
+        stream_photos(directory, found, stats),
+        geocode_photos(found, located, geolocator, stats, writers, throttle, say, labels, settings),
+        *(write_photos(located, stats, dry_run, batch_size, say) for _ in range(writers)),
+    ]
+    tasks = [asyncio.ensure_future(step) for step in steps]
+    try:
+        with TRACER.stage("pipeline"):
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()  # after a failure, don't leave the other steps blocked on a queue
+    return stats
+
+
+def print_header(dry_run):
     print(f"🌍 反向地理编码并写入元数据...")
     print(f"   使用 OpenStreetMap Nominatim API")
-    print(f"   API 限制: 每秒1次请求")
-    
+    print(f"   API 限制: 每秒 {NOMINATIM.rate:.3g} 次请求，最多 {NOMINATIM.concurrency} 个并发")
+
     if dry_run:
         print(f"   ⚠️  DRY RUN 模式 - 不会实际修改照片\n")
     else:
         print(f"   ✍️  将直接修改照片 IPTC 元数据\n")
-    
-    geolocator = Nominatim(user_agent="photography-site-songshgeo")
-    cache = {}
-    success = 0
-    failed = 0
-    
-    for i, photo in enumerate(photos, 1):
-        filename = photo['FileName']
-        filepath = photo['SourceFile']
-        lat = photo['GPSLatitude']
-        lon = photo['GPSLongitude']
-        
-        # Round to 2 decimals for cache
-        cache_key = (round(lat, 2), round(lon, 2))
-        
-        if cache_key in cache:
-            city, state, country = cache[cache_key]
-            print(f"   [{i}/{len(photos)}] {filename}")
-            print(f"      📍 {city}, {country} (缓存)")
-        else:
-            city, state, country = reverse_geocode(lat, lon, geolocator)
-            
-            if city:
-                cache[cache_key] = (city, state, country)
-                print(f"   [{i}/{len(photos)}] {filename}")
-                print(f"      📍 {city}, {state}, {country}" if state else f"      📍 {city}, {country}")
-            else:
-                failed += 1
-                print(f"   [{i}/{len(photos)}] {filename}")
-                print(f"      ❌ 查询失败")
-                time.sleep(2)
-                continue
-            
-            # Respect API rate limit
-            time.sleep(1.1)
-        
-        # Write metadata
-        if city and country:
-            if write_metadata_to_photo(filepath, city, state, country, dry_run):
-                success += 1
-                if not dry_run:
-                    print(f"      ✅ 已写入元数据")
-            else:
-                failed += 1
-                print(f"      ❌ 写入失败")
-    
+
+
+def print_summary(stats, dry_run):
     print(f"\n✅ 完成！")
-    print(f"   成功: {success}")
-    print(f"   失败: {failed}")
-    
+    print(f"   有 GPS 的照片: {stats.found}")
+    print(f"   成功: {stats.success}")
+    print(f"   失败: {stats.failed}")
+
     if not dry_run:
         print(f"\n📖 在 Lightroom 中:")
         print(f"   1. 右键照片文件夹 > 同步文件夹")
@@ -172,27 +304,48 @@ def process_photos(photos, dry_run=False):
         print(f"\n💡 确认无误后，去掉 --dry-run 参数执行")
 
 
-if __name__ == '__main__':
+def main():
+    """Command-line entry point."""
+
     import argparse
-    
+
     parser = argparse.ArgumentParser(
         description='Reverse geocode and write location metadata to photos'
     )
     parser.add_argument('directory', help='Directory containing photos')
     parser.add_argument('--dry-run', action='store_true',
                        help='Preview without modifying photos')
-    
+    parser.add_argument('-j', '--jobs', type=int, default=WRITERS,
+                       help=f'Concurrent exiftool writers (default: {WRITERS})')
+    parser.add_argument('--locations', metavar='FILE',
+                       help='Places already geocoded by smart-gps-extract (gpx/<name>-locations.json)')
+    geocoding.add_arguments(parser)
+    perf.add_arguments(parser)
+
     args = parser.parse_args()
-    
+    ensure('geopy')
+    settings = geocoding.configure(args)
+    perf.start(args)
+
     if not Path(args.directory).exists():
         print(f"❌ 目录不存在: {args.directory}")
         sys.exit(1)
-    
-    photos = extract_gps_from_photos(args.directory)
-    
-    if not photos:
+    if args.locations and not Path(args.locations).exists():
+        print(f"❌ 地点文件不存在: {args.locations}")
+        sys.exit(1)
+
+    import asyncio
+
+    print_header(args.dry_run)
+    stats = asyncio.run(run_pipeline(args.directory, dry_run=args.dry_run, writers=max(1, args.jobs),
+                                     labels=args.locations, settings=settings))
+
+    if not stats.found:
         print("❌ 没有找到包含 GPS 的照片")
         sys.exit(1)
-    
-    process_photos(photos, dry_run=args.dry_run)
 
+    print_summary(stats, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
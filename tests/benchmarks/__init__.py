@@ -0,0 +1,10 @@
+"""
+Performance benchmarks for the photography workflow scripts.
+
+Not collected by pytest (no `test_` files); run them explicitly:
+
+    python -m tests.benchmarks run --sizes 1k,10k,100k --save
+    python -m tests.benchmarks compare tests/benchmarks/baselines/<host>.json
+
+See `pipeline.py` for what is timed.
+"""
@@ -0,0 +1,161 @@
+"""
+Run or compare the pipeline benchmarks.
+
+Usage:
+    python -m tests.benchmarks run [--sizes 1k,10k,100k] [--repeat 3] [--out FILE | --save]
+    python -m tests.benchmarks compare BASELINE [CURRENT] [--threshold 0.2]
+    python -m tests.benchmarks corpus DIR [--count 20000] [--size-kb 200] [--heic 0.1]
+    python -m tests.benchmarks nominatim [--port 8088] [--latency 0.3] [--error-rate 0.05]
+
+`compare` without CURRENT runs the benchmarks for the baseline's sizes first.
+It exits with status 1 when any stage regressed beyond the threshold.
+`corpus` writes real JPEG/HEIC files for end-to-end runs of the scripts.
+`nominatim` serves a local reverse-geocoding API to point NOMINATIM_URL at.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from tests.benchmarks.pipeline import (  # noqa: E402
+    DEFAULT_SIZES, DEFAULT_THRESHOLD, compare, default_baseline,
+    parse_sizes, print_comparison, run_benchmarks,
+)
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2)
+        fh.write("\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks",
+                                     description="Pipeline stage benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="benchmark synthetic libraries")
+    run.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                     help="comma-separated library sizes: 1k, 10k, 100k, 1m or a number "
+                          f"(default: {','.join(DEFAULT_SIZES)})")
+    run.add_argument("--repeat", type=int, default=3, help="runs per size; the best counts (default: 3)")
+    run.add_argument("--photos-per-trip", type=int, default=500, help="trip size (default: 500)")
+    target = run.add_mutually_exclusive_group()
+    target.add_argument("--out", metavar="FILE", help="write results as JSON")
+    target.add_argument("--save", action="store_true",
+                        help="write results as this machine's baseline")
+
+    cmp = sub.add_parser("compare", help="flag stages slower than a baseline")
+    cmp.add_argument("baseline", nargs="?", help="baseline JSON (default: this machine's)")
+    cmp.add_argument("current", nargs="?", help="results JSON (default: run the benchmarks now)")
+    cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                     help=f"allowed slowdown as a fraction (default: {DEFAULT_THRESHOLD})")
+    cmp.add_argument("--repeat", type=int, default=3, help="runs per size when benchmarking (default: 3)")
+
+    corpus = sub.add_parser("corpus", help="write a synthetic photo tree with real metadata")
+    corpus.add_argument("root", help="output directory (photos go under ROOT/content/trips)")
+    corpus.add_argument("--count", type=int, default=20_000, help="number of photos (default: 20000)")
+    corpus.add_argument("--photos-per-trip", type=int, default=200, help="trip size (default: 200)")
+    corpus.add_argument("--size-kb", type=int, default=200, help="approximate JPEG size (default: 200)")
+    corpus.add_argument("--heic", type=float, default=0.0, metavar="RATIO",
+                        help="fraction of HEIC containers (default: 0)")
+    corpus.add_argument("--rated", type=float, default=0.2, metavar="RATIO",
+                        help="fraction of photos with an XMP rating (default: 0.2)")
+    corpus.add_argument("--seed", type=int, default=0)
+
+    fake = sub.add_parser("nominatim", help="serve a local Nominatim /reverse API with injected faults")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=8088, help="(default: 8088)")
+    fake.add_argument("--latency", type=float, default=0.0, help="seconds per response (default: 0)")
+    fake.add_argument("--jitter", type=float, default=0.0, help="± seconds around --latency (default: 0)")
+    fake.add_argument("--error-rate", type=float, default=0.0, metavar="RATIO",
+                      help="fraction of requests that fail (default: 0)")
+    fake.add_argument("--error-status", default="429,503", metavar="CODES",
+                      help="statuses failures pick from (default: 429,503)")
+    fake.add_argument("--retry-after", type=float, metavar="SECONDS",
+                      help="Retry-After header on failures")
+    fake.add_argument("--min-interval", type=float, default=0.0, metavar="SECONDS",
+                      help="answer 429 to requests closer together than this (default: off)")
+    fake.add_argument("--idle-timeout", type=float, metavar="SECONDS",
+                      help="close keep-alive connections idle this long (default: never)")
+    fake.add_argument("--gazetteer", metavar="FILE",
+                      help='JSON list of {"lat", "lon", "address"} (default: the MockGeocoder cities)')
+    fake.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "nominatim":
+        from tests.benchmarks.nominatim import FakeNominatim, load_gazetteer
+
+        server = FakeNominatim(
+            args.host, args.port, latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate,
+            error_statuses=[int(c) for c in args.error_status.split(",") if c],
+            retry_after=args.retry_after, min_interval=args.min_interval,
+            idle_timeout=args.idle_timeout,
+            gazetteer=load_gazetteer(args.gazetteer) if args.gazetteer else None, seed=args.seed,
+        )
+        print(f"🌍 Nominatim stand-in on {server.url} ({len(server.gazetteer)} places)\n"
+              f"   export NOMINATIM_URL={server.url}", file=sys.stderr)
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server.server_close()
+            print(json.dumps(dict(sorted(server.stats.items())), indent=2), file=sys.stderr)
+        return 0
+
+    if args.command == "corpus":
+        from tests.benchmarks.corpus import generate_corpus
+
+        started = time.perf_counter()
+        truth = generate_corpus(args.root, args.count, args.photos_per_trip, args.size_kb,
+                                heic_ratio=args.heic, rated_ratio=args.rated, seed=args.seed)
+        print(f"✅ {len(truth)} photos under {os.path.join(args.root, 'content', 'trips')} "
+              f"in {time.perf_counter() - started:.1f}s (expected metadata: corpus.json)",
+              file=sys.stderr)
+        return 0
+
+    if args.command == "run":
+        data = run_benchmarks(parse_sizes(args.sizes), args.repeat, args.photos_per_trip)
+        path = default_baseline() if args.save else args.out
+        if path:
+            write_json(path, data)
+            print(f"✅ {path}", file=sys.stderr)
+        else:
+            json.dump(data, sys.stdout, indent=2)
+            print()
+        return 0
+
+    baseline_path = args.baseline or default_baseline()
+    try:
+        with open(baseline_path, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    except FileNotFoundError:
+        print(f"error: no baseline at {baseline_path} (create one with `run --save`)", file=sys.stderr)
+        return 2
+    if args.current:
+        with open(args.current, encoding="utf-8") as fh:
+            current = json.load(fh)
+    else:
+        sizes = [r["photos"] for r in baseline["results"].values()]
+        current = run_benchmarks(sizes, args.repeat, baseline.get("photos_per_trip", 500))
+
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(rows)
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) more than {args.threshold:.0%} slower than {baseline_path}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Synthetic photo corpus with real EXIF, XMP and IPTC metadata.
+
+Writes a `content/trips/<Country>/<City>/` tree of small but valid JPEGs (and
+optionally HEIC containers) that exiftool, Pillow and the workflow scripts
+read exactly like camera files, so the real extractors and writers can be
+benchmarked offline at tens of thousands of files.
+
+Encoding is done once: a handful of noise images sized to `size_kb` are
+encoded with Pillow up front, and every photo is that image data behind its
+own metadata segments. Writing a file is then a few byte concatenations.
+
+Each JPEG carries:
+    APP1 Exif   Make/Model, DateTimeOriginal/CreateDate, GPS lat/lon/alt
+    APP1 XMP    xmp:Rating (on `rated` photos), dc:title
+    APP13 IPTC  City, Country, Keywords, ObjectName
+
+HEIC files are ISOBMFF containers with the same Exif and XMP as items. There
+is no HEVC encoder here, so their image item is a stub: metadata tools read
+them, image decoders don't.
+"""
+
+import json
+import os
+import random
+import struct
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from tests.test_helpers import MockGeocoder
+
+CITIES = [
+    # (country, city, lat, lon); the first ones match MockGeocoder
+    (MockGeocoder._get_country(city), city, lat, lon)
+    for (lat, lon), city in MockGeocoder().known_locations.items()
+]
+BASE_IMAGES = 4  # distinct encoded images per corpus
+
+
+# --- TIFF/Exif ----------------------------------------------------------------
+
+ASCII, BYTE, SHORT, LONG, RATIONAL = 2, 1, 3, 4, 5
+
+
+def _ascii(text: str) -> tuple:
+    data = text.encode("ascii") + b"\0"
+    return ASCII, len(data), data
+
+
+def _rationals(*values) -> tuple:
+    data = b"".join(struct.pack("<II", n, d) for n, d in values)
+    return RATIONAL, len(values), data
+
+
+def _dms(value: float) -> tuple:
+    """Degrees as (deg, min, sec) rationals, seconds to 1/10000."""
+    value = abs(value)
+    deg = int(value)
+    minutes = int((value - deg) * 60)
+    seconds = round(((value - deg) * 60 - minutes) * 60 * 10000)
+    return _rationals((deg, 1), (minutes, 1), (seconds, 10000))
+
+
+def _ifd(entries: Dict[int, tuple], offset: int, next_ifd: int = 0) -> bytes:
+    """One little-endian IFD at `offset`, followed by its out-of-line values."""
+    data_offset = offset + 2 + 12 * len(entries) + 4
+    head, tail = [struct.pack("<H", len(entries))], []
+    for tag in sorted(entries):
+        kind, count, value = entries[tag]
+        if len(value) <= 4:
+            head.append(struct.pack("<HHI", tag, kind, count) + value.ljust(4, b"\0"))
+        else:
+            head.append(struct.pack("<HHII", tag, kind, count, data_offset))
+            value += b"\0" * (len(value) % 2)  # word alignment
+            tail.append(value)
+            data_offset += len(value)
+    head.append(struct.pack("<I", next_ifd))
+    return b"".join(head + tail)
+
+
+def _ifd_size(entries: Dict[int, tuple]) -> int:
+    return len(_ifd(entries, 0))
+
+
+def exif_tiff(lat: float, lon: float, alt: float, taken: datetime,
+              make: str = "Synthetic", model: str = "Corpus 1") -> bytes:
+    """TIFF-structured Exif block with IFD0, Exif and GPS sub-IFDs."""
+    stamp = taken.strftime("%Y:%m:%d %H:%M:%S")
+    exif = {0x9003: _ascii(stamp), 0x9004: _ascii(stamp)}  # DateTimeOriginal, CreateDate
+    gps = {
+        0x0000: (BYTE, 4, bytes([2, 3, 0, 0])),                      # GPSVersionID
+        0x0001: _ascii("N" if lat >= 0 else "S"), 0x0002: _dms(lat),
+        0x0003: _ascii("E" if lon >= 0 else "W"), 0x0004: _dms(lon),
+        0x0005: (BYTE, 1, bytes([0 if alt >= 0 else 1])),             # above sea level
+        0x0006: _rationals((round(abs(alt) * 100), 100)),
+    }
+    ifd0 = {
+        0x010F: _ascii(make), 0x0110: _ascii(model),
+        0x8769: (LONG, 1, b"\0\0\0\0"), 0x8825: (LONG, 1, b"\0\0\0\0"),  # patched below
+    }
+    ifd0_at = 8
+    exif_at = ifd0_at + _ifd_size(ifd0)
+    gps_at = exif_at + _ifd_size(exif)
+    ifd0[0x8769] = (LONG, 1, struct.pack("<I", exif_at))
+    ifd0[0x8825] = (LONG, 1, struct.pack("<I", gps_at))
+    return (b"II*\0" + struct.pack("<I", ifd0_at)
+            + _ifd(ifd0, ifd0_at) + _ifd(exif, exif_at) + _ifd(gps, gps_at))
+
+
+# --- XMP / IPTC ---------------------------------------------------------------
+
+XMP_TEMPLATE = """<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"{rating}>
+   <dc:title><rdf:Alt><rdf:li xml:lang="x-default">{title}</rdf:li></rdf:Alt></dc:title>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+
+def xmp_packet(title: str, rating: Optional[int] = None) -> bytes:
+    rating_attr = f'\n    xmp:Rating="{rating}"' if rating is not None else ""
+    return XMP_TEMPLATE.format(title=title, rating=rating_attr).encode("utf-8")
+
+
+def iptc_block(city: str, country: str, keywords: List[str], title: str) -> bytes:
+    """Photoshop 8BIM resource 0x0404 holding IPTC-IIM records."""
+    def dataset(record, number, value):
+        return struct.pack(">BBBH", 0x1C, record, number, len(value)) + value
+
+    iim = dataset(1, 90, b"\x1b%G")  # coded character set: UTF-8
+    iim += dataset(2, 5, title.encode("utf-8"))
+    for word in keywords:
+        iim += dataset(2, 25, word.encode("utf-8"))
+    iim += dataset(2, 90, city.encode("utf-8"))
+    iim += dataset(2, 101, country.encode("utf-8"))
+    iim += b"\0" * (len(iim) % 2)
+    return b"8BIM" + struct.pack(">H", 0x0404) + b"\0\0" + struct.pack(">I", len(iim)) + iim
+
+
+# --- Containers ---------------------------------------------------------------
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    if len(payload) + 2 > 0xFFFF:
+        raise ValueError("JPEG segment too large")
+    return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+
+def jpeg_bytes(image: bytes, tiff: bytes, xmp: bytes, iptc: bytes) -> bytes:
+    """Encoded JPEG `image` with its APP segments replaced by ours."""
+    return (b"\xff\xd8"
+            + _segment(0xE1, b"Exif\0\0" + tiff)
+            + _segment(0xE1, b"http://ns.adobe.com/xap/1.0/\0" + xmp)
+            + _segment(0xED, b"Photoshop 3.0\0" + iptc)
+            + image)
+
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def _full_box(kind: bytes, version: int, payload: bytes) -> bytes:
+    return _box(kind, struct.pack(">I", version << 24) + payload)
+
+
+def heic_bytes(tiff: bytes, xmp: bytes, image_stub: bytes = b"\0" * 64) -> bytes:
+    """HEIF container: stub 'hvc1' primary item plus Exif and XMP items."""
+    items = [
+        (1, b"hvc1", b"", image_stub),
+        (2, b"Exif", b"", struct.pack(">I", 6) + b"Exif\0\0" + tiff),
+        (3, b"mime", b"application/rdf+xml\0", xmp),
+    ]
+
+    def meta(mdat_start):
+        infe = b"".join(
+            _full_box(b"infe", 2, struct.pack(">HH", i, 0) + kind + b"\0" + extra)
+            for i, kind, extra, _ in items
+        )
+        iloc, offset = [], mdat_start
+        for i, _, _, data in items:
+            iloc.append(struct.pack(">HHHII", i, 0, 1, offset, len(data)))
+            offset += len(data)
+        return _full_box(b"meta", 0, b"".join([
+            _full_box(b"hdlr", 0, b"\0\0\0\0pict" + b"\0" * 12 + b"\0"),
+            _full_box(b"pitm", 0, struct.pack(">H", 1)),
+            _full_box(b"iinf", 0, struct.pack(">H", len(items)) + infe),
+            _full_box(b"iref", 0, _box(b"cdsc", struct.pack(">HHH", 2, 1, 1))
+                      + _box(b"cdsc", struct.pack(">HHH", 3, 1, 1))),
+            _full_box(b"iloc", 0, b"\x44\x00" + struct.pack(">H", len(items)) + b"".join(iloc)),
+        ]))
+
+    ftyp = _box(b"ftyp", b"heic" + struct.pack(">I", 0) + b"mif1heic")
+    head = len(ftyp) + len(meta(0)) + 8  # meta's size doesn't depend on the offsets
+    body = b"".join(data for *_, data in items)
+    return ftyp + meta(head) + _box(b"mdat", body)
+
+
+def encode_base_images(size_kb: int, count: int = BASE_IMAGES, seed: int = 0) -> List[bytes]:
+    """Noise JPEGs of roughly `size_kb`, SOI and APP segments stripped."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+
+    def encode(width):
+        height = max(16, width * 2 // 3)
+        # Upscaled noise: compresses like a detailed photo, not like static
+        noise = Image.frombytes("RGB", (width // 4, height // 4), rng.randbytes(width // 4 * (height // 4) * 3))
+        buf = BytesIO()
+        noise.resize((width, height)).save(buf, "JPEG", quality=90)
+        return buf.getvalue(), width * height
+
+    probe, pixels = encode(320)
+    bytes_per_pixel = len(probe) / pixels
+    width = max(64, int((size_kb * 1024 / bytes_per_pixel * 3 / 2) ** 0.5))
+    return [_strip_app_segments(encode(width)[0]) for _ in range(count)]
+
+
+def _strip_app_segments(jpeg: bytes) -> bytes:
+    pos = 2
+    while jpeg[pos] == 0xFF and 0xE0 <= jpeg[pos + 1] <= 0xEF:
+        pos += 2 + struct.unpack(">H", jpeg[pos + 2:pos + 4])[0]
+    return jpeg[pos:]
+
+
+# --- Corpus -------------------------------------------------------------------
+
+def write_page(path: str, front_matter: dict) -> None:
+    if os.path.exists(path):
+        return
+    lines = ["---"] + [f"{k}: {json.dumps(v, ensure_ascii=False)}" for k, v in front_matter.items()] + ["---", ""]
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("\n".join(lines))
+
+
+def generate_corpus(root: str, count: int, photos_per_trip: int = 200, size_kb: int = 200,
+                    heic_ratio: float = 0.0, rated_ratio: float = 0.2,
+                    start_date: datetime = datetime(2015, 1, 1), seed: int = 0) -> List[dict]:
+    """Write `count` photos under `root/content/trips`; returns the ground truth.
+
+    Trips cycle through CITIES, one every 30 days, and spread their photos
+    over up to ten days. The returned records (also written to
+    `root/corpus.json`) hold each file's expected metadata in exiftool's
+    `-n` JSON form, for checking what the scripts read back.
+    """
+    rng = random.Random(seed)
+    images = encode_base_images(size_kb, seed=seed)
+    truth = []
+    for trip, first in enumerate(range(0, count, photos_per_trip)):
+        country, city, lat0, lon0 = CITIES[trip % len(CITIES)]
+        folder = os.path.join(root, "content", "trips", country, city)
+        os.makedirs(folder, exist_ok=True)
+        trip_start = start_date + timedelta(days=30 * trip)
+        write_page(os.path.join(os.path.dirname(folder), "_index.md"),
+                   {"title": country, "date": trip_start.strftime("%Y-%m-%d")})
+        write_page(os.path.join(folder, "index.md"),
+                   {"title": f"{city}, {country}", "date": trip_start.strftime("%Y-%m-%d")})
+
+        per_day = max(1, photos_per_trip // 10)
+        for n in range(min(photos_per_trip, count - first)):
+            seq = first + n
+            taken = trip_start.replace(hour=8) + timedelta(days=min(n // per_day, 9),
+                                                          seconds=(n % per_day) * 600 + rng.randrange(600))
+            lat = round(lat0 + rng.uniform(-0.004, 0.004), 6)
+            lon = round(lon0 + rng.uniform(-0.004, 0.004), 6)
+            alt = round(rng.uniform(0, 300), 2)
+            rating = rng.randint(1, 5) if rng.random() < rated_ratio else None
+            title = f"{city} #{seq}"
+
+            tiff = exif_tiff(lat, lon, alt, taken)
+            xmp = xmp_packet(title, rating)
+            heic = rng.random() < heic_ratio
+            name = f"{taken:%Y%m%d}-S{seq:07d}." + ("heic" if heic else "jpg")
+            if heic:
+                data = heic_bytes(tiff, xmp)
+            else:
+                iptc = iptc_block(city, country, [country.lower(), city.lower(), "synthetic"], title)
+                data = jpeg_bytes(images[seq % len(images)], tiff, xmp, iptc)
+            path = os.path.join(folder, name)
+            with open(path, "wb") as fh:
+                fh.write(data)
+
+            record = {
+                "SourceFile": os.path.relpath(path, root).replace(os.sep, "/"),
+                "FileName": name,
+                "GPSLatitude": lat,
+                "GPSLongitude": lon,
+                "GPSAltitude": alt,
+                "DateTimeOriginal": taken.strftime("%Y:%m:%d %H:%M:%S"),
+                "Title": title,
+            }
+            if rating is not None:
+                record["Rating"] = rating
+            truth.append(record)
+
+    with open(os.path.join(root, "corpus.json"), "w", encoding="utf-8") as fh:
+        json.dump(truth, fh, ensure_ascii=False, indent=1)
+    return truth
@@ -0,0 +1,206 @@
+"""
+Local stand-in for Nominatim's `/reverse` API.
+
+Serves reverse lookups over a small gazetteer (the MockGeocoder cities by
+default) through real HTTP, so the scripts' geopy client, timeouts and error
+handling run exactly as they do against openstreetmap.org, and fault
+injection can reproduce a bad day on the public server:
+
+    latency, jitter     seconds added to every response (uniform ± jitter)
+    error_rate          fraction of requests answered with an error status
+    error_statuses      which statuses to pick from (default 429 and 503)
+    retry_after         Retry-After header on those errors, in seconds
+    min_interval        usage policy: requests sooner than this after the
+                        previous one get 429, like the real rate limiter
+    idle_timeout        close keep-alive connections idle this long
+
+Point the scripts at it with NOMINATIM_URL (see scripts/geocoding.py):
+
+    python -m tests.benchmarks nominatim --port 8088 --latency 0.3 --error-rate 0.05
+    NOMINATIM_URL=http://127.0.0.1:8088 NOMINATIM_RATE=4 \\
+        python3 -m scripts write-meta /tmp/corpus/content/trips --dry-run --profile
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+from tests.test_helpers import MockGeocoder
+
+MAX_DISTANCE_KM = 50.0  # farther from every place: "Unable to geocode"
+
+
+def default_gazetteer() -> List[dict]:
+    """One place per MockGeocoder city, in Nominatim's response shape."""
+    places = []
+    for (lat, lon), city in MockGeocoder().known_locations.items():
+        country = MockGeocoder._get_country(city)
+        places.append({
+            "lat": lat, "lon": lon,
+            "address": {"city": city, "country": country},
+        })
+    return places
+
+
+def load_gazetteer(path: str) -> List[dict]:
+    """Places from a JSON list of {"lat", "lon", "address": {...}}."""
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance (haversine)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class FakeNominatim:
+    """Threaded HTTP server answering `/reverse` like Nominatim, with injected faults.
+
+    Use as a context manager (or start()/stop()); `url` is the base URL to
+    hand to NOMINATIM_URL. Every request is recorded in `stats`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_statuses: Sequence[int] = (429, 503),
+                 retry_after: Optional[float] = None, min_interval: float = 0.0,
+                 idle_timeout: Optional[float] = None, gazetteer: Optional[List[dict]] = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+        self.gazetteer = gazetteer if gazetteer is not None else default_gazetteer()
+        self.stats = Counter()  # requests, connections, status.<code>, max_in_flight
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_request = None
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeNominatim":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def lookup(self, lat: float, lon: float) -> dict:
+        """Nearest place within MAX_DISTANCE_KM, as a `/reverse` JSON body."""
+        best, best_km = None, MAX_DISTANCE_KM
+        for place in self.gazetteer:
+            km = distance_km(lat, lon, place["lat"], place["lon"])
+            if km <= best_km:
+                best, best_km = place, km
+        if best is None:
+            return {"error": "Unable to geocode"}
+        address = best["address"]
+        return {
+            "place_id": self.gazetteer.index(best) + 1,
+            "lat": str(best["lat"]), "lon": str(best["lon"]),
+            "display_name": ", ".join(str(v) for v in address.values()),
+            "address": address,
+        }
+
+    def _plan(self):
+        """Decide one request's fate under the lock: (delay, status)."""
+        with self._lock:
+            now = time.monotonic()
+            self.stats["requests"] += 1
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+            too_soon = (self.min_interval and self._last_request is not None
+                        and now - self._last_request < self.min_interval)
+            self._last_request = now
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            if too_soon:
+                status = 429
+            elif self.error_rate and self._rng.random() < self.error_rate:
+                status = self._rng.choice(self.error_statuses)
+            else:
+                status = 200
+            self.stats[f"status.{status}"] += 1
+        return delay, status
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+            timeout = fake.idle_timeout
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.stats["connections"] += 1
+
+            def do_GET(self):
+                try:
+                    self.respond()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out and hung up first
+                finally:
+                    with fake._lock:
+                        fake._in_flight -= 1
+
+            def respond(self):
+                delay, status = fake._plan()
+                time.sleep(delay)
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+
+                if parts.path.rstrip("/") != "/reverse":
+                    return self.send(404, {"error": "Unknown endpoint"})
+                if status != 200:
+                    headers = {}
+                    if fake.retry_after is not None:
+                        headers["Retry-After"] = f"{fake.retry_after:g}"
+                    return self.send(status, {"error": "Injected failure"}, headers)
+                try:
+                    lat, lon = float(query["lat"]), float(query["lon"])
+                except (KeyError, ValueError):
+                    return self.send(400, {"error": "Parameter 'lat' and 'lon' required"})
+                self.send(200, fake.lookup(lat, lon))
+
+            def send(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # one line per request would drown the scripts' own output
+
+        return Handler
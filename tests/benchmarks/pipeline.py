@@ -0,0 +1,183 @@
+"""
+Stage benchmarks over synthetic photo libraries.
+
+Each library comes from `TestDataGenerator.iter_photo_library` and is run
+trip by trip through the stages that scale with the number of photos:
+
+    analyze    analyze_date_range (EXIF date parsing and grouping)
+    geocode    reverse_geocode_locations against MockGeocoder with no rate
+               limit, i.e. the sampling and caching work around the API
+    gpx        generate_gpx into a temporary directory
+    featured   featured_item + FeaturedSelector + near-duplicate pass of
+               build_featured over the whole library
+
+Data generation is not timed. Every stage reports the best of `repeat`
+runs, so a result is the machine's floor for that stage, not an average
+inflated by whatever else was running.
+"""
+
+import contextlib
+import io
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+from unittest.mock import patch
+
+from scripts import build_featured, smart_gps_extract
+from scripts.geocoding import Throttle
+from tests.test_helpers import MockGeocoder, TestDataGenerator
+
+STAGES = ("analyze", "geocode", "gpx", "featured")
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SIZES = ("1k", "10k", "100k")  # 1m takes minutes; ask for it explicitly
+DEFAULT_THRESHOLD = 0.20  # flag stages more than 20% slower than the baseline
+NOISE_FLOOR = 0.005  # seconds; smaller absolute changes are never regressions
+
+
+class GeopyMockGeocoder(MockGeocoder):
+    """MockGeocoder behind geopy's `reverse("lat, lon")` interface."""
+
+    def __init__(self, user_agent=None):
+        super().__init__()
+        self.calls = 0
+
+    def reverse(self, query, language='en'):
+        self.calls += 1
+        lat, lon = (float(v) for v in query.split(','))
+        result = super().reverse((lat, lon), language)
+        return SimpleNamespace(raw={'address': result}) if result else None
+
+
+def parse_sizes(text: str) -> List[int]:
+    """'1k,10k,5000' -> [1000, 10000, 5000]."""
+    return [SIZES[s] if s in SIZES else int(s) for s in text.lower().split(',') if s]
+
+
+def size_label(n: int) -> str:
+    for label, value in SIZES.items():
+        if value == n:
+            return label
+    return str(n)
+
+
+def run_library(num_photos: int, photos_per_trip: int = 500, seed: int = 0) -> Dict[str, float]:
+    """Time every stage once over a library of `num_photos`; returns seconds per stage."""
+    extract = smart_gps_extract.smart_gps_extract_main
+    totals = dict.fromkeys(STAGES, 0.0)
+    geocoder = GeopyMockGeocoder()
+    throttle, cache = Throttle(0), {}
+    selector = build_featured.FeaturedSelector(limit=60, per_page=4, now=datetime(2025, 1, 1))
+
+    library = TestDataGenerator.iter_photo_library(num_photos, photos_per_trip, seed=seed)
+    with tempfile.TemporaryDirectory() as out, \
+            contextlib.redirect_stdout(io.StringIO()) as log, \
+            patch.object(extract, 'make_geocoder', lambda url=None: geocoder):
+        for name, records in library:
+            start = time.perf_counter()
+            photos_by_date, dates, _ = extract.analyze_date_range(records)
+            totals["analyze"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            locations = extract.reverse_geocode_locations(
+                photos_by_date, dates, throttle=throttle, cache=cache)
+            totals["geocode"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            extract.generate_gpx(photos_by_date, dates, locations, name, output_dir=out)
+            totals["gpx"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for record in records:
+                item = build_featured.featured_item(record, 1)
+                if item is not None:
+                    selector.push(item)
+            totals["featured"] += time.perf_counter() - start
+
+            log.seek(0)
+            log.truncate()  # the stages print per day; don't buffer a million lines
+
+        start = time.perf_counter()
+        build_featured.drop_near_duplicates(selector.ranked(), {}, 10)
+        totals["featured"] += time.perf_counter() - start
+    return totals
+
+
+def run_benchmarks(sizes: Iterable[int], repeat: int = 3, photos_per_trip: int = 500,
+                   stream=None) -> dict:
+    """Benchmark each library size; returns a JSON-able result document."""
+    stream = stream or sys.stderr
+    results = {}
+    for n in sizes:
+        best = dict.fromkeys(STAGES, float('inf'))
+        for _ in range(repeat):
+            for stage, seconds in run_library(n, photos_per_trip).items():
+                best[stage] = min(best[stage], seconds)
+        results[size_label(n)] = {
+            "photos": n,
+            "trips": -(-n // photos_per_trip),
+            "stages": {
+                stage: {"seconds": round(s, 6), "us_per_photo": round(s / n * 1e6, 3)}
+                for stage, s in best.items()
+            },
+        }
+        print(f"{size_label(n):>6}: " + "  ".join(f"{k} {v:.3f}s" for k, v in best.items()),
+              file=stream)
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.node() or "unknown",
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "photos_per_trip": photos_per_trip,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD,
+            noise_floor: float = NOISE_FLOOR) -> List[dict]:
+    """Stage-by-stage comparison of two result documents.
+
+    Only sizes and stages present in both are compared. A row is a
+    regression when the stage got more than `threshold` slower and the
+    absolute difference exceeds `noise_floor`.
+    """
+    rows = []
+    for size, base in baseline["results"].items():
+        cur = current["results"].get(size)
+        if cur is None:
+            continue
+        for stage, b in base["stages"].items():
+            c = cur["stages"].get(stage)
+            if c is None:
+                continue
+            before, after = b["seconds"], c["seconds"]
+            ratio = after / before if before else float('inf')
+            rows.append({
+                "size": size,
+                "stage": stage,
+                "baseline_s": before,
+                "current_s": after,
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + threshold and after - before > noise_floor,
+            })
+    return rows
+
+
+def print_comparison(rows: List[dict], stream=None) -> None:
+    stream = stream or sys.stdout
+    print(f"{'size':>6} {'stage':<10} {'baseline':>10} {'current':>10} {'change':>8}", file=stream)
+    for r in rows:
+        flag = "  ❌ regression" if r["regression"] else ""
+        print(f"{r['size']:>6} {r['stage']:<10} {r['baseline_s']:>9.3f}s {r['current_s']:>9.3f}s "
+              f"{(r['ratio'] - 1) * 100:>+7.1f}%{flag}", file=stream)
+
+
+def default_baseline(directory: Optional[str] = None) -> str:
+    """Per-machine baseline path: timings only compare on the same hardware."""
+    directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+    return os.path.join(directory, f"{platform.node() or 'unknown'}.json")
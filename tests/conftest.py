@@ -10,6 +10,18 @@ from pathlib import Path
 from datetime import datetime, timedelta
 
 
+@pytest.fixture(autouse=True)
+def geocode_environment(monkeypatch):
+    """
+    Fixture: Ignore the developer's GEOCODE_* settings.
+
+    `geocoding.configure` reads them when a test runs a script's main(), so
+    a cache file or gazetteer set in the shell would change the results.
+    """
+    for name in ("GEOCODE_CACHE", "GEOCODE_GAZETTEER", "GEOCODE_BOUNDARIES", "GEOCODE_ADMIN1"):
+        monkeypatch.delenv(name, raising=False)
+
+
 @pytest.fixture
 def temp_dir():
     """
@@ -0,0 +1,516 @@
+"""
+Test suite for batch GPS extraction.
+
+Tests cover:
+- The shared geocoding throttle
+- Manifest parsing
+- Concurrent, non-interactive processing of several trips
+- Speculative stages while interactive prompts are on screen
+- Skipping stages whose inputs are unchanged
+"""
+
+import json
+import subprocess
+import threading
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts.geocoding import GeocodeSettings, Throttle
+    from scripts import smart_gps_extract
+    from scripts.smart_gps_extract import ExtractionError, load_manifest, run_batch, run_interactive, run_trip
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+module = smart_gps_extract.smart_gps_extract_main
+
+
+class FakeNominatim:
+    """Geopy-compatible geocoder answering from a fixed table."""
+
+    CITIES = {(62.01, -6.77): "Tórshavn", (55.68, 12.57): "Copenhagen"}
+    REGIONS = {"Tórshavn": ("Streymoy", "Faroe Islands"), "Copenhagen": ("Capital Region", "Denmark")}
+    calls = 0
+    lock = threading.Lock()
+
+    def __init__(self, user_agent=None):
+        pass
+
+    def reverse(self, query, language='en'):
+        with FakeNominatim.lock:
+            FakeNominatim.calls += 1
+        lat, lon = (float(v) for v in query.split(','))
+        city = self.CITIES.get((round(lat, 2), round(lon, 2)))
+        if not city:
+            return None
+        state, country = self.REGIONS[city]
+        return SimpleNamespace(raw={'address': {'city': city, 'state': state, 'country': country}})
+
+
+def exiftool_records(lat, lon, days, start="2025:08:15"):
+    """Exiftool-style records: two photos per day at one location."""
+    y, m, d = (int(v) for v in start.split(':'))
+    return [
+        {
+            "FileName": f"IMG_{day}{n}.jpg",
+            "GPSLatitude": lat + n * 0.0001,
+            "GPSLongitude": lon,
+            "DateTimeOriginal": f"{y}:{m:02d}:{d + day:02d} {10 + n}:00:00",
+        }
+        for day in range(days) for n in range(2)
+    ]
+
+
+class FakeExiftool(dict):
+    """Folder name -> records table that counts scans."""
+    calls = 0
+
+
+@pytest.fixture
+def fake_tools(monkeypatch):
+    """Patch exiftool and Nominatim; returns the folder -> records table."""
+    folders = FakeExiftool()
+
+    def run(cmd, capture_output=True, text=True):
+        folders.calls += 1
+        records = folders.get(Path(cmd[-1]).name)
+        if records is None:
+            return SimpleNamespace(returncode=1, stdout="", stderr="no such folder")
+        return SimpleNamespace(returncode=0, stdout=json.dumps(records), stderr="")
+
+    monkeypatch.setattr(subprocess, "run", run)
+    monkeypatch.setattr(module, "make_geocoder", FakeNominatim)
+    FakeNominatim.calls = 0
+    return folders
+
+
+class TestThrottle:
+    """Test the thread-safe request spacing."""
+
+    def test_slots_are_spaced_across_threads(self):
+        """
+        Test concurrent callers never get slots closer than the interval.
+
+        Edge Cases:
+            - Many threads waiting at once
+        """
+        throttle = Throttle(interval=0.02)
+        start = time.monotonic()
+        stamps = []
+        lock = threading.Lock()
+
+        def call():
+            throttle.wait()
+            with lock:
+                stamps.append(time.monotonic())
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # The k-th request may not go out before k intervals have passed.
+        stamps.sort()
+        assert all(t - start >= k * 0.02 - 0.001 for k, t in enumerate(stamps)), "Requests must not bunch up"
+
+    def test_backoff_delays_next_slot(self):
+        """
+        Test that a backoff pushes the next request out.
+
+        Expected:
+            - The next wait sleeps at least the backoff time
+        """
+        throttle = Throttle(interval=0.0)
+        throttle.backoff(0.05)
+        assert throttle.wait() >= 0.04
+
+
+class TestManifest:
+    """Test manifest loading."""
+
+    def test_relative_folders_and_defaults(self, temp_dir):
+        """
+        Test folder resolution and default names.
+
+        Expected:
+            - Relative folders resolve against the manifest directory
+            - Missing names default to the folder name
+            - Override keys become strings
+        """
+        manifest = temp_dir / "trips.json"
+        manifest.write_text(json.dumps({"trips": [
+            {"folder": "photos/faroe", "overrides": {1: "Tórshavn"}},
+            {"folder": "/abs/denmark", "name": "denmark-2025", "start": "2025-08-12"},
+        ]}))
+
+        trips = load_manifest(manifest)
+
+        assert trips[0]["folder"] == temp_dir.resolve() / "photos/faroe"
+        assert trips[0]["name"] == "faroe"
+        assert trips[0]["overrides"] == {"1": "Tórshavn"}
+        assert trips[1]["name"] == "denmark-2025"
+        assert trips[1]["start"] == "2025-08-12" and trips[1]["end"] is None
+
+    def test_duplicate_names_rejected(self, temp_dir):
+        """
+        Test that two trips cannot share outputs.
+
+        Edge Cases:
+            - Concurrent trips writing the same gpx/<name> files
+        """
+        manifest = temp_dir / "trips.json"
+        manifest.write_text(json.dumps([
+            {"folder": "a", "name": "trip"},
+            {"folder": "b", "name": "trip"},
+        ]))
+        with pytest.raises(ExtractionError):
+            load_manifest(manifest)
+
+
+class TestBatchRun:
+    """Test concurrent processing of several trips."""
+
+    def test_trips_processed_into_output_dir(self, temp_dir, fake_tools, capsys):
+        """
+        Test a clean batch of two trips.
+
+        Expected:
+            - Every trip writes its own GPX, GPS JSON and summary (with trip stats),
+              and its route into the site's data/routes
+            - Results keep manifest order
+            - Trip logs are printed as whole blocks
+        """
+        for name in ("faroe", "denmark"):
+            (temp_dir / name).mkdir()
+        fake_tools["faroe"] = exiftool_records(62.01, -6.77, days=2)
+        fake_tools["denmark"] = exiftool_records(55.68, 12.57, days=3)
+        trips = [
+            {"folder": temp_dir / name, "name": name, "start": None, "end": None, "overrides": {}}
+            for name in ("faroe", "denmark")
+        ]
+        out = temp_dir / "gpx"
+
+        results = run_batch(trips, str(out), jobs=2, throttle=Throttle(0))
+
+        assert [r["name"] for r in results] == ["faroe", "denmark"]
+        assert all(r["status"] == "ok" for r in results)
+        assert results[0]["cities"] == ["Tórshavn"] and results[1]["days"] == 3
+        for name in ("faroe", "denmark"):
+            assert (out / f"{name}.gpx").exists()
+            assert (out / f"{name}-gps.json").exists()
+            assert json.loads((out / f"{name}-summary.json").read_text())["trip_name"] == name
+        assert len(json.loads((temp_dir / "data" / "routes" / "denmark.json").read_text())["days"]) == 3
+        assert not (out / "denmark-route.json").exists()
+        summary = json.loads((out / "denmark-summary.json").read_text())
+        assert summary["stats"]["bbox"] and "distance_km" in summary["daily_locations"][0]["stats"]
+
+        log = capsys.readouterr().out
+        blocks = log.split("📸 ")[1:]
+        assert sorted(b.split("\033")[0] for b in blocks) == ["denmark", "faroe"]
+        assert all(b.count("步骤 1/5") == 1 and b.count("步骤 5/5") == 1 for b in blocks)
+        assert sys.stdout is not None and not isinstance(sys.stdout, module._ThreadLocalStdout)
+
+    def test_geocode_cache_shared_between_trips(self, temp_dir, fake_tools):
+        """
+        Test that trips at the same place reuse each other's lookups.
+
+        Expected:
+            - The second trip at a known location costs no extra requests
+        """
+        (temp_dir / "a").mkdir()
+        (temp_dir / "b").mkdir()
+        fake_tools["a"] = exiftool_records(62.01, -6.77, days=1)
+        fake_tools["b"] = exiftool_records(62.01, -6.77, days=1)
+        trips = [
+            {"folder": temp_dir / n, "name": n, "start": None, "end": None, "overrides": {}}
+            for n in ("a", "b")
+        ]
+
+        run_batch(trips, str(temp_dir / "gpx"), jobs=1, throttle=Throttle(0))
+
+        assert FakeNominatim.calls == 1
+
+    @pytest.mark.edge_case
+    def test_failures_do_not_stop_other_trips(self, temp_dir, fake_tools):
+        """
+        Test isolation between trips.
+
+        Edge Cases:
+            - Folder that does not exist
+            - exiftool failure
+            - A day that cannot be geocoded
+            - Expected date range not covered
+        """
+        for name in ("broken", "unknown", "short", "good"):
+            (temp_dir / name).mkdir()
+        fake_tools["unknown"] = exiftool_records(0.0, 0.0, days=1)
+        fake_tools["short"] = exiftool_records(62.01, -6.77, days=1)
+        fake_tools["good"] = exiftool_records(62.01, -6.77, days=1)
+        trips = [
+            {"folder": temp_dir / "missing", "name": "missing", "start": None, "end": None, "overrides": {}},
+            {"folder": temp_dir / "broken", "name": "broken", "start": None, "end": None, "overrides": {}},
+            {"folder": temp_dir / "unknown", "name": "unknown", "start": None, "end": None, "overrides": {}},
+            {"folder": temp_dir / "short", "name": "short", "start": "2025-08-15", "end": "2025-08-17",
+             "overrides": {}},
+            {"folder": temp_dir / "good", "name": "good", "start": None, "end": None, "overrides": {}},
+        ]
+
+        results = {r["name"]: r for r in run_batch(trips, str(temp_dir / "gpx"), jobs=3, throttle=Throttle(0))}
+
+        assert results["missing"]["status"] == "failed"
+        assert results["broken"]["status"] == "failed"
+        assert "exiftool" in results["broken"]["error"]
+        assert results["unknown"]["status"] == "unknown-days"
+        assert results["unknown"]["needs_overrides"] == [1]
+        assert results["short"]["status"] == "missing-dates"
+        assert results["short"]["needs_overrides"] == [2, 3]
+        assert results["good"]["status"] == "ok"
+
+
+class TestSpeculativeStages:
+    """Test background work during the interactive prompts."""
+
+    @pytest.fixture
+    def trip(self, temp_dir, fake_tools, monkeypatch):
+        """One two-day trip, with the shared throttle disabled."""
+        monkeypatch.setattr(module.NOMINATIM, "interval", 0)
+        (temp_dir / "faroe").mkdir()
+        fake_tools["faroe"] = exiftool_records(62.01, -6.77, days=2)
+        args = SimpleNamespace(output_name="faroe", expected_start=None, expected_end=None,
+                               photo_folder=str(temp_dir / "faroe"))
+        return args, temp_dir
+
+    def run(self, trip, answers, on_prompt=None):
+        """Run the interactive flow with scripted answers; returns the log."""
+        args, temp_dir = trip
+        prompts = []
+
+        def ask(prompt="继续？"):
+            prompts.append(prompt)
+            if on_prompt:
+                on_prompt(len(prompts))
+            return answers[len(prompts) - 1]
+
+        proxy = module._ThreadLocalStdout(sys.stdout)
+        with patch.object(module, "ask_continue", ask):
+            sys.stdout = proxy
+            try:
+                run_interactive(args, temp_dir / "faroe", str(temp_dir / "gpx"), {}, proxy)
+            finally:
+                sys.stdout = proxy.stream
+        return prompts
+
+    def test_geocoding_runs_during_first_prompt(self, trip, capsys):
+        """
+        Test that geocoding finishes while the user is still reading.
+
+        Expected:
+            - Lookups happen before the second prompt is answered
+            - Step output appears in order, after the prompt that precedes it
+        """
+        (trip[1] / "gpx").mkdir()
+        seen = {}
+
+        def on_prompt(n):
+            if n == 1:
+                deadline = time.monotonic() + 2
+                while FakeNominatim.calls < 1 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                seen["calls"] = FakeNominatim.calls
+                seen["log"] = capsys.readouterr().out
+
+        prompts = self.run(trip, [True, True, True], on_prompt)
+
+        assert len(prompts) == 3
+        assert seen["calls"] >= 1, "Geocoding should start before the first answer"
+        assert "步骤 2/5" not in seen["log"], "Background output must wait for the answer"
+        log = capsys.readouterr().out
+        assert log.index("步骤 2/5") < log.index("步骤 3/5") < log.index("步骤 5/5")
+        assert (trip[1] / "gpx" / "faroe.gpx").exists()
+
+    def test_declining_cancels_background_work(self, trip, capsys):
+        """
+        Test that "n" stops speculative geocoding.
+
+        Edge Cases:
+            - Cancel while step 3 is between requests
+        """
+        (trip[1] / "gpx").mkdir()
+        prompts = self.run(trip, [False])
+        time.sleep(0.1)
+        calls = FakeNominatim.calls
+        time.sleep(0.1)
+
+        log = capsys.readouterr().out
+        assert prompts == ["继续分析行程？"]
+        assert FakeNominatim.calls == calls, "No requests after cancelling"
+        assert "步骤 2/5" not in log and "步骤 3/5" not in log
+        assert not (trip[1] / "gpx" / "faroe.gpx").exists()
+
+
+class TestStageCache:
+    """Test reuse of artifacts from earlier runs."""
+
+    @pytest.fixture
+    def trip(self, temp_dir, fake_tools):
+        """A two-day trip with two photos on disk."""
+        folder = temp_dir / "faroe"
+        folder.mkdir()
+        for n in range(2):
+            (folder / f"IMG_{n}.jpg").write_bytes(b"jpeg")
+        fake_tools["faroe"] = exiftool_records(62.01, -6.77, days=2)
+        fake_tools["faroe"][2]["GPSLatitude"] = 55.68  # day 2 in Copenhagen
+        fake_tools["faroe"][2]["GPSLongitude"] = 12.57
+        fake_tools["faroe"][3]["GPSLatitude"] = 55.68
+        fake_tools["faroe"][3]["GPSLongitude"] = 12.57
+        entry = {"folder": folder, "name": "faroe", "start": None, "end": None, "overrides": {}}
+        return entry, str(temp_dir / "gpx")
+
+    def rerun(self, trip, fake_tools, geocode_settings=GeocodeSettings(), **overrides):
+        """Run the trip again; returns (result, exiftool scans, geocoder calls)."""
+        entry, out = trip
+        fake_tools.calls = FakeNominatim.calls = 0
+        result = run_trip(dict(entry, **overrides), out, throttle=Throttle(0), geocode_settings=geocode_settings)
+        return result, fake_tools.calls, FakeNominatim.calls
+
+    def test_unchanged_trip_skips_everything(self, trip, fake_tools):
+        """
+        Test a second run over identical inputs.
+
+        Expected:
+            - No exiftool scan and no geocoder request
+            - Artifacts are left as they were
+        """
+        Path(trip[1]).mkdir()
+        first, scans, calls = self.rerun(trip, fake_tools)
+        assert first["status"] == "ok" and scans == 1 and calls == 2
+        gpx, route = Path(trip[1]) / "faroe.gpx", Path(trip[1]).parent / "data" / "routes" / "faroe.json"
+        mtimes = gpx.stat().st_mtime_ns, route.stat().st_mtime_ns
+
+        second, scans, calls = self.rerun(trip, fake_tools)
+
+        assert second["status"] == "ok"
+        assert (scans, calls) == (0, 0)
+        assert (gpx.stat().st_mtime_ns, route.stat().st_mtime_ns) == mtimes
+
+    def test_override_only_recomputes_summary(self, trip, fake_tools):
+        """
+        Test that changing a --dN override reuses the scan and the geocoding.
+
+        Expected:
+            - Summary reflects the override
+            - Removing the override again needs no request either
+        """
+        Path(trip[1]).mkdir()
+        self.rerun(trip, fake_tools)
+
+        result, scans, calls = self.rerun(trip, fake_tools, overrides={"2": "Roskilde"})
+        summary = json.loads((Path(trip[1]) / "faroe-summary.json").read_text())
+
+        assert (scans, calls) == (0, 0)
+        assert result["cities"] == ["Roskilde", "Tórshavn"]
+        assert summary["daily_locations"][1]["manually_set"] is True
+
+        _, scans, calls = self.rerun(trip, fake_tools)
+        assert (scans, calls) == (0, 0)
+
+    def test_locations_file_has_full_labels(self, trip, fake_tools):
+        """
+        Test the geocode artifact and the summary built from it.
+
+        Expected:
+            - <name>-locations.json: per-day samples with coordinates, city, state, country
+            - Summary days carry state and country; countries listed once
+            - A manually named day takes state/country from a geocoded day in that city
+        """
+        Path(trip[1]).mkdir()
+        self.rerun(trip, fake_tools)
+
+        labels = json.loads((Path(trip[1]) / "faroe-locations.json").read_text())
+        assert labels["2025-08-15"][0] == {"lat": 62.01, "lon": -6.77, "city": "Tórshavn",
+                                           "state": "Streymoy", "country": "Faroe Islands"}
+        summary = json.loads((Path(trip[1]) / "faroe-summary.json").read_text())
+        assert [(d["state"], d["country"]) for d in summary["daily_locations"]] == [
+            ("Streymoy", "Faroe Islands"), ("Capital Region", "Denmark")]
+        assert summary["countries_visited"] == ["Denmark", "Faroe Islands"]
+
+        self.rerun(trip, fake_tools, overrides={"2": "Tórshavn"})
+        summary = json.loads((Path(trip[1]) / "faroe-summary.json").read_text())
+        assert summary["daily_locations"][1]["country"] == "Faroe Islands"
+
+    @pytest.mark.edge_case
+    def test_changed_inputs_invalidate_downstream(self, trip, fake_tools):
+        """
+        Test invalidation.
+
+        Edge Cases:
+            - A new photo in the folder forces a rescan
+            - Different GPS data forces geocoding again
+            - --force ignores every stamp
+        """
+        Path(trip[1]).mkdir()
+        self.rerun(trip, fake_tools)
+
+        (trip[0]["folder"] / "IMG_9.jpg").write_bytes(b"new")
+        _, scans, calls = self.rerun(trip, fake_tools)
+        assert scans == 1 and calls == 0, "Same GPS output: geocoding stays cached"
+
+        (trip[0]["folder"] / "IMG_10.jpg").write_bytes(b"new")
+        fake_tools["faroe"][0]["GPSLatitude"] = 62.02
+        _, scans, calls = self.rerun(trip, fake_tools)
+        assert scans == 1 and calls > 0
+
+        fake_tools.calls = FakeNominatim.calls = 0
+        run_trip(trip[0], trip[1], throttle=Throttle(0), force=True)
+        assert fake_tools.calls == 1 and FakeNominatim.calls > 0
+
+    @pytest.mark.edge_case
+    def test_changed_geocoding_setup_invalidates_labels(self, trip, fake_tools, temp_dir):
+        """
+        Test that cached place labels belong to the provider that made them.
+
+        Edge Cases:
+            - Another Nominatim server: every day geocoded again
+            - A gazetteer added: its places replace the cached labels
+        """
+        Path(trip[1]).mkdir()
+        self.rerun(trip, fake_tools)
+
+        _, scans, calls = self.rerun(trip, fake_tools, geocode_settings=GeocodeSettings(url="localhost:8080"))
+        assert (scans, calls) == (0, 2)
+        _, _, calls = self.rerun(trip, fake_tools, geocode_settings=GeocodeSettings(url="localhost:8080"))
+        assert calls == 0, "Same server again: labels reused"
+
+        gazetteer = temp_dir / "places.json"
+        gazetteer.write_text(json.dumps([{"lat": 62.01, "lon": -6.77, "address": {
+            "town": "Hoyvík", "state": "Streymoy", "country": "Faroe Islands"}}]), encoding="utf-8")
+        self.rerun(trip, fake_tools, geocode_settings=GeocodeSettings(gazetteer=str(gazetteer)))
+        labels = json.loads((Path(trip[1]) / "faroe-locations.json").read_text())
+        assert labels["2025-08-15"][0]["city"] == "Hoyvík"
+
+    @pytest.mark.edge_case
+    def test_changed_route_parameters_rebuild_gpx(self, trip, fake_tools, monkeypatch):
+        """
+        Test that the GPX stage's key covers how routes are simplified.
+
+        Edge Cases:
+            - Same GPS data, other route parameters: GPX and route rewritten
+        """
+        Path(trip[1]).mkdir()
+        self.rerun(trip, fake_tools)
+        gpx = Path(trip[1]) / "faroe.gpx"
+        mtime = gpx.stat().st_mtime_ns
+
+        monkeypatch.setattr(module, "ROUTE_PARAMS", (5, 500, 10.0, 20))
+        time.sleep(0.01)
+        _, scans, calls = self.rerun(trip, fake_tools)
+
+        assert (scans, calls) == (0, 0)
+        assert gpx.stat().st_mtime_ns != mtime
@@ -0,0 +1,266 @@
+"""
+Test suite for the benchmark tooling.
+
+Tests cover:
+- The synthetic photo-library generator
+- A small end-to-end benchmark run
+- Baseline comparison and regression flagging
+- The synthetic JPEG/HEIC corpus and its metadata
+"""
+
+import json
+import shutil
+import struct
+import subprocess
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from PIL import Image, IptcImagePlugin
+    from tests.benchmarks.__main__ import main
+    from tests.benchmarks.corpus import generate_corpus
+    from tests.benchmarks.pipeline import STAGES, compare, parse_sizes, run_benchmarks
+    from tests.test_helpers import MockGeocoder, TestDataGenerator
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Benchmark import failed: {e}", allow_module_level=True)
+
+
+def result_doc(**seconds):
+    """Result document for the 1k library with the given stage times."""
+    return {"results": {"1k": {"photos": 1000, "stages": {
+        stage: {"seconds": s} for stage, s in seconds.items()
+    }}}}
+
+
+def heif_items(data):
+    """item_ID -> bytes of a HEIF file, from its iloc box."""
+    def boxes(buf, start, end):
+        while start < end:
+            size, kind = struct.unpack(">I4s", buf[start:start + 8])
+            yield kind, start + 8, start + size
+            start += size
+
+    items = {}
+    for kind, body, end in boxes(data, 0, len(data)):
+        if kind == b"meta":
+            for sub, sbody, send in boxes(data, body + 4, end):
+                if sub == b"iloc":
+                    count = struct.unpack(">H", data[sbody + 6:sbody + 8])[0]
+                    for n in range(count):
+                        item, _, _, offset, length = struct.unpack(
+                            ">HHHII", data[sbody + 8 + 14 * n:sbody + 22 + 14 * n])
+                        items[item] = data[offset:offset + length]
+    return items
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    """Small corpus shared by the corpus tests: (root, ground truth)."""
+    root = tmp_path_factory.mktemp("corpus")
+    truth = generate_corpus(str(root), 60, photos_per_trip=20, size_kb=40,
+                            heic_ratio=0.25, rated_ratio=0.5, seed=1)
+    return root, truth
+
+
+class TestPhotoLibrary:
+    """Test the synthetic library generator."""
+
+    def test_library_is_deterministic_and_complete(self):
+        """
+        Test library shape.
+
+        Expected:
+            - Same seed, same records
+            - Trips split at photos_per_trip, file names unique
+            - Every trip geocodes to a MockGeocoder city
+        """
+        first = list(TestDataGenerator.iter_photo_library(1050, photos_per_trip=100, seed=3))
+        again = list(TestDataGenerator.iter_photo_library(1050, photos_per_trip=100, seed=3))
+
+        assert first == again
+        assert [len(r) for _, r in first] == [100] * 10 + [50]
+        names = [p["FileName"] for _, records in first for p in records]
+        assert len(set(names)) == 1050
+
+        geocoder = MockGeocoder()
+        for _, records in first:
+            p = records[0]
+            assert geocoder.reverse((p["GPSLatitude"], p["GPSLongitude"])) is not None
+
+    def test_trip_spans_requested_days(self):
+        """
+        Test the date spread within a trip.
+
+        Edge Cases:
+            - Photos per trip not divisible by days
+        """
+        (_, records), = TestDataGenerator.iter_photo_library(95, photos_per_trip=95, days_per_trip=10)
+        days = {p["DateTimeOriginal"][:10] for p in records}
+        assert len(days) == 10
+
+
+class TestBenchmarkRun:
+    """Test a benchmark run end to end."""
+
+    def test_small_run_times_every_stage(self):
+        """
+        Test the result document.
+
+        Expected:
+            - One entry per size, every stage timed
+        """
+        data = run_benchmarks([200], repeat=1, photos_per_trip=50)
+
+        result = data["results"]["200"]
+        assert result["trips"] == 4
+        assert set(result["stages"]) == set(STAGES)
+        assert all(s["seconds"] > 0 for s in result["stages"].values())
+
+    @pytest.mark.parametrize("text,expected", [
+        ("1k,10k", [1_000, 10_000]),
+        ("100K,1m", [100_000, 1_000_000]),
+        ("2500", [2_500]),
+    ])
+    def test_parse_sizes(self, text, expected):
+        """Test size shorthands."""
+        assert parse_sizes(text) == expected
+
+
+class TestCompare:
+    """Test regression detection."""
+
+    def test_slowdown_beyond_threshold_flagged(self):
+        """
+        Test flagging.
+
+        Expected:
+            - 50% slower: regression
+            - 10% slower or faster: fine
+        """
+        rows = compare(result_doc(analyze=1.0, gpx=1.0, featured=1.0),
+                       result_doc(analyze=1.5, gpx=1.1, featured=0.5), threshold=0.2)
+
+        assert {r["stage"]: r["regression"] for r in rows} == {
+            "analyze": True, "gpx": False, "featured": False,
+        }
+
+    @pytest.mark.edge_case
+    def test_noise_and_missing_entries_ignored(self):
+        """
+        Test what isn't compared.
+
+        Edge Cases:
+            - Sub-millisecond stages tripling is noise
+            - Stages or sizes missing on one side are skipped
+        """
+        baseline = result_doc(geocode=0.0005, gpx=1.0)
+        baseline["results"]["1m"] = result_doc(gpx=9.0)["results"]["1k"]
+
+        rows = compare(baseline, result_doc(geocode=0.0015, analyze=3.0))
+
+        assert [(r["size"], r["stage"], r["regression"]) for r in rows] == [("1k", "geocode", False)]
+
+    def test_cli_exit_code(self, temp_dir, capsys):
+        """
+        Test `python -m tests.benchmarks compare`.
+
+        Expected:
+            - Exit 1 on a regression, 0 otherwise, 2 without a baseline
+        """
+        base, slow = temp_dir / "base.json", temp_dir / "slow.json"
+        base.write_text(json.dumps(result_doc(gpx=1.0)))
+        slow.write_text(json.dumps(result_doc(gpx=2.0)))
+
+        assert main(["compare", str(base), str(slow)]) == 1
+        assert "regression" in capsys.readouterr().out
+        assert main(["compare", str(base), str(base)]) == 0
+        assert main(["compare", str(temp_dir / "none.json"), str(base)]) == 2
+
+
+class TestCorpus:
+    """Test the synthetic photo corpus."""
+
+    def test_layout_and_ground_truth(self, corpus):
+        """
+        Test the directory tree.
+
+        Expected:
+            - content/trips/<Country>/<City>/ with Hugo index pages
+            - corpus.json lists every file, both JPEG and HEIC
+        """
+        root, truth = corpus
+        assert json.loads((root / "corpus.json").read_text()) == truth
+        assert all((root / r["SourceFile"]).exists() for r in truth)
+        assert (root / "content/trips/Faroe Islands/Tórshavn/index.md").exists()
+        assert (root / "content/trips/Denmark/_index.md").exists()
+        assert {r["FileName"].rsplit(".", 1)[1] for r in truth} == {"jpg", "heic"}
+
+    def test_jpeg_metadata_round_trip(self, corpus):
+        """
+        Test what a reader gets back from a JPEG.
+
+        Expected:
+            - Decodable image of roughly the requested size
+            - Exif date and GPS match the ground truth
+            - XMP rating and IPTC city are present
+        """
+        root, truth = corpus
+        record = next(r for r in truth if r["FileName"].endswith(".jpg") and "Rating" in r)
+        path = root / record["SourceFile"]
+
+        with Image.open(path) as im:
+            im.load()
+            exif = im.getexif()
+            gps = exif.get_ifd(0x8825)
+            lat = sum(float(v) / 60 ** n for n, v in enumerate(gps[2]))
+            assert exif.get_ifd(0x8769)[0x9003] == record["DateTimeOriginal"]
+            assert lat == pytest.approx(record["GPSLatitude"], abs=1e-6)
+            assert gps[3] == ("W" if record["GPSLongitude"] < 0 else "E")
+            assert f'xmp:Rating="{record["Rating"]}"'.encode() in im.info["xmp"]
+            iptc = IptcImagePlugin.getiptcinfo(im)
+        assert iptc[(2, 90)].decode() in record["SourceFile"]
+        assert 20_000 < path.stat().st_size < 80_000
+
+    def test_heic_exif_item(self, corpus):
+        """
+        Test the HEIC container.
+
+        Expected:
+            - 'heic' brand, Exif item readable as TIFF with the right date
+        """
+        root, truth = corpus
+        record = next(r for r in truth if r["FileName"].endswith(".heic"))
+        data = (root / record["SourceFile"]).read_bytes()
+        assert data[8:12] == b"heic"
+
+        item = heif_items(data)[2]
+        exif = Image.Exif()
+        exif.load(item[4 + struct.unpack(">I", item[:4])[0]:])
+        assert exif.get_ifd(0x8769)[0x9003] == record["DateTimeOriginal"]
+
+    @pytest.mark.integration
+    @pytest.mark.skipif(shutil.which("exiftool") is None, reason="exiftool not installed")
+    def test_exiftool_reads_ground_truth(self, corpus):
+        """
+        Test the corpus against exiftool, as the scripts read it.
+
+        Expected:
+            - GPS, date, rating and title match corpus.json for every file
+        """
+        root, truth = corpus
+        out = subprocess.run(
+            ["exiftool", "-n", "-json", "-r", "-GPSLatitude", "-GPSLongitude",
+             "-DateTimeOriginal", "-Rating", "-Title", str(root / "content")],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        found = {r["SourceFile"].split("/")[-1]: r for r in json.loads(out)}
+        for r in truth:
+            got = found[r["FileName"]]
+            assert got["GPSLatitude"] == pytest.approx(r["GPSLatitude"], abs=1e-6)
+            assert got["GPSLongitude"] == pytest.approx(r["GPSLongitude"], abs=1e-6)
+            assert got["DateTimeOriginal"] == r["DateTimeOriginal"]
+            assert got.get("Rating") == r.get("Rating")
+            assert got["Title"] == r["Title"]
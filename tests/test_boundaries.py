@@ -0,0 +1,344 @@
+"""
+Test suite for the offline country/state boundary index.
+
+Tests cover:
+- Point in polygon with holes, multipolygons and overlapping claims
+- The STR-packed R-tree and the banded polygon test against brute force
+- Countries and admin-1 regions together
+- The geocoder chain taking state and country from the polygons
+- shapely engine parity and throughput (when shapely is installed)
+"""
+
+import contextlib
+import io
+import json
+import math
+import random
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts import smart_gps_extract
+    from scripts.boundaries import (
+        Boundaries, BoundaryIndex, PreparedPolygon, Region, _query, load_boundaries, str_pack,
+    )
+    from scripts.geocoder_chain import Gazetteer, GeocoderChain, Place, make_chain
+    from scripts.geocoding import GeocodeSettings, Throttle
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+def zigzag_border(x, teeth=20):
+    """A north-south border at longitude `x` wobbling ±0.5° (lat 0..10)."""
+    return [[x + (0.5 if i % 2 else -0.5), 10 * i / teeth] for i in range(teeth + 1)]
+
+
+def feature(name, geometry, **props):
+    return {"type": "Feature", "properties": {"NAME_LONG": name, **props}, "geometry": geometry}
+
+
+@pytest.fixture
+def countries(tmp_path):
+    """Westland | Eastland along a zigzag at lon 10; an enclave in Westland; island parts."""
+    border = zigzag_border(10)
+    west = [[0, 0], *border, [0, 10], [0, 0]]
+    east = [[20, 0], [20, 10], *reversed(border), [20, 0]]
+    path = tmp_path / "countries.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        feature("Westland", {"type": "Polygon", "coordinates": [west, square(2, 2, 3, 3)]}),
+        feature("Eastland", {"type": "Polygon", "coordinates": [east]}),
+        feature("Enclave", {"type": "Polygon", "coordinates": [square(2, 2, 3, 3)]}),
+        feature("Islands", {"type": "MultiPolygon", "coordinates": [[square(30, 0, 31, 1)], [square(40, 5, 41, 6)]]}),
+        feature("Greater Eastland", {"type": "Polygon", "coordinates": [square(15, 0, 25, 10)]}),
+    ]}), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def admin1(tmp_path):
+    """Two Westland provinces split at lat 5 (coarser than the border), one Eastland province."""
+    path = tmp_path / "admin1.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": "South", "admin": "Westland"},
+         "geometry": {"type": "Polygon", "coordinates": [square(0, 0, 10, 5)]}},
+        {"type": "Feature", "properties": {"name": "North", "admin": "Westland"},
+         "geometry": {"type": "Polygon", "coordinates": [square(0, 5, 9.5, 10)]}},
+        {"type": "Feature", "properties": {"name_en": "Capital Region", "name": "Hovedstaden", "admin": "Eastland"},
+         "geometry": {"type": "Polygon", "coordinates": [square(10.5, 0, 20, 10)]}},
+    ]}), encoding="utf-8")
+    return str(path)
+
+
+def name(region):
+    return region.name if region else None
+
+
+class TestBoundaryIndex:
+    """Test point-in-polygon lookups."""
+
+    def test_both_sides_of_a_jagged_border(self, countries):
+        """
+        Test points on either side of a zigzag border.
+
+        Expected:
+            - Each point in the country whose polygon contains it, even where the
+              border bulges past the other country's nearest territory
+        """
+        index = BoundaryIndex.from_geojson(countries, use_shapely=False)
+        # Tooth at lat 0.5 bulges east to lon 10.5; at lat 1.0 west to 9.5
+        assert name(index.locate(0.5, 10.3)) == "Westland"
+        assert name(index.locate(1.0, 9.7)) == "Eastland"
+        assert name(index.locate(5.0, 1.0)) == "Westland"
+
+    def test_holes_and_multipolygons(self, countries):
+        """
+        Test an enclave and a country in several parts.
+
+        Expected:
+            - A point in the hole belongs to the enclave, not the surrounding country
+            - Every part of a multipolygon answers; the sea between them doesn't
+        """
+        index = BoundaryIndex.from_geojson(countries, use_shapely=False)
+
+        assert name(index.locate(2.5, 2.5)) == "Enclave"
+        assert name(index.locate(0.5, 30.5)) == "Islands"
+        assert name(index.locate(5.5, 40.5)) == "Islands"
+        assert index.locate(3.0, 35.0) is None
+
+    @pytest.mark.edge_case
+    def test_overlapping_claims(self, countries):
+        """
+        Test polygons that overlap.
+
+        Edge Case:
+            - The feature listed first in the file wins
+        """
+        index = BoundaryIndex.from_geojson(countries, use_shapely=False)
+
+        assert name(index.locate(5.0, 18.0)) == "Eastland"
+        assert name(index.locate(5.0, 22.0)) == "Greater Eastland"
+
+    def test_bulk_matches_single(self, countries):
+        """
+        Test locate_many over repeated and scattered points.
+
+        Expected:
+            - Same answers as one point at a time, in order
+        """
+        index = BoundaryIndex.from_geojson(countries, use_shapely=False)
+        rng = random.Random(1)
+        points = [(rng.uniform(-1, 11), rng.uniform(-1, 42)) for _ in range(300)] * 2
+
+        assert index.locate_many(points) == [index.locate(lat, lon) for lat, lon in points]
+        assert index.locate_many([]) == []
+
+
+class TestStructures:
+    """Test the pure-Python R-tree and prepared polygons against brute force."""
+
+    def test_str_tree_finds_every_box(self):
+        """
+        Test an R-tree over many random boxes.
+
+        Expected:
+            - A point query returns exactly the boxes containing the point
+        """
+        rng = random.Random(2)
+        boxes = []
+        for _ in range(2000):
+            x, y = rng.uniform(-180, 170), rng.uniform(-80, 70)
+            boxes.append((x, y, x + rng.uniform(0, 10), y + rng.uniform(0, 10)))
+        root = str_pack(boxes)
+
+        for _ in range(200):
+            lon, lat = rng.uniform(-180, 180), rng.uniform(-80, 80)
+            found = []
+            _query(root, lon, lat, found)
+            expected = [i for i, b in enumerate(boxes) if b[0] <= lon <= b[2] and b[1] <= lat <= b[3]]
+            assert sorted(found) == expected
+
+    def test_banded_polygon_matches_plain_ray_casting(self):
+        """
+        Test a star-shaped polygon with thousands of vertices.
+
+        Expected:
+            - Same inside/outside answers as ray casting over every edge
+        """
+        rng = random.Random(3)
+        ring = []
+        for i in range(4000):
+            angle = 2 * math.pi * i / 4000
+            r = 5 + rng.uniform(-2, 2)
+            ring.append((10 + r * math.cos(angle), 50 + r * math.sin(angle)))
+        polygon = PreparedPolygon([ring])
+        assert polygon.bands > 1
+
+        def plain(x, y):
+            inside = False
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    inside = not inside
+            return inside
+
+        for _ in range(300):
+            x, y = rng.uniform(2, 18), rng.uniform(42, 58)
+            assert polygon.contains(x, y) == plain(x, y)
+
+
+class TestBoundaries:
+    """Test countries and states together."""
+
+    def test_state_and_country(self, countries, admin1):
+        """
+        Test both files loaded.
+
+        Expected:
+            - (state, country) per point; admin-1 named in English where available
+            - Outside everything: ("", "")
+        """
+        boundaries = Boundaries(BoundaryIndex.from_geojson(countries, use_shapely=False),
+                                load_boundaries(None, admin1).admin1)
+
+        assert boundaries.lookup_many([(2.0, 4.0), (7.0, 4.0), (5.0, 15.0), (50.0, 50.0)]) == [
+            ("South", "Westland"), ("North", "Westland"), ("Capital Region", "Eastland"), ("", "")]
+
+    @pytest.mark.edge_case
+    def test_files_disagree_at_the_border(self, countries, admin1):
+        """
+        Test a point the country file puts in Eastland but the admin-1 file in a Westland province.
+
+        Edge Case:
+            - The country wins and the other country's state is dropped
+            - Without a country file, the state's own country is used
+        """
+        boundaries = load_boundaries(countries, admin1)
+        assert boundaries.lookup(1.0, 9.7) == ("", "Eastland")
+        assert load_boundaries(None, admin1).lookup(1.0, 9.7) == ("South", "Westland")
+
+
+class TestChainRegions:
+    """Test state and country from polygons in the geocoder chain."""
+
+    def test_polygon_overrides_nearest_place(self, countries, admin1):
+        """
+        Test a gazetteer whose nearest city is across the border.
+
+        Expected:
+            - The city from the gazetteer, state and country from the polygons
+        """
+        gazetteer = Gazetteer([(1.0, 9.8, Place("Eastville", "Capital Region", "Eastland"))], radius_km=100)
+        chain = GeocoderChain([gazetteer], regions=load_boundaries(countries, admin1))
+
+        # The border runs through lon 9.5 at lat 1.0
+        assert chain.lookup(1.0, 9.3) == (Place("Eastville", "South", "Westland"), "gazetteer")
+        assert chain.lookup(1.0, 9.9) == (Place("Eastville", "Capital Region", "Eastland"), "gazetteer")
+
+    def test_country_without_a_city(self, countries):
+        """
+        Test a point no provider knows.
+
+        Expected:
+            - An Unknown city in the polygon's country, from "boundaries"
+            - Without admin-1 polygons, a provider's state is kept when the country agrees
+        """
+        chain = GeocoderChain([Gazetteer([(5.0, 18.0, Place("Easton", "East Province", "Eastland"))])],
+                              regions=load_boundaries(countries))
+
+        assert chain.lookup(5.0, 1.0) == (Place("Unknown", "", "Westland"), "boundaries")
+        assert chain.lookup(5.0, 18.1)[0] == Place("Easton", "East Province", "Eastland")
+
+    def test_make_chain_and_day_votes(self, countries, monkeypatch):
+        """
+        Test --boundaries with smart-gps-extract.
+
+        Expected:
+            - The day's country is the one most of its photos fall in
+        """
+        settings = GeocodeSettings(boundaries=countries)
+        assert make_chain(object(), Throttle(0), settings=settings).regions is not None
+
+        class Geocoder:
+            domain = "boundaries.test"
+
+            def reverse(self, query, language=None):
+                return SimpleNamespace(raw={"address": {"city": "Bordertown", "country": "Eastland"}})
+
+        module = smart_gps_extract.smart_gps_extract_main
+        monkeypatch.setattr(module, "make_geocoder", lambda url=None: Geocoder())
+        photos = {"2025-08-15": [{"lat": 5.0, "lon": 1.0 + i * 0.1} for i in range(5)]
+                  + [{"lat": 5.0, "lon": 15.0}]}
+        with contextlib.redirect_stdout(io.StringIO()):
+            locations = module.reverse_geocode_locations(photos, ["2025-08-15"], throttle=Throttle(0),
+                                                         geocode_settings=settings)
+
+        assert locations["2025-08-15"]["primary"] == "Bordertown"
+        assert locations["2025-08-15"]["country"] == "Westland"
+
+
+class TestShapely:
+    """Test the shapely engine (skipped without shapely)."""
+
+    def test_same_answers_as_pure_python(self, countries):
+        """
+        Test both engines over random points.
+
+        Expected:
+            - Identical regions
+        """
+        pytest.importorskip("shapely")
+        rng = random.Random(4)
+        points = [(rng.uniform(-1, 11), rng.uniform(-1, 42)) for _ in range(2000)]
+        python = BoundaryIndex.from_geojson(countries, use_shapely=False)
+        fast = BoundaryIndex.from_geojson(countries, use_shapely=True)
+
+        assert fast.engine == "shapely"
+        # Points exactly on an edge may differ; random floats never are
+        assert fast.locate_many(points) == python.locate_many(points)
+
+    def test_same_answers_over_many_regions(self):
+        """
+        Test both engines against a 1°-grid of 3,600 regions.
+
+        Expected:
+            - Identical regions, with a pure-Python R-tree several levels deep
+        """
+        pytest.importorskip("shapely")
+        features = [(Region(f"{x},{y}"), {"type": "Polygon", "coordinates": [square(x, y, x + 1, y + 1)]})
+                    for x in range(60) for y in range(60)]
+        rng = random.Random(6)
+        points = [(rng.uniform(-1, 61), rng.uniform(-1, 61)) for _ in range(20_000)]
+        python = BoundaryIndex(features, use_shapely=False)
+
+        assert not python._root[2]  # the root is not a leaf
+        assert BoundaryIndex(features, use_shapely=True).locate_many(points) == python.locate_many(points)
+
+    @pytest.mark.slow
+    def test_bulk_throughput(self):
+        """
+        Test 200k points against a 1°-grid of 3,600 regions.
+
+        Expected:
+            - Over 100k points per second
+        """
+        pytest.importorskip("shapely")
+        features = [(Region(f"{x},{y}"), {"type": "Polygon", "coordinates": [square(x, y, x + 1, y + 1)]})
+                    for x in range(60) for y in range(60)]
+        index = BoundaryIndex(features, use_shapely=True)
+        rng = random.Random(5)
+        points = [(rng.uniform(0, 60), rng.uniform(0, 60)) for _ in range(200_000)]
+
+        start = time.perf_counter()
+        found = index.locate_many(points)
+        rate = len(points) / (time.perf_counter() - start)
+
+        assert found[0].name == f"{int(points[0][1])},{int(points[0][0])}"
+        assert rate > 100_000
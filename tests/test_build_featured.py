@@ -0,0 +1,373 @@
+"""
+Test suite for the featured home-gallery builder.
+
+Tests cover:
+- Thumbnail sizing that mirrors Hugo's `fit` processing
+- Dominant colour and LQIP placeholder generation
+- Server-side justified layout (port of the theme's gallery.js)
+- Bounded top-K featured selection with per-page caps and date decay
+- Pagination into an inline first screen and fixed-size JSON pages
+"""
+
+import base64
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Add scripts to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from PIL import Image
+    from scripts.build_featured import (
+        FeaturedSelector, compute_layouts, featured_item, fit_size, main, paginate, placeholder,
+    )
+    from scripts.justified_layout import layout_gallery
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+class TestFitSize:
+    """Test thumbnail sizing against Hugo's `fit 600x600`."""
+
+    @pytest.mark.parametrize("width,height,expected", [
+        (5184, 2916, (600, 338)),   # Landscape 16:9 camera frame
+        (2916, 5184, (338, 600)),   # Portrait
+        (4000, 4000, (600, 600)),   # Square
+        (400, 300, (400, 300)),     # Already small: never upscaled
+        (600, 100, (600, 100)),     # Exactly on the box edge
+    ])
+    def test_fit_size(self, width, height, expected):
+        """
+        Test downscale-only fit with half-up rounding.
+
+        Edge Cases:
+            - Images smaller than the box keep their size
+            - Portrait and landscape scale on the longer edge
+        """
+        assert fit_size(width, height) == expected
+
+
+class TestPlaceholder:
+    """Test dominant colour and LQIP precomputation."""
+
+    def test_solid_image(self, temp_dir):
+        """
+        Test placeholder for a solid-colour JPEG.
+
+        Expected:
+            - Thumbnail size follows fit_size
+            - Dominant colour is close to the fill colour
+            - LQIP is a small base64 JPEG data URI
+        """
+        path = temp_dir / "solid.jpg"
+        Image.new("RGB", (1200, 800), (200, 40, 40)).save(path, quality=95)
+
+        result = placeholder(str(path))
+
+        assert (result["width"], result["height"]) == (600, 400)
+        r, g, b = (int(result["color"][i:i + 2], 16) for i in (1, 3, 5))
+        assert abs(r - 200) < 16 and abs(g - 40) < 16 and abs(b - 40) < 16
+        assert result["lqip"].startswith("data:image/jpeg;base64,")
+        data = base64.b64decode(result["lqip"].split(",", 1)[1])
+        assert len(data) < 2048, "LQIP should stay tiny"
+
+    def test_exif_rotation_swaps_size(self, temp_dir):
+        """
+        Test that EXIF Orientation 6 (rotated 90°) swaps width and height.
+
+        Edge Case:
+            - Camera stores landscape pixels with a portrait orientation tag
+        """
+        path = temp_dir / "rotated.jpg"
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (1200, 800), (10, 10, 10)).save(path, exif=exif)
+
+        result = placeholder(str(path))
+
+        assert (result["width"], result["height"]) == (400, 600)
+
+    def test_unreadable_file(self, temp_dir):
+        """
+        Test that an undecodable file yields no placeholder.
+
+        Edge Case:
+            - Corrupt or non-image file in the trips tree
+        """
+        path = temp_dir / "broken.jpg"
+        path.write_bytes(b"not a jpeg")
+
+        assert placeholder(str(path)) == {}
+
+    def test_decompression_bomb(self, temp_dir, monkeypatch):
+        """
+        Test that an image past Pillow's pixel limit yields no placeholder.
+
+        Edge Case:
+            - Huge stitched panorama: DecompressionBombError is not an OSError
+        """
+        path = temp_dir / "panorama.jpg"
+        Image.new("RGB", (1200, 800), (10, 10, 10)).save(path)
+        monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+
+        assert placeholder(str(path)) == {}
+
+
+class TestJustifiedLayout:
+    """Test the Python port of the justified layout."""
+
+    def test_full_rows_span_container(self):
+        """
+        Test that every completed row spans the container width.
+
+        Expected:
+            - Boxes in one row share top and height
+            - Row widths plus spacing equal the container width
+        """
+        aspect_ratios = [1.5, 0.667, 1.5, 1.5, 1.0, 1.778, 0.667, 1.5, 1.5]
+        layout = layout_gallery(aspect_ratios, 1024, spacing=14, row_height=340)
+
+        rows = {}
+        for box in layout["boxes"]:
+            rows.setdefault(round(box["top"], 3), []).append(box)
+
+        for boxes in rows.values():
+            assert len({round(b["height"], 6) for b in boxes}) == 1
+            width = sum(b["width"] for b in boxes) + 14 * (len(boxes) - 1)
+            assert width == pytest.approx(1024, abs=1)
+
+    def test_lone_widow_is_capped_and_centered(self):
+        """
+        Test the last-row fill rule for a single trailing portrait.
+
+        Edge Case:
+            - A lone widow may grow to at most 1.9x the target row height,
+              then is centred instead of stretched
+        """
+        layout = layout_gallery([1.5, 1.5, 0.5], 1024, spacing=8, row_height=288)
+        widow = layout["boxes"][-1]
+
+        assert widow["height"] == pytest.approx(288 * 1.9)
+        assert widow["left"] == pytest.approx((1024 - widow["width"]) / 2)
+        assert layout["container_height"] == pytest.approx(widow["top"] + widow["height"])
+
+    def test_empty_gallery(self):
+        """
+        Test layout of an empty gallery.
+
+        Edge Case:
+            - No photos should give no boxes rather than an error
+        """
+        assert layout_gallery([], 1024)["boxes"] == []
+
+
+class TestComputeLayouts:
+    """Test per-breakpoint layout emission for the data file."""
+
+    PARAMS = {"targetRowHeight": 340, "boxSpacing": 14, "targetRowHeightTolerance": 0.25}
+
+    def test_boxes_are_percentages(self):
+        """
+        Test that each item gets one box per breakpoint, in percent.
+
+        Expected:
+            - One breakpoint entry per width, the first starting at 0
+            - Every box lies within the container (0..100%)
+        """
+        items = [{"width": 600, "height": 400}, {"width": 400, "height": 600},
+                 {"width": 600, "height": 338}, {"width": 600, "height": 600}]
+
+        breakpoints = compute_layouts(items, self.PARAMS, widths=(360, 1024))
+
+        assert [bp["min"] for bp in breakpoints] == [0, 1024]
+        for item in items:
+            assert len(item["boxes"]) == 2
+            for left, top, width, height in item["boxes"]:
+                assert 0 <= left and left + width <= 100.01
+                assert 0 <= top and top + height <= 100.01
+
+    def test_missing_size_skips_layout(self):
+        """
+        Test that one item without a thumbnail size disables the static layout.
+
+        Edge Case:
+            - A photo Pillow could not decode; the page falls back to gallery.js
+        """
+        items = [{"width": 600, "height": 400}, {}]
+
+        assert compute_layouts(items, self.PARAMS) == []
+        assert "boxes" not in items[0]
+
+
+def _candidate(page, src, rating, date):
+    return {"page": page, "src": src, "rating": rating, "date": date, "title": ""}
+
+
+class TestFeaturedSelection:
+    """Test the streaming featured selection engine."""
+
+    def test_matches_full_sort_without_caps(self):
+        """
+        Test that an uncapped selector ranks like sorting everything.
+
+        Expected:
+            - Highest rating first, then newest, ties in stream order
+        """
+        rng = random.Random(7)
+        items = [
+            _candidate(f"trips/T{rng.randrange(5)}", f"IMG_{n}.jpg", rng.randint(3, 5),
+                       f"2025:0{rng.randint(1, 9)}:1{rng.randint(0, 9)} 12:00:00")
+            for n in range(200)
+        ]
+        selector = FeaturedSelector(limit=200)
+        for item in items:
+            selector.push(item)
+
+        expected = sorted(items, key=lambda i: (i["rating"], i["date"]), reverse=True)
+        assert selector.ranked() == expected
+
+    def test_per_page_cap_and_limit(self):
+        """
+        Test per-trip quotas and the overall limit.
+
+        Scenario:
+            - One prolific trip with 50 five-star photos, two smaller trips
+        Expected:
+            - The prolific trip contributes only its best `per_page`
+            - Other trips fill the remaining slots
+        """
+        selector = FeaturedSelector(limit=10, per_page=4)
+        for n in range(50):
+            selector.push(_candidate("trips/Ecuador", f"E{n:02d}.jpg", 5, f"2023:10:05 10:{n:02d}:00"))
+        for n in range(3):
+            selector.push(_candidate("trips/Japan", f"J{n}.jpg", 4, "2025:07:25 10:00:00"))
+            selector.push(_candidate("trips/Italy", f"I{n}.jpg", 3, "2025:06:21 10:00:00"))
+
+        ranked = selector.ranked()
+
+        assert [i["src"] for i in ranked if i["page"] == "trips/Ecuador"] == ["E49.jpg", "E48.jpg", "E47.jpg", "E46.jpg"]
+        assert len(ranked) == 10
+        assert selector.seen == 56
+
+    def test_memory_is_bounded_by_pages(self):
+        """
+        Test that retained candidates do not grow with the archive.
+
+        Expected:
+            - Pool size is pages x per_page however many photos stream through
+        """
+        selector = FeaturedSelector(limit=60, per_page=8)
+        for n in range(20000):
+            selector.push(_candidate(f"trips/T{n % 10}", f"IMG_{n}.jpg", 3 + n % 3, "2024:01:01 00:00:00"))
+
+        assert len(selector.ranked()) == 10 * 8
+
+    def test_date_decay(self):
+        """
+        Test optional date decay.
+
+        Scenario:
+            - A 5-star photo from two years ago vs a fresh 4-star one
+        Expected:
+            - With a one-year half-life the fresh photo ranks first
+            - Without decay the 5-star photo wins
+        """
+        now = datetime(2025, 10, 1)
+        old = _candidate("trips/Ecuador", "old.jpg", 5, "2023:10:01 12:00:00")
+        new = _candidate("trips/Japan", "new.jpg", 4, "2025:09:01 12:00:00")
+
+        decayed = FeaturedSelector(limit=2, half_life_days=365, now=now)
+        plain = FeaturedSelector(limit=2, now=now)
+        for selector in (decayed, plain):
+            selector.push(old)
+            selector.push(new)
+
+        assert [i["src"] for i in decayed.ranked()] == ["new.jpg", "old.jpg"]
+        assert [i["src"] for i in plain.ranked()] == ["old.jpg", "new.jpg"]
+
+    @pytest.mark.parametrize("record,expected_title", [
+        ({"SourceFile": "content/trips/Japan/a.jpg", "Rating": 4, "Title": "Tokyo"}, "Tokyo"),
+        ({"SourceFile": "content/trips/Japan/a.jpg", "Rating": 4,
+          "ImageDescription": "OLYMPUS DIGITAL CAMERA"}, ""),
+    ])
+    def test_featured_item(self, record, expected_title):
+        """
+        Test conversion of an exiftool record into a candidate.
+
+        Edge Case:
+            - Camera-default descriptions are dropped as titles
+        """
+        item = featured_item(record, min_rating=3)
+
+        assert item["page"] == "trips/Japan"
+        assert item["title"] == expected_title
+        assert featured_item({**record, "Rating": 2}, min_rating=3) is None
+
+
+class TestPagination:
+    """Test splitting the featured list for infinite scroll."""
+
+    @pytest.mark.parametrize("total,expected_pages", [
+        (10, []),             # Everything fits on the first screen
+        (24, []),             # Exactly one screen
+        (25, [1]),            # One straggler page
+        (80, [24, 24, 8]),    # Full pages plus a partial last page
+    ])
+    def test_page_sizes(self, total, expected_pages):
+        """
+        Test inline/page split sizes.
+
+        Args:
+            total: Number of selected photos
+            expected_pages: Expected sizes of the JSON pages
+        """
+        items = [{"src": f"IMG_{n}.jpg"} for n in range(total)]
+
+        first, pages = paginate(items, inline=24, page_size=24)
+
+        assert len(first) == min(total, 24)
+        assert [len(p) for p in pages] == expected_pages
+        assert first + [i for p in pages for i in p] == items, "Order must be preserved"
+
+    def test_each_page_has_its_own_layout(self):
+        """
+        Test that a page's layout is independent of the inline block.
+
+        Expected:
+            - One container height per breakpoint for every page
+        """
+        items = [{"width": 600, "height": 400 + n % 3 * 100} for n in range(30)]
+        params = {"targetRowHeight": 340, "boxSpacing": 14, "targetRowHeightTolerance": 0.25}
+
+        first, pages = paginate(items, inline=20, page_size=5)
+        heights = [[bp["height"] for bp in compute_layouts(p, params, widths=(360, 1024))] for p in pages]
+
+        assert len(pages) == 2
+        assert all(len(h) == 2 and all(v > 0 for v in h) for h in heights)
+        assert all(len(i["boxes"]) == 2 for p in pages for i in p)
+
+    @pytest.mark.edge_case
+    @pytest.mark.parametrize("argv,message", [
+        (["--page-size", "0"], "--page-size: must be at least 1, got 0"),
+        (["--page-size", "-3"], "--page-size: must be at least 1, got -3"),
+        (["--inline", "-1"], "--inline: must be at least 0, got -1"),
+    ])
+    def test_bad_sizes_rejected(self, argv, message, monkeypatch, capsys):
+        """
+        Test that page sizes that would break pagination stop at parsing.
+
+        Edge Cases:
+            - Zero or negative page size, negative inline count: usage error, no traceback
+        """
+        monkeypatch.setattr(sys, "argv", ["build_featured.py", *argv])
+
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+        assert exit_info.value.code == 2
+        assert message in capsys.readouterr().err
+
@@ -0,0 +1,223 @@
+"""
+Test suite for build_search.py.
+
+Tests cover:
+- Search terms: accents, partial dates, front coding and posting lists
+- Documents from front matter, file names and trip summaries
+- Prefix and all-words lookups, with the index split into many small shards
+- Incremental rebuilds: unchanged files kept, stale ones removed
+"""
+
+import json
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import yaml  # noqa: F401
+    from scripts.build_search import (build, encode_postings, front_code, front_decode, photo_date,
+                                      search, shard_terms, tokens)
+    from scripts.route_codec import decode_values
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def write_page(path, front_matter, *photos):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / ("_index.md" if front_matter.pop("section", False) else "index.md")).write_text(
+        "---\n" + yaml.safe_dump(front_matter, allow_unicode=True) + "---\n\nSome text.\n", encoding="utf-8")
+    for photo in photos:
+        (path / photo).write_bytes(b"")
+
+
+@pytest.fixture
+def site(tmp_path):
+    """content/trips with a section, two trips and a draft, gpx/ with one summary."""
+    trips = tmp_path / "content" / "trips"
+    write_page(trips / "Denmark", {
+        "title": "Denmark", "date": "2025-08-20", "tags": ["coastline", "scandinavia"],
+        "resources": [{"src": "20250820-P8200150.jpeg", "title": "Danish coastal landscape"},
+                      {"src": "*.jpeg", "title": "Cityscape detail"}],
+    }, "20250820-P8200150.jpeg", "20250821-P8210193.jpeg", "notes.txt")
+    write_page(trips / "Faroe Islands", {"section": True, "title": "Faroe Islands", "date": "2025-08-12"})
+    write_page(trips / "Faroe Islands" / "Streymoy", {"title": "Streymoy", "date": "2025-08-13", "track": "faroe-2025"},
+               "20250813-P8130001.jpg", "20250814-P8140037.jpg")
+    write_page(trips / "Japan", {"title": "Japan", "draft": True}, "20240401-P4010001.jpg")
+    gpx = tmp_path / "gpx"
+    gpx.mkdir()
+    (gpx / "faroe-2025-summary.json").write_text(json.dumps({
+        "cities_visited": ["Tórshavn", "Vestmanna"],
+        "countries_visited": ["Faroe Islands"],
+        "daily_locations": [
+            {"date": "2025-08-13", "all_cities": ["Tórshavn"], "state": "Streymoy", "country": "Faroe Islands"},
+            {"date": "2025-08-14", "all_cities": ["Vestmanna"], "state": None, "country": "Faroe Islands"},
+        ],
+    }), encoding="utf-8")
+
+    def run(**kwargs):
+        return build(str(trips), str(gpx), str(tmp_path / "search"), **kwargs)
+
+    run.trips = trips
+    run.out = tmp_path / "search"
+    return run
+
+
+def found(site, query):
+    return [f"{page}/{photo}" for page, photo, _, _ in search(str(site.out), query)]
+
+
+class TestEncoding:
+    """Test terms and posting lists."""
+
+    def test_tokens(self):
+        """
+        Test words, accents and dates.
+
+        Expected:
+            - Lowercase, accents dropped, punctuation split
+            - Full and partial dates stay one term
+        """
+        assert tokens("Tórshavn, Faroe-Islands!") == ["torshavn", "faroe", "islands"]
+        assert tokens("2025-08-20 and 2025-08") == ["2025-08-20", "and", "2025-08"]
+        assert tokens("四川 Chengdu_2024") == ["四川", "chengdu", "2024"]
+
+    def test_front_coding_roundtrip(self):
+        """
+        Test sorted terms sharing prefixes.
+
+        Expected:
+            - Decoded back unchanged, shorter than the terms themselves
+        """
+        terms = sorted(["torshavn", "tor", "torso", "ærø", "2025-08-20", "2025-08-21", "x" * 50, "x" * 52])
+        coded = front_code(terms)
+
+        assert front_decode(coded) == terms
+        assert len(coded) < len("\n".join(terms))
+        assert front_decode("") == []
+
+    def test_postings_are_deltas(self):
+        """
+        Test ascending ids.
+
+        Expected:
+            - Gaps stored; close ids take one character each
+        """
+        ids = [3, 4, 5, 9, 1000]
+        coded = encode_postings(ids)
+
+        assert decode_values(coded) == [3, 1, 1, 4, 991]
+        assert len(coded) == 4 + 3  # 991 needs three 5-bit characters
+
+    @pytest.mark.edge_case
+    def test_photo_date(self):
+        """
+        Test file name dates.
+
+        Edge Cases:
+            - A sequence number prefix is skipped
+            - Not a date: None
+        """
+        assert photo_date("20250820-P8200150.jpeg") == "2025-08-20"
+        assert photo_date("01_20250820-P8200150.jpeg") == "2025-08-20"
+        assert photo_date("P8200150.jpeg") is None
+        assert photo_date("20251399-x.jpg") is None
+
+
+class TestSharding:
+    """Test splitting the terms into shards."""
+
+    def test_splits_large_prefixes(self):
+        """
+        Test one crowded prefix among small ones.
+
+        Expected:
+            - The crowded one split on the next character, a term equal to
+              its key kept under the key, every term in exactly one shard
+        """
+        terms = sorted(["t", "ta", "tb", "tc", "td", "tea", "teb", "x"])
+        shards = shard_terms(terms, {t: 10 for t in terms}, limit=25)
+
+        assert shards["t"] == ["t"]
+        assert shards["te"] == ["tea", "teb"]
+        assert shards["x"] == ["x"]
+        assert sorted(t for group in shards.values() for t in group) == terms
+
+
+class TestBuild:
+    """Test building and searching the index."""
+
+    def test_documents(self, site):
+        """
+        Test looking up trips and photos.
+
+        Expected:
+            - Photo titles from resources, the first matching entry winning
+            - Photos found by their page's tags and folder names
+            - Per-day places from the trip summary, without accents
+            - Drafts and non-images left out
+        """
+        stats = site()
+
+        assert stats["pages"] == 3 and stats["docs"] == 7
+        assert found(site, "coastal") == ["trips/Denmark/20250820-P8200150.jpeg"]
+        assert found(site, "cityscape") == ["trips/Denmark/20250821-P8210193.jpeg"]
+        assert found(site, "scandinavia") == [
+            "trips/Denmark/", "trips/Denmark/20250820-P8200150.jpeg", "trips/Denmark/20250821-P8210193.jpeg"]
+        assert found(site, "torshavn") == [
+            "trips/Faroe Islands/Streymoy/", "trips/Faroe Islands/Streymoy/20250813-P8130001.jpg"]
+        assert found(site, "japan") == []
+        assert found(site, "notes") == []
+
+    def test_prefixes_and_all_words(self, site):
+        """
+        Test partial words and several words.
+
+        Expected:
+            - Every word must match the start of a term
+        """
+        site()
+
+        assert found(site, "vest 2025-08-14") == ["trips/Faroe Islands/Streymoy/20250814-P8140037.jpg"]
+        assert found(site, "faro 2025-08-1") == [
+            "trips/Faroe Islands/", "trips/Faroe Islands/Streymoy/",
+            "trips/Faroe Islands/Streymoy/20250813-P8130001.jpg",
+            "trips/Faroe Islands/Streymoy/20250814-P8140037.jpg"]
+        assert found(site, "danish vestmanna") == []
+        assert found(site, "  ") == []
+
+    def test_small_shards_same_results(self, site):
+        """
+        Test an index split into many tiny shards.
+
+        Expected:
+            - One term per shard, same results as with one shard per first character
+        """
+        queries = ["d", "t", "torshavn", "2025", "2025-08-2", "faroe islands", "s"]
+        site()
+        expected = {q: found(site, q) for q in queries}
+        stats = site(shard_bytes=1)
+
+        assert stats["shards"] == stats["terms"]
+        assert {q: found(site, q) for q in queries} == expected
+
+    def test_incremental(self, site):
+        """
+        Test rebuilding after one title changes.
+
+        Expected:
+            - Unchanged: nothing written
+            - Changed: the changed shards and block rewritten, the replaced ones removed
+        """
+        site()
+        assert site()["written"] == 0
+
+        page = site.trips / "Denmark" / "index.md"
+        page.write_text(page.read_text(encoding="utf-8").replace("Cityscape", "Harbour"), encoding="utf-8")
+        stats = site()
+
+        assert stats["written"] == 3  # c... and the new h... shard, the block
+        assert stats["removed"] == 2
+        assert found(site, "harbour") == ["trips/Denmark/20250821-P8210193.jpeg"]
+        assert len(list(site.out.glob("*.json"))) == stats["shards"] + 1 + 1  # shards, one block, manifest
@@ -0,0 +1,232 @@
+"""
+Test suite for build_tiles.py.
+
+Tests cover:
+- Web Mercator projection and line rasterization
+- Bucketing pixels into tiles, including lines across tile seams
+- Incremental builds: unchanged tiles kept, changed ones rewritten, stale ones removed
+- The per-trip view written to data/trip_maps.json
+"""
+
+import json
+import os
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    from PIL import Image
+    from scripts import build_tiles
+    from scripts.build_tiles import TILE_SIZE, bucket, build, densify, project, track_pixels
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def write_gpx(path, *segments):
+    """A GPX file with one track segment per list of (lat, lon)."""
+    body = "".join(
+        "<trkseg>" + "".join(f'<trkpt lat="{lat}" lon="{lon}"/>' for lat, lon in seg) + "</trkseg>"
+        for seg in segments)
+    path.write_text(f'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk>{body}</trk></gpx>')
+
+
+@pytest.fixture
+def site(tmp_path):
+    """gpx/ with two trips, and a build() writing into tmp_path."""
+    gpx = tmp_path / "gpx"
+    gpx.mkdir()
+    write_gpx(gpx / "faroe.gpx", [(62.00, -6.80), (62.05, -6.70), (62.10, -6.75)])
+    write_gpx(gpx / "japan.gpx", [(35.60, 139.70), (35.70, 139.80)])
+
+    def run(**kwargs):
+        return build(str(gpx), str(tmp_path / "tiles"), 0, kwargs.pop("max_zoom", 8),
+                     manifest_path=str(tmp_path / "manifest.json"),
+                     trip_maps=str(tmp_path / "trip_maps.json"), **kwargs)
+
+    run.gpx = gpx
+    run.tiles = tmp_path / "tiles"
+    run.trip_maps = tmp_path / "trip_maps.json"
+    return run
+
+
+def tile_files(root):
+    return {str(p.relative_to(root)): p.stat().st_mtime_ns for p in root.rglob("*.png")}
+
+
+class TestRaster:
+    """Test projecting and drawing tracks."""
+
+    def test_project_known_points(self):
+        """
+        Test the Web Mercator projection.
+
+        Expected:
+            - (0, 0) at the centre of the world, lon -180 at its left edge
+        """
+        x, y = project([(0.0, 0.0), (0.0, -180.0)], zoom=1)
+        assert x.tolist() == pytest.approx([256.0, 0.0])
+        assert y.tolist() == pytest.approx([256.0, 256.0])
+
+    def test_densify_is_continuous(self):
+        """
+        Test rasterizing a long diagonal.
+
+        Expected:
+            - No gap of more than one pixel between neighbouring samples
+            - Both end points included
+        """
+        x, y = densify(np.array([10.5, 300.5]), np.array([20.5, 100.5]), 1024)
+        assert max(np.abs(np.diff(x)).max(), np.abs(np.diff(y)).max()) <= 1
+        assert (x[0], y[0], x[-1], y[-1]) == (10, 20, 300, 100)
+
+    def test_bucket_across_seam(self):
+        """
+        Test a line crossing from one tile into the next.
+
+        Expected:
+            - Pixels split between both tiles, with in-tile offsets
+        """
+        x = np.array([254, 255, 256, 257])
+        y = np.array([3, 3, 3, 3])
+        tiles = bucket(x, y)
+
+        assert sorted(tiles) == [(0, 0), (1, 0)]
+        assert tiles[(0, 0)].tolist() == [3 * TILE_SIZE + 254, 3 * TILE_SIZE + 255]
+        assert tiles[(1, 0)].tolist() == [3 * TILE_SIZE + 0, 3 * TILE_SIZE + 1]
+
+    @pytest.mark.edge_case
+    def test_antimeridian_not_drawn_across_world(self):
+        """
+        Test a segment from lon 179.9 to -179.9.
+
+        Edge Case:
+            - Drawn as two short stubs at the edges, not a line around the world
+        """
+        x, _ = track_pixels([[(0.0, 179.9), (0.0, -179.9)]], zoom=4)
+        world = TILE_SIZE * 2 ** 4
+        assert len(x) < 20
+        assert all(v < 10 or v > world - 10 for v in x.tolist())
+
+
+class TestBuild:
+    """Test building the tile pyramid."""
+
+    def test_only_route_tiles_written(self, site):
+        """
+        Test a first build.
+
+        Expected:
+            - One tile at zoom 0, few at each deeper zoom
+            - Tiles are transparent except for the route
+        """
+        stats = site()
+
+        files = tile_files(site.tiles)
+        assert stats["written"] == stats["tiles"] == len(files)
+        assert "0/0/0.png" in files
+        assert len(files) < 2 * 9 * 3  # two small tracks, nine zooms
+        image = Image.open(site.tiles / "0" / "0" / "0.png")
+        alpha = np.asarray(image)[:, :, 3]
+        assert 0 < (alpha > 0).sum() < 40
+
+    def test_rerun_writes_nothing(self, site):
+        """
+        Test running again with nothing changed.
+
+        Expected:
+            - Every tile unchanged, no file touched
+        """
+        site()
+        before = tile_files(site.tiles)
+        stats = site()
+
+        assert stats["written"] == 0 and stats["unchanged"] == len(before)
+        assert tile_files(site.tiles) == before
+
+    def test_changed_track_rewrites_its_tiles(self, site):
+        """
+        Test extending one trip.
+
+        Expected:
+            - Some tiles rewritten, the other trip's tiles untouched
+        """
+        site()
+        before = tile_files(site.tiles)
+        write_gpx(site.gpx / "faroe.gpx", [(62.00, -6.80), (62.05, -6.70), (62.10, -6.75), (62.30, -6.60)])
+        stats = site()
+
+        after = tile_files(site.tiles)
+        changed = {k for k in after if before.get(k) != after[k]}
+        assert 0 < stats["written"] == len(changed) < len(after)
+        japan = json.loads(site.trip_maps.read_text())["trips"]["japan"]
+        zoom = japan["zoom"]
+        for tx, ty in japan["tiles"]:
+            assert f"{zoom}/{tx}/{ty}.png" not in changed
+
+    def test_stale_tiles_removed(self, site):
+        """
+        Test deleting a trip.
+
+        Expected:
+            - Tiles only it reached are removed, from the manifest too
+        """
+        site()
+        os.remove(site.gpx / "japan.gpx")
+        stats = site()
+
+        assert stats["removed"] > 0
+        assert stats["tiles"] == len(tile_files(site.tiles))
+
+    @pytest.mark.edge_case
+    def test_format_switch_removes_old_tiles(self, site):
+        """
+        Test rebuilding as WebP after a PNG build.
+
+        Edge Case:
+            - No PNG tile is left behind to be published with the site
+        """
+        site()
+        pngs = len(tile_files(site.tiles))
+        stats = site(fmt="webp")
+
+        assert stats["removed"] == pngs
+        assert not tile_files(site.tiles)
+        assert len(list(site.tiles.rglob("*.webp"))) == stats["tiles"] == stats["written"]
+
+    def test_trip_view_fits_few_tiles(self, site):
+        """
+        Test data/trip_maps.json.
+
+        Expected:
+            - Each trip viewed at the deepest zoom built where it fits 3x3 tiles
+            - Only existing tiles listed
+        """
+        site()
+        maps = json.loads(site.trip_maps.read_text())
+
+        assert maps["format"] == "png" and maps["tile_size"] == TILE_SIZE
+        for view in maps["trips"].values():
+            assert view["zoom"] == 8
+            assert view["x"][1] - view["x"][0] < build_tiles.VIEW_TILES
+            assert view["y"][1] - view["y"][0] < build_tiles.VIEW_TILES
+            assert view["tiles"]
+            for tx, ty in view["tiles"]:
+                assert (site.tiles / str(view["zoom"]) / str(tx) / f"{ty}.png").exists()
+
+    @pytest.mark.edge_case
+    def test_empty_gpx_dir(self, site):
+        """
+        Test a gpx/ folder without tracks.
+
+        Edge Case:
+            - Nothing written, an empty trip list
+        """
+        for path in site.gpx.iterdir():
+            path.unlink()
+        stats = site()
+
+        assert stats["tiles"] == stats["written"] == 0
+        assert json.loads(site.trip_maps.read_text())["trips"] == {}
@@ -0,0 +1,153 @@
+"""
+Test suite for the `python -m scripts` entry point.
+
+Tests cover:
+- Command dispatch and usage errors
+- Lazy loading: `--help` never imports gpxpy, geopy or Pillow, nor the
+  slower parts of the standard library and the geocoder chain
+- The start-up time budget, for the entry point and every subcommand
+"""
+
+import os
+import subprocess
+import sys
+import time
+import pytest
+from pathlib import Path
+
+REPO = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO))
+
+try:
+    from scripts.__main__ import COMMANDS, main
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+HEAVY_MODULES = ("gpxpy", "geopy", "PIL", "numpy", "yaml")
+# Standard library and project modules only the work itself needs (~5-60 ms each)
+SLOW_MODULES = ("asyncio", "ssl", "http.client", "urllib.request", "concurrent.futures",
+                "scripts.geocoder_chain", "scripts.boundaries")
+STARTUP_BUDGET = 0.050  # seconds on top of a bare interpreter
+COMMAND_BUDGET = 0.100  # the same for `<command> --help`, which loads its script
+
+
+def run_cli(*args, python_flags=()):
+    """Run `python -m scripts ...` from the repo root."""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # timings assume cached bytecode
+    return subprocess.run(
+        [sys.executable, *python_flags, "-m", "scripts", *args],
+        cwd=REPO, capture_output=True, text=True, env=env,
+    )
+
+
+def imported_modules(importtime_log):
+    """Module names from `python -X importtime` output."""
+    return {
+        line.rsplit("|", 1)[1].strip()
+        for line in importtime_log.splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+
+
+class TestDispatch:
+    """Test command-line dispatch."""
+
+    def test_help_lists_every_command(self, capsys):
+        """
+        Test the top-level help.
+
+        Expected:
+            - Exit code 0 and one line per command
+        """
+        assert main(["--help"]) == 0
+        out = capsys.readouterr().out
+        assert all(f"  {name} " in out for name in COMMANDS)
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], 2),               # No command at all
+        (["nope"], 2),         # Unknown command
+    ])
+    def test_usage_errors(self, argv, expected, capsys):
+        """
+        Test usage errors.
+
+        Edge Cases:
+            - Missing command prints usage and fails
+            - Unknown command names the culprit
+        """
+        assert main(argv) == expected
+        captured = capsys.readouterr()
+        assert "usage:" in captured.out + captured.err
+        if argv:
+            assert "unknown command: nope" in captured.err
+
+    @pytest.mark.parametrize("command", sorted(COMMANDS))
+    def test_subcommand_help_is_lazy(self, command):
+        """
+        Test that each subcommand's --help loads no heavy dependency.
+
+        Args:
+            command: Subcommand name
+
+        Expected:
+            - None of HEAVY_MODULES (or their submodules) and none of SLOW_MODULES
+        """
+        result = run_cli(command, "--help", python_flags=("-X", "importtime"))
+
+        assert result.returncode == 0, result.stderr
+        assert f"scripts {command}" in result.stdout
+        modules = imported_modules(result.stderr)
+        loaded = {m.split(".")[0] for m in modules}
+        assert not loaded & set(HEAVY_MODULES), f"--help imported {loaded & set(HEAVY_MODULES)}"
+        assert not modules & set(SLOW_MODULES), f"--help imported {modules & set(SLOW_MODULES)}"
+
+    def test_wrapper_import_defers_script(self):
+        """
+        Test that importing the wrapper doesn't execute the script.
+
+        Expected:
+            - The script module appears only after the first attribute access
+        """
+        code = (
+            "import sys; import scripts.smart_gps_extract as w; "
+            "before = 'smart_gps_extract_main' in sys.modules; w.Colors; "
+            "print(before, 'smart_gps_extract_main' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO, capture_output=True, text=True)
+        assert result.stdout.split() == ["False", "True"]
+
+
+class TestStartupBudget:
+    """Test start-up time."""
+
+    @staticmethod
+    def best_of(cmd, runs=5):
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        best = float("inf")
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(cmd, cwd=REPO, capture_output=True, env=env)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    @pytest.mark.slow
+    @pytest.mark.parametrize("command", [None, *sorted(COMMANDS)])
+    def test_help_within_budget(self, command):
+        """
+        Test `python -m scripts [command] --help` against the start-up budget.
+
+        Args:
+            command: Subcommand name, or None for the entry point alone
+
+        Expected:
+            - Less than STARTUP_BUDGET (COMMAND_BUDGET for a subcommand) over
+              a bare `python -c pass`
+        """
+        cmd = [sys.executable, "-m", "scripts", *([command] if command else []), "--help"]
+        budget = COMMAND_BUDGET if command else STARTUP_BUDGET
+        self.best_of(cmd, runs=1)  # warm bytecode cache
+        bare = self.best_of([sys.executable, "-c", "pass"])
+        cli = self.best_of(cmd)
+        assert cli - bare < budget, f"{' '.join(cmd[2:])} took {(cli - bare) * 1000:.0f} ms over the interpreter"
@@ -0,0 +1,142 @@
+"""
+Test suite for exif_display.py.
+
+Tests cover:
+- Camera names, exposure times and the other display strings
+- Grouping photos per page and writing one data file per page
+- Rewriting only changed files and removing stale ones
+"""
+
+import json
+import os
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts.exif_display import ExifPages, camera, display_fields, exposure
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def record(page, name, **tags):
+    return {"SourceFile": os.path.join("content", page, name), **tags}
+
+
+OLYMPUS = {"Make": "OLYMPUS CORPORATION", "Model": "E-M1MarkII", "LensModel": "OLYMPUS M.25mm F1.2",
+           "FocalLength": 25, "FocalLengthIn35mmFormat": 50, "FNumber": 1.2, "ExposureTime": 0.004,
+           "ISO": 200, "DateTimeOriginal": "2025:09:22 14:32:10+02:00"}
+
+
+class TestDisplayFields:
+    """Test formatting one photo's EXIF."""
+
+    @pytest.mark.parametrize("make,model,expected", [
+        ("OLYMPUS CORPORATION", "E-M1MarkII", "Olympus E-M1MarkII"),
+        ("NIKON CORPORATION", "NIKON Z 6_2", "Nikon Z 6_2"),
+        ("Canon", "Canon EOS R5", "Canon EOS R5"),
+        ("OM Digital Solutions", "OM-1", "OM-1"),
+        ("Apple", "iPhone 15 Pro", "Apple iPhone 15 Pro"),
+        (None, "X100V", "X100V"),
+        (None, None, ""),
+    ])
+    def test_camera(self, make, model, expected):
+        """
+        Test camera names from Make and Model.
+
+        Expected:
+            - Company suffixes dropped, shouting makes title-cased, the make once
+        """
+        assert camera(make, model) == expected
+
+    @pytest.mark.parametrize("seconds,expected", [
+        (0.004, "1/250 s"), (1 / 3, "1/3 s"), (0.3, "0.3 s"), (2.5, "2.5 s"), (30, "30 s"),
+    ])
+    def test_exposure(self, seconds, expected):
+        """
+        Test exposure times.
+
+        Expected:
+            - Fractions of a second as 1/N where exact, else decimal seconds
+        """
+        assert exposure(seconds) == expected
+
+    def test_fields(self):
+        """
+        Test a full record.
+
+        Expected:
+            - Display strings, the settings line and the gear line joined
+            - The date as ISO local time
+        """
+        fields = display_fields(dict(OLYMPUS, ImageDescription="Elbe at dusk"))
+
+        assert fields["gear"] == "Olympus E-M1MarkII · OLYMPUS M.25mm F1.2"
+        assert fields["settings"] == "25 mm (50 mm eq.) · f/1.2 · 1/250 s · ISO 200"
+        assert fields["date"] == "2025-09-22T14:32:10"
+        assert fields["title"] == "Elbe at dusk"
+
+    @pytest.mark.edge_case
+    def test_missing_and_junk(self):
+        """
+        Test a scan without lens data or with placeholder values.
+
+        Edge Cases:
+            - Placeholder lens, zero aperture, bad date and camera-default
+              description left out
+            - Same focal length in 35 mm: no equivalent shown
+        """
+        fields = display_fields({"Model": "iPhone 15 Pro", "Lens": "----", "FNumber": 0,
+                                 "FocalLength": 24, "FocalLengthIn35mmFormat": 24,
+                                 "DateTimeOriginal": "0000:00:00 00:00:00",
+                                 "ImageDescription": "OLYMPUS DIGITAL CAMERA"})
+
+        assert fields == {"camera": "iPhone 15 Pro", "gear": "iPhone 15 Pro", "focal": "24 mm", "settings": "24 mm"}
+        assert display_fields({}) == {}
+
+
+class TestPages:
+    """Test the per-page data files."""
+
+    def test_one_file_per_page(self, temp_dir):
+        """
+        Test photos from a trip and a section page.
+
+        Expected:
+            - data/exif/<page path>/photos.json per page, keyed by file name
+            - Photos without any field left out
+        """
+        pages = ExifPages()
+        pages.add(record("trips/Germany/Dresden", "20250922-P9220041.jpg", **OLYMPUS))
+        pages.add(record("trips/Germany", "cover.jpg", Model="X100V"))
+        pages.add(record("trips/Germany", "scan.png"))
+        stats = pages.write(str(temp_dir))
+
+        assert (stats["pages"], stats["photos"], stats["written"]) == (2, 2, 2)
+        dresden = json.loads((temp_dir / "trips" / "Germany" / "Dresden" / "photos.json").read_text(encoding="utf-8"))
+        assert dresden["20250922-P9220041.jpg"]["exposure"] == "1/250 s"
+        assert list(json.loads((temp_dir / "trips" / "Germany" / "photos.json").read_text())) == ["cover.jpg"]
+
+    def test_incremental(self, temp_dir):
+        """
+        Test rerunning after one page changes and another loses its photos.
+
+        Expected:
+            - Unchanged files not rewritten, the stale file and its folder removed
+        """
+        first = ExifPages()
+        first.add(record("trips/Denmark", "a.jpg", **OLYMPUS))
+        first.add(record("trips/Zambia", "b.jpg", **OLYMPUS))
+        first.write(str(temp_dir))
+        denmark = temp_dir / "trips" / "Denmark" / "photos.json"
+        mtime = denmark.stat().st_mtime_ns
+
+        second = ExifPages()
+        second.add(record("trips/Denmark", "a.jpg", **OLYMPUS))
+        stats = second.write(str(temp_dir))
+
+        assert (stats["written"], stats["unchanged"], stats["removed"]) == (0, 1, 1)
+        assert denmark.stat().st_mtime_ns == mtime
+        assert not (temp_dir / "trips" / "Zambia").exists()
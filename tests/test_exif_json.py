@@ -0,0 +1,63 @@
+"""
+Test suite for the streaming exiftool JSON reader.
+
+Tests cover:
+- Parity with json.load on exiftool-shaped output
+- Objects split across read boundaries
+- Empty and truncated output
+"""
+
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add scripts to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scripts.exif_json import iter_records
+
+
+class TestIterRecords:
+    """Test incremental parsing of `exiftool -json` output."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+    def test_matches_json_load(self, sample_gps_data, chunk_size):
+        """
+        Test that streaming yields exactly what json.load returns.
+
+        Args:
+            chunk_size: Read size, down to one character per read
+
+        Edge Cases:
+            - Objects and strings split at every possible boundary
+            - Non-ASCII values (Tórshavn)
+        """
+        records = sample_gps_data + [{"SourceFile": "trips/Faroe Islands/Tórshavn.jpg", "Rating": 5}]
+        text = json.dumps(records, indent=2, ensure_ascii=False)
+
+        streamed = list(iter_records(io.StringIO(text), chunk_size=chunk_size))
+
+        assert streamed == records
+
+    @pytest.mark.parametrize("text", ["", "[]", "[\n]\n", "  "])
+    def test_empty_output(self, text):
+        """
+        Test exiftool output with no files.
+
+        Edge Case:
+            - exiftool prints nothing (or an empty array) for an empty folder
+        """
+        assert list(iter_records(io.StringIO(text))) == []
+
+    def test_truncated_output_raises(self):
+        """
+        Test that a truncated document is an error, not silent data loss.
+
+        Edge Case:
+            - exiftool killed mid-write
+        """
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_records(io.StringIO('[{"FileName": "a.jpg"}, {"FileName": "b')))
@@ -0,0 +1,310 @@
+"""
+Test suite for the local Nominatim stand-in and the scripts' HTTP geocoding path.
+
+Tests cover:
+- `/reverse` answers in Nominatim's shape, read through geopy
+- Injected 429/503 responses with Retry-After, and timeouts
+- The minimum-interval policy against the shared throttle
+- Keep-alive connection reuse by the shared client
+- smart-gps-extract and write-location-metadata pointed at NOMINATIM_URL
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import time
+import urllib.error
+import urllib.request
+import pytest
+from pathlib import Path
+import sys
+
+REPO = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO))
+
+try:
+    from geopy.exc import GeocoderRateLimited, GeocoderTimedOut
+    from scripts import smart_gps_extract
+    from scripts.geocoder_chain import GeocoderChain, RemoteProvider
+    from scripts.geocoding import Throttle, make_nominatim
+    from tests.benchmarks.__main__ import main
+    from tests.benchmarks.nominatim import FakeNominatim, distance_km, load_gazetteer
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+pytestmark = pytest.mark.integration
+
+TORSHAVN = (62.011, -6.771)
+MID_ATLANTIC = (40.0, -40.0)
+
+
+@pytest.fixture
+def nominatim(monkeypatch):
+    """Start a FakeNominatim with the given options and point NOMINATIM_URL at it."""
+    servers = []
+
+    def start(**options):
+        server = FakeNominatim(**options).start()
+        servers.append(server)
+        monkeypatch.setenv("NOMINATIM_URL", server.url)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def lookup(lat, lon, timeout=None):
+    geolocator = make_nominatim("test-suite")
+    if timeout is not None:
+        geolocator.timeout = timeout
+    return geolocator.reverse(f"{lat}, {lon}", language="en")
+
+
+class TestReverse:
+    """Test lookups through geopy."""
+
+    def test_nearest_place(self, nominatim):
+        """
+        Test a coordinate near a gazetteer city.
+
+        Expected:
+            - geopy parses the response; address carries city and country
+        """
+        server = nominatim()
+        location = lookup(*TORSHAVN)
+
+        assert location.raw["address"] == {"city": "Tórshavn", "country": "Faroe Islands"}
+        assert location.latitude == pytest.approx(62.01)
+        assert server.stats["requests"] == 1 and server.stats["status.200"] == 1
+
+    @pytest.mark.edge_case
+    def test_nothing_nearby(self, nominatim):
+        """
+        Test the open ocean.
+
+        Edge Case:
+            - "Unable to geocode", which geopy turns into None
+        """
+        nominatim()
+        assert lookup(*MID_ATLANTIC) is None
+
+    @pytest.mark.edge_case
+    def test_bad_requests(self, nominatim):
+        """
+        Test malformed requests.
+
+        Edge Cases:
+            - Unknown endpoint: 404; missing coordinates: 400
+        """
+        server = nominatim()
+        for path, status in (("/search?q=x", 404), ("/reverse?format=json", 400)):
+            with pytest.raises(urllib.error.HTTPError) as exc:
+                urllib.request.urlopen(server.url + path)
+            assert exc.value.code == status
+
+    def test_custom_gazetteer(self, tmp_path):
+        """
+        Test distance and a user-supplied gazetteer.
+
+        Expected:
+            - Haversine distance is sane; nearest of several places wins
+        """
+        assert distance_km(55.68, 12.57, 56.16, 10.20) == pytest.approx(157, abs=5)
+        places = [{"lat": 0.0, "lon": 0.0, "address": {"village": "Null Island"}},
+                  {"lat": 0.3, "lon": 0.0, "address": {"village": "Near Null"}}]
+        path = tmp_path / "places.json"
+        path.write_text(json.dumps(places))
+
+        server = FakeNominatim(gazetteer=load_gazetteer(str(path)))
+        assert server.lookup(0.25, 0.0)["address"] == {"village": "Near Null"}
+        server.server.server_close()
+
+
+class TestFaults:
+    """Test injected failures as geopy reports them."""
+
+    def test_rate_limited_with_retry_after(self, nominatim):
+        """
+        Test an injected 429.
+
+        Expected:
+            - GeocoderRateLimited carrying the Retry-After seconds
+        """
+        nominatim(error_rate=1.0, error_statuses=[429], retry_after=3)
+        with pytest.raises(GeocoderRateLimited) as exc:
+            lookup(*TORSHAVN)
+        assert exc.value.retry_after == 3
+
+    def test_unavailable(self, nominatim):
+        """
+        Test an injected 503.
+
+        Expected:
+            - GeocoderTimedOut (geopy's mapping for 503), which the scripts handle
+        """
+        server = nominatim(error_rate=1.0, error_statuses=[503])
+        with pytest.raises(GeocoderTimedOut):
+            lookup(*TORSHAVN)
+        assert server.stats["status.503"] == 1
+
+    def test_latency_beyond_timeout(self, nominatim):
+        """
+        Test a response slower than the client's timeout.
+
+        Expected:
+            - GeocoderTimedOut from geopy
+            - write-location-metadata's reverse_geocode reports no location
+        """
+        nominatim(latency=0.5)
+        with pytest.raises(GeocoderTimedOut):
+            lookup(*TORSHAVN, timeout=0.1)
+
+        spec = importlib.util.spec_from_file_location(
+            "write_location_metadata", REPO / "scripts" / "write-location-metadata.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        geolocator = make_nominatim("test-suite")
+        geolocator.timeout = 0.1
+        chain = GeocoderChain([RemoteProvider(geolocator, Throttle(0))])
+        assert module.reverse_geocode(*TORSHAVN, chain) == ((None, None, None), None)
+
+    def test_error_rate_is_reproducible(self):
+        """
+        Test seeded fault injection.
+
+        Expected:
+            - The same seed fails the same requests; roughly error_rate of them
+        """
+        def statuses(seed):
+            server = FakeNominatim(error_rate=0.3, seed=seed)
+            server.server.server_close()
+            return [server._plan()[1] for _ in range(200)]
+
+        assert statuses(1) == statuses(1)
+        failed = sum(s != 200 for s in statuses(1))
+        assert 30 < failed < 90
+
+    def test_min_interval_against_throttle(self, nominatim):
+        """
+        Test the usage policy.
+
+        Expected:
+            - Back-to-back requests get 429
+            - Requests spaced by a Throttle with a longer interval never do
+        """
+        server = nominatim(min_interval=0.03)
+        for _ in range(3):
+            with contextlib.suppress(GeocoderRateLimited):
+                lookup(*TORSHAVN)
+        assert server.stats["status.429"] >= 1
+
+        server.stats.clear()
+        throttle = Throttle(0.1)
+        throttle.wait()  # claim a first slot now, so the next one is after the burst
+        for _ in range(4):
+            throttle.wait()
+            lookup(*TORSHAVN)
+        assert server.stats["status.429"] == 0
+
+
+class TestKeepAlive:
+    """Test the pooled HTTP client."""
+
+    def test_connection_reused(self, nominatim):
+        """
+        Test several lookups in a row.
+
+        Expected:
+            - One TCP connection for all of them; one shared client per server
+        """
+        server = nominatim()
+        for _ in range(5):
+            assert lookup(*TORSHAVN) is not None
+
+        assert server.stats["requests"] == 5
+        assert server.stats["connections"] == 1
+        assert make_nominatim("test-suite") is make_nominatim("test-suite")
+
+    @pytest.mark.edge_case
+    def test_server_closed_idle_connection(self, nominatim):
+        """
+        Test a pooled connection the server has since closed.
+
+        Edge Case:
+            - The lookup is retried on a new connection instead of failing
+        """
+        server = nominatim(idle_timeout=0.05)
+        lookup(*TORSHAVN)
+        time.sleep(0.2)
+
+        assert lookup(*TORSHAVN).raw["address"]["city"] == "Tórshavn"
+        assert server.stats["connections"] == 2
+
+    def test_one_connection_per_concurrent_request(self, nominatim):
+        """
+        Test concurrent lookups through the shared client.
+
+        Expected:
+            - Requests overlap at the server; connections stay at the in-flight count
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        server = nominatim(latency=0.05)
+        throttle = Throttle(0, concurrency=4)
+
+        def call(_):
+            with throttle.request():
+                return lookup(*TORSHAVN)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert all(pool.map(call, range(16)))
+
+        assert 1 < server.stats["max_in_flight"] <= 4
+        assert server.stats["connections"] <= 4
+
+
+class TestScriptsAgainstServer:
+    """Test the scripts' geocoding stages over HTTP."""
+
+    def test_smart_gps_extract_geocodes_days(self, nominatim):
+        """
+        Test reverse_geocode_locations with failures mixed in.
+
+        Expected:
+            - Days resolve to gazetteer cities; failed requests don't abort the trip
+        """
+        server = nominatim(error_rate=0.3, seed=3)
+        module = smart_gps_extract.smart_gps_extract_main
+        photos_by_date = {
+            f"2025-08-{15 + d:02d}": [{"lat": lat + i * 0.001, "lon": lon}
+                                      for i in range(3)]
+            for d, (lat, lon) in enumerate([(62.01, -6.77), (55.68, 12.57), (56.16, 10.20)])
+        }
+        dates = sorted(photos_by_date)
+        throttle = Throttle(0)
+        throttle.backoff = lambda *args, **kwargs: 0  # keep the test fast
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            locations = module.reverse_geocode_locations(photos_by_date, dates, throttle=throttle)
+
+        assert server.stats["requests"] >= 3
+        resolved = {d: loc["primary"] for d, loc in locations.items() if loc["primary"] != "Unknown"}
+        assert set(resolved.values()) <= {"Tórshavn", "Copenhagen", "Aarhus"}
+        assert resolved
+
+    def test_cli_serves_until_interrupted(self, monkeypatch, capsys):
+        """
+        Test `python -m tests.benchmarks nominatim`.
+
+        Expected:
+            - Prints the URL to export, prints stats on Ctrl-C, exits 0
+        """
+        def interrupted(self, *a, **k):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr("socketserver.BaseServer.serve_forever", interrupted)
+        assert main(["nominatim", "--port", "0", "--latency", "0.1", "--error-status", "503"]) == 0
+        err = capsys.readouterr().err
+        assert "export NOMINATIM_URL=http://127.0.0.1:" in err
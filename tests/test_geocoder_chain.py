@@ -0,0 +1,364 @@
+"""
+Test suite for the geocoder provider chain.
+
+Tests cover:
+- Fall-through order: places cache, gazetteer, remote API
+- Circuit breakers: open after repeated errors, skip, half-open probe
+- The durable places cache: persisted, merged, written back, misses kept in memory
+- Gazetteer loading (JSON and GeoNames) and radius
+- Per-provider timers and counters
+- smart-gps-extract finishing quickly during an API outage
+"""
+
+import contextlib
+import io
+import json
+import time
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts import smart_gps_extract
+    from scripts.geocoder_chain import (
+        BREAKER_THRESHOLD, CircuitBreaker, Gazetteer, GeocoderChain, Place, PlaceCache,
+        ProviderError, RemoteProvider, load_gazetteer, make_chain,
+    )
+    from scripts.geocoding import GeocodeSettings, Throttle
+    from scripts.perf import Tracer
+    from tests.benchmarks.nominatim import FakeNominatim
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+TORSHAVN = Place("Tórshavn", "", "Faroe Islands")
+
+
+class FakeProvider:
+    """Provider answering `place`, or raising ProviderError while `failing`."""
+
+    def __init__(self, name, place=None, failing=False):
+        self.name = name
+        self.breaker_key = f"{name}@{id(self)}"  # a breaker of its own, not shared across tests
+        self.place = place
+        self.failing = failing
+        self.calls = 0
+
+    def lookup(self, lat, lon):
+        self.calls += 1
+        if self.failing:
+            raise ProviderError("down")
+        return self.place
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """A fresh tracer in place of the process-wide one."""
+    tracer = Tracer()
+    monkeypatch.setattr("scripts.geocoder_chain.TRACER", tracer)
+    return tracer
+
+
+class TestChainOrder:
+    """Test which provider answers."""
+
+    def test_first_answer_wins(self):
+        """
+        Test a chain whose second provider knows the place.
+
+        Expected:
+            - The answer and the provider's name; later providers not asked
+        """
+        gazetteer, remote = FakeProvider("gazetteer", TORSHAVN), FakeProvider("remote", Place("Elsewhere"))
+        chain = GeocoderChain([FakeProvider("empty"), gazetteer, remote])
+
+        assert chain.lookup(62.01, -6.77) == (TORSHAVN, "gazetteer")
+        assert remote.calls == 0
+
+    def test_answers_written_back_to_cache(self):
+        """
+        Test a remote answer followed by a nearby lookup.
+
+        Expected:
+            - The second lookup comes from the cache; the remote is asked once
+        """
+        remote = FakeProvider("remote", TORSHAVN)
+        chain = GeocoderChain([remote], PlaceCache())
+
+        assert chain.lookup(62.011, -6.771) == (TORSHAVN, "remote")
+        assert chain.lookup(62.012, -6.772) == (TORSHAVN, "cache")
+        assert remote.calls == 1
+
+    @pytest.mark.edge_case
+    def test_nobody_knows(self):
+        """
+        Test every provider missing or failing.
+
+        Edge Case:
+            - (None, None), nothing cached
+        """
+        cache = PlaceCache()
+        chain = GeocoderChain([FakeProvider("a"), FakeProvider("b", failing=True)], cache)
+
+        assert chain.lookup(0.0, 0.0) == (None, None)
+        assert cache.entries == {}
+
+    def test_metrics_per_provider(self, tracer):
+        """
+        Test the tracer after a few lookups.
+
+        Expected:
+            - A timer per provider asked; hit/miss/error counters by name
+        """
+        chain = GeocoderChain([FakeProvider("flaky", failing=True), FakeProvider("remote", TORSHAVN)],
+                              PlaceCache())
+        chain.lookup(62.01, -6.77)
+        chain.lookup(62.01, -6.77)
+
+        counters = tracer.counters
+        assert counters["geocode.cache.miss"] == 1 and counters["geocode.cache.hit"] == 1
+        assert counters["geocode.flaky.error"] == 1 and counters["geocode.remote.hit"] == 1
+        assert {"geocode.cache", "geocode.flaky", "geocode.remote"} <= set(tracer.timers)
+
+
+class TestCircuitBreaker:
+    """Test skipping a failing provider."""
+
+    def test_opens_after_threshold(self, tracer):
+        """
+        Test a provider failing every request.
+
+        Expected:
+            - Asked BREAKER_THRESHOLD times, then skipped without a call
+            - Later providers still answer every lookup
+        """
+        down, backup = FakeProvider("remote", failing=True), FakeProvider("backup", TORSHAVN)
+        chain = GeocoderChain([down, backup])
+
+        for _ in range(10):
+            assert chain.lookup(62.01, -6.77) == (TORSHAVN, "backup")
+
+        assert down.calls == BREAKER_THRESHOLD
+        assert tracer.counters["geocode.remote.skipped"] == 10 - BREAKER_THRESHOLD
+        assert tracer.counters["geocode.remote.opened"] == 1
+
+    def test_success_resets_the_count(self):
+        """
+        Test failures that are not in a row.
+
+        Expected:
+            - A success in between keeps the breaker closed
+        """
+        breaker = CircuitBreaker("remote", threshold=2)
+        for _ in range(5):
+            breaker.failure()
+            breaker.success()
+
+        assert breaker.state == "closed" and breaker.allow()
+
+    def test_half_open_probe(self):
+        """
+        Test the breaker after its cooldown.
+
+        Expected:
+            - One probe let through; a failed probe reopens at once
+            - A successful probe closes the breaker
+        """
+        breaker = CircuitBreaker("remote", threshold=1, cooldown=0.02)
+        breaker.failure()
+        assert breaker.state == "open" and not breaker.allow()
+
+        time.sleep(0.03)
+        assert breaker.state == "half-open"
+        assert breaker.allow() and not breaker.allow()  # one probe at a time
+        breaker.failure()
+        assert breaker.state == "open"
+
+        time.sleep(0.03)
+        assert breaker.allow()
+        breaker.success()
+        assert breaker.state == "closed" and breaker.allow()
+
+    @pytest.mark.edge_case
+    def test_breakers_per_server(self):
+        """
+        Test two remote providers for different servers.
+
+        Edge Case:
+            - A failing test server doesn't open the breaker for another one
+        """
+        a = RemoteProvider(type("Client", (), {"domain": "127.0.0.1:1"})())
+        b = RemoteProvider(type("Client", (), {"domain": "127.0.0.1:2"})())
+
+        assert a.breaker_key != b.breaker_key
+        assert GeocoderChain([a]).breakers["nominatim"] is not GeocoderChain([b]).breakers["nominatim"]
+
+
+class TestPlaceCache:
+    """Test the durable places cache."""
+
+    def test_persists_between_runs(self, tmp_path):
+        """
+        Test a cache flushed and loaded again.
+
+        Expected:
+            - The same places, keyed by rounded coordinates
+        """
+        path = tmp_path / "cache" / "geocode.json"
+        cache = PlaceCache(path=str(path))
+        cache.store(62.011, -6.771, TORSHAVN)
+        cache.flush()
+
+        assert PlaceCache(path=str(path)).lookup(62.0099, -6.7701) == TORSHAVN
+
+    def test_flush_merges_concurrent_runs(self, tmp_path):
+        """
+        Test two runs sharing one cache file.
+
+        Expected:
+            - Neither run drops the other's places
+        """
+        path = str(tmp_path / "geocode.json")
+        first, second = PlaceCache(path=path), PlaceCache(path=path)
+        first.store(62.01, -6.77, TORSHAVN)
+        second.store(55.68, 12.57, Place("Copenhagen", "", "Denmark"))
+        first.flush()
+        second.flush()
+
+        assert len(json.loads(Path(path).read_text())) == 2
+
+    @pytest.mark.edge_case
+    def test_unknown_places_not_persisted(self, tmp_path):
+        """
+        Test a miss (no city in the answer) next to a hit.
+
+        Edge Case:
+            - The miss answers again in this run but is asked anew next run,
+              also when an older file holds it
+        """
+        path = tmp_path / "geocode.json"
+        path.write_text(json.dumps({"0.0,0.0": ["Unknown", "", "Nowhere"]}))
+        cache = PlaceCache(path=str(path))
+        assert cache.lookup(0.0, 0.0) is None
+
+        cache.store(62.01, -6.77, TORSHAVN)
+        cache.store(55.68, 12.57, Place("Unknown", "", "Denmark"))
+        cache.flush()
+
+        assert cache.lookup(55.68, 12.57) == Place("Unknown", "", "Denmark")
+        assert list(json.loads(path.read_text())) == ["62.01,-6.77"]
+
+    @pytest.mark.edge_case
+    def test_corrupt_file(self, tmp_path):
+        """
+        Test a truncated cache file.
+
+        Edge Case:
+            - Treated as empty and rewritten on flush
+        """
+        path = tmp_path / "geocode.json"
+        path.write_text('{"62.01,-6.77": ["T')
+        cache = PlaceCache(path=str(path))
+        assert cache.entries == {}
+
+        cache.store(62.01, -6.77, TORSHAVN)
+        cache.flush()
+        assert PlaceCache(path=str(path)).lookup(62.01, -6.77) == TORSHAVN
+
+
+class TestGazetteer:
+    """Test the offline provider."""
+
+    def test_json_places(self, tmp_path):
+        """
+        Test the FakeNominatim gazetteer format.
+
+        Expected:
+            - Nearest place within the radius; None beyond it
+        """
+        path = tmp_path / "places.json"
+        path.write_text(json.dumps([
+            {"lat": 62.01, "lon": -6.77, "address": {"city": "Tórshavn", "country": "Faroe Islands"}},
+            {"lat": 62.06, "lon": -7.0, "address": {"village": "Sørvágur", "country": "Faroe Islands"}},
+        ]))
+        gazetteer = load_gazetteer(str(path), 25.0)
+
+        assert gazetteer.lookup(62.02, -6.80) == TORSHAVN
+        assert gazetteer.lookup(62.06, -7.01).city == "Sørvágur"
+        assert gazetteer.lookup(40.0, -40.0) is None
+
+    def test_geonames_dump(self, tmp_path):
+        """
+        Test a GeoNames cities file.
+
+        Expected:
+            - Name and country code from their columns
+        """
+        row = ["2611396", "Tórshavn", "Torshavn", "", "62.00973", "-6.77164",
+               "P", "PPLC", "FO", "", "00", "", "", "", "13326", "", "24", "Atlantic/Faroe", "2019-01-01"]
+        path = tmp_path / "cities1000.txt"
+        path.write_text("\t".join(row) + "\n")
+
+        assert load_gazetteer(str(path)).lookup(62.01, -6.77) == Place("Tórshavn", "", "FO")
+
+    @pytest.mark.edge_case
+    def test_nearest_across_cell_border(self):
+        """
+        Test a place just across a 1° cell border.
+
+        Edge Case:
+            - Found from the neighbouring cell, including across the antimeridian
+        """
+        gazetteer = Gazetteer([(55.99, 12.5, Place("North")), (-17.0, -179.99, Place("East"))])
+
+        assert gazetteer.lookup(56.01, 12.5) == Place("North")
+        assert gazetteer.lookup(-17.0, 179.99) == Place("East")
+
+    def test_make_chain_from_settings(self, tmp_path):
+        """
+        Test a gazetteer and a cache file from GeocodeSettings.
+
+        Expected:
+            - cache → gazetteer → nominatim, with the cache at the given path
+        """
+        path = tmp_path / "places.json"
+        path.write_text(json.dumps([{"lat": 62.01, "lon": -6.77, "address": {"city": "Tórshavn"}}]))
+        settings = GeocodeSettings(cache=str(tmp_path / "geocode.json"), gazetteer=str(path))
+
+        chain = make_chain(object(), Throttle(0), settings=settings)
+        assert [p.name for p in chain.providers] == ["cache", "gazetteer", "nominatim"]
+        assert chain.lookup(62.01, -6.77)[1] == "gazetteer"
+        chain.flush()
+        assert (tmp_path / "geocode.json").exists()
+
+
+@pytest.mark.integration
+class TestOutage:
+    """Test a trip geocoded while the API is down."""
+
+    def test_smart_gps_extract_falls_through(self, monkeypatch):
+        """
+        Test reverse_geocode_locations against a server failing every request.
+
+        Expected:
+            - Only BREAKER_THRESHOLD requests reach the server
+            - Every day finishes as Unknown, without waiting out backoffs
+        """
+        module = smart_gps_extract.smart_gps_extract_main
+        photos_by_date = {f"2025-08-{d:02d}": [{"lat": 62.01 + i * 0.05, "lon": -6.77} for i in range(5)]
+                          for d in range(1, 8)}
+        dates = sorted(photos_by_date)
+        throttle = Throttle(0)
+        throttle.backoff = lambda *args, **kwargs: 0  # the breaker, not backoff, is under test
+
+        with FakeNominatim(error_rate=1.0, error_statuses=[503]) as server:
+            monkeypatch.setenv("NOMINATIM_URL", server.url)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                locations = module.reverse_geocode_locations(photos_by_date, dates, throttle=throttle)
+            elapsed = time.perf_counter() - start
+
+        assert server.stats["requests"] == BREAKER_THRESHOLD
+        assert {loc["primary"] for loc in locations.values()} == {"Unknown"}
+        assert elapsed < 2
@@ -0,0 +1,240 @@
+"""
+Test suite for the geocoding rate limiter and its settings.
+
+Tests cover:
+- Token bucket: bursts, sustained rate, presets
+- Exponential, jittered backoff honouring Retry-After
+- The in-flight cap across threads
+- Settings from arguments, environment and presets
+"""
+
+import os
+import threading
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts import geocoding
+    from scripts.geocoding import ERROR_BACKOFF, MAX_BACKOFF, PRESETS, GeocodeSettings, Throttle
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+class TestTokenBucket:
+    """Test request spacing."""
+
+    def test_burst_then_rate(self):
+        """
+        Test a bucket of 3 tokens at 20 per second.
+
+        Expected:
+            - The first 3 requests go at once, later ones 50 ms apart
+        """
+        throttle = Throttle.from_rate(20, burst=3)
+        delays = [throttle.reserve() for _ in range(6)]
+
+        assert delays[:3] == [0, 0, 0]
+        assert delays[3:] == pytest.approx([0.05, 0.10, 0.15], abs=0.01)
+
+    def test_bucket_refills_while_idle(self):
+        """
+        Test tokens saved up between requests.
+
+        Expected:
+            - After a pause of two intervals, two requests go at once again
+        """
+        throttle = Throttle(interval=0.02, burst=2)
+        throttle.reserve(), throttle.reserve()
+        time.sleep(0.045)
+
+        assert throttle.reserve() == 0
+        assert throttle.reserve() == pytest.approx(0, abs=0.005)
+        assert throttle.reserve() > 0.01
+
+    def test_presets(self):
+        """
+        Test the named presets.
+
+        Expected:
+            - public: under one request per second, one at a time
+            - self-hosted: tens per second, several in flight
+        """
+        public, hosted = Throttle.preset("public"), Throttle.preset("self-hosted")
+
+        assert public.rate < 1 and (public.burst, public.concurrency) == (1, 1)
+        assert hosted.rate >= 20 and hosted.concurrency > 1
+        assert Throttle(0).rate == float("inf") and Throttle(0).reserve() == 0
+
+    def test_in_flight_cap(self):
+        """
+        Test `request()` from many threads with no rate limit.
+
+        Expected:
+            - Never more than `concurrency` requests inside at once
+        """
+        throttle = Throttle(0, concurrency=3)
+        inside, peak, lock = 0, 0, threading.Lock()
+
+        def call():
+            nonlocal inside, peak
+            with throttle.request():
+                with lock:
+                    inside += 1
+                    peak = max(peak, inside)
+                time.sleep(0.01)
+                with lock:
+                    inside -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert peak == 3
+
+
+class TestBackoff:
+    """Test pauses after failures."""
+
+    def test_exponential_with_jitter(self):
+        """
+        Test failures in a row.
+
+        Expected:
+            - Each pause within [½, 1] of ERROR_BACKOFF · 2ⁿ, capped at MAX_BACKOFF
+            - A success starts over
+        """
+        throttle = Throttle(0, seed=1)
+        pauses = [throttle.backoff() for _ in range(8)]
+
+        for n, pause in enumerate(pauses):
+            ceiling = min(MAX_BACKOFF, ERROR_BACKOFF * 2 ** n)
+            assert ceiling / 2 <= pause <= ceiling
+        throttle.success()
+        assert throttle.backoff() <= ERROR_BACKOFF
+
+    def test_jitter_spreads_callers(self):
+        """
+        Test two clients failing at the same moment.
+
+        Expected:
+            - Different seeds retry at different times
+        """
+        assert Throttle(0, seed=1).backoff() != Throttle(0, seed=2).backoff()
+
+    def test_retry_after_is_a_floor(self):
+        """
+        Test a 429 with Retry-After.
+
+        Expected:
+            - The pause is at least Retry-After, and the next token waits for it
+        """
+        throttle = Throttle(0)
+        assert throttle.backoff(retry_after=30) == 30
+        assert throttle.reserve() == pytest.approx(30, abs=0.1)
+
+    @pytest.mark.edge_case
+    def test_backoff_empties_the_bucket(self):
+        """
+        Test a backoff on a bursty bucket.
+
+        Edge Case:
+            - After the pause, requests are spaced again rather than bursting
+        """
+        throttle = Throttle(interval=0.01, burst=5)
+        throttle.backoff(0.05)
+        first, second = throttle.reserve(), throttle.reserve()
+
+        assert first >= 0.045
+        assert second - first == pytest.approx(0.01, abs=0.003)
+
+
+class TestSettings:
+    """Test where limits come from."""
+
+    def test_defaults_to_public(self, monkeypatch):
+        """
+        Test no arguments and a clean environment.
+
+        Expected:
+            - The public preset and openstreetmap.org
+        """
+        for name in ("NOMINATIM_URL", "NOMINATIM_PRESET", "NOMINATIM_RATE",
+                     "NOMINATIM_BURST", "NOMINATIM_CONCURRENCY"):
+            monkeypatch.delenv(name, raising=False)
+        assert geocoding.settings() == (None, *PRESETS["public"])
+
+    def test_arguments_over_environment_over_preset(self, monkeypatch):
+        """
+        Test precedence.
+
+        Expected:
+            - The environment picks the preset and overrides one limit
+            - A command-line value wins over the environment
+        """
+        monkeypatch.setenv("NOMINATIM_PRESET", "self-hosted")
+        monkeypatch.setenv("NOMINATIM_RATE", "40")
+        monkeypatch.setenv("NOMINATIM_CONCURRENCY", "4")
+        args = SimpleNamespace(nominatim_url=None, geocode_preset=None, geocode_rate=None,
+                               geocode_burst=None, geocode_concurrency=2)
+
+        _, rate, burst, concurrency = geocoding.settings(args)
+        assert (rate, burst, concurrency) == (40.0, PRESETS["self-hosted"][1], 2)
+
+    def test_configure_updates_limiter(self, monkeypatch):
+        """
+        Test applying settings to a limiter.
+
+        Expected:
+            - Rate, burst and in-flight cap changed in place; rate 0 is unlimited
+        """
+        monkeypatch.delenv("NOMINATIM_URL", raising=False)
+        args = SimpleNamespace(nominatim_url=None, geocode_preset="self-hosted", geocode_rate=0.0,
+                               geocode_burst=None, geocode_concurrency=None)
+        throttle = Throttle()
+        geocoding.configure(args, throttle)
+
+        assert throttle.interval == 0 and throttle.concurrency == PRESETS["self-hosted"][2]
+
+    def test_configure_returns_settings_without_touching_environment(self, monkeypatch):
+        """
+        Test the server, cache and offline files from arguments and environment.
+
+        Expected:
+            - Arguments over the environment; no cache file unless one is named
+            - --no-geocode-cache drops $GEOCODE_CACHE
+            - os.environ unchanged afterwards
+        """
+        monkeypatch.setenv("GEOCODE_GAZETTEER", "cities1000.txt")
+        monkeypatch.setenv("GEOCODE_BOUNDARIES", "admin0.geojson")
+        monkeypatch.delenv("GEOCODE_CACHE", raising=False)
+        monkeypatch.delenv("NOMINATIM_URL", raising=False)
+        before = dict(os.environ)
+        args = SimpleNamespace(nominatim_url="http://127.0.0.1:8088", geocode_preset=None, geocode_rate=None,
+                               geocode_burst=None, geocode_concurrency=None, boundaries="countries.geojson")
+
+        assert geocoding.configure(args, Throttle()) == GeocodeSettings(
+            url="http://127.0.0.1:8088", gazetteer="cities1000.txt", boundaries="countries.geojson")
+        monkeypatch.setenv("GEOCODE_CACHE", "geocode.json")
+        assert geocoding.configure(args, Throttle()).cache == "geocode.json"
+        args.no_geocode_cache = True
+        assert geocoding.configure(args, Throttle()).cache is None
+        assert dict(os.environ) == dict(before, GEOCODE_CACHE="geocode.json")
+
+    @pytest.mark.edge_case
+    def test_unknown_preset(self, monkeypatch):
+        """
+        Test a typo in NOMINATIM_PRESET.
+
+        Edge Case:
+            - ValueError naming the valid presets
+        """
+        monkeypatch.setenv("NOMINATIM_PRESET", "fast")
+        with pytest.raises(ValueError, match="self-hosted"):
+            geocoding.settings()
@@ -0,0 +1,199 @@
+"""
+Test suite for gps_filter.py and its use in date analysis.
+
+Tests cover:
+- Teleporting fixes dropped by speed, stale fixes by distance, bad ones by error
+- Real travel kept: flights, day trips, the first photo at home
+- Report-only mode and the options
+- Outliers never reaching the grouped photos the geocoder samples
+"""
+
+import argparse
+import contextlib
+import io
+import pytest
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    from scripts import gps_filter, smart_gps_extract
+    from scripts.gps_filter import GpsFilter, filter_photos, find_outliers
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+START = datetime(2025, 8, 15, 9, 0)
+TORSHAVN = (62.01, -6.77)
+PARIS = (48.86, 2.35)
+
+
+def track(*points):
+    """Photos at (lat, lon, minutes after START)."""
+    return [{'lat': lat, 'lon': lon, 'time': START + timedelta(minutes=m), 'filename': f"IMG_{i}.jpg"}
+            for i, (lat, lon, m) in enumerate(points)]
+
+
+def walk(n, minutes=10, lat=TORSHAVN[0], lon=TORSHAVN[1]):
+    """`n` photos a few hundred metres apart, `minutes` apart."""
+    return [(lat + i * 0.002, lon, i * minutes) for i in range(n)]
+
+
+def names(photos):
+    return [p['filename'] for p in photos]
+
+
+class TestFilter:
+    """Test which fixes are dropped."""
+
+    def test_teleport_dropped(self):
+        """
+        Test one photo in Paris between photos in Tórshavn ten minutes apart.
+
+        Expected:
+            - The Paris fix dropped for speed, everything else kept
+        """
+        points = walk(6)
+        points[3] = (*PARIS, points[3][2])
+        kept, outliers = filter_photos(track(*points), [None] * 6)
+
+        assert names(outliers['speed']) == ["IMG_3.jpg"]
+        assert len(kept) == 5 and "IMG_3.jpg" not in names(kept)
+
+    def test_stale_fix_between_distant_photos(self):
+        """
+        Test a fix from home in a photo hours after the last one.
+
+        Expected:
+            - Slow by the clock but far from both neighbours: dropped as lone
+        """
+        points = walk(3, minutes=240) + [(*PARIS, 730)] + [(p[0], p[1], p[2] + 960) for p in walk(3)]
+        kept, outliers = filter_photos(track(*points), [None] * 7)
+
+        assert names(outliers['lone']) == ["IMG_3.jpg"]
+        assert len(kept) == 6
+
+    def test_real_travel_kept(self):
+        """
+        Test a flight, a one-photo day trip and a first photo at the home airport.
+
+        Expected:
+            - Nothing dropped: the track moves and stays, or moves at road speed
+        """
+        home = [(*PARIS, 0)]
+        faroe = [(p[0], p[1], p[2] + 300) for p in walk(4)]
+        day_trip = [(60.39, -1.3, 700)]  # ~320 km away, hours later
+        back = [(p[0], p[1], p[2] + 1300) for p in walk(3)]
+        kept, outliers = filter_photos(track(*home, *faroe, *day_trip, *back), [None] * 9)
+
+        assert not any(outliers.values())
+        assert len(kept) == 9
+
+    def test_positioning_error(self):
+        """
+        Test a Wi-Fi guess with a 3 km error.
+
+        Expected:
+            - Dropped for error; unknown errors kept
+        """
+        kept, outliers = filter_photos(track(*walk(4)), [5.0, None, 3000.0, 12.0])
+
+        assert names(outliers['error']) == ["IMG_2.jpg"] and len(kept) == 3
+
+    def test_report_only(self):
+        """
+        Test --keep-outliers.
+
+        Expected:
+            - Outliers reported but every photo kept, in time order
+        """
+        points = walk(5)
+        points[2] = (*PARIS, points[2][2])
+        photos = track(*points)[::-1]
+        kept, outliers = filter_photos(photos, [None] * 5, GpsFilter(drop=False))
+
+        assert names(outliers['speed']) == ["IMG_2.jpg"]
+        assert names(kept) == [f"IMG_{i}.jpg" for i in range(5)]
+
+    @pytest.mark.edge_case
+    def test_chunk_seams(self, monkeypatch):
+        """
+        Test teleports on either side of a chunk boundary.
+
+        Edge Case:
+            - Found the same as without chunking
+        """
+        monkeypatch.setattr(gps_filter, "CHUNK", 4)
+        lat = np.array([p[0] for p in walk(12)])
+        lon = np.full(12, TORSHAVN[1])
+        lat[[4, 5 + 3]] = PARIS[0]
+        seconds = np.arange(12) * 600.0
+
+        reason = find_outliers(lat, lon, seconds, np.full(12, np.nan))
+
+        assert np.flatnonzero(reason).tolist() == [4, 8]
+
+    @pytest.mark.edge_case
+    @pytest.mark.parametrize("points,dropped", [
+        ([(*PARIS, 0)] + walk(3, minutes=5), ["IMG_0.jpg"]),        # First photo teleported
+        (walk(3) + [(*PARIS, 25)], ["IMG_3.jpg"]),                  # Last photo teleported
+        (walk(2), []),                                               # Too few photos to judge
+    ])
+    def test_ends(self, points, dropped):
+        """
+        Test the first and last photo, which have one neighbour.
+
+        Edge Cases:
+            - A fast jump at either end is dropped
+            - Two photos are never judged against each other
+        """
+        kept, outliers = filter_photos(track(*points), [None] * len(points))
+        assert names(outliers['speed']) == dropped
+
+    def test_options(self):
+        """
+        Test the command-line options.
+
+        Expected:
+            - Defaults without options, 0 turns a check off
+        """
+        parser = argparse.ArgumentParser()
+        gps_filter.add_arguments(parser)
+
+        assert gps_filter.from_args(parser.parse_args([])) == GpsFilter()
+        custom = gps_filter.from_args(parser.parse_args(["--max-speed", "0", "--keep-outliers"]))
+        assert custom.max_speed_kmh == 0 and custom.drop is False
+        points = walk(5)
+        points[2] = (*PARIS, points[2][2])
+        assert not any(filter_photos(track(*points), [None] * 5, custom)[1].values())
+
+
+class TestAnalysis:
+    """Test the filter inside date analysis."""
+
+    def test_outliers_never_grouped(self):
+        """
+        Test exiftool records with a teleported fix and a bad accuracy.
+
+        Expected:
+            - Neither photo is in any day, so the geocoder never samples them
+            - The counts are reported
+        """
+        module = smart_gps_extract.smart_gps_extract_main
+        records = [
+            {'FileName': f"IMG_{i}.jpg", 'GPSLatitude': lat, 'GPSLongitude': lon,
+             'DateTimeOriginal': (START + timedelta(minutes=m)).strftime('%Y:%m:%d %H:%M:%S')}
+            for i, (lat, lon, m) in enumerate(walk(6))
+        ]
+        records[2].update(GPSLatitude=PARIS[0], GPSLongitude=PARIS[1])
+        records[4]['GPSHPositioningError'] = 5000
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            photos_by_date, dates, _ = module.analyze_date_range(records)
+
+        grouped = [p['filename'] for day in dates for p in photos_by_date[day]]
+        assert grouped == ["IMG_0.jpg", "IMG_1.jpg", "IMG_3.jpg", "IMG_5.jpg"]
+        assert "2 个 GPS 异常点" in out.getvalue()
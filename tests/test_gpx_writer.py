@@ -0,0 +1,147 @@
+"""
+Test suite for the streaming GPX writer and json2gpx.
+
+Tests cover:
+- Byte-for-byte parity with gpxpy's output
+- Escaping of names and creators
+- json2gpx ordering, elevation and skipped records
+- json2gpx --route: one route line per day
+"""
+
+import io
+import json
+import pytest
+from datetime import datetime
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import gpxpy
+    import gpxpy.gpx
+    from scripts.gpx_writer import write_track
+    from scripts.json2gpx import json_to_gpx
+    from scripts.route_codec import decode
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+POINTS = [
+    (62.0123456789, -6.77, 12.5, datetime(2025, 8, 15, 10, 0, 0)),
+    (62.0, -6.7, None, datetime(2025, 8, 15, 11, 30, 5)),
+    (55.68, 12.57, 0.0, datetime(2025, 8, 16, 9, 0, 0)),
+]
+
+
+class TestWriteTrack:
+    """Test the streaming writer."""
+
+    def test_matches_gpxpy(self):
+        """
+        Test parity with gpxpy.
+
+        Expected:
+            - Identical text, including points without elevation
+        """
+        gpx = gpxpy.gpx.GPX()
+        gpx.creator = "Smart GPS Extractor - SongshGeo"
+        track = gpxpy.gpx.GPXTrack()
+        track.name = "Trip 2025-08-15 to 2025-08-16"
+        gpx.tracks.append(track)
+        segment = gpxpy.gpx.GPXTrackSegment()
+        track.segments.append(segment)
+        for lat, lon, ele, time in POINTS:
+            segment.points.append(gpxpy.gpx.GPXTrackPoint(lat, lon, elevation=ele, time=time))
+
+        out = io.StringIO()
+        count = write_track(out, ((lat, lon, ele, t.isoformat()) for lat, lon, ele, t in POINTS),
+                            creator=gpx.creator, name=track.name)
+
+        assert count == 3
+        assert out.getvalue() == gpx.to_xml()
+
+    @pytest.mark.edge_case
+    def test_escapes_markup(self):
+        """
+        Test names that aren't plain text.
+
+        Edge Cases:
+            - Ampersands, angle brackets and quotes survive a parse
+        """
+        out = io.StringIO()
+        write_track(out, [], creator='A "quoted" <tool>', name="Faroe & <Denmark>")
+
+        parsed = gpxpy.parse(out.getvalue())
+        assert parsed.creator == 'A "quoted" <tool>'
+        assert parsed.tracks[0].name == "Faroe & <Denmark>"
+
+
+class TestJsonToGpx:
+    """Test converting an exiftool export."""
+
+    def test_points_sorted_and_bad_records_skipped(self, temp_dir, capsys):
+        """
+        Test the conversion.
+
+        Expected:
+            - Points in time order, elevation only where present
+            - Records without GPS ignored, unparsable dates skipped and reported
+        """
+        records = [
+            {"FileName": "b.jpg", "GPSLatitude": 55.68, "GPSLongitude": 12.57,
+             "DateTimeOriginal": "2025:08:16 09:00:00", "GPSAltitude": 20},
+            {"FileName": "a.jpg", "GPSLatitude": 62.01, "GPSLongitude": -6.77,
+             "DateTimeOriginal": "2025:08:15 10:00:00"},
+            {"FileName": "nogps.jpg", "DateTimeOriginal": "2025:08:15 11:00:00"},
+            {"FileName": "bad.jpg", "GPSLatitude": 1, "GPSLongitude": 1,
+             "DateTimeOriginal": "0000:00:00 00:00:00"},
+        ]
+        source = temp_dir / "in.json"
+        source.write_text(json.dumps(records))
+
+        json_to_gpx(str(source), str(temp_dir / "out.gpx"))
+
+        points = gpxpy.parse((temp_dir / "out.gpx").read_text()).tracks[0].segments[0].points
+        assert [(p.latitude, p.elevation) for p in points] == [(62.01, None), (55.68, 20.0)]
+        assert points[0].time == datetime(2025, 8, 15, 10, 0, 0)
+        out = capsys.readouterr().out
+        assert "跳过 bad.jpg" in out and "开始: 2025-08-15 10:00:00" in out
+
+    def test_route_split_by_day(self, temp_dir, capsys):
+        """
+        Test --route.
+
+        Expected:
+            - One day per calendar date, points in time order
+        """
+        records = [
+            {"FileName": f"{i}.jpg", "GPSLatitude": 62.0 + i / 100, "GPSLongitude": -6.77,
+             "DateTimeOriginal": f"2025:08:{15 + i // 3} {10 + i % 3:02d}:00:00"}
+            for i in reversed(range(6))
+        ]
+        source = temp_dir / "in.json"
+        source.write_text(json.dumps(records))
+
+        json_to_gpx(str(source), str(temp_dir / "out.gpx"), str(temp_dir / "route.json"))
+
+        days = json.loads((temp_dir / "route.json").read_text())["days"]
+        assert [d["date"] for d in days] == ["2025-08-15", "2025-08-16"]
+        assert decode(days[1]["line"])[0] == (62.03, -6.77)
+
+    @pytest.mark.edge_case
+    def test_no_usable_records_exits(self, temp_dir):
+        """
+        Test an export without GPS.
+
+        Edge Case:
+            - Exit code 1, no GPX written
+        """
+        source = temp_dir / "in.json"
+        source.write_text(json.dumps([{"FileName": "x.jpg"}]))
+
+        with pytest.raises(SystemExit) as exc:
+            json_to_gpx(str(source), str(temp_dir / "out.gpx"))
+
+        assert exc.value.code == 1
+        assert not (temp_dir / "out.gpx").exists()
@@ -8,10 +8,11 @@ This module provides utilities to:
 """
 
 import json
+import random
 import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 
 
 class TestDataGenerator:
@@ -177,6 +178,67 @@ class TestDataGenerator:
         
         return photos
 
+    @staticmethod
+    def iter_photo_library(
+        num_photos: int,
+        photos_per_trip: int = 500,
+        days_per_trip: int = 10,
+        start_date: datetime = datetime(2015, 1, 1),
+        seed: int = 0
+    ) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Generate a synthetic photo library, one trip at a time.
+
+        Trips are centred on MockGeocoder's known cities (so every lookup
+        resolves), one every 30 days. Records carry everything the pipeline
+        and build_featured read: GPS, altitude, date, SourceFile and a
+        rating for about one photo in five. Yielding per trip keeps memory
+        flat even for million-photo libraries.
+
+        Args:
+            num_photos: Total number of photos across all trips
+            photos_per_trip: Photos per trip (the last trip may be smaller)
+            days_per_trip: Days each trip spans
+            start_date: Start of the first trip
+            seed: Random seed; equal seeds give identical libraries
+
+        Yields:
+            (trip_name, records) tuples
+
+        Examples:
+            >>> gen = TestDataGenerator()
+            >>> trips = list(gen.iter_photo_library(1200))
+            >>> [len(records) for _, records in trips]
+            [500, 500, 200]
+        """
+        rng = random.Random(seed)
+        cities = list(MockGeocoder().known_locations)
+        per_day = max(1, photos_per_trip // days_per_trip)
+
+        for trip, first in enumerate(range(0, num_photos, photos_per_trip)):
+            name = f"trip-{trip:05d}"
+            lat0, lon0 = cities[trip % len(cities)]
+            trip_start = (start_date + timedelta(days=30 * trip)).replace(hour=8)
+            records = []
+            for n in range(min(photos_per_trip, num_photos - first)):
+                day, slot = divmod(n, per_day)
+                taken = trip_start + timedelta(days=min(day, days_per_trip - 1),
+                                               seconds=slot * 600 + rng.randrange(600))
+                filename = f"IMG_{first + n:07d}.jpg"
+                record = {
+                    "SourceFile": f"content/trips/{name}/{filename}",
+                    "FileName": filename,
+                    # Jitter stays within MockGeocoder's 2-decimal rounding
+                    "GPSLatitude": lat0 + rng.uniform(-0.004, 0.004),
+                    "GPSLongitude": lon0 + rng.uniform(-0.004, 0.004),
+                    "GPSAltitude": rng.uniform(0, 300),
+                    "DateTimeOriginal": taken.strftime('%Y:%m:%d %H:%M:%S'),
+                }
+                if rng.random() < 0.2:
+                    record["Rating"] = rng.randint(1, 5)
+                records.append(record)
+            yield name, records
+
 
 class MockGeocoder:
     """Mock geocoder for testing without API calls."""
@@ -0,0 +1,215 @@
+"""
+Test suite for perceptual hashing and near-duplicate lookup.
+
+Tests cover:
+- pHash stability across re-exports and sensitivity to different scenes
+- BK-tree radius queries against brute force
+- Content-keyed hash cache
+- Duplicate grouping and featured dedup
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add scripts to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from PIL import Image, ImageDraw, ImageEnhance
+    from scripts.image_hash import BKTree, HashCache, duplicate_groups, hamming, phash
+    from scripts.build_featured import drop_near_duplicates
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def _scene(seed: int, size=(640, 480)) -> Image.Image:
+    """Random shapes on a gradient: distinct per seed, stable per seed."""
+    rng = random.Random(seed)
+    im = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(im)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randrange(20, 120)
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=colour)
+    return im
+
+
+class TestPerceptualHash:
+    """Test pHash behaviour on re-exports and distinct photos."""
+
+    def test_reexport_is_near_duplicate(self, temp_dir):
+        """
+        Test that a resized, brightened, recompressed copy hashes close.
+
+        Scenario:
+            - Same shot exported twice under different names and settings
+        """
+        original = temp_dir / "P8210189.jpg"
+        reedit = temp_dir / "P8210189-edit.jpg"
+        _scene(1).save(original, quality=95)
+        ImageEnhance.Brightness(_scene(1).resize((320, 240))).enhance(1.15).save(reedit, quality=60)
+
+        assert hamming(phash(str(original)), phash(str(reedit))) <= 6
+
+    def test_different_scenes_are_far(self, temp_dir):
+        """
+        Test that unrelated photos are far apart.
+
+        Expected:
+            - Distance well above the default dedup threshold
+        """
+        a, b = temp_dir / "a.jpg", temp_dir / "b.jpg"
+        _scene(1).save(a)
+        _scene(2).save(b)
+
+        assert hamming(phash(str(a)), phash(str(b))) > 12
+
+    def test_undecodable_file(self, temp_dir):
+        """
+        Test that a broken file hashes to None.
+
+        Edge Case:
+            - Corrupt file in the archive must not abort the build
+        """
+        path = temp_dir / "broken.jpg"
+        path.write_bytes(b"\xff\xd8 not really")
+
+        assert phash(str(path)) is None
+
+    def test_decompression_bomb(self, temp_dir, monkeypatch):
+        """
+        Test that an image past Pillow's pixel limit hashes to None.
+
+        Edge Case:
+            - Huge stitched panorama must not abort the build either
+        """
+        path = temp_dir / "panorama.jpg"
+        _scene(1).save(path)
+        monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+
+        assert phash(str(path)) is None
+
+
+class TestBKTree:
+    """Test BK-tree radius search."""
+
+    def test_matches_brute_force(self):
+        """
+        Test that radius queries return exactly the brute-force result.
+
+        Scenario:
+            - 2,000 random 64-bit hashes, queries at several radii
+        """
+        rng = random.Random(42)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        tree = BKTree((h, i) for i, h in enumerate(hashes))
+
+        for query in hashes[:20]:
+            for radius in (0, 4, 10):
+                expected = sorted(i for i, h in enumerate(hashes) if hamming(query, h) <= radius)
+                assert sorted(v for _, v in tree.search(query, radius)) == expected
+
+        assert len(tree) == 2000
+
+    def test_empty_tree(self):
+        """
+        Test searching an empty tree.
+
+        Edge Case:
+            - First featured photo is checked against an empty index
+        """
+        assert BKTree().search(0, 10) == []
+
+
+class TestHashCache:
+    """Test the content-keyed hash cache."""
+
+    def test_roundtrip_and_rename(self, temp_dir):
+        """
+        Test that hashes persist and follow content, not file names.
+
+        Scenario:
+            - A hash stored for one file is found for a renamed byte-identical copy
+        """
+        photo = temp_dir / "a.jpg"
+        photo.write_bytes(b"same bytes")
+        copy = temp_dir / "renamed.jpg"
+        copy.write_bytes(b"same bytes")
+
+        cache = HashCache(str(temp_dir / "cache" / "hashes.json"))
+        cache.put(cache.digest(str(photo)), 0xABC)
+        cache.save()
+
+        reloaded = HashCache(str(temp_dir / "cache" / "hashes.json"))
+        assert reloaded.get(reloaded.digest(str(copy))) == 0xABC
+
+    @pytest.mark.edge_case
+    def test_save_drops_unseen_files(self, temp_dir):
+        """
+        Test that deleted and renamed photos leave the cache.
+
+        Edge Cases:
+            - A path not hashed in this run is dropped, with its content's hash
+            - A hash still used by a kept path stays
+        """
+        kept, gone = temp_dir / "kept.jpg", temp_dir / "gone.jpg"
+        kept.write_bytes(b"kept bytes")
+        gone.write_bytes(b"gone bytes")
+        path = str(temp_dir / "hashes.json")
+        cache = HashCache(path)
+        cache.put(cache.digest(str(kept)), 0x1)
+        cache.put(cache.digest(str(gone)), 0x2)
+        cache.save()
+
+        gone.unlink()
+        rerun = HashCache(path)
+        rerun.digest(str(kept))
+        rerun.save()
+
+        reloaded = HashCache(path)
+        assert list(reloaded.files) == [str(kept)]
+        assert list(reloaded.hashes.values()) == [f"{0x1:016x}"]
+
+
+class TestDuplicateGroups:
+    """Test archive-wide grouping and featured dedup."""
+
+    def test_groups_are_transitive(self):
+        """
+        Test grouping of chained near-duplicates.
+
+        Expected:
+            - a~b and b~c end up in one group; far hashes stay alone
+        """
+        hashes = {"a.jpg": 0b0000, "b.jpg": 0b0011, "c.jpg": 0b1111, "d.jpg": (1 << 63) - 1}
+
+        assert duplicate_groups(hashes, radius=2) == [["a.jpg", "b.jpg", "c.jpg"]]
+
+    def test_featured_keeps_highest_ranked(self):
+        """
+        Test that featured dedup keeps the first (best-ranked) copy.
+
+        Scenario:
+            - 20250821-P8210189.jpeg in both content/trips/ and Denmark/
+        """
+        items = [
+            {"page": "trips/Denmark", "src": "20250821-P8210189.jpeg"},
+            {"page": "trips", "src": "copy-of-P8210189.jpeg"},
+            {"page": "trips/Japan", "src": "20250725-P7250201.jpg"},
+            {"page": "trips/Japan", "src": "unhashed.jpg"},
+        ]
+        hashes = {
+            "content/trips/Denmark/20250821-P8210189.jpeg": 0xF0F0,
+            "content/trips/copy-of-P8210189.jpeg": 0xF0F1,
+            "content/trips/Japan/20250725-P7250201.jpg": 0x0F0F0F0F0F0F,
+        }
+
+        kept = drop_near_duplicates(items, hashes, threshold=6)
+
+        assert [i["src"] for i in kept] == [
+            "20250821-P8210189.jpeg", "20250725-P7250201.jpg", "unhashed.jpg",
+        ]
@@ -0,0 +1,202 @@
+"""
+Memory-budget regression tests for the pipeline stages.
+
+Tests cover:
+- Flat peak memory for the streaming paths (exiftool JSON reader, featured scan)
+- Per-record budgets for json2gpx, GPX generation and trip statistics
+- Per-record budget for date analysis, which holds the trip by design
+
+Each stage runs on generated inputs of increasing size under tracemalloc.
+A streaming path must not grow with the input; a path that has to keep
+every point must stay within a fixed number of bytes per record. Reading a
+whole exiftool document with `json.load`, or building the whole GPX in
+memory, breaks these budgets by an order of magnitude.
+"""
+
+import contextlib
+import gc
+import io
+import json
+import os
+import tracemalloc
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts import build_featured, smart_gps_extract
+    from scripts.exif_json import iter_records
+    from scripts.geocoding import Throttle
+    from scripts.json2gpx import json_to_gpx
+    from scripts.trip_stats import trip_stats
+    from tests.benchmarks.pipeline import GeopyMockGeocoder
+    from tests.test_helpers import TestDataGenerator
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+module = smart_gps_extract.smart_gps_extract_main
+
+SMALL, LARGE = 2_000, 20_000
+GROWTH_LIMIT = 1.5  # max peak ratio for streaming paths while the input grows 10×
+SLACK = 64 * 1024  # allocator and first-call noise, far below 10× growth of any buffer
+
+pytestmark = pytest.mark.memory
+
+
+def peak_memory(func, *args, **kwargs):
+    """Peak bytes allocated while `func` runs (its printed output discarded)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def library(n, trips=10):
+    """`n` generated records spread over a fixed number of trips."""
+    return [r for _, records in TestDataGenerator.iter_photo_library(n, photos_per_trip=n // trips)
+            for r in records]
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    """exiftool-style JSON exports of SMALL and LARGE photos: {n: path}."""
+    root = tmp_path_factory.mktemp("exports")
+    paths = {}
+    for n in (SMALL, LARGE):
+        paths[n] = root / f"export-{n}.json"
+        with open(paths[n], "w", encoding="utf-8") as fh:
+            json.dump(library(n), fh, indent=1)
+    return paths
+
+
+class TestStreamingPaths:
+    """Test that streaming stages use constant memory."""
+
+    def test_exif_json_reader_is_flat(self, exports):
+        """
+        Test reading an exiftool export record by record.
+
+        Expected:
+            - Peak memory doesn't grow with the document
+            - Peak stays far below the document size
+        """
+        def read(path):
+            with open(path, encoding="utf-8") as fh:
+                for _ in iter_records(fh):
+                    pass
+
+        small, large = (peak_memory(read, exports[n]) for n in (SMALL, LARGE))
+
+        assert large < small * GROWTH_LIMIT + SLACK, f"peak grew {large / small:.1f}× for 10× the input"
+        assert large < os.path.getsize(exports[LARGE]) / 10
+
+    def test_featured_scan_is_flat(self, exports):
+        """
+        Test build_featured's scan: stream, rate filter, bounded top-K.
+
+        Expected:
+            - Peak memory depends on the number of trips, not photos
+        """
+        def scan(path):
+            selector = build_featured.FeaturedSelector(limit=60, per_page=4)
+            with open(path, encoding="utf-8") as fh:
+                for record in iter_records(fh):
+                    item = build_featured.featured_item(record, 1)
+                    if item is not None:
+                        selector.push(item)
+            build_featured.drop_near_duplicates(selector.ranked(), {}, 10)
+
+        small, large = (peak_memory(scan, exports[n]) for n in (SMALL, LARGE))
+
+        assert large < small * GROWTH_LIMIT + SLACK, f"peak grew {large / small:.1f}× for 10× the input"
+
+    def test_geocode_planning_is_flat(self, monkeypatch):
+        """
+        Test day-by-day geocoding of one trip with more and more photos.
+
+        Expected:
+            - Peak memory depends on the number of days, not photos
+        """
+        monkeypatch.setattr(module, "make_geocoder", GeopyMockGeocoder)
+        peaks = []
+        for n in (SMALL, LARGE):
+            with contextlib.redirect_stdout(io.StringIO()):
+                photos_by_date, dates, _ = module.analyze_date_range(library(n, trips=1))
+            peaks.append(peak_memory(module.reverse_geocode_locations,
+                                     photos_by_date, dates, throttle=Throttle(0)))
+
+        assert peaks[1] < peaks[0] * GROWTH_LIMIT + SLACK
+
+
+class TestPerRecordBudgets:
+    """Test stages that must keep every point, at a bounded cost each."""
+
+    JSON2GPX_BYTES = 160      # typed arrays + sort index; json.load needs ~1.5 KB
+    GPX_WRITE_BYTES = 48      # sort of existing points; gpxpy objects need ~1 KB
+    STATS_BYTES = 120         # a few float arrays; a list of tuples per point needs ~200
+    ANALYZE_BYTES = 400       # one small dict per photo
+
+    @pytest.mark.slow
+    def test_json2gpx_budget(self, exports, temp_dir):
+        """
+        Test converting a large export.
+
+        Expected:
+            - Within JSON2GPX_BYTES per record
+            - Never as much as the input document itself
+        """
+        path = exports[LARGE]
+        peak = peak_memory(json_to_gpx, str(path), str(temp_dir / "track.gpx"))
+
+        assert peak / LARGE < self.JSON2GPX_BYTES, f"{peak / LARGE:.0f} bytes per record"
+        assert peak < os.path.getsize(path) / 2, "the input document appears to be buffered whole"
+
+    def test_generate_gpx_budget(self, temp_dir):
+        """
+        Test writing a large trip's GPX.
+
+        Expected:
+            - Within GPX_WRITE_BYTES per point, far below the GPX file size
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            photos_by_date, dates, _ = module.analyze_date_range(library(LARGE))
+        locations = {d: {'primary': 'X', 'all': ['X'], 'count': 1} for d in dates}
+        (temp_dir / "gpx").mkdir()
+
+        peak = peak_memory(module.generate_gpx, photos_by_date, dates, locations, "big",
+                           output_dir=str(temp_dir / "gpx"))
+
+        assert peak / LARGE < self.GPX_WRITE_BYTES, f"{peak / LARGE:.0f} bytes per point"
+        assert peak < os.path.getsize(temp_dir / "gpx" / "big.gpx") / 4
+
+    def test_trip_stats_budget(self):
+        """
+        Test trip statistics over a large library.
+
+        Expected:
+            - Within STATS_BYTES per point
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            photos_by_date, dates, _ = module.analyze_date_range(library(LARGE))
+        trip_stats({dates[0]: photos_by_date[dates[0]]}, dates[:1])  # import NumPy outside the measurement
+
+        peak = peak_memory(trip_stats, photos_by_date, dates)
+
+        assert peak / LARGE < self.STATS_BYTES, f"{peak / LARGE:.0f} bytes per point"
+
+    @pytest.mark.slow
+    def test_analyze_budget(self):
+        """
+        Test grouping a large library by date.
+
+        Expected:
+            - Within ANALYZE_BYTES per record
+        """
+        peak = peak_memory(module.analyze_date_range, library(LARGE))
+        assert peak / LARGE < self.ANALYZE_BYTES, f"{peak / LARGE:.0f} bytes per record"
@@ -0,0 +1,224 @@
+"""
+Test suite for stage timings and performance traces.
+
+Tests cover:
+- Stage spans, timers and counters
+- Rate-limited progress output
+- --trace / --cprofile / --profile reporting at exit
+- Instrumentation of the throttle and the GPS pipeline
+"""
+
+import atexit
+import io
+import json
+import pstats
+import subprocess
+import threading
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+import sys
+
+REPO = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO))
+
+try:
+    from scripts import perf
+    from scripts.geocoding import Throttle
+    from scripts.perf import TRACER, Progress, Tracer
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+class TestTracer:
+    """Test the collector itself."""
+
+    def test_stage_records_wall_and_cpu(self):
+        """
+        Test a stage span.
+
+        Expected:
+            - Wall time covers a sleep, CPU time doesn't
+            - The thread's label is attached
+        """
+        tracer = Tracer()
+        with tracer.label("faroe"), tracer.stage("extract"):
+            time.sleep(0.02)
+
+        (span,) = tracer.stages
+        assert span["name"] == "extract" and span["label"] == "faroe"
+        assert span["wall_s"] >= 0.015
+        assert span["cpu_s"] < span["wall_s"]
+
+    def test_labels_are_per_thread(self):
+        """
+        Test labels under concurrency.
+
+        Edge Cases:
+            - Two threads labelled differently at the same time
+            - Label restored after the block
+        """
+        tracer = Tracer()
+        barrier = threading.Barrier(2)
+
+        def trip(name):
+            with tracer.label(name):
+                barrier.wait()
+                with tracer.stage("gpx"):
+                    pass
+
+        threads = [threading.Thread(target=trip, args=(n,)) for n in ("a", "b")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert sorted(s["label"] for s in tracer.stages) == ["a", "b"]
+        with tracer.stage("after"):
+            pass
+        assert tracer.stages[-1]["label"] is None
+
+    def test_stage_recorded_on_exception(self):
+        """
+        Test that a failing stage still shows up.
+
+        Edge Cases:
+            - Exception propagates unchanged
+        """
+        tracer = Tracer()
+        with pytest.raises(ValueError):
+            with tracer.stage("scan"):
+                raise ValueError("boom")
+        assert [s["name"] for s in tracer.stages] == ["scan"]
+
+    def test_report_is_json(self):
+        """
+        Test the machine-readable report.
+
+        Expected:
+            - Timers accumulate calls and seconds, counters add up
+            - The report survives a JSON round trip
+        """
+        tracer = Tracer()
+        tracer.add_time("subprocess.exiftool", 0.5)
+        tracer.add_time("subprocess.exiftool", 0.25)
+        tracer.count("geocode.cache_hit")
+        tracer.count("geocode.cache_hit", 2)
+
+        data = json.loads(json.dumps(tracer.report()))
+
+        assert data["timers"]["subprocess.exiftool"] == {"calls": 2, "seconds": 0.75}
+        assert data["counters"] == {"geocode.cache_hit": 3}
+
+        out = io.StringIO()
+        tracer.print_summary(out)
+        assert "subprocess.exiftool" in out.getvalue()
+
+
+class TestProgress:
+    """Test rate-limited progress output."""
+
+    def test_prints_at_most_once_per_interval(self):
+        """
+        Test output volume for a long loop.
+
+        Expected:
+            - The first and the final update are always printed
+            - Updates in between are dropped within the interval
+        """
+        out = io.StringIO()
+        progress = Progress(10_000, "photos", interval=60, stream=out)
+        for i in range(1, 10_001):
+            progress.update(i)
+
+        lines = out.getvalue().splitlines()
+        assert lines == ["photos 1/10000", "photos 10000/10000"]
+
+
+class TestReporting:
+    """Test the command-line flags."""
+
+    def test_finish_writes_trace_and_profile(self, temp_dir, capsys):
+        """
+        Test what `start()` writes at exit.
+
+        Expected:
+            - --trace writes the JSON report
+            - --cprofile writes loadable pstats data
+            - --profile prints the summary to stderr
+        """
+        args = SimpleNamespace(
+            quiet=False, profile=True,
+            trace=str(temp_dir / "trace.json"), cprofile=str(temp_dir / "run.prof"),
+        )
+        finish = perf.start(args)
+        atexit.unregister(finish)  # run it here instead of at pytest's exit
+        with TRACER.stage("test-stage"):
+            sum(range(1000))
+        finish()
+
+        trace = json.loads((temp_dir / "trace.json").read_text())
+        assert "test-stage" in [s["name"] for s in trace["stages"]]
+        assert pstats.Stats(str(temp_dir / "run.prof")).total_calls > 0
+        assert "test-stage" in capsys.readouterr().err
+
+    def test_trace_written_by_cli(self, temp_dir):
+        """
+        Test --trace end to end through `python -m scripts gpx`.
+
+        Expected:
+            - The trace holds the gpx stage and point counters
+        """
+        source = temp_dir / "in.json"
+        source.write_text(json.dumps([
+            {"GPSLatitude": 62.0, "GPSLongitude": -6.7, "DateTimeOriginal": "2025:08:15 10:00:00"},
+            {"GPSLatitude": 62.1, "GPSLongitude": -6.8, "DateTimeOriginal": "2025:08:15 11:00:00"},
+        ]))
+        trace = temp_dir / "trace.json"
+
+        result = subprocess.run(
+            [sys.executable, "-m", "scripts", "gpx", str(source), str(temp_dir / "out.gpx"),
+             "--trace", str(trace)],
+            cwd=REPO, capture_output=True, text=True,
+        )
+
+        assert result.returncode == 0, result.stderr
+        data = json.loads(trace.read_text())
+        assert [s["name"] for s in data["stages"]] == ["gpx"]
+        assert data["counters"]["gpx.points"] == 2
+
+
+class TestInstrumentation:
+    """Test what the scripts record."""
+
+    def test_throttle_sleep_is_timed(self):
+        """
+        Test that rate-limit sleeps are accounted for.
+
+        Expected:
+            - Each wait adds one call; the forced backoff shows up as time
+        """
+        before = TRACER.report()["timers"].get("geocode.throttle_sleep", {"calls": 0, "seconds": 0})
+        throttle = Throttle(interval=0.0)
+        throttle.backoff(0.03)
+        throttle.wait()
+        throttle.wait()
+
+        after = TRACER.report()["timers"]["geocode.throttle_sleep"]
+        assert after["calls"] - before["calls"] == 2
+        assert after["seconds"] - before["seconds"] >= 0.02
+
+    def test_subprocess_timed_by_program(self, monkeypatch):
+        """
+        Test `perf.run`.
+
+        Expected:
+            - Timed under the program's base name
+        """
+        monkeypatch.setattr(subprocess, "run", lambda cmd, **kw: SimpleNamespace(returncode=0))
+        before = TRACER.report()["timers"].get("subprocess.exiftool", {"calls": 0})["calls"]
+
+        perf.run(["/usr/local/bin/exiftool", "-json", "."])
+
+        assert TRACER.report()["timers"]["subprocess.exiftool"]["calls"] == before + 1
@@ -0,0 +1,127 @@
+"""
+Test suite for route_codec.py.
+
+Tests cover:
+- Google encoded polyline round trips (against the reference example)
+- Douglas-Peucker simplification and photo anchors
+- The route document: per-day lines, size on a long trip
+"""
+
+import json
+import math
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scripts.route_codec import anchors, build_route, decode, encode, route_path, simplify, write_route
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+# The example from Google's polyline algorithm documentation
+REFERENCE = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+REFERENCE_TEXT = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+class TestPolyline:
+    """Test encoding and decoding."""
+
+    def test_reference_example(self):
+        """
+        Test against Google's documented example.
+
+        Expected:
+            - Encodes to the documented string and decodes back
+        """
+        assert encode(REFERENCE) == REFERENCE_TEXT
+        assert decode(REFERENCE_TEXT) == REFERENCE
+
+    @pytest.mark.edge_case
+    def test_quantized_round_trip(self):
+        """
+        Test points with more precision than the encoding keeps.
+
+        Edge Cases:
+            - Rounded to 1e-5 degrees, negative and antimeridian values intact
+        """
+        points = [(62.0123456, -6.7712345), (-33.8688197, 151.2092955), (0.0, -179.99999)]
+        decoded = decode(encode(points))
+        assert decoded == [(round(a, 5), round(b, 5)) for a, b in points]
+        assert decode(encode([])) == []
+
+
+class TestSimplify:
+    """Test thinning a day's track."""
+
+    def test_straight_run_collapses(self):
+        """
+        Test points along a straight road.
+
+        Expected:
+            - Only the end points remain
+        """
+        line = [(62.0 + i * 0.001, -6.77) for i in range(50)]
+        assert simplify(line, 10.0) == [line[0], line[-1]]
+
+    def test_detour_kept(self):
+        """
+        Test a short out-and-back detour.
+
+        Expected:
+            - The turning point is kept even though it lies near the chord's line
+        """
+        line = [(62.0, -6.77), (62.01, -6.77), (62.05, -6.77), (62.02, -6.77), (62.03, -6.77)]
+        kept = simplify(line, 10.0)
+        assert (62.05, -6.77) in kept and kept[0] == line[0] and kept[-1] == line[-1]
+
+    def test_anchors_merge_nearby_photos(self):
+        """
+        Test anchors for a burst of photos and a distant one.
+
+        Expected:
+            - One anchor per place, with its photo count
+        """
+        points = [(62.0, -6.77)] * 4 + [(62.00001, -6.77001), (62.5, -6.77)]
+        places, counts = anchors(points, 100.0)
+        assert places == [(62.0, -6.77), (62.5, -6.77)] and counts == [5, 1]
+
+
+class TestRoute:
+    """Test the route document."""
+
+    def test_days_and_size(self, temp_dir):
+        """
+        Test a ten-day trip with a photo every few hundred metres.
+
+        Expected:
+            - One line per day, each within the tolerance of its track
+            - A few KB of JSON for 5000 photos, in the site's data/routes
+        """
+        days = []
+        for d in range(10):
+            points = [(35.0 + d * 0.1 + 0.02 * math.sin(i / 40), 139.0 + i * 0.001) for i in range(500)]
+            days.append((f"2025-04-{d + 1:02d}", points))
+        route = build_route(days)
+        path = Path(route_path(str(temp_dir / "gpx"), "japan-2025"))
+        write_route(str(path), route)
+
+        assert [d["date"] for d in route["days"]] == [d for d, _ in days]
+        assert all(sum(day["photos"]) == 500 for day in route["days"])
+        assert path == temp_dir / "data" / "routes" / "japan-2025.json"
+        assert json.loads(path.read_text()) == route
+        assert path.stat().st_size < 8 * 1024
+        line = decode(route["days"][0]["line"])
+        assert line[0] == days[0][1][0] and 2 < len(line) < 100
+
+    @pytest.mark.edge_case
+    def test_empty_trip(self):
+        """
+        Test a trip without points.
+
+        Edge Case:
+            - An empty document, not an error
+        """
+        assert build_route([("2025-04-01", [])])["days"] == []
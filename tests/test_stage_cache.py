@@ -0,0 +1,112 @@
+"""
+Test suite for pipeline artifact fingerprints.
+
+Tests cover:
+- Stable stage keys
+- Photo folder signatures
+- Stamp freshness and invalidation
+"""
+
+import os
+import pytest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scripts.stage_cache import StageStamps, fingerprint, folder_signature
+
+
+class TestFingerprint:
+    """Test stage keys."""
+
+    def test_key_is_order_independent_for_dicts(self):
+        """
+        Test that equal inputs give equal keys.
+
+        Expected:
+            - Dict key order doesn't matter; values and stage names do
+        """
+        assert fingerprint("summary", {"a": 1, "b": 2}) == fingerprint("summary", {"b": 2, "a": 1})
+        assert fingerprint("summary", {"a": 1}) != fingerprint("summary", {"a": 2})
+        assert fingerprint("gpx", "x") != fingerprint("summary", "x")
+
+
+class TestFolderSignature:
+    """Test photo folder signatures."""
+
+    def test_only_photos_count(self, temp_dir):
+        """
+        Test which files make up a signature.
+
+        Edge Cases:
+            - Upper-case extensions and nested folders are included
+            - Sidecars and other files are ignored
+        """
+        (temp_dir / "day1").mkdir()
+        (temp_dir / "day1" / "IMG_1.JPG").write_bytes(b"a")
+        (temp_dir / "IMG_2.heic").write_bytes(b"bb")
+        (temp_dir / "IMG_2.xmp").write_bytes(b"sidecar")
+        (temp_dir / "notes.txt").write_bytes(b"x")
+
+        sig = folder_signature(str(temp_dir))
+
+        assert [entry[:2] for entry in sig] == [["IMG_2.heic", 2], [os.path.join("day1", "IMG_1.JPG"), 1]]
+
+    def test_modified_photo_changes_signature(self, temp_dir):
+        """
+        Test that an edited photo is noticed.
+
+        Expected:
+            - A size or mtime change alters the signature
+        """
+        photo = temp_dir / "IMG_1.jpg"
+        photo.write_bytes(b"a")
+        before = folder_signature(str(temp_dir))
+        photo.write_bytes(b"ab")
+        assert folder_signature(str(temp_dir)) != before
+
+
+class TestStageStamps:
+    """Test freshness checks."""
+
+    @pytest.fixture
+    def artifact(self, gpx_dir):
+        path = gpx_dir / "trip.gpx"
+        path.write_text("<gpx/>")
+        return str(path)
+
+    def test_fresh_after_record(self, gpx_dir, artifact):
+        """
+        Test the round trip through the stamps file.
+
+        Expected:
+            - Fresh for the recorded key, in a new StageStamps instance too
+            - Stale for any other key
+        """
+        StageStamps(str(gpx_dir), "trip").record(artifact, "k1")
+
+        stamps = StageStamps(str(gpx_dir), "trip")
+        assert stamps.fresh(artifact, "k1")
+        assert not stamps.fresh(artifact, "k2")
+        assert (gpx_dir / "trip.stamps.json").exists()
+
+    @pytest.mark.edge_case
+    def test_stale_when_artifact_edited_or_missing(self, gpx_dir, artifact):
+        """
+        Test that outputs touched outside the pipeline are rebuilt.
+
+        Edge Cases:
+            - Artifact edited by hand
+            - Artifact deleted
+            - Forced rebuild (enabled=False)
+        """
+        stamps = StageStamps(str(gpx_dir), "trip")
+        stamps.record(artifact, "k1")
+        assert not StageStamps(str(gpx_dir), "trip", enabled=False).fresh(artifact, "k1")
+
+        Path(artifact).write_text("<gpx>edited</gpx>")
+        assert not stamps.fresh(artifact, "k1")
+
+        os.remove(artifact)
+        assert not stamps.fresh(artifact, "k1")
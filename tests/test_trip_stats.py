@@ -0,0 +1,115 @@
+"""
+Test suite for trip_stats.py.
+
+Tests cover:
+- Haversine distances against known values
+- Per-day and trip distances, active hours and elevation
+- Extent and centroid, including a trip across the antimeridian
+"""
+
+import pytest
+from datetime import datetime
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    from scripts.trip_stats import haversine_km, trip_stats
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def photo(lat, lon, hour, alt=None, day=15):
+    return {'lat': lat, 'lon': lon, 'alt': alt, 'time': datetime(2025, 8, day, hour)}
+
+
+class TestDistance:
+    """Test great-circle distances."""
+
+    def test_known_distances(self):
+        """
+        Test one degree along the equator and Copenhagen to Aarhus.
+
+        Expected:
+            - ~111.2 km and ~157 km
+        """
+        d = haversine_km(np.array([0.0, 0.0, 55.6761, 56.1629]), np.array([0.0, 1.0, 12.5683, 10.2039]))
+        assert d[0] == pytest.approx(111.19, abs=0.01)
+        assert d[2] == pytest.approx(157.0, abs=1.0)
+
+
+class TestTripStats:
+    """Test the summary statistics."""
+
+    def test_per_day_and_totals(self):
+        """
+        Test a two-day trip with photos out of order.
+
+        Expected:
+            - Each day's distance joins that day's photos in time order
+            - The trip total also includes the overnight hop
+            - Active hours from first to last photo of each day
+        """
+        photos = {
+            '2025-08-15': [photo(0.0, 1.0, 12), photo(0.0, 0.0, 9), photo(0.0, 2.0, 15)],
+            '2025-08-16': [photo(0.0, 3.0, 10, day=16), photo(0.0, 3.0, 11, day=16)],
+        }
+        totals, days = trip_stats(photos, sorted(photos))
+
+        assert days['2025-08-15']['distance_km'] == pytest.approx(222.39, abs=0.01)
+        assert days['2025-08-16']['distance_km'] == 0.0
+        assert totals['distance_km'] == pytest.approx(333.58, abs=0.01)
+        assert days['2025-08-15']['active_hours'] == 6.0
+        assert totals['active_hours'] == 7.0
+        assert totals['bbox'] == [0.0, 0.0, 3.0, 0.0]
+        assert 'elevation_gain_m' not in totals
+
+    def test_elevation_skips_missing_altitudes(self):
+        """
+        Test a hike with a photo without altitude.
+
+        Expected:
+            - Gain and loss compare each altitude with the previous known one
+            - Nothing is counted between days
+        """
+        photos = {
+            '2025-08-15': [photo(62.0, -6.8, 9, 10), photo(62.0, -6.8, 10, None),
+                           photo(62.0, -6.8, 11, 310), photo(62.0, -6.8, 12, 200)],
+            '2025-08-16': [photo(62.0, -6.8, 9, 900, day=16), photo(62.0, -6.8, 10, 950, day=16)],
+        }
+        totals, days = trip_stats(photos, sorted(photos))
+
+        assert (days['2025-08-15']['elevation_gain_m'], days['2025-08-15']['elevation_loss_m']) == (300, 110)
+        assert days['2025-08-16']['elevation_gain_m'] == 50
+        assert (totals['elevation_gain_m'], totals['max_altitude_m']) == (350, 950)
+
+    @pytest.mark.edge_case
+    def test_centroid_across_antimeridian(self):
+        """
+        Test a trip on both sides of 180°.
+
+        Edge Case:
+            - The centroid lies near 180°, not near 0°
+        """
+        photos = {'2025-08-15': [photo(-17.0, 179.0, 9), photo(-17.0, -179.0, 10)]}
+        totals, _ = trip_stats(photos, ['2025-08-15'])
+
+        assert abs(totals['centroid'][0]) == pytest.approx(180.0)
+        assert totals['centroid'][1] == -17.0
+        assert totals['distance_km'] < 250
+
+    @pytest.mark.edge_case
+    def test_single_photo(self):
+        """
+        Test a trip with one photo.
+
+        Edge Case:
+            - Zero distance and hours, no elevation
+        """
+        totals, days = trip_stats({'2025-08-15': [photo(1.0, 2.0, 9, 100)]}, ['2025-08-15'])
+
+        assert (totals['distance_km'], totals['active_hours']) == (0.0, 0.0)
+        assert 'elevation_gain_m' not in days['2025-08-15']
+        assert totals['centroid'] == [2.0, 1.0]
@@ -0,0 +1,388 @@
+"""
+Test suite for write-location-metadata.py's asyncio pipeline.
+
+Tests cover:
+- Scan, geocode and write overlapping instead of running one after another
+- Backpressure from a slow geocoder back to the exiftool pipe
+- Batched writes (one exiftool call per location) and dry runs
+- Geocoding failures and the incremental JSON decoder underneath
+"""
+
+import asyncio
+import importlib.util
+import json
+import re
+import threading
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+import sys
+
+REPO = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO))
+
+try:
+    import geopy  # noqa: F401
+    from scripts.exif_json import RecordDecoder
+    from scripts.geocoding import Throttle
+    from scripts.perf import Progress
+
+    spec = importlib.util.spec_from_file_location(
+        "write_location_metadata", REPO / "scripts" / "write-location-metadata.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+except (ImportError, SystemExit) as e:
+    pytest.skip(f"Script import failed: {e}", allow_module_level=True)
+
+
+def photo(i, lat, lon):
+    return {"SourceFile": f"/photos/IMG_{i:04d}.jpg", "FileName": f"IMG_{i:04d}.jpg",
+            "GPSLatitude": lat, "GPSLongitude": lon}
+
+
+class FakeReader:
+    """exiftool's stdout: one record per read, counting reads."""
+
+    def __init__(self, records):
+        text = json.dumps(records)
+        # Split between records so each read completes exactly one object
+        parts = re.split(r'(?<=\}), ', text)
+        self.chunks = [p.encode() + (b", " if i < len(parts) - 1 else b"")
+                       for i, p in enumerate(parts)]
+        self.reads = 0
+
+    async def read(self, n):
+        if self.reads >= len(self.chunks):
+            return b""
+        self.reads += 1
+        await asyncio.sleep(0)
+        return self.chunks[self.reads - 1]
+
+
+class FakeProcess:
+    def __init__(self, stdout=None, output=b"", status=0):
+        self.stdout = stdout
+        self.output = output
+        self.status = status
+        self.returncode = None
+
+    async def wait(self):
+        self.returncode = 0
+        return 0
+
+    async def communicate(self):
+        await asyncio.sleep(0)
+        self.returncode = self.status
+        return self.output, b""
+
+    def kill(self):
+        self.returncode = -9
+
+
+class FakeExiftool:
+    """Stands in for asyncio.create_subprocess_exec: scans `records`, logs writes."""
+
+    def __init__(self, records, events):
+        self.reader = FakeReader(records)
+        self.events = events
+        self.writes = []
+
+    async def __call__(self, *cmd, **kwargs):
+        if "-json" in cmd:
+            return FakeProcess(stdout=self.reader)
+        files = [c for c in cmd if c.startswith("/photos/")]
+        self.writes.append(cmd)
+        self.events.append(("write", len(files)))
+        return FakeProcess(output=f"    {len(files)} image files updated\n".encode())
+
+
+class SlowGeocoder:
+    """geopy-style reverse(): a city named after the rounded latitude, after `delay` seconds."""
+
+    def __init__(self, events, delay=0.0, fail=()):
+        self.events = events
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def reverse(self, query, language=None):
+        from geopy.exc import GeocoderTimedOut
+
+        self.calls += 1
+        self.events.append(("geocode", self.calls))
+        time.sleep(self.delay)
+        lat, lon = (round(float(x), 2) for x in query.split(","))
+        if (lat, lon) in self.fail:
+            raise GeocoderTimedOut("timeout")
+        return SimpleNamespace(raw={"address": {"city": f"City {lat}", "country": "Faroe Islands"}})
+
+
+def run(records, monkeypatch, geocoder=None, **kwargs):
+    events = []
+    exiftool = FakeExiftool(records, events)
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", exiftool)
+    geocoder = geocoder or SlowGeocoder(events)
+    geocoder.events = events
+    stats = asyncio.run(module.run_pipeline(
+        "/photos", geolocator=geocoder, throttle=Throttle(0), **kwargs))
+    return stats, exiftool, events
+
+
+# One photo per distinct location, so every photo needs a lookup
+DISTINCT = [photo(i, 62.0 + i * 0.05, -6.77) for i in range(12)]
+
+
+class TestPipeline:
+    """Test the scan → geocode → write pipeline."""
+
+    def test_all_photos_written(self, monkeypatch, capsys):
+        """
+        Test a normal run.
+
+        Expected:
+            - Every photo with GPS found and written once
+            - Photos without GPS ignored
+        """
+        records = DISTINCT + [{"SourceFile": "/photos/x.jpg", "FileName": "x.jpg"}]
+        stats, exiftool, _ = run(records, monkeypatch)
+
+        assert (stats.found, stats.success, stats.failed) == (12, 12, 0)
+        written = [c for cmd in exiftool.writes for c in cmd if c.startswith("/photos/")]
+        assert sorted(written) == sorted(p["SourceFile"] for p in DISTINCT)
+        assert any("-IPTC:City=City 62.0" in cmd and "/photos/IMG_0000.jpg" in cmd
+                   for cmd in exiftool.writes)
+
+    def test_stages_overlap(self, monkeypatch):
+        """
+        Test that writing starts before geocoding ends.
+
+        Expected:
+            - The first exiftool write happens before the last geocode request
+        """
+        _, _, events = run(DISTINCT, monkeypatch, geocoder=SlowGeocoder([], delay=0.01), writers=2)
+
+        kinds = [kind for kind, _ in events]
+        assert kinds.index("write") < len(kinds) - 1 - kinds[::-1].index("geocode")
+
+    def test_backpressure_bounds_reads(self, monkeypatch):
+        """
+        Test a geocoder far slower than the scan.
+
+        Expected:
+            - The scan stops reading once the queues are full
+            - Everything still gets written in the end
+        """
+        records = [photo(i, 10.0 + i * 0.05, 10.0) for i in range(40)]
+        events = []
+        exiftool = FakeExiftool(records, events)
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", exiftool)
+        geocoder = SlowGeocoder(events, delay=0.02)
+
+        async def sample():
+            task = asyncio.ensure_future(module.run_pipeline(
+                "/photos", geolocator=geocoder, throttle=Throttle(0), queue_size=2, writers=1))
+            await asyncio.sleep(0.1)  # ~5 lookups in
+            return exiftool.reader.reads, await task
+
+        reads_mid_run, stats = asyncio.run(sample())
+
+        # queue_size photos per queue, one in each step's hands, plus the read in flight
+        assert reads_mid_run <= 2 * 2 + 4
+        assert stats.success == 40
+
+    def test_writes_batched_per_location(self, monkeypatch):
+        """
+        Test many photos in one place.
+
+        Expected:
+            - One geocode request, far fewer exiftool calls than photos
+        """
+        records = [photo(i, 55.68, 12.57) for i in range(60)]
+        stats, exiftool, events = run(records, monkeypatch, writers=1, batch_size=25)
+
+        assert stats.success == 60
+        assert sum(1 for kind, _ in events if kind == "geocode") == 1
+        assert len(exiftool.writes) < 60 / 5
+        assert sum(n for kind, n in events if kind == "write") == 60
+
+    def test_concurrent_lookups(self, monkeypatch):
+        """
+        Test a limiter that allows several requests in flight.
+
+        Expected:
+            - Lookups overlap, up to the limiter's concurrency
+            - Photos at a location already being looked up don't ask again
+        """
+        records = DISTINCT + [photo(100 + i, DISTINCT[0]["GPSLatitude"], -6.77) for i in range(5)]
+        geocoder = SlowGeocoder([], delay=0.03)
+        inside, peak, lock = 0, 0, threading.Lock()
+        original = geocoder.reverse
+
+        def reverse(query, language=None):
+            nonlocal inside, peak
+            with lock:
+                inside += 1
+                peak = max(peak, inside)
+            try:
+                return original(query, language)
+            finally:
+                with lock:
+                    inside -= 1
+
+        geocoder.reverse = reverse
+        events = []
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", FakeExiftool(records, events))
+        stats = asyncio.run(module.run_pipeline(
+            "/photos", geolocator=geocoder, throttle=Throttle(0, concurrency=3)))
+
+        assert stats.success == 17
+        assert geocoder.calls == 12
+        assert 1 < peak <= 3
+
+    def test_trip_locations_reused(self, monkeypatch, tmp_path):
+        """
+        Test --locations with a smart-gps-extract labels file.
+
+        Expected:
+            - Photos near a labelled sample are written with its city, state
+              and country, without a geocode request
+            - Photos far from every sample are still geocoded
+        """
+        labels = tmp_path / "faroe-locations.json"
+        labels.write_text(json.dumps({"2025-08-15": [
+            {"lat": 62.01, "lon": -6.77, "city": "Tórshavn", "state": "Streymoy", "country": "Faroe Islands"},
+        ]}), encoding="utf-8")
+        records = [photo(i, 62.01 + i * 0.003, -6.77) for i in range(5)] + [photo(9, 55.68, 12.57)]
+        geocoder = SlowGeocoder([])
+        stats, exiftool, events = run(records, monkeypatch, geocoder=geocoder, labels=str(labels))
+
+        assert stats.success == 6
+        assert geocoder.calls == 1
+        tags = [c for cmd in exiftool.writes for c in cmd if c.startswith("-IPTC:")]
+        assert "-IPTC:Province-State=Streymoy" in tags and "-IPTC:City=City 55.68" in tags
+
+    def test_dry_run_writes_nothing(self, monkeypatch, capsys):
+        """
+        Test --dry-run.
+
+        Expected:
+            - No exiftool write, commands printed instead
+        """
+        stats, exiftool, _ = run(DISTINCT[:3], monkeypatch, dry_run=True)
+
+        assert exiftool.writes == []
+        assert stats.success == 3
+        assert capsys.readouterr().out.count("[DRY RUN] exiftool -overwrite_original") == 3
+
+    @pytest.mark.edge_case
+    def test_geocode_failure_counted(self, monkeypatch):
+        """
+        Test a failing lookup.
+
+        Edge Cases:
+            - The failed photo is counted and skipped, the rest still written
+        """
+        bad = (round(DISTINCT[1]["GPSLatitude"], 2), -6.77)
+        stats, exiftool, _ = run(DISTINCT[:4], monkeypatch, geocoder=SlowGeocoder([], fail={bad}))
+
+        assert (stats.found, stats.success, stats.failed) == (4, 3, 1)
+        written = [c for cmd in exiftool.writes for c in cmd if c.startswith("/photos/")]
+        assert DISTINCT[1]["SourceFile"] not in written
+
+    @pytest.mark.edge_case
+    def test_no_gps_photos(self, monkeypatch):
+        """
+        Test a folder without GPS.
+
+        Edge Case:
+            - Nothing found, no writes, no hang
+        """
+        stats, exiftool, _ = run([{"SourceFile": "/photos/x.jpg", "FileName": "x.jpg"}], monkeypatch)
+
+        assert stats.found == 0 and exiftool.writes == []
+
+
+class TestWriteMetadata:
+    """Test counting what one exiftool write call managed."""
+
+    PATHS = ["/photos/a.jpg", "/photos/b.jpg", "/photos/c.jpg"]
+
+    def write(self, monkeypatch, output, status):
+        async def exec_(*cmd, **kwargs):
+            return FakeProcess(output=output, status=status)
+
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", exec_)
+        return asyncio.run(module.write_metadata(self.PATHS, ("Tórshavn", "Streymoy", "Faroe Islands")))
+
+    @pytest.mark.edge_case
+    @pytest.mark.parametrize("output,status,expected", [
+        (b"    1 image files updated\n    2 image files unchanged\n", 0, 3),
+        (b"    3 image files unchanged\n", 0, 3),
+        (b"    1 image files updated\n    1 image files unchanged\n"
+         b"    1 files weren't updated due to errors\n", 1, 2),
+        (b"    1 files weren't updated due to errors\n", 1, 0),
+    ])
+    def test_unchanged_files_succeed(self, monkeypatch, output, status, expected):
+        """
+        Test a rerun where some photos already carry the location.
+
+        Edge Cases:
+            - Exit status 0: every file counts, updated or unchanged
+            - Exit status 1: updated and unchanged files count, failed ones don't
+        """
+        assert self.write(monkeypatch, output, status) == expected
+
+
+class TestHelpers:
+    """Test the pieces the pipeline is built on."""
+
+    def test_record_decoder_split_anywhere(self):
+        """
+        Test feeding a document in arbitrary pieces.
+
+        Expected:
+            - Each object returned once, as soon as it's complete
+        """
+        text = json.dumps([{"a": 1}, {"b": "x]y"}, {"c": [1, 2]}])
+        decoder = RecordDecoder()
+        records = []
+        for i in range(0, len(text), 3):
+            records += decoder.feed(text[i:i + 3])
+
+        assert records + decoder.close() == [{"a": 1}, {"b": "x]y"}, {"c": [1, 2]}]
+
+    @pytest.mark.edge_case
+    def test_record_decoder_truncated(self):
+        """
+        Test a document cut off mid-object.
+
+        Edge Case:
+            - close() raises instead of dropping the partial record
+        """
+        decoder = RecordDecoder()
+        assert decoder.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+        with pytest.raises(json.JSONDecodeError):
+            decoder.close()
+
+    def test_location_tags(self):
+        """
+        Test the IPTC assignments.
+
+        Expected:
+            - Unknown city/country and empty state are left out
+        """
+        assert module.location_tags("Aarhus", "", "Denmark") == [
+            "-IPTC:City=Aarhus", "-IPTC:Country-PrimaryLocationName=Denmark"]
+        assert module.location_tags("Unknown", "Region", "Unknown") == ["-IPTC:Province-State=Region"]
+
+    def test_progress_without_total(self, capsys):
+        """
+        Test a progress line for a stream of unknown length.
+
+        Expected:
+            - Count printed without "/total"
+        """
+        Progress(None, "进度").update(7, "ok", force=True)
+        err = capsys.readouterr().err
+        assert "7" in err and "/" not in err